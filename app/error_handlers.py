@@ -5,7 +5,7 @@ This module provides centralized error handling for all application routes.
 """
 
 import logging
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, make_response
 from werkzeug.exceptions import HTTPException
 from app.exceptions import JobecoException
 
@@ -65,8 +65,14 @@ def register_error_handlers(app):
         """Handle 429 Too Many Requests errors."""
         logger.warning(f"Rate limit exceeded: {request.url}")
         if is_ajax_request():
-            return jsonify({'error': 'Too many requests', 'message': 'Rate limit exceeded'}), 429
-        return render_template('errors/429.html'), 429
+            response = jsonify({'error': 'Too many requests', 'message': 'Rate limit exceeded'})
+        else:
+            response = make_response(render_template('errors/429.html'))
+        response.status_code = 429
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            response.headers['Retry-After'] = str(retry_after)
+        return response
     
     @app.errorhandler(500)
     def internal_error(error):
@@ -97,6 +103,8 @@ def register_error_handlers(app):
             return render_template('errors/401.html'), 401
         elif error.status_code == 400:
             return render_template('errors/400.html'), 400
+        elif error.status_code == 429:
+            return render_template('errors/429.html'), 429
         else:
             return render_template('errors/500.html'), 500
     
@@ -1,4 +1,6 @@
-from flask import flash, redirect, url_for, session, Response
+import re
+import math
+from flask import flash, redirect, url_for, session, request, Response, current_app, abort, make_response
 from functools import wraps
 from typing import Callable, Any, Optional, Union
 
@@ -29,6 +31,95 @@ def login_required(f: Callable) -> Callable:
     return decorated_function
 
 
+def is_admin() -> bool:
+    """Whether the logged-in user is listed in ADMIN_USERNAMES."""
+    if session.get("user_id") is None:
+        return False
+    from app.services.user_service import UserService
+    user = UserService().get_user_by_id(session["user_id"])
+    return bool(user) and user['username'] in current_app.config.get('ADMIN_USERNAMES', set())
+
+
+def admin_required(f: Callable) -> Callable:
+    """Decorate routes to require a user listed in ADMIN_USERNAMES."""
+
+    @wraps(f)
+    def decorated_function(*args: Any, **kwargs: Any) -> Union[Response, Any]:
+        if session.get("user_id") is None:
+            return redirect("/login")
+        if not is_admin():
+            abort(403)
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def rate_limit(scope: str, methods: tuple = ('POST',), by: str = 'ip',
+               failures_only: bool = False) -> Callable:
+    """
+    Decorate routes to limit how often each client may use them.
+
+    The limit and window of the scope come from RATE_LIMITS; refused requests
+    get a 429 with a Retry-After header.
+
+    Args:
+        scope: Key of RATE_LIMITS, also the bucket's name
+        methods: Request methods that are limited
+        by: 'ip' for the client address, 'user' for the logged-in user (address when logged out)
+        failures_only: Give the token back when the route redirects, its response to
+            a successful form, so that users who get their password right aren't limited.
+            The token is still taken up front, so concurrent attempts can't all pass a check
+            made before any of them fails.
+    """
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated_function(*args: Any, **kwargs: Any) -> Union[Response, Any]:
+            if request.method not in methods or not current_app.config.get('RATE_LIMIT_ENABLED'):
+                return f(*args, **kwargs)
+            from app.services.background import start_worker
+            from app.services.rate_limit_service import RateLimitService, expire_buckets
+            start_worker('rate-limit-expiry', expire_buckets, current_app.config['RATE_LIMIT_EXPIRY_INTERVAL'])
+            limit, window = current_app.config['RATE_LIMITS'][scope]
+            client = session.get('user_id') if by == 'user' else None
+            key = f"{scope}:user:{client}" if client is not None else f"{scope}:ip:{request.remote_addr}"
+            limiter = RateLimitService()
+
+            allowed, retry_after = limiter.hit(key, limit, window)
+            if not allowed:
+                abort(429, retry_after=math.ceil(retry_after))
+            response = make_response(f(*args, **kwargs))
+            if failures_only and response.status_code in (301, 302, 303):
+                limiter.refund(key, limit)
+            return response
+
+        return decorated_function
+    return decorator
+
+
+def postcode_district(postcode: Optional[str]) -> str:
+    """
+    Reduce a postcode to its district, the unit prices are compared over.
+
+    UK postcodes keep their outward code without a sub-district letter
+    ('SW1A 1AA' -> 'SW1'); anything else is normalised but otherwise kept.
+    """
+    if not postcode:
+        return ''
+    normalised = re.sub(r'\s+', '', postcode).upper()
+    match = re.match(r'^([A-Z]{1,2}[0-9]{1,2})[A-Z]?(?:[0-9][A-Z]{2})?$', normalised)
+    return match.group(1) if match else normalised
+
+
+def distance_miles(lat1: Optional[float], lon1: Optional[float],
+                   lat2: Optional[float], lon2: Optional[float]) -> Optional[float]:
+    """Great-circle distance in miles between two points; also registered as an SQL function."""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 3958.8 * math.asin(min(1.0, math.sqrt(a)))
+
+
 
 
 #api requests TBD
\ No newline at end of file
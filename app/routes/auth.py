@@ -1,11 +1,8 @@
 from flask import Blueprint, flash, redirect, render_template, request, session, url_for, make_response
 from werkzeug.wrappers.response import Response
-from datetime import datetime, timedelta
-from functools import wraps
-from typing import Callable, Any, Dict, Optional, Union
-from typing import cast
+from typing import Dict
 
-from app.helpers import login_required
+from app.helpers import login_required, rate_limit
 from app.services.user_service import UserService
 from app.validators import validate_form, StringValidator, EmailValidator, PasswordValidator
 from app.exceptions import AuthenticationError, ValidationError, DuplicateResourceError
@@ -16,47 +13,8 @@ auth_bp = Blueprint('auth', __name__)
 # Initialize services
 user_service = UserService()
 
-# Rate limiting storage (persists across requests)
-_rate_limit_attempts: Dict[str, list] = {}
-
-# Rate limiting decorator
-def rate_limit(limit: int = 5, window: int = 300) -> Callable:  # 5 attempts per 5 minutes
-    def decorator(f: Callable) -> Callable:
-        @wraps(f)
-        def wrapped(*args: Any, **kwargs: Any) -> Union[str, tuple[str, int], Response]:
-            now = datetime.now()
-            ip = request.remote_addr or "unknown"
-            
-            # Clean old attempts
-            _rate_limit_attempts[ip] = [t for t in _rate_limit_attempts.get(ip, []) if now - t < timedelta(seconds=window)]
-            
-            if len(_rate_limit_attempts.get(ip, [])) >= limit:
-                flash("Too many login attempts. Please try again later.", "error")
-                return render_template("login.html"), 429
-            
-            # Call the original function
-            result = f(*args, **kwargs)
-            
-            # Only count failed attempts (when login fails)
-            # Check if this was a POST request and login failed
-            if request.method == "POST":
-                # If the result is a redirect to "/", login was successful
-                # If the result is a rendered template, login failed
-                if isinstance(result, Response) and result.status_code == 302 and result.location == "/":
-                    # Successful login - don't count this attempt
-                    pass
-                else:
-                    # Failed login - count this attempt
-                    _rate_limit_attempts[ip] = _rate_limit_attempts.get(ip, []) + [now]
-            
-            if isinstance(result, (str, tuple, Response)):
-                return result
-            raise RuntimeError("rate_limit wrapped function did not return str, tuple[str, int], or Response")
-        return wrapped
-    return decorator
-
 @auth_bp.route("/login", methods=["GET", "POST"])
-# @rate_limit() # Disabled rate limiting
+@rate_limit('login', failures_only=True)
 def login() -> Response:
     """Log user in"""
     # Forget any user_id
@@ -133,6 +91,7 @@ def logout() -> Response:
     return redirect("/")
 
 @auth_bp.route("/register", methods=["GET", "POST"])
+@rate_limit('register')
 def register() -> Response:
     # Get invitation token from query parameter or session
     invitation_token = request.args.get('invitation_token') or session.get('pending_invitation')
@@ -1,8 +1,10 @@
-from flask import Blueprint, flash, redirect, render_template, request, session, url_for
+from flask import Blueprint, flash, redirect, render_template, request, session, url_for, abort
 from werkzeug.wrappers.response import Response
 from typing import Optional, List, Dict, Any, Union
-from app.helpers import login_required
+from app.helpers import login_required, rate_limit
 from app.services.group_service import GroupService
+from app.services.geo_service import SEARCH_RADII
+from app.services.export_service import ExportService, TRADESMAN_COLUMNS
 
 # Create Blueprint
 groups_bp = Blueprint('groups', __name__)
@@ -29,6 +31,23 @@ def create_group() -> Union[str, Response]:
             return redirect(url_for('groups.create_group'))
     return render_template('create_group.html')
 
+@groups_bp.route('/view_group/<int:group_id>/tradesmen/export.<export_format>')
+@login_required
+def export_group_tradesmen(group_id: int, export_format: str) -> Response:
+    """Stream the group's tradesmen as CSV or XLSX; members only."""
+    if export_format not in ExportService.enabled_formats():
+        abort(404)
+    group: Optional[Dict[str, Any]] = group_service.get_group_by_id(group_id)
+    if not group:
+        abort(404)
+    membership: Optional[Dict[str, Any]] = group_service.get_user_group_membership(session['user_id'], group_id)
+    if not membership or membership['status'] not in ['member', 'admin', 'creator']:
+        abort(403)
+    
+    from app.services.tradesman_service import TradesmanService
+    rows = TradesmanService().iter_tradesmen_by_group(group_id)
+    return ExportService.response(rows, TRADESMAN_COLUMNS, export_format, f"group-{group_id}-tradesmen")
+
 @groups_bp.route('/view_group/<int:group_id>', methods=['GET', 'POST'])
 @login_required
 def view_group(group_id: int) -> Union[str, Response]:
@@ -80,16 +99,20 @@ def view_group(group_id: int) -> Union[str, Response]:
             return redirect(url_for('groups.view_group', group_id=group_id))
         except Exception as e:
             flash(f'An error occurred: {str(e)}', 'error')
-    return render_template('view_group.html', group=group, members=members, tradesmen=tradesmen, creator=creator, member_count=member_count, tradesmen_count=tradesmen_count, job_count=job_count, group_jobs_quotes=group_jobs_quotes, is_member=is_member, is_admin_or_creator=is_admin_or_creator, pending_requests_count=pending_requests_count, pending_requests=pending_requests, pending_request=pending_request)
+    return render_template('view_group.html', group=group, members=members, tradesmen=tradesmen, creator=creator, member_count=member_count, tradesmen_count=tradesmen_count, job_count=job_count, group_jobs_quotes=group_jobs_quotes, is_member=is_member, is_admin_or_creator=is_admin_or_creator, pending_requests_count=pending_requests_count, pending_requests=pending_requests, pending_request=pending_request, export_formats=ExportService.enabled_formats())
 
 @groups_bp.route('/search_groups', methods=['GET', 'POST'])
 @login_required
+@rate_limit('search', by='user')
 def search_groups() -> str:
     groups: List[Dict[str, Any]] = []
+    postcode: Optional[str] = None
+    radius: Optional[float] = None
     if request.method == 'POST':
         name: Optional[str] = request.form.get('name')
-        postcode: Optional[str] = request.form.get('postcode')
-        groups = group_service.search_groups(name=name, postcode=postcode)
+        postcode = request.form.get('postcode')
+        radius = request.form.get('radius', type=float)
+        groups = group_service.search_groups(name=name, postcode=postcode, radius=radius)
     else:
         groups = group_service.get_all_groups()
     
@@ -100,7 +123,7 @@ def search_groups() -> str:
         membership = group_service.get_user_group_membership(session['user_id'], group['id'])
         group['status'] = membership['status'] if membership else None
     
-    return render_template('search_groups.html', groups=groups)
+    return render_template('search_groups.html', groups=groups, postcode=postcode, radius=radius, radii=SEARCH_RADII)
 
 @groups_bp.route('/group_members/<int:group_id>')
 @login_required
@@ -172,6 +195,7 @@ def handle_request(request_id: int, action: str) -> Response:
 
 @groups_bp.route('/send_invitation/<int:group_id>', methods=['GET', 'POST'])
 @login_required
+@rate_limit('invitation', by='user')
 def send_invitation(group_id: int) -> Union[str, Response]:
     """Send an email invitation to join a group."""
     # Check if user has permission to send invitations (admin or creator)
@@ -1,10 +1,16 @@
 from flask import Blueprint, flash, redirect, render_template, request, session, url_for, current_app, abort
 from werkzeug.wrappers.response import Response
 from typing import Optional, List, Dict, Any, Union
-from app.helpers import login_required
+from app.helpers import login_required, admin_required
 from app.services.job_service import JobService
 from app.services.tradesman_service import TradesmanService
 from app.services.file_service import FileService
+from app.services.upload_service import UploadService
+from app.services.price_stats_service import PriceStatsService, JOB_METRICS, QUOTE_METRICS
+from app.services.quote_sketch_service import QuoteSketchService
+from app.services.anomaly_service import AnomalyService, REVIEW_STATUSES
+from app.services.group_service import GroupService
+from app.exceptions import JobecoException
 from pathlib import Path
 import os
 import uuid
@@ -16,6 +22,38 @@ jobs_bp = Blueprint('jobs', __name__)
 # Initialize services
 job_service = JobService()
 tradesman_service = TradesmanService()
+upload_service = UploadService()
+price_stats_service = PriceStatsService()
+quote_sketch_service = QuoteSketchService()
+group_service = GroupService()
+anomaly_service = AnomalyService()
+
+def _form_file(field: str, folder: str, current: Optional[str] = None) -> Optional[str]:
+    """
+    Resolve the file for a form field.
+
+    A finished chunked upload (sent as `<field>_upload_id`) takes precedence over
+    an inline multipart file; with neither, the current file is kept.
+    """
+    new_file = None
+    upload_id = request.form.get(f"{field}_upload_id")
+    if upload_id:
+        try:
+            new_file = upload_service.claim_upload(upload_id, session["user_id"])
+        except JobecoException as e:
+            flash(e.message, "error")
+            return current
+    elif field in request.files:
+        file_obj = request.files[field]
+        if file_obj and file_obj.filename:
+            new_file = FileService.save_file(file_obj, folder)
+
+    if new_file is None:
+        return current
+    # Delete old file if it exists
+    if current:
+        FileService.delete_file(current)
+    return new_file
 
 @jobs_bp.route("/add_job/<int:tradesman_id>", methods=["GET", "POST"])
 @login_required
@@ -43,18 +81,8 @@ def add_job(tradesman_id: int) -> Union[str, Response]:
         rating = request.form.get("rating")
 
         # Handle file uploads
-        quote_file = None
-        job_file = None
-        
-        if 'quote_file' in request.files:
-            quote_file_obj = request.files['quote_file']
-            if quote_file_obj and quote_file_obj.filename:
-                quote_file = FileService.save_file(quote_file_obj, 'quotes')
-        
-        if 'job_file' in request.files:
-            job_file_obj = request.files['job_file']
-            if job_file_obj and job_file_obj.filename:
-                job_file = FileService.save_file(job_file_obj, 'jobs')
+        quote_file = _form_file('quote_file', 'quotes')
+        job_file = _form_file('job_file', 'jobs')
 
         try:
             # Convert empty strings to None for optional fields and cast to correct types
@@ -119,11 +147,7 @@ def add_quote(tradesman_id: int) -> Union[str, Response]:
         status = request.form.get("status", "pending")
 
         # Handle file upload
-        quote_file = None
-        if 'quote_file' in request.files:
-            quote_file_obj = request.files['quote_file']
-            if quote_file_obj and quote_file_obj.filename:
-                quote_file = FileService.save_file(quote_file_obj, 'quotes')
+        quote_file = _form_file('quote_file', 'quotes')
 
         try:
             # Convert empty strings to None for optional fields and cast to correct types
@@ -214,7 +238,12 @@ def view_quote(quote_id: int) -> Union[str, Response]:
         return redirect(url_for("search.search_tradesmen"))
     
     can_edit = job_service.can_user_edit_job(session["user_id"], quote_id)
-    return render_template("view_quote.html", quote=quote, can_edit=can_edit)
+    price_stats = price_stats_service.get_stats(quote['trade'], quote['postcode'], QUOTE_METRICS)
+    group_postcodes = [group['postcode'] for group in group_service.get_user_groups(session["user_id"])
+                       if group['status'] != 'pending']
+    price_scores = quote_sketch_service.score_quote(quote, QUOTE_METRICS, group_postcodes)
+    return render_template("view_quote.html", quote=quote, can_edit=can_edit,
+                           price_stats=price_stats, price_scores=price_scores)
 
 @jobs_bp.route('/edit_quote/<int:quote_id>', methods=['GET', 'POST'])
 @login_required
@@ -243,16 +272,8 @@ def edit_quote(quote_id: int) -> Union[str, Response]:
         total_quote = request.form.get("total_quote")
         status = request.form.get("status", "pending")
 
-        # Handle file upload
-        quote_file = quote.get('quote_file')  # Keep existing file if no new one uploaded
-        
-        if 'quote_file' in request.files:
-            quote_file_obj = request.files['quote_file']
-            if quote_file_obj and quote_file_obj.filename:
-                # Delete old file if it exists
-                if quote_file:
-                    FileService.delete_file(quote_file)
-                quote_file = FileService.save_file(quote_file_obj, 'quotes')
+        # Handle file upload, keeping the existing file if no new one was sent
+        quote_file = _form_file('quote_file', 'quotes', quote.get('quote_file'))
 
         try:
             call_out_fee_int = int(call_out_fee) if call_out_fee else None
@@ -295,7 +316,9 @@ def view_job(job_id: int) -> Union[str, Response]:
         flash("Job not found.", "error")
         return redirect(url_for("search.search_jobs_quotes"))
     
-    return render_template("view_job.html", job=job)
+    price_stats = price_stats_service.get_stats(job['trade'], job['postcode'], JOB_METRICS)
+    quote_snapshot = job_service.get_quote_snapshot(job_id)
+    return render_template("view_job.html", job=job, price_stats=price_stats, quote_snapshot=quote_snapshot)
 
 @jobs_bp.route('/edit_job/<int:job_id>', methods=['GET', 'POST'])
 @login_required
@@ -324,25 +347,9 @@ def edit_job(job_id: int) -> Union[str, Response]:
         total_cost = request.form.get("total_cost")
         rating = request.form.get("rating")
 
-        # Handle file uploads
-        quote_file = job.get('quote_file')  # Keep existing file if no new one uploaded
-        job_file = job.get('job_file')      # Keep existing file if no new one uploaded
-        
-        if 'quote_file' in request.files:
-            quote_file_obj = request.files['quote_file']
-            if quote_file_obj and quote_file_obj.filename:
-                # Delete old file if it exists
-                if quote_file:
-                    FileService.delete_file(quote_file)
-                quote_file = FileService.save_file(quote_file_obj, 'quotes')
-        
-        if 'job_file' in request.files:
-            job_file_obj = request.files['job_file']
-            if job_file_obj and job_file_obj.filename:
-                # Delete old file if it exists
-                if job_file:
-                    FileService.delete_file(job_file)
-                job_file = FileService.save_file(job_file_obj, 'jobs')
+        # Handle file uploads, keeping existing files if no new ones were sent
+        quote_file = _form_file('quote_file', 'quotes', job.get('quote_file'))
+        job_file = _form_file('job_file', 'jobs', job.get('job_file'))
 
         try:
             call_out_fee_int = int(call_out_fee) if call_out_fee else None
@@ -410,6 +417,25 @@ def delete_job(job_id: int) -> Union[str, Response]:
         flash(f"An error occurred while deleting the job: {str(e)}", "error")
         return redirect(url_for("jobs.edit_job", job_id=job_id))
 
+@jobs_bp.route('/price_review')
+@admin_required
+def price_review() -> str:
+    """Queue of prices flagged as implausible when they were saved."""
+    return render_template("price_review.html", anomalies=anomaly_service.get_pending())
+
+@jobs_bp.route('/price_review/<int:anomaly_id>', methods=['POST'])
+@admin_required
+def review_price(anomaly_id: int) -> Response:
+    """Accept a flagged price into the statistics or reject it for good."""
+    status = request.form.get('status')
+    if status not in REVIEW_STATUSES:
+        abort(400)
+    if anomaly_service.review(anomaly_id, status, session["user_id"]):
+        flash("Price accepted." if status == 'accepted' else "Price rejected.", "success")
+    else:
+        flash("This price has already been reviewed.", "error")
+    return redirect(url_for("jobs.price_review"))
+
 @jobs_bp.route('/uploads/<path:filename>')
 @login_required
 def uploaded_file(filename):
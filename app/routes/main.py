@@ -1,13 +1,22 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session, current_app, abort
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, current_app, abort, jsonify
 from flask_babel import gettext as _
 from werkzeug.wrappers.response import Response
 from typing import Any, Dict, List, Union, Optional
-from app.helpers import login_required
+from app.helpers import login_required, postcode_district
 from app.services.user_service import UserService
 from app.services.group_service import GroupService
 from app.services.tradesman_service import TradesmanService
 from app.services.job_service import JobService
 from app.services.file_service import FileService
+from app.services.storage_service import get_storage
+from app.services import metrics_service
+from app.services.dashboard_service import DashboardService
+from app.services.price_index_service import PriceIndexService, PERIOD_TYPES
+from app.services.jobs_snapshot_service import get_jobs_snapshot
+from app.services.change_log import schedule_change_processing
+from app.services.export_service import ExportService, JOB_COLUMNS, TRADESMAN_COLUMNS, GROUP_COLUMNS
+from app.config.dashboard import DASHBOARD_CONFIG, PERFORMANCE_CONFIG
+from app.exceptions import ValidationError
 from config import get_config
 from pathlib import Path
 import os
@@ -16,6 +25,12 @@ from datetime import datetime
 
 main_bp = Blueprint('main', __name__)
 
+DASHBOARD_EXPORT_COLUMNS = {
+    'tradesmen': TRADESMAN_COLUMNS,
+    'jobs': JOB_COLUMNS,
+    'groups': GROUP_COLUMNS,
+}
+
 # Configure application
 from flask import Flask, g, render_template, request, session, current_app, redirect, url_for, flash, Response
 from flask_session import Session
@@ -146,39 +161,131 @@ def setup_extensions(app: Flask, config):
 @login_required
 def index() -> Union[str, Response]:
     """Show portfolio of tradesmen and recent jobs."""
-    user_service = UserService()
-    group_service = GroupService()
-    tradesman_service = TradesmanService()
-    job_service = JobService()
+    dashboard_service = DashboardService()
     
     user_id = session.get("user_id")
     if user_id is None:
         flash(_("User not logged in."), "error")
         return redirect(url_for("auth.login"))
     
-    # Get user's tradesmen
-    user_tradesmen = tradesman_service.get_tradesmen_by_user(user_id)
-    
-    # Get user's groups
-    user_groups = group_service.get_user_groups_with_stats(user_id, limit=10)
-    
-    # Get recent jobs for user's tradesmen
-    recent_jobs = job_service.get_recent_completed_jobs_for_user(user_id, limit=5)
+    # Only the first page of each section is rendered; the tables fetch the
+    # rest from main.dashboard_section as the user scrolls
+    page_size = DASHBOARD_CONFIG['max_items_per_section']
+    sections = {
+        section: dashboard_service.get_page(section, user_id, limit=page_size)
+        for section in ('tradesmen', 'jobs', 'groups')
+    }
     
     # Get statistics
     stats = {
-        'total_tradesmen': len(user_tradesmen),
-        'total_groups': len(user_groups),
-        'total_jobs': len(recent_jobs)
+        'total_tradesmen': dashboard_service.count('tradesmen', user_id),
+        'total_groups': dashboard_service.count('groups', user_id),
+        'total_jobs': dashboard_service.count('jobs', user_id)
     }
     
     return render_template("index.html", 
-                         tradesmen=user_tradesmen, 
-                         my_groups=user_groups, 
-                         recent_jobs=recent_jobs,
+                         tradesmen=sections['tradesmen']['rows'], 
+                         my_groups=sections['groups']['rows'], 
+                         recent_jobs=sections['jobs']['rows'],
+                         sections=sections,
+                         page_size=page_size,
+                         performance=PERFORMANCE_CONFIG,
+                         export_formats=ExportService.enabled_formats(),
                          stats=stats,
                          config=current_app.config)
 
+@main_bp.route('/api/dashboard/<section>')
+@login_required
+def dashboard_section(section: str):
+    """One page of a dashboard table as JSON, sorted and paginated in SQL."""
+    dashboard_service = DashboardService()
+    try:
+        limit = min(int(request.args.get('limit', DASHBOARD_CONFIG['max_items_per_section'])),
+                    PERFORMANCE_CONFIG['max_visible_rows'])
+    except ValueError:
+        raise ValidationError("limit must be an integer", "limit")
+    
+    page = dashboard_service.get_page(
+        section,
+        session["user_id"],
+        sort=request.args.get('sort'),
+        order=request.args.get('order'),
+        cursor=request.args.get('cursor'),
+        limit=max(limit, 1)
+    )
+    return jsonify({
+        'sort': page['sort'],
+        'order': page['order'],
+        'next_cursor': page['next_cursor'],
+        'count': len(page['rows']),
+        'html': render_template('components/dashboard_rows.html', section=section, rows=page['rows'])
+    })
+
+@main_bp.route('/api/dashboard/<section>/export.<export_format>')
+@login_required
+def export_dashboard_section(section: str, export_format: str) -> Response:
+    """Stream a whole dashboard section as CSV or XLSX, in the table's sort order."""
+    if export_format not in ExportService.enabled_formats():
+        abort(404)
+    
+    rows = DashboardService().iter_section(
+        section,
+        session["user_id"],
+        sort=request.args.get('sort'),
+        order=request.args.get('order')
+    )
+    return ExportService.response(rows, DASHBOARD_EXPORT_COLUMNS[section], export_format, f"dashboard-{section}")
+
+@main_bp.route('/api/price_index')
+@login_required
+def price_index():
+    """A trade's monthly or quarterly price index as chart series, read from the rollup."""
+    trade = request.args.get('trade', '').strip()
+    if not trade:
+        raise ValidationError("trade is required", "trade")
+    period_type = request.args.get('period', 'month')
+    if period_type not in PERIOD_TYPES:
+        raise ValidationError(f"period must be one of {', '.join(PERIOD_TYPES)}", "period")
+    district = postcode_district(request.args.get('postcode'))
+
+    series = PriceIndexService().get_series(
+        trade, district, period_type,
+        start=request.args.get('start'),
+        end=request.args.get('end')
+    )
+    return jsonify({
+        'trade': trade,
+        'district': district,
+        'period': period_type,
+        'labels': [row['period'] for row in series],
+        'job_count': [row['job_count'] for row in series],
+        'median_hourly_rate': [row['median_hourly_rate'] for row in series],
+        'median_total_cost': [row['median_total_cost'] for row in series],
+    })
+
+@main_bp.route('/api/trade_insights')
+@login_required
+def trade_insights():
+    """Cost per hour, estimate accuracy and rating trends of trades, read from the jobs snapshot."""
+    trade = request.args.get('trade', '').strip() or None
+    snapshot = get_jobs_snapshot()
+    if snapshot is None:
+        # The change log worker builds the first snapshot
+        schedule_change_processing()
+        return jsonify({'trade': trade, 'cost_per_hour': {}, 'estimate_accuracy': {}, 'rating_trend': []})
+
+    cost_per_hour = snapshot.cost_per_hour_by_trade()
+    estimate_accuracy = snapshot.estimate_accuracy_by_trade()
+    if trade is not None:
+        cost_per_hour = {name: stats for name, stats in cost_per_hour.items() if name == trade}
+        estimate_accuracy = {name: stats for name, stats in estimate_accuracy.items() if name == trade}
+    return jsonify({
+        'trade': trade,
+        'cost_per_hour': cost_per_hour,
+        'estimate_accuracy': estimate_accuracy,
+        'rating_trend': snapshot.rating_trend(trade),
+    })
+
 @main_bp.route('/set_language/<language>')
 def set_language(language: str) -> Response:
     """Modern language switching with optional persistence."""
@@ -263,9 +370,40 @@ def uploaded_file(filename):
     if '..' in filename or filename.startswith('/'):
         abort(404)
     
+    # Object storage hands out a presigned URL so this node never proxies the bytes
+    storage = get_storage()
+    download_url = storage.url(filename, Path(filename).name)
+    if download_url:
+        return redirect(download_url)
+    
     upload_folder = current_app.config['UPLOAD_FOLDER']
     return send_from_directory(upload_folder, filename)
 
+@main_bp.route('/previews/<path:filename>')
+@login_required
+def file_preview(filename):
+    """Serve the generated thumbnail or first-page preview of an upload."""
+    from flask import send_file
+    from app.services.preview_service import find_preview
+    
+    # Security check - ensure filename doesn't contain path traversal
+    if '..' in filename or filename.startswith('/'):
+        abort(404)
+    
+    # Previews appear once the background worker has finished
+    local_path = get_storage().local_path(filename)
+    preview = find_preview(local_path) if local_path is not None else None
+    metrics_service.record_cache('previews', preview is not None)
+    if preview is None:
+        abort(404)
+    
+    response = send_file(preview.resolve(), max_age=current_app.config['PREVIEW_CACHE_MAX_AGE'])
+    # Upload names are unique, so a preview never changes once written
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.immutable = True
+    return response
+
 @main_bp.route('/test_translation')
 def test_translation():
     """Test route to verify translations are working."""
@@ -1,9 +1,13 @@
-from flask import Blueprint, render_template, request, session, flash, redirect, url_for, Response
-from typing import Any, Dict, List, Optional, Union
-from app.helpers import login_required
+from flask import Blueprint, render_template, request, session, flash, redirect, url_for, Response, abort
+from typing import Any, Dict, List, Optional, Union, Iterator
+import heapq
+import itertools
+from app.helpers import login_required, rate_limit
 from app.services.tradesman_service import TradesmanService
-from app.services.job_service import JobService
+from app.services.job_service import JobService, SEARCH_SORTS
 from app.services.group_service import GroupService
+from app.services.geo_service import SEARCH_RADII
+from app.services.export_service import ExportService, JOB_COLUMNS, TRADESMAN_COLUMNS
 
 # Create Blueprint
 search_bp = Blueprint('search', __name__)
@@ -13,8 +17,13 @@ tradesman_service = TradesmanService()
 job_service = JobService()
 group_service = GroupService()
 
+def _merge_results(streams: List[Iterator[Dict[str, Any]]], sort: str) -> Iterator[Dict[str, Any]]:
+    """Merge job and quote results that are each already in a SEARCH_SORTS order."""
+    return heapq.merge(*streams, key=lambda row: row['effective_hourly_rate'], reverse=sort == 'rate_desc')
+
 @search_bp.route('/search_tradesmen', methods=['GET', 'POST'])
 @login_required
+@rate_limit('search', by='user')
 def search_tradesmen() -> str:
     message = request.args.get('message')
     tradesmen: List[Dict[str, Any]] = []
@@ -25,28 +34,39 @@ def search_tradesmen() -> str:
     postcode = ''
     selected_user = ''
     selected_group = ''
+    selected_sort = ''
+    radius = None
     
     if request.method == 'POST':
         search_term = request.form.get('search_term', '')
         trade = request.form.get('trade', '')
         postcode = request.form.get('postcode', '')
+        radius = request.form.get('radius', type=float)
         added_by_user = request.form.get('added_by_user', '')
         group = request.form.get('group', '')
+        sort = request.form.get('sort', '')
         
         # Update selected values for form persistence
         selected_trade = trade
         selected_user = added_by_user
         selected_group = group
+        selected_sort = sort
         
-        tradesmen = tradesman_service.search_tradesmen(search_term, trade, postcode)
+        tradesmen = tradesman_service.search_tradesmen(search_term, trade, postcode, sort, radius)
     
     # Get filter options
     trades = tradesman_service.get_unique_trades()
     users = tradesman_service.get_unique_users()
     groups = tradesman_service.get_unique_groups()
     
+    # Filters for the export links, so the download matches the results
+    export_args = {'search_term': search_term, 'trade': selected_trade, 'postcode': postcode, 'sort': selected_sort,
+                   'radius': radius or ''}
+    
     return render_template('search_tradesmen.html', 
                          tradesmen=tradesmen, 
+                         export_args=export_args,
+                         export_formats=ExportService.enabled_formats(), 
                          message=message,
                          trades=trades,
                          users=users,
@@ -54,11 +74,15 @@ def search_tradesmen() -> str:
                          search_term=search_term,
                          selected_trade=selected_trade,
                          postcode=postcode,
+                         radius=radius,
+                         radii=SEARCH_RADII,
                          selected_user=selected_user,
-                         selected_group=selected_group)
+                         selected_group=selected_group,
+                         selected_sort=selected_sort)
 
 @search_bp.route('/search_jobs_quotes', methods=['GET', 'POST'])
 @login_required
+@rate_limit('search', by='user')
 def search_jobs_quotes() -> str:
     jobs: List[Dict[str, Any]] = []
     quotes: List[Dict[str, Any]] = []
@@ -70,6 +94,7 @@ def search_jobs_quotes() -> str:
     selected_rating = ''
     selected_user = ''
     selected_group = ''
+    selected_sort = ''
     include_jobs = 'on'
     include_quotes = 'on'
     
@@ -138,37 +163,59 @@ def search_jobs_quotes() -> str:
         group = request.form.get('group', '')
         include_jobs = request.form.get('include_jobs', 'on')
         include_quotes = request.form.get('include_quotes', 'on')
+        sort = request.form.get('sort', '')
         
         # Update selected values for form persistence
         selected_trade = trade
         selected_rating = rating
         selected_user = added_by_user
         selected_group = group
+        selected_sort = sort
         
         # Search for jobs if requested
         if include_jobs == 'on':
-            jobs = job_service.search_jobs(search_term, trade, rating, added_by_user, group)
+            jobs = job_service.search_jobs(search_term, trade, rating, added_by_user, group, sort)
             for job in jobs:
                 job['type'] = 'job'
-                combined_results.append(job)
         
         # Search for quotes if requested
         if include_quotes == 'on':
-            quotes = job_service.search_quotes(search_term, trade, None, None)
+            quotes = job_service.search_quotes(search_term, trade, None, None, sort)
             for quote in quotes:
                 quote['type'] = 'quote'
-                combined_results.append(quote)
         
-        # Sort combined results by date (most recent first)
-        combined_results.sort(key=lambda x: x.get('date_finished') or x.get('date_requested') or '', reverse=True)
+        if sort in SEARCH_SORTS:
+            # Both lists come back ordered by the rate index, so merge instead of re-sorting
+            combined_results = list(_merge_results([jobs, quotes], sort))
+        else:
+            # Sort combined results by date (most recent first)
+            combined_results = jobs + quotes
+            combined_results.sort(key=lambda x: x.get('date_finished') or x.get('date_requested') or '', reverse=True)
     
     # Get filter options
     trades = job_service.get_unique_trades()
     users = job_service.get_unique_users()
     groups = job_service.get_unique_groups()
     
+    # Filters for the export links, so the download matches the results
+    if filtered_user:
+        export_args = {'user_id': filtered_user['id']}
+    else:
+        export_args = {
+            'search_term': search_term,
+            'trade': selected_trade,
+            'rating': selected_rating,
+            'added_by_user': selected_user,
+            'group': selected_group,
+            'include_jobs': include_jobs,
+            'include_quotes': include_quotes,
+            'sort': selected_sort
+        }
+    
     return render_template('search_jobs_quotes.html', 
                          results=combined_results, 
+                         export_args=export_args,
+                         export_formats=ExportService.enabled_formats(), 
                          trades=trades, 
                          users=users, 
                          groups=groups,
@@ -177,19 +224,70 @@ def search_jobs_quotes() -> str:
                          selected_rating=selected_rating,
                          selected_user=selected_user,
                          selected_group=selected_group,
+                         selected_sort=selected_sort,
                          include_jobs=include_jobs,
                          include_quotes=include_quotes,
                          filtered_user=filtered_user,
                          show_search_form=show_search_form)
 
+@search_bp.route('/search_tradesmen/export.<export_format>')
+@login_required
+@rate_limit('search', methods=('GET',), by='user')
+def export_tradesmen(export_format: str) -> Response:
+    """Stream the tradesman search results as CSV or XLSX."""
+    if export_format not in ExportService.enabled_formats():
+        abort(404)
+    
+    rows = tradesman_service.iter_search_tradesmen(
+        request.args.get('search_term', ''),
+        request.args.get('trade', ''),
+        request.args.get('postcode', ''),
+        request.args.get('sort', ''),
+        request.args.get('radius', type=float)
+    )
+    return ExportService.response(rows, TRADESMAN_COLUMNS, export_format, 'tradesmen')
+
+@search_bp.route('/search_jobs_quotes/export.<export_format>')
+@login_required
+@rate_limit('search', methods=('GET',), by='user')
+def export_jobs_quotes(export_format: str) -> Response:
+    """Stream the job and quote search results as CSV or XLSX, jobs first."""
+    if export_format not in ExportService.enabled_formats():
+        abort(404)
+    
+    streams: List[Iterator[Dict[str, Any]]] = []
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        streams = [job_service.iter_user_jobs(user_id, 'job'), job_service.iter_user_jobs(user_id, 'quote')]
+    else:
+        search_term = request.args.get('search_term', '')
+        trade = request.args.get('trade', '')
+        sort = request.args.get('sort', '')
+        if request.args.get('include_jobs', 'on') == 'on':
+            streams.append(job_service.iter_search_jobs(
+                search_term, trade,
+                request.args.get('rating', ''),
+                request.args.get('added_by_user', ''),
+                request.args.get('group', ''),
+                sort
+            ))
+        if request.args.get('include_quotes', 'on') == 'on':
+            streams.append(job_service.iter_search_quotes(search_term, trade, None, None, sort))
+        if sort in SEARCH_SORTS:
+            return ExportService.response(_merge_results(streams, sort), JOB_COLUMNS, export_format, 'jobs-and-quotes')
+    
+    return ExportService.response(itertools.chain(*streams), JOB_COLUMNS, export_format, 'jobs-and-quotes')
+
 @search_bp.route('/search_groups', methods=['GET', 'POST'])
 @login_required
+@rate_limit('search', by='user')
 def search_groups() -> str:
     groups: List[Dict[str, Any]] = []
     if request.method == 'POST':
         name = request.form.get('name')
         postcode = request.form.get('postcode')
-        groups = group_service.search_groups(name=name, postcode=postcode)
+        groups = group_service.search_groups(name=name, postcode=postcode,
+                                             radius=request.form.get('radius', type=float))
     else:
         groups = group_service.get_all_groups()
     return render_template('search_groups.html', groups=groups)
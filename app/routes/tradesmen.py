@@ -3,12 +3,18 @@ from werkzeug.wrappers.response import Response
 from typing import Optional, List, Dict, Any, Union
 from app.helpers import login_required
 from app.services.tradesman_service import TradesmanService
+from app.services.price_stats_service import PriceStatsService
+from app.services.accuracy_service import AccuracyService
+from app.services.leaderboard_service import LeaderboardService
 
 # Create Blueprint
 tradesmen_bp = Blueprint('tradesmen', __name__)
 
-# Initialize service
+# Initialize services
 tradesman_service = TradesmanService()
+price_stats_service = PriceStatsService()
+accuracy_service = AccuracyService()
+leaderboard_service = LeaderboardService()
 
 @tradesmen_bp.route("/add_tradesman", methods=["GET", "POST"])
 @login_required
@@ -54,6 +60,8 @@ def view_tradesman(tradesman_id: int) -> Union[str, Response]:
         group_id = session.get('group_id')
         added_by_info = tradesman_service.get_tradesman_added_by_info(tradesman_id)
         can_edit = tradesman_service.can_user_edit_tradesman(session["user_id"], tradesman_id)
+        price_stats = price_stats_service.get_stats(tradesman['trade'], tradesman['postcode'])
+        accuracy = accuracy_service.get_accuracy(tradesman_id)
 
         return render_template("view_tradesman.html", 
                              tradesman=tradesman, 
@@ -61,7 +69,9 @@ def view_tradesman(tradesman_id: int) -> Union[str, Response]:
                              quotes=quotes,
                              group_id=group_id,
                              can_edit=can_edit,
-                             added_by_info=added_by_info)
+                             added_by_info=added_by_info,
+                             price_stats=price_stats,
+                             accuracy=accuracy)
     except Exception as e:
         flash(f"An error occurred while fetching tradesman data: {str(e)}", "error")
         return redirect(url_for("groups.search_groups"))
@@ -122,6 +132,22 @@ def user_tradesmen(user_id: int) -> Union[str, Response]:
     tradesmen_list = tradesman_service.get_tradesmen_by_user(user_id)
     return render_template("user_tradesmen.html", user=user, tradesmen=tradesmen_list)
 
+@tradesmen_bp.route("/top_tradesmen")
+@login_required
+def top_tradesmen() -> str:
+    """Leaderboard of a trade, everywhere or in the user's postcode district"""
+    trades = tradesman_service.get_unique_trades()
+    trade = request.args.get('trade') or (trades[0] if trades else '')
+    near_me = request.args.get('near_me') == '1'
+    postcode = None
+    if near_me:
+        from app.services.user_service import UserService
+        user = UserService().get_user_by_id(session["user_id"])
+        postcode = user['postcode'] if user else None
+    leaders = leaderboard_service.top(trade, postcode) if trade else []
+    return render_template("top_tradesmen.html", leaders=leaders, trades=trades,
+                           selected_trade=trade, near_me=near_me)
+
 @tradesmen_bp.route("/add_my_tradesman_to_group/<int:group_id>", methods=["GET", "POST"])
 @login_required
 def add_my_tradesman_to_group(group_id: int) -> Union[str, Response]:
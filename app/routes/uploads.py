@@ -0,0 +1,95 @@
+from flask import Blueprint, request, session, jsonify, current_app, url_for
+from typing import Any, Dict
+from app.helpers import login_required
+from app.services.upload_service import UploadService
+from app.exceptions import JobecoException, ValidationError
+
+# Create Blueprint
+uploads_bp = Blueprint('uploads', __name__)
+
+# Initialize services
+upload_service = UploadService()
+
+def _upload_response(upload: Dict[str, Any], status: int = 200):
+    """Serialize an upload session for the client."""
+    return jsonify({
+        'id': upload['id'],
+        'filename': upload['filename'],
+        'folder': upload['folder'],
+        'total_size': upload['total_size'],
+        'offset': upload['received_bytes'],
+        'status': upload['status'],
+        'sha256': upload['sha256'],
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+        'url': url_for('uploads.upload_status', upload_id=upload['id'])
+    }), status
+
+@uploads_bp.errorhandler(JobecoException)
+def handle_upload_error(error: JobecoException):
+    """Always answer API clients with JSON."""
+    body: Dict[str, Any] = {'error': error.__class__.__name__, 'message': error.message}
+    return jsonify(body), error.status_code
+
+@uploads_bp.route('/api/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    """Start a chunked upload."""
+    data = request.get_json(silent=True) or {}
+    try:
+        total_size = int(data.get('total_size', 0))
+    except (TypeError, ValueError):
+        raise ValidationError("total_size must be an integer", "total_size")
+
+    upload = upload_service.create_upload(
+        user_id=session["user_id"],
+        filename=data.get('filename', ''),
+        total_size=total_size,
+        folder=data.get('folder', 'quotes'),
+        expected_sha256=data.get('sha256')
+    )
+    return _upload_response(upload, 201)
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id: str):
+    """Report how many bytes have been received, so the client can resume."""
+    upload = upload_service.get_upload(upload_id, session["user_id"])
+    return _upload_response(upload)
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id: str):
+    """Append one chunk; the body is the raw bytes, Upload-Offset says where they go."""
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        raise ValidationError("Upload-Offset header is required")
+    length = request.content_length
+    if not length:
+        raise ValidationError("Content-Length header is required")
+
+    # request.stream reads the body incrementally instead of spooling it
+    upload = upload_service.write_chunk(upload_id, session["user_id"], offset, request.stream, length)
+    return _upload_response(upload)
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id: str):
+    """Abandon an upload in progress."""
+    upload = upload_service.get_upload(upload_id, session["user_id"])
+    if upload['status'] == 'uploading':
+        upload_service.discard_upload(upload_id)
+    return '', 204
+
+@uploads_bp.route('/api/uploads/<upload_id>/attach', methods=['POST'])
+@login_required
+def attach_upload(upload_id: str):
+    """Attach a finished upload to a job as its quote or invoice file."""
+    data = request.get_json(silent=True) or {}
+    try:
+        job_id = int(data.get('job_id', 0))
+    except (TypeError, ValueError):
+        raise ValidationError("job_id must be an integer", "job_id")
+
+    stored_path = upload_service.attach_to_job(upload_id, session["user_id"], job_id, data.get('field', ''))
+    return jsonify({'job_id': job_id, 'file': stored_path})
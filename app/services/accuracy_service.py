@@ -0,0 +1,142 @@
+"""
+How far each tradesman's jobs overrun the quotes they came from.
+
+Converting a quote into a job stores the quote as it stood in
+quote_snapshots. The overrun of a converted job is its final figure over the
+quoted one, minus one: 0.1 is 10% over the quote, -0.1 is 10% under. Cost,
+hours and days are compared separately. A converted job is costed at its
+quote until the final cost is entered, so its cost only counts once
+quote_snapshots.cost_entered is set.
+
+The count, mean, median and 90th percentile overrun of each tradesman are
+kept in the tradesman_accuracy table, so pages and searches read and sort by
+them without scanning jobs. The table is kept fresh from the job_changes log,
+recomputing only the tradesmen whose jobs changed.
+"""
+
+import logging
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+
+from app.services.database import get_db_service
+from app.services.change_log import ChangeLog
+from app.services.price_stats_service import group_stats, fetch_columns
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'tradesman_accuracy'
+
+# Metric name -> (final value, quoted value) over jobs j and quote_snapshots s
+ACCURACY_METRICS = {
+    'cost': ("CASE WHEN s.cost_entered THEN j.total_cost END", "s.total_quote"),
+    'hours': ("j.hours_worked", "s.hours_estimated"),
+    'days': ("j.days_worked", "s.days_estimated"),
+}
+
+
+class AccuracyService:
+    """Service maintaining and reading the tradesman_accuracy table."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def refresh(self, max_changes: int = 1000) -> bool:
+        """
+        Recompute the tradesmen touched by pending job changes.
+
+        Rebuilds everything if the table has never been computed.
+
+        Returns:
+            bool: True if there may be more changes to process
+        """
+        change_log = ChangeLog(CONSUMER)
+        if change_log.get_cursor() is None:
+            self.rebuild()
+            return False
+
+        changes = change_log.pending(max_changes)
+        if not changes:
+            return False
+        self._recompute({change['tradesman_id'] for change in changes})
+        change_log.advance(changes[-1]['id'])
+        change_log.prune()
+        return len(changes) == max_changes
+
+    def rebuild(self) -> int:
+        """
+        Recompute the accuracy of every tradesman.
+
+        Returns:
+            int: Number of tradesman_accuracy rows written
+        """
+        change_log = ChangeLog(CONSUMER)
+        # Take the position first: changes made during the rebuild are replayed later
+        last_change_id = change_log.latest_id()
+        written = self._recompute(None)
+        change_log.advance(last_change_id)
+        change_log.prune()
+        return written
+
+    def _load(self, tradesman_ids: Optional[List[int]]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Load the tradesman id and overrun columns of the live converted jobs."""
+        overruns = ', '.join(
+            f"CASE WHEN {quoted} > 0 THEN CAST({final} AS REAL) / {quoted} - 1 END as {name}"
+            for name, (final, quoted) in ACCURACY_METRICS.items()
+        )
+        query = f"""
+            SELECT j.tradesman_id, {overruns}
+            FROM quote_snapshots s
+            JOIN jobs j ON j.id = s.job_id
+            JOIN tradesmen t ON j.tradesman_id = t.id
+            WHERE j.type = 'job' AND j.deleted_at IS NULL AND t.deleted_at IS NULL
+        """
+        params: Tuple = ()
+        if tradesman_ids is not None:
+            query += f" AND j.tradesman_id IN ({', '.join('?' * len(tradesman_ids))})"
+            params = tuple(tradesman_ids)
+
+        with self.db.get_cursor() as cursor:
+            cursor.execute(query, params)
+            tradesman_column, *values = fetch_columns(cursor, [np.int64] + [float] * len(ACCURACY_METRICS))
+        return tradesman_column, dict(zip(ACCURACY_METRICS, values))
+
+    def _recompute(self, tradesman_ids: Optional[Iterable[int]]) -> int:
+        """Replace the accuracy rows of the given tradesmen, or of all tradesmen if None."""
+        tradesman_ids = list(tradesman_ids) if tradesman_ids is not None else None
+        tradesman_column, metric_columns = self._load(tradesman_ids)
+
+        rows = []
+        for metric, values in metric_columns.items():
+            stats = group_stats(tradesman_column, values)
+            for i, tradesman_id in enumerate(stats['key']):
+                rows.append((
+                    int(tradesman_id), metric, int(stats['count'][i]), float(stats['mean'][i]),
+                    float(stats['p50'][i]), float(stats['p90'][i])
+                ))
+
+        with self.db.transaction() as cursor:
+            if tradesman_ids is None:
+                cursor.execute("DELETE FROM tradesman_accuracy")
+            else:
+                cursor.executemany("DELETE FROM tradesman_accuracy WHERE tradesman_id = ?",
+                                   [(tradesman_id,) for tradesman_id in tradesman_ids])
+            cursor.executemany("""
+                INSERT INTO tradesman_accuracy (tradesman_id, metric, count, mean, median, p90)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+        logger.info(f"Recomputed {len(rows)} tradesman accuracy rows")
+        return len(rows)
+
+    def get_accuracy(self, tradesman_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Get a tradesman's overrun on each metric.
+
+        Returns:
+            dict: Metric name -> tradesman_accuracy row, in ACCURACY_METRICS order
+        """
+        rows = self.db.execute_query(
+            "SELECT * FROM tradesman_accuracy WHERE tradesman_id = ?", (tradesman_id,)
+        )
+        by_metric = {row['metric']: row for row in rows}
+        return {metric: by_metric[metric] for metric in ACCURACY_METRICS if metric in by_metric}
@@ -0,0 +1,255 @@
+"""
+Screening of job and quote prices as they are saved.
+
+Every trade keeps a running count, mean and sum of squared deviations
+(Welford's algorithm) of the log of each rate in the price_moments table.
+Screening a price therefore costs one primary-key read per rate, however
+many jobs there are. Rates are compared on a log scale: ten times the
+typical rate is as far out as a tenth of it. Totals are checked for
+consistency with the job's own fees plus rate times time.
+
+Implausible prices are queued in price_anomalies for review. Until a
+reviewer accepts them, the job stays out of the running moments and of the
+price statistics built from the change log (see UNFLAGGED). Rejected jobs
+stay out for good.
+
+Moments follow edits but not deletions; rebuild() recomputes them from the
+accepted jobs.
+"""
+
+import logging
+import math
+from typing import Optional, List, Dict, Any, Mapping, Tuple
+
+from flask import current_app, has_app_context
+
+from app.services.database import get_db_service
+from app.services.change_log import schedule_change_processing
+
+logger = logging.getLogger(__name__)
+
+# Rates screened against their trade's running moments
+SCREENED_METRICS = ('hourly_rate', 'daily_rate', 'effective_hourly_rate')
+
+# Condition over jobs j keeping only jobs whose prices can be trusted
+UNFLAGGED = """NOT EXISTS (
+    SELECT 1 FROM price_anomalies a WHERE a.job_id = j.id AND a.status != 'accepted'
+)"""
+
+REVIEW_STATUSES = ('accepted', 'rejected')
+
+
+def _setting(name: str, default: Any) -> Any:
+    """A setting of the current app, or its default when jobs are written outside one."""
+    return current_app.config.get(name, default) if has_app_context() else default
+
+
+def _welford_add(count: int, mean: float, m2: float, value: float) -> Tuple[int, float, float]:
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    return count, mean, m2 + delta * (value - mean)
+
+
+def _welford_remove(count: int, mean: float, m2: float, value: float) -> Tuple[int, float, float]:
+    if count <= 1:
+        return 0, 0.0, 0.0
+    count -= 1
+    delta = value - mean
+    mean -= delta / count
+    return count, mean, max(m2 - delta * (value - mean), 0.0)
+
+
+def _log_rates(job: Mapping[str, Any]) -> Dict[str, float]:
+    """Log of each positive screened rate of a job."""
+    return {
+        metric: math.log(job[metric])
+        for metric in SCREENED_METRICS
+        if job.get(metric) is not None and job[metric] > 0
+    }
+
+
+def total_mismatch(job: Mapping[str, Any]) -> Optional[Tuple[float, float]]:
+    """
+    Check a job's total against its fees plus rate times time.
+
+    Returns:
+        tuple: (total, expected total) if they differ by more than
+        PRICE_ANOMALY_TOTAL_RATIO times, None if they agree or cannot be compared
+    """
+    is_quote = job.get('type') == 'quote'
+    total = job.get('total_quote' if is_quote else 'total_cost')
+    parts = [
+        (job.get('hourly_rate'), job.get('hours_estimated' if is_quote else 'hours_worked')),
+        (job.get('daily_rate'), job.get('days_estimated' if is_quote else 'days_worked')),
+    ]
+    time_cost = [rate * time for rate, time in parts if rate is not None and time is not None]
+    if total is None or not time_cost:
+        return None
+
+    expected = sum(time_cost) + (job.get('call_out_fee') or 0) + (job.get('materials_fee') or 0)
+    ratio = _setting('PRICE_ANOMALY_TOTAL_RATIO', 2.0)
+    if expected <= 0 or total <= 0:
+        return None
+    if total > expected * ratio or total * ratio < expected:
+        return float(total), float(expected)
+    return None
+
+
+class AnomalyService:
+    """Service screening prices on write and serving the review queue."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def screen(self, cursor, job_id: int, previous: Optional[Mapping[str, Any]] = None) -> int:
+        """
+        Screen a job's prices on an open transaction's cursor, after it was written.
+
+        Args:
+            cursor: Cursor of the transaction that wrote the job
+            job_id: Job or quote id
+            previous: The job's row before an update, None for a new job
+
+        Returns:
+            int: Number of anomalies queued
+        """
+        cursor.execute("""
+            SELECT j.*, t.trade FROM jobs j JOIN tradesmen t ON t.id = j.tradesman_id WHERE j.id = ?
+        """, (job_id,))
+        job = dict(cursor.fetchone())
+        trade = job['trade']
+
+        # Take the job's old prices out of its trade's moments; the edit supersedes any review
+        if previous is not None:
+            cursor.execute(
+                "SELECT COUNT(*) FROM price_anomalies WHERE job_id = ? AND status != 'accepted'", (job_id,)
+            )
+            if cursor.fetchone()[0] == 0:
+                self._fold(cursor, trade, _log_rates(previous), _welford_remove)
+            cursor.execute("DELETE FROM price_anomalies WHERE job_id = ?", (job_id,))
+
+        min_samples = _setting('PRICE_ANOMALY_MIN_SAMPLES', 20)
+        max_z = _setting('PRICE_ANOMALY_Z', 3.5)
+        log_rates = _log_rates(job)
+        moments = self._moments(cursor, trade, list(log_rates))
+
+        anomalies = []
+        for metric, log_rate in log_rates.items():
+            count, mean, m2 = moments.get(metric, (0, 0.0, 0.0))
+            if count < min_samples or m2 <= 0:
+                continue
+            z = (log_rate - mean) / math.sqrt(m2 / (count - 1))
+            if abs(z) > max_z:
+                anomalies.append((job_id, trade, metric, job[metric], math.exp(mean), z))
+
+        mismatch = total_mismatch(job)
+        if mismatch is not None:
+            total_metric = 'total_quote' if job['type'] == 'quote' else 'total_cost'
+            anomalies.append((job_id, trade, total_metric, mismatch[0], mismatch[1], None))
+
+        if anomalies:
+            cursor.executemany("""
+                INSERT INTO price_anomalies (job_id, trade, metric, value, expected, z_score)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, anomalies)
+            logger.info(f"Queued {len(anomalies)} price anomalies of job {job_id} for review")
+        else:
+            self._fold(cursor, trade, log_rates, _welford_add, moments)
+        return len(anomalies)
+
+    def _moments(self, cursor, trade: str, metrics: List[str]) -> Dict[str, Tuple[int, float, float]]:
+        if not metrics:
+            return {}
+        cursor.execute(f"""
+            SELECT metric, count, mean, m2 FROM price_moments
+            WHERE trade = ? AND metric IN ({', '.join('?' * len(metrics))})
+        """, (trade, *metrics))
+        return {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+    def _fold(self, cursor, trade: str, log_rates: Dict[str, float], update,
+              moments: Optional[Dict[str, Tuple[int, float, float]]] = None) -> None:
+        """Add or remove a job's log rates to or from its trade's moments."""
+        if moments is None:
+            moments = self._moments(cursor, trade, list(log_rates))
+        cursor.executemany("""
+            INSERT INTO price_moments (trade, metric, count, mean, m2) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (trade, metric) DO UPDATE SET
+                count = excluded.count, mean = excluded.mean, m2 = excluded.m2,
+                updated_at = CURRENT_TIMESTAMP
+        """, [
+            (trade, metric, *update(*moments.get(metric, (0, 0.0, 0.0)), log_rate))
+            for metric, log_rate in log_rates.items()
+        ])
+
+    def rebuild(self) -> int:
+        """
+        Recompute every trade's moments from its live, unflagged jobs.
+
+        Returns:
+            int: Number of price_moments rows written
+        """
+        rows = self.db.execute_query(f"""
+            SELECT t.trade, {', '.join(f'j.{metric}' for metric in SCREENED_METRICS)}
+            FROM jobs j
+            JOIN tradesmen t ON j.tradesman_id = t.id
+            WHERE j.deleted_at IS NULL AND t.deleted_at IS NULL AND {UNFLAGGED}
+        """)
+        moments: Dict[Tuple[str, str], Tuple[int, float, float]] = {}
+        for row in rows:
+            for metric, log_rate in _log_rates(row).items():
+                key = (row['trade'], metric)
+                moments[key] = _welford_add(*moments.get(key, (0, 0.0, 0.0)), log_rate)
+
+        with self.db.transaction() as cursor:
+            cursor.execute("DELETE FROM price_moments")
+            cursor.executemany(
+                "INSERT INTO price_moments (trade, metric, count, mean, m2) VALUES (?, ?, ?, ?, ?)",
+                [(*key, *values) for key, values in moments.items()]
+            )
+        logger.info(f"Rebuilt {len(moments)} price moments")
+        return len(moments)
+
+    def get_pending(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get the oldest anomalies awaiting review, with their jobs."""
+        return self.db.execute_query("""
+            SELECT a.*, j.type, j.title, j.tradesman_id, t.first_name, t.family_name, t.company_name
+            FROM price_anomalies a
+            JOIN jobs j ON j.id = a.job_id
+            JOIN tradesmen t ON t.id = j.tradesman_id
+            WHERE a.status = 'pending' AND j.deleted_at IS NULL
+            ORDER BY a.created_at, a.id
+            LIMIT ?
+        """, (limit,))
+
+    def review(self, anomaly_id: int, status: str, user_id: int) -> bool:
+        """
+        Accept or reject a queued anomaly.
+
+        Accepting a job's last open anomaly adds its prices to the moments.
+        Either way the change log picks up the job again.
+        """
+        if status not in REVIEW_STATUSES:
+            raise ValueError(f"Unknown review status: {status}")
+
+        with self.db.transaction() as cursor:
+            cursor.execute("""
+                UPDATE price_anomalies SET status = ?, reviewed_by = ?, reviewed_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'pending'
+            """, (status, user_id, anomaly_id))
+            if cursor.rowcount == 0:
+                return False
+            cursor.execute("""
+                SELECT j.*, t.trade FROM price_anomalies a
+                JOIN jobs j ON j.id = a.job_id
+                JOIN tradesmen t ON t.id = j.tradesman_id
+                WHERE a.id = ?
+            """, (anomaly_id,))
+            job = dict(cursor.fetchone())
+            cursor.execute(
+                "SELECT COUNT(*) FROM price_anomalies WHERE job_id = ? AND status != 'accepted'", (job['id'],)
+            )
+            if cursor.fetchone()[0] == 0:
+                self._fold(cursor, job['trade'], _log_rates(job), _welford_add)
+        schedule_change_processing()
+        return True
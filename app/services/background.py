@@ -0,0 +1,104 @@
+"""
+Background worker threads for deferred maintenance tasks.
+
+A worker owns one daemon thread that runs its task inside a fresh application
+context whenever it is woken, and periodically as a safety net. Each run gets
+its own database connection through ``flask.g``.
+"""
+
+import logging
+import threading
+from typing import Callable, Optional
+
+from flask import Flask, current_app
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """Runs a task on a daemon thread whenever it is woken."""
+
+    def __init__(self, app: Flask, name: str, task: Callable[[], bool], interval: float = 60.0):
+        """
+        Args:
+            app: Flask application the task runs against
+            name: Thread name, used in log messages
+            task: Callable returning True while there is more work to do
+            interval: Seconds between runs when nobody wakes the worker
+        """
+        self.app = app
+        self.name = name
+        self.task = task
+        self.interval = interval
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker thread if it isn't running yet."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        """Ask the worker to run as soon as possible."""
+        self.start()
+        self._wake_event.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the worker thread."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+            more_work = True
+            while more_work and not self._stop_event.is_set():
+                try:
+                    with self.app.app_context():
+                        more_work = bool(self.task())
+                except Exception as e:
+                    logger.error(f"Background worker {self.name} failed: {e}")
+                    more_work = False
+
+
+def wake_worker(name: str, task: Callable[[], bool], interval: float = 60.0) -> None:
+    """
+    Wake the named worker for the current app, creating it on first use.
+
+    Workers are not started while the app is under test; tests run the
+    task directly so that they stay deterministic.
+    """
+    worker = _get_worker(name, task, interval)
+    if worker is not None:
+        worker.wake()
+
+
+def start_worker(name: str, task: Callable[[], bool], interval: float = 60.0) -> None:
+    """
+    Start the named worker for the current app without waking it, for tasks
+    that only need to run every interval. Not started under test either.
+    """
+    worker = _get_worker(name, task, interval)
+    if worker is not None:
+        worker.start()
+
+
+def _get_worker(name: str, task: Callable[[], bool], interval: float) -> Optional[BackgroundWorker]:
+    if current_app.testing:
+        return None
+    app = current_app._get_current_object()
+    workers = app.extensions.setdefault('background_workers', {})
+    worker = workers.get(name)
+    if worker is None:
+        worker = BackgroundWorker(app, name, task, interval)
+        workers[name] = worker
+    return worker
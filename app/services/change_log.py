@@ -0,0 +1,97 @@
+from typing import Optional, List, Dict, Any
+from flask import current_app
+from app.services.database import get_db_service
+from app.services.background import wake_worker
+
+class ChangeLog:
+    """
+    Reader for the trigger-fed job_changes table.
+
+    Each consumer keeps the id of the last change it processed in
+    change_cursors, so derived data can be refreshed incrementally. A consumer
+    without a cursor has never run and should rebuild from scratch.
+    """
+
+    def __init__(self, consumer: str):
+        self.db = get_db_service()
+        self.consumer = consumer
+
+    def get_cursor(self) -> Optional[int]:
+        """Id of the last processed change, or None if the consumer never ran."""
+        result = self.db.execute_single_query(
+            "SELECT last_change_id FROM change_cursors WHERE consumer = ?", (self.consumer,)
+        )
+        return result['last_change_id'] if result else None
+
+    def latest_id(self) -> int:
+        """Id of the newest change."""
+        result = self.db.execute_single_query("SELECT MAX(id) as last_id FROM job_changes")
+        return (result['last_id'] or 0) if result else 0
+
+    def pending(self, limit: int = 1000, after: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Changes after the consumer's cursor, or after the given id, oldest first."""
+        if after is None:
+            after = self.get_cursor() or 0
+        return self.db.execute_query(
+            "SELECT * FROM job_changes WHERE id > ? ORDER BY id LIMIT ?",
+            (after, limit)
+        )
+
+    def advance(self, last_change_id: int) -> None:
+        """Record that every change up to last_change_id has been processed."""
+        self.db.execute_update("""
+            INSERT INTO change_cursors (consumer, last_change_id, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (consumer) DO UPDATE SET
+                last_change_id = MAX(last_change_id, excluded.last_change_id),
+                updated_at = CURRENT_TIMESTAMP
+        """, (self.consumer, last_change_id))
+
+    def claim(self, cursor, expected: Optional[int], last_change_id: int) -> bool:
+        """
+        Move the cursor from expected to last_change_id on an open transaction's cursor.
+
+        Returns:
+            bool: False if another process moved the cursor first; its batch must then be abandoned
+        """
+        cursor.execute("""
+            UPDATE change_cursors SET last_change_id = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE consumer = ? AND last_change_id = ?
+        """, (last_change_id, self.consumer, expected))
+        return cursor.rowcount > 0
+
+    def prune(self) -> int:
+        """Delete changes every consumer has processed."""
+        return self.db.execute_delete("""
+            DELETE FROM job_changes
+            WHERE id <= (SELECT COALESCE(MIN(last_change_id), 0) FROM change_cursors)
+        """)
+
+
+def process_job_changes() -> bool:
+    """Worker task running every consumer of the change log."""
+    from app.services.price_stats_service import PriceStatsService
+    from app.services.quote_sketch_service import QuoteSketchService
+    from app.services.jobs_snapshot_service import JobsSnapshotService
+    from app.services.accuracy_service import AccuracyService
+    from app.services.leaderboard_service import LeaderboardService
+    from app.services.price_index_service import PriceIndexService
+    more_work = [
+        PriceStatsService().refresh(),
+        QuoteSketchService().refresh(),
+        JobsSnapshotService().refresh(),
+        AccuracyService().refresh(),
+        LeaderboardService().refresh(),
+        PriceIndexService().refresh(),
+    ]
+    return any(more_work)
+
+
+def schedule_change_processing() -> None:
+    """Wake the worker that folds pending job changes into derived data."""
+    try:
+        wake_worker('job-changes-worker', process_job_changes,
+                    current_app.config.get('JOB_CHANGES_WORKER_INTERVAL', 60))
+    except RuntimeError:
+        # Outside an app context the next worker run picks the changes up
+        pass
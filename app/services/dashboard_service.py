@@ -0,0 +1,212 @@
+import json
+import base64
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+from app.services.database import get_db_service
+from app.config.dashboard import TABLE_CONFIG
+from app.exceptions import ValidationError, NotFoundError
+
+# Members of the groups the user belongs to, shared by the jobs section filters.
+# A join rather than nested IN lists, so both sides are read off indexes.
+GROUP_PEERS = """
+    SELECT peer.user_id FROM user_groups mine
+    JOIN user_groups peer ON peer.group_id = mine.group_id
+    WHERE mine.user_id = ? AND mine.status IN ('member', 'admin', 'creator')
+"""
+
+# Per section: the base query (one row per id, user id bound `user_params` times),
+# the clause the keyset seek is added with, the row id column and the SQL
+# expression behind each sortable TABLE_CONFIG column. Sort keys are never NULL,
+# so (sort_key, id) is a total order usable for keyset pagination. The seek and
+# ORDER BY go on the base query itself, so indexes on the sort expressions (see
+# idx_jobs_dashboard_*) can drive the LIMIT.
+SECTION_QUERIES = {
+    'tradesmen': {
+        'query': """
+            SELECT t.*,
+                   COUNT(CASE WHEN j.type = 'job' THEN j.id END) as job_count,
+                   COUNT(CASE WHEN j.type = 'quote' THEN j.id END) as quote_count,
+                   AVG(CASE WHEN j.type = 'job' THEN j.rating END) as rating,
+                   u.username as added_by_username,
+                   u.id as added_by_user_id,
+                   {sort_key} as sort_key
+            FROM tradesmen t
+            JOIN user_tradesmen ut ON t.id = ut.tradesman_id
+            JOIN users u ON ut.user_id = u.id
+            LEFT JOIN jobs j ON t.id = j.tradesman_id AND j.deleted_at IS NULL
+            WHERE ut.user_id = ? AND t.deleted_at IS NULL
+            GROUP BY t.id
+        """,
+        'user_params': 1,
+        # Most sort keys are aggregates, which can only be compared after grouping
+        'seek': 'HAVING',
+        'id': 't.id',
+        'sort_keys': {
+            'name': "LOWER(COALESCE(t.first_name, '') || ' ' || t.family_name)",
+            'company': "LOWER(COALESCE(t.company_name, ''))",
+            'trade': "LOWER(t.trade)",
+            'rating': "COALESCE(AVG(CASE WHEN j.type = 'job' THEN j.rating END), 0)",
+            'jobs': "COUNT(CASE WHEN j.type = 'job' THEN j.id END)",
+            'quotes': "COUNT(CASE WHEN j.type = 'quote' THEN j.id END)",
+            'added_by': "LOWER(u.username)",
+        },
+    },
+    'jobs': {
+        'query': """
+            SELECT j.*,
+                   t.first_name, t.family_name, t.company_name, t.trade,
+                   u.username as added_by_username,
+                   u.id as added_by_user_id,
+                   {sort_key} as sort_key
+            FROM jobs j
+            JOIN tradesmen t ON j.tradesman_id = t.id
+            JOIN users u ON j.user_id = u.id
+            WHERE (j.user_id = ? OR j.user_id IN (""" + GROUP_PEERS + """))
+            AND j.deleted_at IS NULL AND t.deleted_at IS NULL
+            AND (
+                j.type = 'job' OR
+                (j.type = 'quote' AND j.date_received IS NOT NULL)
+            )
+        """,
+        'user_params': 2,
+        'seek': 'AND',
+        'id': 'j.id',
+        'sort_keys': {
+            'title': "LOWER(j.title)",
+            'tradesman': "LOWER(COALESCE(t.company_name, COALESCE(t.first_name, '') || ' ' || t.family_name))",
+            'trade': "LOWER(t.trade)",
+            'date': """COALESCE(CASE
+                           WHEN j.type = 'job' THEN COALESCE(j.date_finished, j.date_started, j.date_requested)
+                           WHEN j.type = 'quote' THEN j.date_received
+                       END, '')""",
+            'cost': "COALESCE(CASE WHEN j.type = 'job' THEN j.total_cost ELSE j.total_quote END, 0)",
+            'rating': "COALESCE(j.rating, 0)",
+            'added_by': "LOWER(u.username)",
+        },
+    },
+    'groups': {
+        'query': """
+            SELECT g.*,
+                   (SELECT COUNT(*) FROM user_groups WHERE group_id = g.id AND status != 'pending') as member_count,
+                   ug.status,
+                   {sort_key} as sort_key
+            FROM groups g
+            JOIN user_groups ug ON g.id = ug.group_id
+            WHERE ug.user_id = ? AND ug.status != 'pending'
+        """,
+        'user_params': 1,
+        'seek': 'AND',
+        'id': 'g.id',
+        'sort_keys': {
+            'name': "LOWER(g.name)",
+            'postcode': "LOWER(g.postcode)",
+            'members': "(SELECT COUNT(*) FROM user_groups WHERE group_id = g.id AND status != 'pending')",
+            'status': "ug.status",
+        },
+    },
+}
+
+class DashboardService:
+    """Service for the sortable, keyset-paginated dashboard tables."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    @staticmethod
+    def encode_cursor(sort_key: Any, row_id: int) -> str:
+        """Encode the last row's position as an opaque cursor."""
+        payload = json.dumps([sort_key, row_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[Any, int]:
+        """Decode a cursor produced by encode_cursor."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            sort_key, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return sort_key, int(row_id)
+        except (ValueError, TypeError):
+            raise ValidationError("Invalid cursor", "cursor")
+
+    def _sorted_query(self, section: str, sort: str, order: str,
+                      seek: bool = False) -> str:
+        """
+        A section's base query ordered by sort.
+
+        With seek, the query skips to the rows after a (sort_key, id) pair,
+        which is bound as three parameters: sort_key, sort_key, id.
+        """
+        spec = SECTION_QUERIES[section]
+        sort_key = spec['sort_keys'][sort]
+        query = spec['query'].format(sort_key=sort_key)
+        direction = 'DESC' if order == 'desc' else 'ASC'
+        if seek:
+            comparison = '<' if order == 'desc' else '>'
+            # The bound on the sort key alone lets SQLite seek the index; the row value then skips ties
+            query += (f" {spec['seek']} {sort_key} {comparison}= ?"
+                      f" AND ({sort_key}, {spec['id']}) {comparison} (?, ?)")
+        return query + f" ORDER BY {sort_key} {direction}, {spec['id']} {direction}"
+
+    def resolve_sort(self, section: str, sort: Optional[str] = None,
+                     order: Optional[str] = None) -> Tuple[str, str]:
+        """Validate sort and order against TABLE_CONFIG, falling back to the section defaults."""
+        if section not in SECTION_QUERIES:
+            raise NotFoundError("Unknown dashboard section")
+        table = TABLE_CONFIG[section]
+        sortable = {c['column'] for c in table['columns'] if c.get('sortable')}
+        sort = sort if sort in sortable else table['default_sort']
+        order = order if order in ('asc', 'desc') else table['default_order']
+        return sort, order
+
+    def get_page(self, section: str, user_id: int, sort: Optional[str] = None,
+                 order: Optional[str] = None, cursor: Optional[str] = None,
+                 limit: int = 10) -> Dict[str, Any]:
+        """
+        Get one page of a dashboard section, sorted in SQL.
+
+        Args:
+            section: 'tradesmen', 'jobs' or 'groups'
+            user_id: ID of the dashboard's user
+            sort: A sortable column from TABLE_CONFIG
+            order: 'asc' or 'desc'
+            cursor: The next_cursor of the previous page
+            limit: Maximum number of rows
+
+        Returns:
+            dict: rows, next_cursor (None on the last page), sort and order
+        """
+        sort, order = self.resolve_sort(section, sort, order)
+        params: List[Any] = [user_id] * SECTION_QUERIES[section]['user_params']
+        if cursor:
+            sort_key, last_id = self.decode_cursor(cursor)
+            params.extend([sort_key, sort_key, last_id])
+        query = self._sorted_query(section, sort, order, seek=bool(cursor)) + " LIMIT ?"
+        # Fetch one extra row to know whether there is a next page
+        params.append(limit + 1)
+
+        rows = self.db.execute_query(query, tuple(params))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1]['sort_key'], rows[-1]['id'])
+        return {'rows': rows, 'next_cursor': next_cursor, 'sort': sort, 'order': order}
+
+    def iter_section(self, section: str, user_id: int, sort: Optional[str] = None,
+                     order: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream every row of a dashboard section in the requested order, for exports."""
+        sort, order = self.resolve_sort(section, sort, order)
+        return self.db.iter_query(
+            self._sorted_query(section, sort, order),
+            tuple([user_id] * SECTION_QUERIES[section]['user_params'])
+        )
+
+    def count(self, section: str, user_id: int) -> int:
+        """Count the rows of a dashboard section."""
+        if section not in SECTION_QUERIES:
+            raise NotFoundError("Unknown dashboard section")
+        spec = SECTION_QUERIES[section]
+        base_query = spec['query'].format(sort_key='NULL')
+        result = self.db.execute_single_query(
+            f"SELECT COUNT(*) as count FROM ({base_query})",
+            tuple([user_id] * spec['user_params'])
+        )
+        return result['count'] if result else 0
@@ -1,14 +1,51 @@
+import time
 import sqlite3
 import logging
+import threading
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any, Tuple
-from flask import g, current_app
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+from flask import g, current_app, has_app_context
 from config import get_config
+from app.helpers import distance_miles, postcode_district
+from app.services import metrics_service
 
 logger = logging.getLogger(__name__)
 
+# Transaction control is not a query
+UNCOUNTED_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+def is_lock_timeout(error: Exception) -> bool:
+    """Whether an error is SQLite giving up on waiting for another connection's lock."""
+    return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+def _count_statement(statement: str) -> None:
+    """
+    Count the statements of the current request, trigger bodies included, in g.db_queries.
+
+    Profiled requests also keep the statements themselves in g.query_log.
+    """
+    if has_app_context() and not statement.lstrip()[:8].upper().startswith(UNCOUNTED_STATEMENTS):
+        g.db_queries = g.get('db_queries', 0) + 1
+        query_log = g.get('query_log')
+        if query_log is not None:
+            query_log.append(statement)
+
+# Databases already switched to WAL by this process; the mode is stored in the file
+_wal_databases = set()
+_wal_lock = threading.Lock()
+
+def _add_db_time(started: float) -> None:
+    """Add the time since started to the current request's g.db_seconds."""
+    if has_app_context():
+        g.db_seconds = g.get('db_seconds', 0.0) + time.perf_counter() - started
+
+
 class DatabaseService:
     """Centralized database service for handling all database operations."""
+
+    # Lock timeouts since the process started; the current request's count is in g.lock_timeouts
+    lock_timeouts = 0
+    _lock_timeouts_lock = threading.Lock()
     
     def __init__(self, database_path: Optional[str] = None):
         if database_path is None:
@@ -22,18 +59,31 @@ class DatabaseService:
         try:
             # Try to use Flask's g object if we're in a Flask context
             if not hasattr(g, '_database'):
-                g._database = sqlite3.connect(self.database_path, isolation_level=None)
-                g._database.row_factory = sqlite3.Row
-                g._database.execute("PRAGMA foreign_keys = ON")
+                g._database = self._connect()
             return g._database
         except RuntimeError:
             # We're outside Flask context, create a direct connection
             if not hasattr(self, '_test_connection'):
-                self._test_connection = sqlite3.connect(self.database_path, isolation_level=None)
-                self._test_connection.row_factory = sqlite3.Row
-                self._test_connection.execute("PRAGMA foreign_keys = ON")
+                self._test_connection = self._connect()
             return self._test_connection
     
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database_path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        # In WAL mode readers don't block writers, so a long export doesn't hold up
+        # rate limit, session and job writes until its cursor is exhausted
+        with _wal_lock:
+            if self.database_path not in _wal_databases:
+                conn.execute("PRAGMA journal_mode = WAL")
+                _wal_databases.add(self.database_path)
+        # Proximity searches rank by distance in SQL
+        conn.create_function('distance_miles', 4, distance_miles, deterministic=True)
+        # The price index groups jobs by district in SQL
+        conn.create_function('postcode_district', 1, postcode_district, deterministic=True)
+        conn.set_trace_callback(_count_statement)
+        return conn
+    
     def close_connection(self):
         """Close the database connection if it exists."""
         try:
@@ -48,19 +98,63 @@ class DatabaseService:
                 delattr(self, '_test_connection')
     
     @contextmanager
-    def get_cursor(self):
-        """Context manager for database cursor operations."""
+    def get_cursor(self, timed: bool = True):
+        """
+        Context manager for database cursor operations.
+
+        Args:
+            timed: Add the time spent in the block to g.db_seconds; callers that
+                hand rows out between fetches time the fetches themselves
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
+        started = time.perf_counter()
         try:
             yield cursor
         except Exception as e:
             logger.error(f"Database error: {e}")
+            self._count_lock_timeout(e)
             conn.rollback()
             raise
         finally:
             cursor.close()
+            if timed:
+                _add_db_time(started)
     
+    @contextmanager
+    def transaction(self):
+        """Context manager running the enclosed statements in a single write transaction."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            self._count_lock_timeout(e)
+            cursor.close()
+            _add_db_time(started)
+            raise
+        try:
+            yield cursor
+            cursor.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"Transaction error: {e}")
+            self._count_lock_timeout(e)
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
+            _add_db_time(started)
+
+    def _count_lock_timeout(self, error: Exception) -> None:
+        if not is_lock_timeout(error):
+            return
+        with DatabaseService._lock_timeouts_lock:
+            DatabaseService.lock_timeouts += 1
+        metrics_service.record_lock_timeout()
+        if has_app_context():
+            g.lock_timeouts = g.get('lock_timeouts', 0) + 1
+
     def execute_query(self, query: str, params: Tuple = ()) -> List[Dict[str, Any]]:
         """Execute a SELECT query and return results as list of dictionaries."""
         with self.get_cursor() as cursor:
@@ -78,6 +172,26 @@ class DatabaseService:
                 return dict(zip(columns, row))
             return None
     
+    def iter_query(self, query: str, params: Tuple = (), batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Execute a SELECT query and yield results as dictionaries, batch by batch.
+
+        Unlike execute_query the result set is never materialised, so memory stays
+        constant however many rows match.
+        """
+        with self.get_cursor(timed=False) as cursor:
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                _add_db_time(started)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+                started = time.perf_counter()
+
     def execute_insert(self, query: str, params: Tuple = ()) -> int:
         with self.get_cursor() as cursor:
             cursor.execute(query, params)
@@ -0,0 +1,210 @@
+import time
+import logging
+from typing import Optional, List, Dict, Any
+from flask import current_app
+from app.services.database import get_db_service
+from app.services.file_service import FileService
+from app.services.background import wake_worker
+from app.services.preview_service import PREVIEW_SUFFIX
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
+
+ENTITY_TABLES = {
+    'job': 'jobs',
+    'tradesman': 'tradesmen',
+    'user': 'users',
+}
+
+class DeletionService:
+    """
+    Service for asynchronous, cascading deletes.
+
+    Deleting marks the row and queues it in a single short transaction. The
+    deletion worker later removes dependent jobs in bounded batches, deletes
+    the row itself and garbage-collects the uploaded files.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.db = get_db_service()
+        self.batch_size = batch_size
+
+    def _batch_size(self) -> int:
+        if self.batch_size is not None:
+            return self.batch_size
+        try:
+            return current_app.config.get('DELETION_BATCH_SIZE', 500)
+        except RuntimeError:
+            return 500
+
+    def mark_deleted(self, entity_type: str, entity_id: int) -> bool:
+        """
+        Mark a job, tradesman or user deleted and queue it for purging.
+
+        Returns:
+            bool: True if the row existed and was not already deleted
+        """
+        table = ENTITY_TABLES[entity_type]
+        with self.db.transaction() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET deleted_at = CURRENT_TIMESTAMP WHERE id = ? AND deleted_at IS NULL",
+                (entity_id,)
+            )
+            if cursor.rowcount <= 0:
+                return False
+            cursor.execute(
+                "INSERT INTO deletion_queue (entity_type, entity_id) VALUES (?, ?)",
+                (entity_type, entity_id)
+            )
+
+        try:
+            wake_worker('deletion-worker', lambda: DeletionService().process_pending(),
+                        current_app.config.get('DELETION_WORKER_INTERVAL', 60))
+        except RuntimeError:
+            # Outside an app context the queue is drained by the next worker run
+            pass
+        return True
+
+    def get_pending_count(self) -> int:
+        """Get the number of queued deletions."""
+        result = self.db.execute_single_query("SELECT COUNT(*) as count FROM deletion_queue")
+        return result['count'] if result else 0
+
+    def _max_attempts(self) -> int:
+        try:
+            return current_app.config.get('DELETION_MAX_ATTEMPTS', 5)
+        except RuntimeError:
+            return 5
+
+    def process_pending(self, max_items: int = 10) -> bool:
+        """
+        Purge up to max_items queued deletions.
+
+        Items that fail are retried after the fresh ones, and left in the queue
+        with their last error once they have failed DELETION_MAX_ATTEMPTS times,
+        so that one bad row never holds up the rest.
+
+        Returns:
+            bool: True if there may be more queued work
+        """
+        max_attempts = self._max_attempts()
+        items = self.db.execute_query(
+            "SELECT * FROM deletion_queue WHERE attempts < ? ORDER BY attempts, id LIMIT ?",
+            (max_attempts, max_items)
+        )
+        purged = 0
+        for item in items:
+            try:
+                self.purge(item['entity_type'], item['entity_id'])
+                self.db.execute_delete("DELETE FROM deletion_queue WHERE id = ?", (item['id'],))
+                purged += 1
+            except Exception as e:
+                logger.error(f"Failed to purge {item['entity_type']} {item['entity_id']}: {e}")
+                self.db.execute_update(
+                    "UPDATE deletion_queue SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (str(e), item['id'])
+                )
+                if item['attempts'] + 1 >= max_attempts:
+                    logger.error(f"Giving up purging {item['entity_type']} {item['entity_id']} "
+                                 f"after {max_attempts} attempts")
+        # A batch of nothing but failures waits for the next interval rather than retrying at once
+        return purged > 0 and len(items) == max_items
+
+    def purge(self, entity_type: str, entity_id: int) -> None:
+        """Remove a marked row, its dependent jobs and their files."""
+        if entity_type == 'job':
+            self._purge_jobs("id = ?", entity_id)
+        elif entity_type == 'tradesman':
+            self._purge_jobs("tradesman_id = ?", entity_id)
+            # Group and user links go with the tradesman via ON DELETE CASCADE
+            self.db.execute_delete("DELETE FROM tradesmen WHERE id = ?", (entity_id,))
+        elif entity_type == 'user':
+            # jobs.user_id has no foreign key, so the user's jobs are removed explicitly
+            self._purge_jobs("user_id = ?", entity_id)
+            self.db.execute_delete("DELETE FROM users WHERE id = ?", (entity_id,))
+        else:
+            raise ValueError(f"Unknown entity type: {entity_type}")
+
+    def _purge_jobs(self, condition: str, value: int) -> int:
+        """Delete matching jobs in bounded batches, removing files after each commit."""
+        batch_size = self._batch_size()
+        deleted = 0
+        while True:
+            rows = self.db.execute_query(
+                f"SELECT id, quote_file, job_file FROM jobs WHERE {condition} LIMIT ?",
+                (value, batch_size)
+            )
+            if not rows:
+                return deleted
+
+            ids = [row['id'] for row in rows]
+            placeholders = ', '.join('?' * len(ids))
+            with self.db.transaction() as cursor:
+                cursor.execute(f"DELETE FROM jobs WHERE id IN ({placeholders})", tuple(ids))
+            deleted += len(ids)
+
+            # Files go only once the rows are gone, so a crash can leave orphans
+            # for the reconciliation scan but never a row without its file
+            for row in rows:
+                for filename in (row['quote_file'], row['job_file']):
+                    if filename:
+                        FileService.delete_file(filename)
+
+    def find_orphan_files(self, min_age_seconds: int = 3600) -> List[str]:
+        """
+        Compare the stored files against jobs.quote_file/job_file.
+
+        Args:
+            min_age_seconds: Skip files younger than this, which may belong to
+                an upload whose job row isn't committed yet
+
+        Returns:
+            list: Storage keys that no job references
+        """
+        storage = get_storage()
+        referenced = set()
+        with self.db.get_cursor() as cursor:
+            cursor.execute("SELECT quote_file, job_file FROM jobs")
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for quote_file, job_file in rows:
+                    if quote_file:
+                        referenced.add(quote_file)
+                    if job_file:
+                        referenced.add(job_file)
+
+        # Finished chunked uploads wait here until they're attached to a job
+        pending_uploads = self.db.execute_query(
+            "SELECT stored_path FROM upload_sessions WHERE status = 'complete'"
+        )
+        referenced.update(row['stored_path'] for row in pending_uploads)
+
+        cutoff = time.time() - min_age_seconds
+        orphans = []
+        for key, modified in storage.list_keys():
+            # Previews belong to their blob and go when the blob goes
+            blob = key.split(PREVIEW_SUFFIX, 1)[0]
+            if blob in referenced:
+                continue
+            if modified > cutoff:
+                continue
+            orphans.append(key)
+        return sorted(orphans)
+
+    def reconcile_orphan_files(self, delete: bool = False, min_age_seconds: int = 3600) -> Dict[str, Any]:
+        """
+        Find, and optionally delete, uploaded files that no job references.
+
+        Returns:
+            dict: The orphan paths and how many were deleted
+        """
+        orphans = self.find_orphan_files(min_age_seconds)
+        deleted_count = 0
+        if delete:
+            storage = get_storage()
+            for key in orphans:
+                if storage.delete(key):
+                    deleted_count += 1
+        return {'orphans': orphans, 'deleted': deleted_count}
@@ -0,0 +1,151 @@
+"""
+Normalised effective costs of jobs and quotes.
+
+Prices are recorded in different shapes: a total, an hourly or daily rate
+times the time spent, fees on top, or a mix. Jobs use the *_worked fields and
+total_cost, quotes the *_estimated fields and total_quote. The normaliser
+derives comparable figures from whatever is present:
+
+- effective_labour_cost: the total less call-out and materials fees, or
+  rate times time when there is no total
+- effective_hourly_rate: labour cost per hour, with a day counted as
+  HOURS_PER_DAY hours, or the quoted rate when no time is recorded
+- materials_share: materials fee as a fraction of the total price
+
+The figures are stored in indexed columns of the jobs table. JobService
+computes them on every insert and update; backfill() fills existing rows.
+"""
+
+import logging
+from typing import Dict, Any, Mapping, Optional
+
+import numpy as np
+
+from app.services.database import get_db_service
+
+logger = logging.getLogger(__name__)
+
+# Hours in a working day, for costing work billed by the day
+HOURS_PER_DAY = 8
+
+DERIVED_COLUMNS = ('effective_labour_cost', 'effective_hourly_rate', 'materials_share')
+
+# Columns of jobs the derived ones are computed from
+SOURCE_COLUMNS = (
+    'type', 'call_out_fee', 'materials_fee', 'hourly_rate', 'daily_rate',
+    'hours_worked', 'days_worked', 'total_cost',
+    'hours_estimated', 'days_estimated', 'total_quote',
+)
+
+
+def effective_costs(columns: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Derive the effective cost columns for a batch of jobs and quotes.
+
+    Args:
+        columns: One array per SOURCE_COLUMNS name; numbers as floats with NaN for NULL
+
+    Returns:
+        dict: One float array per DERIVED_COLUMNS name, NaN where it cannot be derived
+    """
+    is_quote = np.asarray(columns['type']) == 'quote'
+    hours = np.where(is_quote, columns['hours_estimated'], columns['hours_worked'])
+    days = np.where(is_quote, columns['days_estimated'], columns['days_worked'])
+    total = np.where(is_quote, columns['total_quote'], columns['total_cost'])
+    hourly_rate = columns['hourly_rate']
+    daily_rate = columns['daily_rate']
+    materials = columns['materials_fee']
+    fees = np.nan_to_num(columns['call_out_fee']) + np.nan_to_num(materials)
+
+    hourly_part = hourly_rate * hours
+    daily_part = daily_rate * days
+    has_time_cost = ~np.isnan(hourly_part) | ~np.isnan(daily_part)
+    time_cost = np.where(has_time_cost, np.nan_to_num(hourly_part) + np.nan_to_num(daily_part), np.nan)
+
+    # What was actually charged wins over rate arithmetic
+    labour = np.where(np.isnan(total), time_cost, np.maximum(total - fees, 0))
+    price = np.where(np.isnan(total), labour + fees, total)
+
+    effective_hours = np.nan_to_num(hours) + np.nan_to_num(days) * HOURS_PER_DAY
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quoted_rate = np.where(np.isnan(hourly_rate), daily_rate / HOURS_PER_DAY, hourly_rate)
+        hourly = np.where(effective_hours > 0, labour / effective_hours, quoted_rate)
+        materials_share = np.where(price > 0, materials / price, np.nan)
+
+    return {
+        'effective_labour_cost': labour,
+        'effective_hourly_rate': hourly,
+        'materials_share': materials_share,
+    }
+
+
+def _as_column(values) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def derive_costs(job: Mapping[str, Any]) -> Dict[str, Optional[float]]:
+    """Derived cost columns of a single job or quote, with None for NULL."""
+    columns = {name: _as_column([job.get(name)]) for name in SOURCE_COLUMNS if name != 'type'}
+    columns['type'] = np.array([job.get('type', 'job')])
+    derived = effective_costs(columns)
+    return {
+        name: None if np.isnan(values[0]) else round(float(values[0]), 4)
+        for name, values in derived.items()
+    }
+
+
+class EffectiveCostService:
+    """Service filling the derived cost columns of existing jobs in batches."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def backfill(self, batch_size: int = 5000, only_missing: bool = False) -> int:
+        """
+        Recompute the derived cost columns of every job and quote.
+
+        Args:
+            batch_size: Rows read and written per batch
+            only_missing: Only fill rows whose derived columns were never computed
+
+        Returns:
+            int: Number of rows updated
+        """
+        # Pages are read by id, so neither the table nor a large result set is held at once
+        query = f"SELECT id, {', '.join(SOURCE_COLUMNS)} FROM jobs WHERE id > ?"
+        if only_missing:
+            query += " AND effective_labour_cost IS NULL AND effective_hourly_rate IS NULL"
+        query += " ORDER BY id LIMIT ?"
+
+        updated = 0
+        last_id = 0
+        while True:
+            with self.db.get_cursor() as cursor:
+                cursor.execute(query, (last_id, batch_size))
+                rows = cursor.fetchall()
+            if not rows:
+                break
+
+            batch = list(zip(*rows))
+            columns = {name: _as_column(batch[i]) for i, name in enumerate(SOURCE_COLUMNS, start=1)
+                       if name != 'type'}
+            columns['type'] = np.array(batch[1])
+            derived = effective_costs(columns)
+
+            params = [
+                tuple(None if np.isnan(derived[name][i]) else round(float(derived[name][i]), 4)
+                      for name in DERIVED_COLUMNS) + (job_id,)
+                for i, job_id in enumerate(batch[0])
+            ]
+            with self.db.transaction() as cursor:
+                cursor.executemany(f"""
+                    UPDATE jobs SET {', '.join(f'{name} = ?' for name in DERIVED_COLUMNS)}
+                    WHERE id = ?
+                """, params)
+            updated += len(params)
+            last_id = rows[-1][0]
+            if len(rows) < batch_size:
+                break
+
+        logger.info(f"Backfilled effective costs of {updated} jobs and quotes")
+        return updated
@@ -16,6 +16,7 @@ from email.mime.multipart import MIMEMultipart
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 from config import get_config
+from app.services import metrics_service
 
 logger = logging.getLogger(__name__)
 
@@ -107,6 +108,7 @@ class EmailService:
         """
         if not self.is_configured():
             logger.warning("OAuth email configuration incomplete. Cannot send invitation.")
+            metrics_service.record_email('invitation', 'skipped')
             return False
         
         subject = f"Invitation to join {group_name}"
@@ -133,7 +135,9 @@ class EmailService:
         </html>
         """
         
-        return self._send_email_oauth(to_email, subject, body)
+        sent = self._send_email_oauth(to_email, subject, body)
+        metrics_service.record_email('invitation', 'sent' if sent else 'failed')
+        return sent
     
     def _send_email_oauth(self, to_email: str, subject: str, body: str) -> bool:
         """
@@ -0,0 +1,282 @@
+"""
+Streaming CSV and XLSX exports.
+
+Rows come from ``DatabaseService.iter_query`` and are written out as they are
+read, so an export of any size is served in constant memory. The XLSX writer
+builds the workbook by hand, streaming the zip archive with data descriptors,
+so it needs no spreadsheet library and never buffers the sheet.
+"""
+
+import io
+import re
+import csv
+import datetime
+import itertools
+import zipfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+from app.config.dashboard import EXPORT_CONFIG
+
+Column = Tuple[str, Callable[[Dict[str, Any]], Any]]
+
+FLUSH_EVERY_ROWS = 200
+
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Spreadsheet apps run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def field(name: str) -> Callable[[Dict[str, Any]], Any]:
+    """Column getter for a plain row field."""
+    return lambda row: row.get(name)
+
+
+def _job_date(row: Dict[str, Any]) -> Any:
+    if row.get('type') == 'quote':
+        return row.get('date_received') or row.get('date_requested')
+    return row.get('date_finished') or row.get('date_started')
+
+
+def _job_price(row: Dict[str, Any]) -> Any:
+    return row.get('total_quote') if row.get('type') == 'quote' else row.get('total_cost')
+
+
+JOB_COLUMNS: List[Column] = [
+    ('Type', field('type')),
+    ('Title', field('title')),
+    ('Trade', field('trade')),
+    ('Tradesman', lambda row: ' '.join(filter(None, [row.get('first_name'), row.get('family_name')]))),
+    ('Company', field('company_name')),
+    ('Status', field('status')),
+    ('Date', _job_date),
+    ('Price', _job_price),
+    ('Effective Hourly Rate', field('effective_hourly_rate')),
+    ('Rating', field('rating')),
+    ('Added By', field('added_by_username')),
+]
+
+TRADESMAN_COLUMNS: List[Column] = [
+    ('Trade', field('trade')),
+    ('First Name', field('first_name')),
+    ('Family Name', field('family_name')),
+    ('Company', field('company_name')),
+    ('Postcode', field('postcode')),
+    ('Distance (miles)', field('distance')),
+    ('Phone', field('phone_number')),
+    ('Email', field('email')),
+    ('Jobs', field('job_count')),
+    ('Quotes', field('quote_count')),
+    ('Rating', lambda row: row.get('avg_rating', row.get('rating'))),
+    ('Cost Overrun', field('cost_overrun')),
+    ('Added By', field('added_by_username')),
+]
+
+GROUP_COLUMNS: List[Column] = [
+    ('Group Name', field('name')),
+    ('Postcode', field('postcode')),
+    ('Members', field('member_count')),
+    ('Your Status', field('status')),
+]
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Unseekable sink that collects written bytes until they are drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns: List[Column]) -> Iterator[bytes]:
+    """Yield a CSV file, a batch of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the file as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _ in columns])
+
+    for count, row in enumerate(rows, start=1):
+        values = []
+        for _, getter in columns:
+            value = getter(row)
+            if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+                value = "'" + value
+            values.append('' if value is None else value)
+        writer.writerow(values)
+        if count % FLUSH_EVERY_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _column_letter(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(reference: str, value: Any, style: int = 0) -> str:
+    style_attr = f' s="{style}"' if style else ''
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"{style_attr}><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"{style_attr}><v>{value}</v></c>'
+    text = escape(ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c r="{reference}" t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number: int, values: List[Any], letters: List[str], style: int = 0) -> str:
+    cells = ''.join(_xlsx_cell(f'{letter}{number}', value, style) for letter, value in zip(letters, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '</styleSheet>'
+    ),
+}
+
+
+def iter_xlsx(rows: Iterable[Dict[str, Any]], columns: List[Column], sheet_name: str = 'Export') -> Iterator[bytes]:
+    """Yield an XLSX workbook with a single sheet, a batch of rows at a time."""
+    buffer = _ChunkBuffer()
+    letters = [_column_letter(i) for i in range(len(columns))]
+    sheet_name = escape(re.sub(r'[\[\]:*?/\\]', '', sheet_name)[:31] or 'Export', {'"': '&quot;'})
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield buffer.drain()
+
+        # force_zip64 because the sheet size isn't known up front
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>'
+                + _xlsx_row(1, [header for header, _ in columns], letters, style=1)
+            ).encode('utf-8'))
+            for number, row in enumerate(rows, start=2):
+                values = [getter(row) for _, getter in columns]
+                sheet.write(_xlsx_row(number, values, letters).encode('utf-8'))
+                if number % FLUSH_EVERY_ROWS == 0:
+                    yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+class ExportService:
+    """Builds streaming download responses for exports."""
+
+    @staticmethod
+    def enabled_formats() -> List[str]:
+        """Formats switched on in EXPORT_CONFIG."""
+        formats = []
+        if EXPORT_CONFIG.get('enable_csv_export'):
+            formats.append('csv')
+        if EXPORT_CONFIG.get('enable_excel_export'):
+            formats.append('xlsx')
+        return formats
+
+    @staticmethod
+    def stream(rows: Iterable[Dict[str, Any]], columns: List[Column], export_format: str,
+               sheet_name: str = 'Export') -> Iterator[bytes]:
+        """Encode rows in the given format, capped at max_export_rows."""
+        rows = itertools.islice(rows, EXPORT_CONFIG.get('max_export_rows'))
+        if export_format == 'xlsx':
+            return iter_xlsx(rows, columns, sheet_name)
+        return iter_csv(rows, columns)
+
+    @staticmethod
+    def response(rows: Iterable[Dict[str, Any]], columns: List[Column], export_format: str,
+                 name: str) -> Response:
+        """
+        Stream rows to the client as a file download.
+
+        Args:
+            rows: Lazily produced rows, e.g. from DatabaseService.iter_query
+            columns: (header, getter) pairs
+            export_format: 'csv' or 'xlsx'
+            name: Base file name, used as the sheet name too
+        """
+        filename = f"{name}-{datetime.date.today().isoformat()}.{export_format}"
+        # The database cursor lives on flask.g, so keep the context for the whole stream
+        body = stream_with_context(ExportService.stream(rows, columns, export_format, name))
+        response = Response(body, mimetype=MIMETYPES[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
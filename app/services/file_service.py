@@ -1,8 +1,9 @@
-import os
 import uuid
-from pathlib import Path
 from werkzeug.utils import secure_filename
 from flask import current_app
+from app.services.preview_service import PreviewService
+from app.services.storage_service import get_storage
+from app.services import metrics_service
 
 class FileService:
     @staticmethod
@@ -14,12 +15,13 @@ class FileService:
     def save_file(file, folder='uploads'):
         if file and file.filename and FileService.allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            upload_path = Path(current_app.config['UPLOAD_FOLDER']) / folder
-            upload_path.mkdir(parents=True, exist_ok=True)
-            file_path = upload_path / unique_filename
-            file.save(str(file_path))
-            return str(file_path.relative_to(current_app.config['UPLOAD_FOLDER']))
+            key = f"{folder}/{uuid.uuid4().hex}_{filename}"
+            # Stream straight into the backend rather than buffering the whole file
+            get_storage().save(key, file.stream)
+            metrics_service.record_upload_bytes('form', file.stream.tell())
+            # Thumbnails are generated in the background; never wait on them here
+            PreviewService.schedule(key)
+            return key
         return None
 
     @staticmethod
@@ -27,10 +29,11 @@ class FileService:
         if not filename:
             return True
         try:
-            file_path = Path(current_app.config['UPLOAD_FOLDER']) / filename
-            if file_path.exists():
-                file_path.unlink()
-                return True
+            storage = get_storage()
+            file_path = storage.local_path(filename)
+            if file_path is not None:
+                PreviewService.delete_previews(file_path)
+            return storage.delete(filename)
         except Exception:
             pass
         return False
@@ -39,4 +42,4 @@ class FileService:
     def get_file_url(filename):
         if not filename:
             return None
-        return f"/uploads/{filename}" 
\ No newline at end of file
+        return f"/uploads/{filename}"
@@ -0,0 +1,201 @@
+"""
+Postcode coordinates and proximity search over tradesmen, groups and users.
+
+Coordinates come from an offline postcode dataset loaded into the postcodes
+table; outward codes get the centroid of their postcodes so partial or
+unknown postcodes still land nearby. Where each tradesman, group and user
+is lives in an R*Tree index, filled by triggers as their postcodes change.
+
+A radius search asks the R*Tree for the square around the circle, which
+touches only the rows nearby. The exact great-circle distance is then
+checked, and ranked on, with the distance_miles SQL function.
+"""
+
+import logging
+import math
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from app.services.database import get_db_service
+
+logger = logging.getLogger(__name__)
+
+# Searchable table -> R*Tree index of its rows' coordinates
+LOCATION_INDEXES = {
+    'tradesmen': 'tradesman_locations',
+    'groups': 'group_locations',
+    'users': 'user_locations',
+}
+
+MILES_PER_DEGREE_LATITUDE = 69.05
+
+# Radii offered by the search forms
+SEARCH_RADII = (1, 5, 10, 25, 50)
+
+
+def normalise_postcode(postcode: Optional[str]) -> str:
+    """Postcode as keyed in the postcodes table: upper case without spaces."""
+    return ''.join((postcode or '').split()).upper()
+
+
+def bounding_box(latitude: float, longitude: float, miles: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) of a square enclosing a circle of the radius."""
+    lat_delta = miles / MILES_PER_DEGREE_LATITUDE
+    # Degrees of longitude shrink towards the poles; widen the box by the narrower edge
+    edge = min(abs(latitude) + lat_delta, 89.9)
+    lon_delta = miles / (MILES_PER_DEGREE_LATITUDE * math.cos(math.radians(edge)))
+    return latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta
+
+
+class GeoService:
+    """Service loading postcode coordinates and answering proximity queries."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def load_postcodes(self, rows: Iterable[Dict[str, Any]], batch_size: int = 10000) -> int:
+        """
+        Load postcode coordinates, replacing any already loaded for the same postcodes.
+
+        Args:
+            rows: Mappings with postcode, latitude and longitude keys, e.g. from csv.DictReader
+            batch_size: Rows written per transaction
+
+        Returns:
+            int: Number of postcodes loaded
+        """
+        loaded = 0
+        batch: List[Tuple[str, float, float]] = []
+        for row in rows:
+            try:
+                batch.append((normalise_postcode(row['postcode']), float(row['latitude']), float(row['longitude'])))
+            except (TypeError, ValueError):
+                continue  # Terminated postcodes have no coordinates
+            if len(batch) >= batch_size:
+                loaded += self._write_postcodes(batch)
+                batch = []
+        loaded += self._write_postcodes(batch)
+
+        # Outward codes ('SW1A' of 'SW1A 1AA') get the centroid of their postcodes
+        with self.db.transaction() as cursor:
+            cursor.execute("""
+                INSERT OR REPLACE INTO postcodes (postcode, latitude, longitude)
+                SELECT substr(postcode, 1, length(postcode) - 3), AVG(latitude), AVG(longitude)
+                FROM postcodes WHERE length(postcode) >= 5
+                GROUP BY substr(postcode, 1, length(postcode) - 3)
+            """)
+        logger.info(f"Loaded {loaded} postcodes")
+        return loaded
+
+    def _write_postcodes(self, batch: List[Tuple[str, float, float]]) -> int:
+        if not batch:
+            return 0
+        with self.db.transaction() as cursor:
+            cursor.executemany(
+                "INSERT OR REPLACE INTO postcodes (postcode, latitude, longitude) VALUES (?, ?, ?)", batch
+            )
+        return len(batch)
+
+    def reindex(self) -> int:
+        """
+        Refill every location index from the current postcodes.
+
+        Returns:
+            int: Number of rows indexed
+        """
+        indexed = 0
+        with self.db.transaction() as cursor:
+            for table, index in LOCATION_INDEXES.items():
+                cursor.execute(f"DELETE FROM {index}")
+                cursor.execute(f"""
+                    INSERT INTO {index} (id, min_lat, max_lat, min_lon, max_lon)
+                    SELECT e.id, p.latitude, p.latitude, p.longitude, p.longitude
+                    FROM {table} e
+                    JOIN postcodes p ON p.postcode = (
+                        SELECT postcode FROM postcodes
+                        WHERE postcode IN (upper(replace(e.postcode, ' ', '')),
+                                           substr(upper(replace(e.postcode, ' ', '')), 1,
+                                                  length(upper(replace(e.postcode, ' ', ''))) - 3))
+                        ORDER BY length(postcode) DESC LIMIT 1
+                    )
+                """)
+                indexed += cursor.rowcount
+        logger.info(f"Indexed {indexed} locations")
+        return indexed
+
+    def locate(self, postcode: Optional[str]) -> Optional[Tuple[float, float]]:
+        """(latitude, longitude) of a postcode, or of its outward code; None if unknown."""
+        normalised = normalise_postcode(postcode)
+        if not normalised:
+            return None
+        row = self.db.execute_single_query("""
+            SELECT latitude, longitude FROM postcodes WHERE postcode IN (?, ?)
+            ORDER BY length(postcode) DESC LIMIT 1
+        """, (normalised, normalised[:-3]))
+        return (row['latitude'], row['longitude']) if row else None
+
+    def proximity(self, table: str, id_column: str, postcode: Optional[str],
+                  miles: float) -> Optional[Tuple[str, str, Tuple, str]]:
+        """
+        SQL restricting a search to rows of a table within a radius of a postcode.
+
+        Args:
+            table: Key of LOCATION_INDEXES the search is over
+            id_column: Qualified id column of that table in the search, e.g. 't.id'
+            postcode: Postcode at the centre
+            miles: Radius
+
+        Returns:
+            tuple: (join, condition, condition params, distance expression), or
+            None if the postcode has no known coordinates
+        """
+        centre = self.locate(postcode)
+        if centre is None:
+            return None
+        index = LOCATION_INDEXES[table]
+        latitude, longitude = centre
+        # Coordinates come from the postcodes table, so they are plain floats
+        distance = f"distance_miles({float(latitude)!r}, {float(longitude)!r}, loc.min_lat, loc.min_lon)"
+        join = f"JOIN {index} loc ON loc.id = {id_column}"
+        # The IN subquery lets the R*Tree pick the candidates instead of scanning the table
+        condition = f"""{id_column} IN (
+            SELECT id FROM {index} WHERE min_lat >= ? AND max_lat <= ? AND min_lon >= ? AND max_lon <= ?
+        ) AND {distance} <= ?"""
+        return join, condition, (*bounding_box(latitude, longitude, miles), miles), distance
+
+    def within(self, table: str, postcode: Optional[str], miles: float,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Ids of a table's rows within a radius of a postcode, nearest first.
+
+        Returns:
+            list: Rows with id and distance in miles
+        """
+        centre = self.locate(postcode)
+        if centre is None:
+            return []
+        latitude, longitude = centre
+        query = f"""
+            SELECT id, distance_miles(?, ?, min_lat, min_lon) as distance FROM {LOCATION_INDEXES[table]}
+            WHERE min_lat >= ? AND max_lat <= ? AND min_lon >= ? AND max_lon <= ? AND distance <= ?
+            ORDER BY distance
+        """
+        params: Tuple = (latitude, longitude, *bounding_box(latitude, longitude, miles), miles)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        return self.db.execute_query(query, params)
+
+    def nearest(self, table: str, postcode: Optional[str], k: int = 10,
+                max_miles: float = 500) -> List[Dict[str, Any]]:
+        """
+        The k rows of a table nearest a postcode, nearest first.
+
+        The radius doubles from one mile until k rows are inside it, so only
+        the neighbourhood is read.
+        """
+        miles = 1.0
+        while True:
+            rows = self.within(table, postcode, miles, limit=k)
+            if len(rows) >= k or miles >= max_miles:
+                return rows
+            miles = min(miles * 2, max_miles)
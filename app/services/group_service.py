@@ -1,10 +1,12 @@
 from typing import Optional, List, Dict, Any
 from app.services.database import get_db_service
+from app.services.geo_service import GeoService
 
 class GroupService:
     """Service class for group-related database operations."""
     def __init__(self):
         self.db = get_db_service()
+        self.geo = GeoService()
 
     def get_group_by_id(self, group_id: int) -> Optional[Dict[str, Any]]:
         query = "SELECT * FROM groups WHERE id = ?"
@@ -67,19 +69,28 @@ class GroupService:
         query = "SELECT * FROM groups ORDER BY name"
         return self.db.execute_query(query)
 
-    def search_groups(self, name: Optional[str] = None, postcode: Optional[str] = None) -> List[Dict[str, Any]]:
-        query = "SELECT * FROM groups"
+    def search_groups(self, name: Optional[str] = None, postcode: Optional[str] = None,
+                      radius: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Search groups by name and postcode; with a radius in miles, nearest first with their distance."""
+        proximity = self.geo.proximity('groups', 'g.id', postcode, radius) if postcode and radius else None
+        if proximity:
+            query = f"SELECT g.*, {proximity[3]} as distance FROM groups g {proximity[0]}"
+        else:
+            query = "SELECT g.*, NULL as distance FROM groups g"
         conditions = []
         params = []
         if name:
-            conditions.append("name LIKE ?")
+            conditions.append("g.name LIKE ?")
             params.append(f"%{name}%")
-        if postcode:
-            conditions.append("postcode LIKE ?")
+        if proximity:
+            conditions.append(proximity[1])
+            params.extend(proximity[2])
+        elif postcode:
+            conditions.append("g.postcode LIKE ?")
             params.append(f"%{postcode}%")
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
-        query += " ORDER BY name"
+        query += " ORDER BY distance, g.name" if proximity else " ORDER BY g.name"
         return self.db.execute_query(query, tuple(params))
 
     def add_user_to_group(self, user_id: int, group_id: int, status: str = 'pending') -> bool:
@@ -159,7 +170,7 @@ class GroupService:
         query = """
             SELECT t.id FROM tradesmen t
             JOIN user_tradesmen ut ON t.id = ut.tradesman_id
-            WHERE ut.user_id = ?
+            WHERE ut.user_id = ? AND t.deleted_at IS NULL
         """
         user_tradesmen = self.db.execute_query(query, (user_id,))
         
@@ -199,6 +210,7 @@ class GroupService:
             JOIN user_groups ug ON u.id = ug.user_id
             JOIN group_tradesmen gt ON ug.group_id = gt.group_id
             WHERE ug.group_id = ? AND ug.status IN ('member', 'admin', 'creator')
+            AND j.deleted_at IS NULL AND u.deleted_at IS NULL
         """
         result = self.db.execute_single_query(query, (group_id,))
         return result['count'] if result else 0
@@ -218,7 +230,7 @@ class GroupService:
             JOIN tradesmen t ON j.tradesman_id = t.id
             JOIN users u ON j.user_id = u.id
             JOIN group_tradesmen gt ON t.id = gt.tradesman_id
-            WHERE gt.group_id = ?
+            WHERE gt.group_id = ? AND j.deleted_at IS NULL AND t.deleted_at IS NULL
             ORDER BY 
                 CASE 
                     WHEN j.date_finished IS NOT NULL THEN j.date_finished 
@@ -1,10 +1,13 @@
 import secrets
+import logging
 import datetime
 from typing import Optional, List, Dict, Any
 from app.services.database import get_db_service
 from app.services.email_service import EmailService
 from app.services.user_service import UserService
 
+logger = logging.getLogger(__name__)
+
 class InvitationService:
     """Service for managing group invitations."""
     
@@ -50,7 +53,7 @@ class InvitationService:
             return None
             
         except Exception as e:
-            print(f"Error creating invitation: {e}")
+            logger.error(f"Error creating invitation: {e}")
             return None
     
     def get_invitation_by_token(self, token: str) -> Optional[Dict[str, Any]]:
@@ -111,7 +114,7 @@ class InvitationService:
                 return True
             return False
         except Exception as e:
-            print(f"Error accepting invitation: {e}")
+            logger.error(f"Error accepting invitation: {e}")
             return False
     
     def send_invitation_email(self, group_id: int, invited_by_user_id: int, 
@@ -130,7 +133,7 @@ class InvitationService:
         try:
             # Validate inputs
             if not group_id or not invited_by_user_id or not email:
-                print(f"Invalid inputs: group_id={group_id}, invited_by_user_id={invited_by_user_id}, email={email}")
+                logger.warning(f"Invalid inputs: group_id={group_id}, invited_by_user_id={invited_by_user_id}, email={email}")
                 return False
             
             # Get group and inviter details
@@ -141,23 +144,23 @@ class InvitationService:
             user = self.db.execute_single_query(user_query, (invited_by_user_id,))
             
             if not group:
-                print(f"Group not found with ID: {group_id}")
+                logger.warning(f"Group not found with ID: {group_id}")
                 return False
                 
             if not user:
-                print(f"User not found with ID: {invited_by_user_id}")
+                logger.warning(f"User not found with ID: {invited_by_user_id}")
                 return False
             
             # Create invitation
             token = self.create_invitation(group_id, invited_by_user_id, email)
             if not token:
-                print("Failed to create invitation")
+                logger.error("Failed to create invitation")
                 return False
             
             # Get invitation details for email
             invitation = self.get_invitation_by_token(token)
             if not invitation:
-                print("Failed to retrieve invitation after creation")
+                logger.error("Failed to retrieve invitation after creation")
                 return False
             
             # Send email
@@ -170,7 +173,7 @@ class InvitationService:
             )
             
         except Exception as e:
-            print(f"Error sending invitation email: {e}")
+            logger.error(f"Error sending invitation email: {e}")
             return False
     
     def get_pending_invitations_for_group(self, group_id: int) -> List[Dict[str, Any]]:
@@ -229,7 +232,7 @@ class InvitationService:
             return self.db.execute_update(update_query, (invitation_id,)) > 0
             
         except Exception as e:
-            print(f"Error cancelling invitation: {e}")
+            logger.error(f"Error cancelling invitation: {e}")
             return False
     
     def get_pending_invitations_by_email(self, email: str) -> List[Dict[str, Any]]:
@@ -293,7 +296,7 @@ class InvitationService:
             return accepted_groups
             
         except Exception as e:
-            print(f"Error accepting pending invitations for user {user_id}: {e}")
+            logger.error(f"Error accepting pending invitations for user {user_id}: {e}")
             return []
 
     def _mark_invitation_expired(self, token: str) -> bool:
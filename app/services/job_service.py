@@ -1,12 +1,25 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 from app.services.database import get_db_service
-from app.services.file_service import FileService
+from app.services.deletion_service import DeletionService
+from app.services.change_log import schedule_change_processing
+from app.services.effective_cost_service import DERIVED_COLUMNS, derive_costs
+from app.services.anomaly_service import AnomalyService
+from app.services.geo_service import GeoService
+
+# Search result orders: sort key -> (ORDER BY clause, extra condition).
+# Rate orders scan idx_jobs_effective_hourly_rate, so results without a rate are left out.
+SEARCH_SORTS = {
+    'rate_asc': ("j.effective_hourly_rate ASC", "j.effective_hourly_rate IS NOT NULL"),
+    'rate_desc': ("j.effective_hourly_rate DESC", "j.effective_hourly_rate IS NOT NULL"),
+}
 
 class JobService:
     """Service class for job and quote-related database operations."""
     
     def __init__(self):
         self.db = get_db_service()
+        self.anomalies = AnomalyService()
+        self.geo = GeoService()
     
     def get_job_by_id(self, job_id: int) -> Optional[Dict[str, Any]]:
         """Get job by ID with related information."""
@@ -16,13 +29,13 @@ class JobService:
                        WHEN t.first_name IS NOT NULL THEN t.first_name || ' ' || t.family_name
                        ELSE t.family_name
                    END as tradesman_name,
-                   t.first_name, t.family_name, t.company_name, t.trade,
+                   t.first_name, t.family_name, t.company_name, t.trade, t.postcode,
                    u.username as added_by_username,
                    u.id as added_by_user_id
             FROM jobs j
             JOIN tradesmen t ON j.tradesman_id = t.id
             JOIN users u ON j.user_id = u.id
-            WHERE j.id = ?
+            WHERE j.id = ? AND j.deleted_at IS NULL AND t.deleted_at IS NULL
         """
         return self.db.execute_single_query(query, (job_id,))
     
@@ -40,16 +53,26 @@ class JobService:
                 date_started, date_finished, date_requested, date_received,
                 call_out_fee, materials_fee, hourly_rate, hours_worked,
                 hours_estimated, daily_rate, days_worked, days_estimated,
-                total_cost, total_quote, rating, status, quote_file, job_file
+                total_cost, total_quote, rating, status, quote_file, job_file,
+                effective_labour_cost, effective_hourly_rate, materials_share
             )
-            VALUES (?, ?, 'job', ?, ?, ?, ?, NULL, NULL, ?, ?, ?, ?, NULL, ?, ?, NULL, ?, NULL, ?, 'accepted', ?, ?)
+            VALUES (?, ?, 'job', ?, ?, ?, ?, NULL, NULL, ?, ?, ?, ?, NULL, ?, ?, NULL, ?, NULL, ?, 'accepted', ?, ?,
+                    ?, ?, ?)
         """
-        return self.db.execute_insert(query, (
+        derived = derive_costs({
+            'type': 'job', 'call_out_fee': call_out_fee, 'materials_fee': materials_fee,
+            'hourly_rate': hourly_rate, 'hours_worked': hours_worked,
+            'daily_rate': daily_rate, 'days_worked': days_worked, 'total_cost': total_cost
+        })
+        job_id = self._insert_screened(query, (
             user_id, tradesman_id, title, description,
             date_started, date_finished, call_out_fee, materials_fee,
             hourly_rate, hours_worked, daily_rate, days_worked,
-            total_cost, rating, quote_file, job_file
+            total_cost, rating, quote_file, job_file,
+            *(derived[name] for name in DERIVED_COLUMNS)
         ))
+        schedule_change_processing()
+        return job_id
     
     def create_quote(self, user_id: int, tradesman_id: int, title: str, description: str,
                      date_requested: str = None, date_received: str = None,
@@ -63,16 +86,33 @@ class JobService:
                 user_id, tradesman_id, type, title, description,
                 date_requested, date_received, call_out_fee, materials_fee,
                 hourly_rate, hours_estimated, daily_rate, days_estimated,
-                total_quote, quote_file
+                total_quote, quote_file,
+                effective_labour_cost, effective_hourly_rate, materials_share
             )
-            VALUES (?, ?, 'quote', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, 'quote', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
-        return self.db.execute_insert(query, (
+        derived = derive_costs({
+            'type': 'quote', 'call_out_fee': call_out_fee, 'materials_fee': materials_fee,
+            'hourly_rate': hourly_rate, 'hours_estimated': hours_estimated,
+            'daily_rate': daily_rate, 'days_estimated': days_estimated, 'total_quote': total_quote
+        })
+        quote_id = self._insert_screened(query, (
             user_id, tradesman_id, title, description,
             date_requested, date_received, call_out_fee, materials_fee,
             hourly_rate, hours_estimated, daily_rate, days_estimated,
-            total_quote, quote_file
+            total_quote, quote_file,
+            *(derived[name] for name in DERIVED_COLUMNS)
         ))
+        schedule_change_processing()
+        return quote_id
+    
+    def _insert_screened(self, query: str, params: Tuple) -> int:
+        """Insert a job or quote and screen its prices in the same write."""
+        with self.db.transaction() as cursor:
+            cursor.execute(query, params)
+            job_id = cursor.lastrowid
+            self.anomalies.screen(cursor, job_id)
+        return job_id
     
     def update_job(self, job_id: int, **kwargs) -> bool:
         """Update job information."""
@@ -93,9 +133,7 @@ class JobService:
         if not update_fields:
             return False
         
-        params.append(job_id)
-        query = f"UPDATE jobs SET {', '.join(update_fields)} WHERE id = ?"
-        return self.db.execute_update(query, tuple(params)) > 0
+        return self._update_with_costs(job_id, update_fields, params)
     
     def update_quote(self, quote_id: int, **kwargs) -> bool:
         """Update quote information."""
@@ -116,48 +154,67 @@ class JobService:
         if not update_fields:
             return False
         
-        params.append(quote_id)
-        query = f"UPDATE jobs SET {', '.join(update_fields)} WHERE id = ?"
-        return self.db.execute_update(query, tuple(params)) > 0
+        return self._update_with_costs(quote_id, update_fields, params)
+    
+    def _update_with_costs(self, job_id: int, update_fields: List[str], params: List[Any]) -> bool:
+        """Apply "field = ?" updates to a job, recomputing its derived cost columns in the same write."""
+        with self.db.transaction() as cursor:
+            updated = self._apply_update(cursor, job_id, update_fields, params)
+        if updated:
+            schedule_change_processing()
+        return updated
+    
+    def _apply_update(self, cursor, job_id: int, update_fields: List[str], params: List[Any]) -> bool:
+        """Run an update with derived cost columns on an open transaction's cursor, rescreening its prices."""
+        cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        job = dict(row)
+        job.update((field.split(' = ')[0], value) for field, value in zip(update_fields, params))
+        derived = derive_costs(job)
+        update_fields = update_fields + [f"{name} = ?" for name in DERIVED_COLUMNS]
+        params = params + [derived[name] for name in DERIVED_COLUMNS] + [job_id]
+        cursor.execute(f"UPDATE jobs SET {', '.join(update_fields)} WHERE id = ?", tuple(params))
+        if cursor.rowcount == 0:
+            return False
+        self.anomalies.screen(cursor, job_id, previous=dict(row))
+        return True
     
     def delete_job(self, job_id: int) -> bool:
-        """Delete a job or quote and associated files."""
-        # Get job info to delete associated files
-        job = self.get_job_by_id(job_id)
-        if job:
-            # Delete associated files
-            if job.get('quote_file'):
-                FileService.delete_file(job['quote_file'])
-            if job.get('job_file'):
-                FileService.delete_file(job['job_file'])
-        
-        query = "DELETE FROM jobs WHERE id = ?"
-        return self.db.execute_delete(query, (job_id,)) > 0
+        """Delete a job or quote; the deletion worker removes the row and its files."""
+        deleted = DeletionService().mark_deleted('job', job_id)
+        if deleted:
+            schedule_change_processing()
+        return deleted
     
-    def get_jobs_by_user(self, user_id: int) -> List[Dict[str, Any]]:
-        """Get all jobs created by a user."""
-        query = """
+    def _user_jobs_query(self, user_id: int, job_type: str) -> Tuple[str, Tuple]:
+        """Build the query for all jobs or quotes created by a user."""
+        order_column = 'date_started' if job_type == 'job' else 'date_requested'
+        query = f"""
             SELECT j.*, t.first_name, t.family_name, t.trade
             FROM jobs j
             JOIN tradesmen t ON j.tradesman_id = t.id
-            WHERE j.user_id = ? AND j.type = 'job'
-            ORDER BY j.date_started DESC
+            WHERE j.user_id = ? AND j.type = ? AND j.deleted_at IS NULL AND t.deleted_at IS NULL
+            ORDER BY j.{order_column} DESC
         """
-        return self.db.execute_query(query, (user_id,))
+        return query, (user_id, job_type)
+    
+    def get_jobs_by_user(self, user_id: int) -> List[Dict[str, Any]]:
+        """Get all jobs created by a user."""
+        return self.db.execute_query(*self._user_jobs_query(user_id, 'job'))
     
     def get_quotes_by_user(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all quotes created by a user."""
-        query = """
-            SELECT j.*, t.first_name, t.family_name, t.trade
-            FROM jobs j
-            JOIN tradesmen t ON j.tradesman_id = t.id
-            WHERE j.user_id = ? AND j.type = 'quote'
-            ORDER BY j.date_requested DESC
-        """
-        return self.db.execute_query(query, (user_id,))
+        return self.db.execute_query(*self._user_jobs_query(user_id, 'quote'))
     
-    def search_jobs(self, search_term=None, trade=None, rating=None, added_by_user=None, group=None):
-        """Search for jobs with filters"""
+    def iter_user_jobs(self, user_id: int, job_type: str) -> Iterator[Dict[str, Any]]:
+        """Stream all jobs or quotes created by a user, for exports."""
+        return self.db.iter_query(*self._user_jobs_query(user_id, job_type))
+    
+    def _search_jobs_query(self, search_term=None, trade=None, rating=None, added_by_user=None,
+                           group=None, sort=None) -> Tuple[str, Tuple]:
+        """Build the job search query and its parameters."""
         query = """
             SELECT j.*, 
                    t.first_name, t.family_name, t.company_name, t.trade,
@@ -166,7 +223,7 @@ class JobService:
             FROM jobs j
             JOIN tradesmen t ON j.tradesman_id = t.id
             JOIN users u ON j.user_id = u.id
-            WHERE j.type = 'job'
+            WHERE j.type = 'job' AND j.deleted_at IS NULL AND t.deleted_at IS NULL
         """
         params = []
         
@@ -195,21 +252,39 @@ class JobService:
             )"""
             params.append(group)
             
-        query += " ORDER BY j.date_finished DESC NULLS LAST"
+        if sort in SEARCH_SORTS:
+            order_by, condition = SEARCH_SORTS[sort]
+            query += f" AND {condition} ORDER BY {order_by}"
+        else:
+            query += " ORDER BY j.date_finished DESC NULLS LAST"
         
-        return self.db.execute_query(query, tuple(params))
+        return query, tuple(params)
     
-    def search_quotes(self, search_term: str = None, trade: str = None,
-                     postcode: str = None, status: str = None) -> List[Dict[str, Any]]:
-        """Search quotes with optional filters."""
-        query = """
+    def search_jobs(self, search_term=None, trade=None, rating=None, added_by_user=None, group=None, sort=None):
+        """Search for jobs with filters, newest first or in a SEARCH_SORTS order"""
+        return self.db.execute_query(*self._search_jobs_query(search_term, trade, rating, added_by_user, group, sort))
+    
+    def iter_search_jobs(self, search_term=None, trade=None, rating=None, added_by_user=None,
+                         group=None, sort=None) -> Iterator[Dict[str, Any]]:
+        """Stream job search results, for exports."""
+        return self.db.iter_query(*self._search_jobs_query(search_term, trade, rating, added_by_user, group, sort))
+    
+    def _search_quotes_query(self, search_term: str = None, trade: str = None,
+                             postcode: str = None, status: str = None,
+                             sort: str = None, radius: float = None) -> Tuple[str, Tuple]:
+        """Build the quote search query and its parameters."""
+        proximity = self.geo.proximity('tradesmen', 't.id', postcode, radius) if postcode and radius else None
+        location_join, distance = (proximity[0], proximity[3]) if proximity else ('', 'NULL')
+        query = f"""
             SELECT j.*, t.first_name, t.family_name, t.trade,
                    u.username as added_by_username, u.firstname, u.lastname,
-                   u.id as added_by_user_id
+                   u.id as added_by_user_id,
+                   {distance} as distance
             FROM jobs j
             JOIN tradesmen t ON j.tradesman_id = t.id
             JOIN users u ON j.user_id = u.id
-            WHERE j.type = 'quote'
+            {location_join}
+            WHERE j.type = 'quote' AND j.deleted_at IS NULL AND t.deleted_at IS NULL
         """
         
         conditions = []
@@ -227,7 +302,10 @@ class JobService:
             conditions.append("t.trade = ?")
             params.append(trade)
         
-        if postcode:
+        if proximity:
+            conditions.append(proximity[1])
+            params.extend(proximity[2])
+        elif postcode:
             conditions.append("t.postcode LIKE ?")
             params.append(f"%{postcode}%")
         
@@ -235,32 +313,71 @@ class JobService:
             conditions.append("j.status = ?")
             params.append(status)
         
+        order_by = "j.date_requested DESC"
+        if sort == 'distance' and proximity:
+            order_by = "distance, j.date_requested DESC"
+        elif sort in SEARCH_SORTS:
+            order_by, condition = SEARCH_SORTS[sort]
+            conditions.append(condition)
+        
         if conditions:
             query += " AND " + " AND ".join(conditions)
         
-        query += " ORDER BY j.date_requested DESC"
+        query += f" ORDER BY {order_by}"
         
-        return self.db.execute_query(query, tuple(params))
+        return query, tuple(params)
+    
+    def search_quotes(self, search_term: str = None, trade: str = None,
+                     postcode: str = None, status: str = None, sort: str = None,
+                     radius: float = None) -> List[Dict[str, Any]]:
+        """
+        Search quotes with optional filters, newest first or in a SEARCH_SORTS order.
+
+        With a radius in miles, only quotes from tradesmen that close to the
+        postcode are returned, and sort='distance' puts the nearest first.
+        """
+        return self.db.execute_query(*self._search_quotes_query(search_term, trade, postcode, status, sort, radius))
+    
+    def iter_search_quotes(self, search_term: str = None, trade: str = None,
+                           postcode: str = None, status: str = None,
+                           sort: str = None, radius: float = None) -> Iterator[Dict[str, Any]]:
+        """Stream quote search results, for exports."""
+        return self.db.iter_query(*self._search_quotes_query(search_term, trade, postcode, status, sort, radius))
     
     def convert_quote_to_job(self, quote_id: int) -> bool:
-        """Convert a quote to a job."""
+        """Convert a quote to a job, keeping a snapshot of the quote to compare the outcome with."""
         # First get the quote details
         quote = self.get_job_by_id(quote_id)
         if not quote or quote['type'] != 'quote':
             return False
         
         try:
-            # Update the quote to be a job
-            self.update_job(quote_id, 
-                           date_started=quote.get('date_requested'),
-                           total_cost=quote.get('total_quote'))
-            
-            # Update the type from 'quote' to 'job'
-            query = "UPDATE jobs SET type = 'job', status = 'accepted' WHERE id = ?"
-            return self.db.execute_update(query, (quote_id,)) > 0
+            with self.db.transaction() as cursor:
+                # Turn the quote into an accepted job, costed from the quoted total until the final cost is entered
+                converted = self._apply_update(
+                    cursor, quote_id,
+                    ["type = ?", "status = ?", "date_started = ?", "total_cost = ?"],
+                    ['job', 'accepted', quote.get('date_requested'), quote.get('total_quote')]
+                )
+                # Snapshot after costing, so the copied total doesn't count as an entered cost
+                cursor.execute("""
+                    INSERT OR REPLACE INTO quote_snapshots (
+                        job_id, date_requested, date_received, call_out_fee, materials_fee,
+                        hourly_rate, hours_estimated, daily_rate, days_estimated, total_quote
+                    )
+                    SELECT id, date_requested, date_received, call_out_fee, materials_fee,
+                           hourly_rate, hours_estimated, daily_rate, days_estimated, total_quote
+                    FROM jobs WHERE id = ?
+                """, (quote_id,))
+            schedule_change_processing()
+            return converted
         except Exception:
             return False
     
+    def get_quote_snapshot(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get the quote a job was converted from, as it stood at conversion."""
+        return self.db.execute_single_query("SELECT * FROM quote_snapshots WHERE job_id = ?", (job_id,))
+    
     def reject_quote(self, quote_id: int) -> bool:
         """Reject a quote by updating its status."""
         query = "UPDATE jobs SET status = 'declined' WHERE id = ? AND type = 'quote'"
@@ -277,7 +394,7 @@ class JobService:
             SELECT j.*, u.username, u.firstname, u.lastname
             FROM jobs j
             JOIN users u ON j.user_id = u.id
-            WHERE j.tradesman_id = ? AND j.type = 'job'
+            WHERE j.tradesman_id = ? AND j.type = 'job' AND j.deleted_at IS NULL
             ORDER BY j.date_started DESC
         """
         return self.db.execute_query(query, (tradesman_id,))
@@ -288,20 +405,20 @@ class JobService:
             SELECT j.*, u.username, u.firstname, u.lastname
             FROM jobs j
             JOIN users u ON j.user_id = u.id
-            WHERE j.tradesman_id = ? AND j.type = 'quote'
+            WHERE j.tradesman_id = ? AND j.type = 'quote' AND j.deleted_at IS NULL
             ORDER BY j.date_requested DESC
         """
         return self.db.execute_query(query, (tradesman_id,))
     
     def can_user_edit_job(self, user_id: int, job_id: int) -> bool:
         """Check if a user can edit a job."""
-        query = "SELECT 1 FROM jobs WHERE id = ? AND user_id = ?"
+        query = "SELECT 1 FROM jobs WHERE id = ? AND user_id = ? AND deleted_at IS NULL"
         result = self.db.execute_single_query(query, (job_id, user_id))
         return result is not None
     
     def get_unique_trades(self):
         """Get all unique trades for filtering"""
-        query = "SELECT DISTINCT trade FROM tradesmen ORDER BY trade"
+        query = "SELECT DISTINCT trade FROM tradesmen WHERE deleted_at IS NULL ORDER BY trade"
         results = self.db.execute_query(query)
         return [row['trade'] for row in results]
     
@@ -311,6 +428,7 @@ class JobService:
             SELECT DISTINCT u.username 
             FROM users u 
             JOIN jobs j ON u.id = j.user_id 
+            WHERE u.deleted_at IS NULL AND j.deleted_at IS NULL
             ORDER BY u.username
         """
         results = self.db.execute_query(query)
@@ -323,6 +441,7 @@ class JobService:
             FROM groups g 
             JOIN group_tradesmen gt ON g.id = gt.group_id 
             JOIN jobs j ON gt.tradesman_id = j.tradesman_id
+            WHERE j.deleted_at IS NULL
             ORDER BY g.name
         """
         results = self.db.execute_query(query)
@@ -345,6 +464,7 @@ class JobService:
                        SELECT group_id FROM user_groups 
                        WHERE user_id = ? AND status IN ('member', 'admin', 'creator')
                    )))
+            AND j.deleted_at IS NULL AND t.deleted_at IS NULL
             AND (
                 j.type = 'job' OR
                 (j.type = 'quote' AND j.date_received IS NOT NULL)
@@ -363,7 +483,7 @@ class JobService:
         query = """
             SELECT status, COUNT(*) as count
             FROM jobs
-            WHERE tradesman_id = ?
+            WHERE tradesman_id = ? AND deleted_at IS NULL
             GROUP BY status
         """
         results = self.db.execute_query(query, (tradesman_id,))
@@ -374,6 +494,6 @@ class JobService:
 
     def get_job_titles_for_tradesman(self, tradesman_id: int) -> List[str]:
         """Get all job titles for a tradesman."""
-        query = "SELECT title FROM jobs WHERE tradesman_id = ?"
+        query = "SELECT title FROM jobs WHERE tradesman_id = ? AND deleted_at IS NULL"
         results = self.db.execute_query(query, (tradesman_id,))
         return [row['title'] for row in results] 
\ No newline at end of file
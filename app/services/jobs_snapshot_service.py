@@ -0,0 +1,517 @@
+"""
+Columnar, memory-mapped snapshot of the jobs table for analytics.
+
+Each column of the live jobs is stored as a .npy file: numbers as float64
+with NaN for NULL, dates as datetime64[D] with NaT, and trade, postcode and
+district dictionary-encoded as int32 codes into the version's dictionaries.
+
+A snapshot is a base, whose rows are sorted by (tradesman_id, id) so a
+tradesman's jobs are one contiguous slice, plus the segments appended since.
+A refresh reads only the jobs named by the change log since the snapshot's
+cursor and writes them as a new segment, along with the ids of the older rows
+they replace or remove; nothing already written is rewritten. Once there are
+more than JOBS_SNAPSHOT_MAX_SEGMENTS segments, or they hold more rows than
+JOBS_SNAPSHOT_COMPACT_RATIO of the base, they are compacted into a new base.
+
+Parts are immutable; a version is a manifest naming its base and segments,
+and CURRENT is atomically repointed at the newest one. Every process maps the
+same files read-only, so they share one copy in the page cache. The trade
+insights API reads the snapshot through get_jobs_snapshot.
+
+Every worker process runs its own change-log worker, so writers take an
+exclusive lock on the directory's LOCK file; a refresh finding it held leaves
+the work to the process holding it. Parts no version names are only removed
+once older than JOBS_SNAPSHOT_PART_GRACE seconds, and a version whose parts
+are missing is treated as no snapshot and rebuilt.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+
+import numpy as np
+from flask import current_app
+
+from app.helpers import postcode_district
+from app.services.database import get_db_service
+from app.services.change_log import ChangeLog
+from app.services import metrics_service
+from app.services.effective_cost_service import HOURS_PER_DAY
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the development server runs a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'jobs_snapshot'
+
+SNAPSHOT_FORMAT = 2
+
+JOB_TYPES = ['job', 'quote']
+JOB_STATUSES = ['pending', 'accepted', 'declined']
+
+NUMERIC_COLUMNS = [
+    'call_out_fee', 'materials_fee', 'hourly_rate', 'hours_worked', 'hours_estimated',
+    'daily_rate', 'days_worked', 'days_estimated', 'total_cost', 'total_quote', 'rating',
+]
+DATE_COLUMNS = ['date_started', 'date_finished', 'date_requested', 'date_received']
+
+
+def _to_dates(values: List[Optional[str]]) -> np.ndarray:
+    """Convert date strings to datetime64[D], with NaT for missing or unparseable dates."""
+    trimmed = [value[:10] if value else None for value in values]
+    try:
+        return np.array(trimmed, dtype='datetime64[D]')
+    except ValueError:
+        dates = np.empty(len(trimmed), dtype='datetime64[D]')
+        for i, value in enumerate(trimmed):
+            try:
+                dates[i] = np.datetime64(value, 'D') if value else np.datetime64('NaT')
+            except ValueError:
+                dates[i] = np.datetime64('NaT')
+        return dates
+
+
+def _codes(dictionary: List[str], lookup: Dict[str, int], values: List[Optional[str]]) -> np.ndarray:
+    """Dictionary-encode values, appending unseen ones to the dictionary; None is -1."""
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(dictionary)
+            dictionary.append(value)
+        codes[i] = code
+    return codes
+
+
+class JobsSnapshot:
+    """Read-only view of one snapshot version; columns are memory-mapped on first use."""
+
+    def __init__(self, directory: str, version: str):
+        self.directory = directory
+        self.version = version
+        self.path = os.path.join(directory, version)
+        with open(self.path, encoding='utf-8') as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.dictionaries: Dict[str, List[str]] = self.meta.get('dictionaries', {})
+        self.parts: List[str] = [self.meta.get('base')] + self.meta.get('segments', [])
+        self._part_columns: Dict[Tuple[str, str], np.ndarray] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._live: Optional[List[Optional[np.ndarray]]] = None
+
+    def __len__(self) -> int:
+        return self.meta['rows']
+
+    def _part_column(self, part: str, name: str) -> np.ndarray:
+        column = self._part_columns.get((part, name))
+        if column is None:
+            column = np.load(os.path.join(self.directory, part, f'{name}.npy'), mmap_mode='r')
+            self._part_columns[(part, name)] = column
+        return column
+
+    def _live_masks(self) -> List[Optional[np.ndarray]]:
+        """Per part, which of its rows no later segment replaced; None when all of them."""
+        if self._live is None:
+            masks: List[Optional[np.ndarray]] = []
+            replaced = np.empty(0, dtype=np.int64)
+            for part in reversed(self.parts):
+                masks.append(~np.isin(self._part_column(part, 'id'), replaced) if len(replaced) else None)
+                if part != self.parts[0]:
+                    replaced = np.union1d(replaced, self._part_column(part, 'replaced'))
+            self._live = masks[::-1]
+        return self._live
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        column = self._columns.get(name)
+        if column is None:
+            if len(self.parts) == 1:
+                # Without segments the base is served straight from the mapped file
+                column = self._part_column(self.parts[0], name)
+            else:
+                column = np.concatenate([
+                    part if live is None else part[live]
+                    for part, live in zip((self._part_column(p, name) for p in self.parts), self._live_masks())
+                ])
+            self._columns[name] = column
+        return column
+
+    @property
+    def columns(self) -> List[str]:
+        return self.meta['columns']
+
+    def decode(self, dictionary: str, codes: np.ndarray) -> List[Optional[str]]:
+        """Turn dictionary codes back into strings."""
+        values = self.dictionaries[dictionary]
+        return [values[code] if code >= 0 else None for code in codes]
+
+    def tradesman_rows(self, tradesman_id: int) -> np.ndarray:
+        """Positions of the rows belonging to a tradesman."""
+        if len(self.parts) > 1:
+            return np.flatnonzero(self['tradesman_id'] == tradesman_id)
+        ids = self._part_column(self.parts[0], 'tradesman_index')
+        i = int(np.searchsorted(ids, tradesman_id))
+        if i == len(ids) or ids[i] != tradesman_id:
+            return np.arange(0)
+        starts = self._part_column(self.parts[0], 'tradesman_starts')
+        return np.arange(int(starts[i]), int(starts[i + 1]))
+
+    def _by_trade(self, mask: np.ndarray, values: np.ndarray) -> Dict[str, Dict[str, float]]:
+        """Count, mean and median of values per trade, over the rows in mask."""
+        trades = np.asarray(self['trade'])[mask]
+        values = values[mask]
+        result = {}
+        order = np.lexsort((values, trades))
+        trades, values = trades[order], values[order]
+        starts = np.flatnonzero(np.r_[True, trades[1:] != trades[:-1]]) if len(trades) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(trades)]
+        names = self.dictionaries['trade']
+        for start, end in zip(starts, ends):
+            group = values[start:end]
+            result[names[trades[start]]] = {
+                'count': int(end - start),
+                'mean': float(group.mean()),
+                'median': float(np.median(group)),
+            }
+        return result
+
+    def cost_per_hour_by_trade(self) -> Dict[str, Dict[str, float]]:
+        """Effective hourly cost of finished jobs per trade, from total cost and time worked."""
+        hours = np.where(np.isnan(self['hours_worked']), self['days_worked'] * HOURS_PER_DAY, self['hours_worked'])
+        is_job = np.asarray(self['type']) == JOB_TYPES.index('job')
+        mask = is_job & (hours > 0) & ~np.isnan(self['total_cost'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost_per_hour = np.asarray(self['total_cost']) / hours
+        return self._by_trade(mask, cost_per_hour)
+
+    def estimate_accuracy_by_trade(self) -> Dict[str, Dict[str, float]]:
+        """Ratio of hours worked to hours estimated per trade, for jobs that have both."""
+        worked = np.where(np.isnan(self['hours_worked']), self['days_worked'] * HOURS_PER_DAY, self['hours_worked'])
+        estimated = np.where(np.isnan(self['hours_estimated']),
+                             self['days_estimated'] * HOURS_PER_DAY, self['hours_estimated'])
+        mask = (worked > 0) & (estimated > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = worked / estimated
+        return self._by_trade(mask, ratio)
+
+    def rating_trend(self, trade: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Mean rating of jobs per month finished, oldest first."""
+        finished = np.asarray(self['date_finished'])
+        ratings = np.asarray(self['rating'])
+        mask = ~np.isnat(finished) & ~np.isnan(ratings)
+        if trade is not None:
+            codes = self.dictionaries['trade']
+            if trade not in codes:
+                return []
+            mask &= np.asarray(self['trade']) == codes.index(trade)
+
+        months = finished[mask].astype('datetime64[M]')
+        unique_months, inverse = np.unique(months, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(unique_months))
+        sums = np.bincount(inverse, weights=ratings[mask], minlength=len(unique_months))
+        return [
+            {'month': str(month), 'count': int(count), 'mean_rating': float(total / count)}
+            for month, count, total in zip(unique_months, counts, sums)
+        ]
+
+
+class JobsSnapshotService:
+    """Builds and refreshes the columnar jobs snapshot."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.db = get_db_service()
+        self._directory = directory
+
+    @property
+    def directory(self) -> str:
+        if self._directory is not None:
+            return self._directory
+        return current_app.config.get('JOBS_SNAPSHOT_DIR', 'snapshots/jobs')
+
+    def open(self) -> Optional[JobsSnapshot]:
+        """Open the current snapshot, or None if none was built yet."""
+        try:
+            with open(os.path.join(self.directory, 'CURRENT'), encoding='utf-8') as f:
+                version = f.read().strip()
+            snapshot = JobsSnapshot(self.directory, version)
+        except (OSError, ValueError):
+            return None
+        if snapshot.meta.get('format') != SNAPSHOT_FORMAT:
+            return None
+        if not all(os.path.isdir(os.path.join(self.directory, part)) for part in snapshot.parts):
+            logger.warning(f"Jobs snapshot {version} is missing parts, ignoring it")
+            return None
+        return snapshot
+
+    @contextmanager
+    def _lock(self, blocking: bool = True) -> Iterator[bool]:
+        """
+        Hold the directory's lock, so one process at a time writes versions and removes parts.
+
+        Yields:
+            bool: False if not blocking and another process holds the lock
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'LOCK'), 'a') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            # Closing the file releases the lock
+            yield True
+
+    def _load_columns(self, dictionaries: Dict[str, List[str]], condition: str = '',
+                      params: Tuple = (), batch_size: int = 10000) -> Dict[str, np.ndarray]:
+        """Read live jobs into column arrays, extending the dictionaries with new strings."""
+        query = f"""
+            SELECT j.id, j.tradesman_id, j.user_id, j.type, j.status, t.trade, t.postcode,
+                   {', '.join(f'j.{name}' for name in NUMERIC_COLUMNS + DATE_COLUMNS)}
+            FROM jobs j
+            JOIN tradesmen t ON j.tradesman_id = t.id
+            WHERE j.deleted_at IS NULL AND t.deleted_at IS NULL {condition}
+        """
+        lookups = {name: {value: code for code, value in enumerate(values)}
+                   for name, values in dictionaries.items()}
+        districts: Dict[str, str] = {}
+        batches: Dict[str, List[np.ndarray]] = {}
+
+        with self.db.get_cursor() as cursor:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                # Transpose the tuples instead of building a dict per row
+                values = list(zip(*rows))
+                postcodes = values[6]
+                batch = {
+                    'id': np.array(values[0], dtype=np.int64),
+                    'tradesman_id': np.array(values[1], dtype=np.int64),
+                    'user_id': np.array(values[2], dtype=np.int64),
+                    'type': np.array([JOB_TYPES.index(v) for v in values[3]], dtype=np.int8),
+                    'status': np.array([JOB_STATUSES.index(v) if v in JOB_STATUSES else -1
+                                        for v in values[4]], dtype=np.int8),
+                    'trade': _codes(dictionaries['trade'], lookups['trade'], values[5]),
+                    'postcode': _codes(dictionaries['postcode'], lookups['postcode'], postcodes),
+                    'district': _codes(dictionaries['district'], lookups['district'], [
+                        districts.setdefault(p, postcode_district(p)) for p in postcodes
+                    ]),
+                }
+                for offset, name in enumerate(NUMERIC_COLUMNS, start=7):
+                    batch[name] = np.array(values[offset], dtype=np.float64)
+                for offset, name in enumerate(DATE_COLUMNS, start=7 + len(NUMERIC_COLUMNS)):
+                    batch[name] = _to_dates(values[offset])
+                for name, column in batch.items():
+                    batches.setdefault(name, []).append(column)
+
+        if not batches:
+            return self._empty_columns()
+        return {name: np.concatenate(parts) for name, parts in batches.items()}
+
+    @staticmethod
+    def _empty_columns() -> Dict[str, np.ndarray]:
+        columns = {
+            'id': np.empty(0, dtype=np.int64),
+            'tradesman_id': np.empty(0, dtype=np.int64),
+            'user_id': np.empty(0, dtype=np.int64),
+            'type': np.empty(0, dtype=np.int8),
+            'status': np.empty(0, dtype=np.int8),
+            'trade': np.empty(0, dtype=np.int32),
+            'postcode': np.empty(0, dtype=np.int32),
+            'district': np.empty(0, dtype=np.int32),
+        }
+        columns.update({name: np.empty(0, dtype=np.float64) for name in NUMERIC_COLUMNS})
+        columns.update({name: np.empty(0, dtype='datetime64[D]') for name in DATE_COLUMNS})
+        return columns
+
+    def _write_part(self, prefix: str, columns: Dict[str, np.ndarray]) -> str:
+        """Save columns as a new part directory and return its name."""
+        os.makedirs(self.directory, exist_ok=True)
+        part = f"{prefix}-{uuid.uuid4().hex[:12]}"
+        path = os.path.join(self.directory, part)
+        os.makedirs(path)
+        for name, column in columns.items():
+            np.save(os.path.join(path, f'{name}.npy'), column)
+        return part
+
+    def _write_base(self, columns: Dict[str, np.ndarray]) -> str:
+        """Write columns as a base, sorted by tradesman with an index of where each one starts."""
+        order = np.lexsort((columns['id'], columns['tradesman_id']))
+        columns = {name: column[order] for name, column in columns.items()}
+        tradesman_index, starts = np.unique(columns['tradesman_id'], return_index=True)
+        columns['tradesman_index'] = tradesman_index
+        columns['tradesman_starts'] = np.append(starts, len(order)).astype(np.int64)
+        return self._write_part('base', columns)
+
+    def _write_version(self, base: str, segments: List[str], dictionaries: Dict[str, List[str]],
+                       rows: int, segment_rows: int, last_change_id: int) -> JobsSnapshot:
+        """Write a manifest naming the parts of a new version and make it current."""
+        version = f"v{last_change_id}-{uuid.uuid4().hex[:8]}.json"
+        with open(os.path.join(self.directory, version), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': SNAPSHOT_FORMAT,
+                'base': base,
+                'segments': segments,
+                'rows': rows,
+                'segment_rows': segment_rows,
+                'columns': sorted(self._empty_columns()),
+                'dictionaries': dictionaries,
+                'last_change_id': last_change_id,
+                'built_at': time.time(),
+            }, f)
+
+        pointer = os.path.join(self.directory, f'CURRENT.{version}')
+        with open(pointer, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.directory, 'CURRENT'))
+
+        self._remove_old_versions(keep=version)
+        ChangeLog(CONSUMER).advance(last_change_id)
+        return JobsSnapshot(self.directory, version)
+
+    def _remove_old_versions(self, keep: str) -> None:
+        """Delete versions older than the previous one, and parts neither of them uses."""
+        manifests = sorted(
+            (entry for entry in os.scandir(self.directory)
+             if entry.is_file() and entry.name.startswith('v') and entry.name != keep),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        # Readers may still map the previous version
+        kept = [keep] + [entry.name for entry in manifests[-1:]]
+        grace = current_app.config.get('JOBS_SNAPSHOT_PART_GRACE', 600)
+        for entry in manifests[:-1]:
+            os.unlink(entry.path)
+        used = set()
+        for version in kept:
+            try:
+                used.update(JobsSnapshot(self.directory, version).parts)
+            except (OSError, ValueError):
+                continue
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            # A part written moments ago may belong to a version that isn't written yet
+            if entry.is_dir() and entry.name not in used and now - entry.stat().st_mtime > grace:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def rebuild(self) -> JobsSnapshot:
+        """Build a snapshot of every live job."""
+        with self._lock():
+            return self._rebuild()
+
+    def _rebuild(self) -> JobsSnapshot:
+        last_change_id = ChangeLog(CONSUMER).latest_id()
+        dictionaries: Dict[str, List[str]] = {'trade': [], 'postcode': [], 'district': []}
+        columns = self._load_columns(dictionaries)
+        snapshot = self._write_version(self._write_base(columns), [], dictionaries,
+                                       len(columns['id']), 0, last_change_id)
+        logger.info(f"Built jobs snapshot with {len(snapshot)} rows")
+        return snapshot
+
+    def compact(self, snapshot: JobsSnapshot) -> JobsSnapshot:
+        """Fold a snapshot's segments into a new base."""
+        with self._lock():
+            return self._compact(snapshot)
+
+    def _compact(self, snapshot: JobsSnapshot) -> JobsSnapshot:
+        columns = {name: np.asarray(snapshot[name]) for name in self._empty_columns()}
+        compacted = self._write_version(self._write_base(columns), [], snapshot.dictionaries, len(snapshot),
+                                        0, snapshot.meta['last_change_id'])
+        logger.info(f"Compacted {len(snapshot.parts) - 1} jobs snapshot segments")
+        return compacted
+
+    def refresh(self, max_changes: int = 5000, force: bool = False) -> bool:
+        """
+        Bring the snapshot up to date with the change log.
+
+        Rebuilds if there is no usable snapshot. Otherwise skips the refresh
+        when the snapshot is younger than JOBS_SNAPSHOT_MIN_AGE, unless forced.
+
+        Returns:
+            bool: True if there may be more changes to process
+        """
+        with self._lock(blocking=False) as locked:
+            if not locked:
+                # Another process is refreshing; changes it misses are picked up on the next run
+                return False
+            return self._refresh(max_changes, force)
+
+    def _refresh(self, max_changes: int, force: bool) -> bool:
+        change_log = ChangeLog(CONSUMER)
+        snapshot = self.open()
+        # A snapshot behind the stored cursor lost changes that may have been pruned
+        if snapshot is None or snapshot.meta['last_change_id'] < (change_log.get_cursor() or 0):
+            self._rebuild()
+            return False
+
+        if not force:
+            min_age = current_app.config.get('JOBS_SNAPSHOT_MIN_AGE', 60)
+            if time.time() - snapshot.meta['built_at'] < min_age:
+                return False
+
+        changes = change_log.pending(max_changes, after=snapshot.meta['last_change_id'])
+        if not changes:
+            return False
+
+        job_ids = sorted({c['job_id'] for c in changes if c['job_id'] is not None})
+        tradesman_ids = sorted({c['tradesman_id'] for c in changes if c['operation'] == 'tradesman'})
+
+        # Every row the changes touched is replaced by whatever of it is still live
+        replaced = np.asarray(job_ids, dtype=np.int64)
+        if tradesman_ids:
+            moved = np.isin(snapshot['tradesman_id'], tradesman_ids)
+            replaced = np.union1d(replaced, np.asarray(snapshot['id'])[moved])
+        conditions = []
+        if job_ids:
+            conditions.append(f"j.id IN ({', '.join('?' * len(job_ids))})")
+        if tradesman_ids:
+            conditions.append(f"j.tradesman_id IN ({', '.join('?' * len(tradesman_ids))})")
+        dictionaries = {name: list(values) for name, values in snapshot.dictionaries.items()}
+        changed = self._load_columns(dictionaries, f"AND ({' OR '.join(conditions)})",
+                                     tuple(job_ids) + tuple(tradesman_ids))
+
+        segment = self._write_part('segment', dict(changed, replaced=replaced))
+        rows = len(snapshot) - int(np.isin(snapshot['id'], replaced).sum()) + len(changed['id'])
+        # Replaced rows cost readers as much as added ones, so both count towards compaction
+        segment_rows = snapshot.meta['segment_rows'] + len(changed['id']) + len(replaced)
+        snapshot = self._write_version(snapshot.parts[0], snapshot.parts[1:] + [segment], dictionaries,
+                                       rows, segment_rows, changes[-1]['id'])
+
+        base_rows = len(snapshot._part_column(snapshot.parts[0], 'id'))
+        if (len(snapshot.parts) - 1 > current_app.config.get('JOBS_SNAPSHOT_MAX_SEGMENTS', 16)
+                or segment_rows > base_rows * current_app.config.get('JOBS_SNAPSHOT_COMPACT_RATIO', 0.25)):
+            self._compact(snapshot)
+        change_log.prune()
+        return len(changes) == max_changes
+
+
+def get_jobs_snapshot() -> Optional[JobsSnapshot]:
+    """
+    Get the current snapshot for this process, reopening it when a newer version is written.
+
+    Returns None if no snapshot has been built yet.
+    """
+    service = JobsSnapshotService()
+    cached = current_app.extensions.get('jobs_snapshot')
+    try:
+        with open(os.path.join(service.directory, 'CURRENT'), encoding='utf-8') as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    hit = cached is not None and cached.version == version
+    metrics_service.record_cache('jobs_snapshot', hit)
+    if not hit:
+        cached = service.open()
+        current_app.extensions['jobs_snapshot'] = cached
+    return cached
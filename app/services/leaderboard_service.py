@@ -0,0 +1,152 @@
+"""
+Leaderboards of tradesmen per trade and postcode district.
+
+Tradesmen are ranked by the Wilson lower bound of their ratings rather than
+the raw average. Ratings are mapped onto 0-1, the bound is taken at
+LEADERBOARD_CONFIDENCE_Z and mapped back onto the 1-5 scale. One 5-star job
+therefore scores about 1.8, while fifty jobs averaging 4.8 score about 4.4.
+A tradesman's score depends only on their own ratings. A rating change
+therefore recomputes only that tradesman.
+
+Scores are kept in the tradesman_scores table, whose (trade, score) and
+(trade, district, score) indexes are the leaderboards. Reading the top N is
+an index range scan of N rows.
+"""
+
+import logging
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.helpers import postcode_district
+from app.services.database import get_db_service
+from app.services.change_log import ChangeLog
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'leaderboards'
+
+
+def wilson_scores(avg_ratings: np.ndarray, counts: np.ndarray, z: float = 1.96) -> np.ndarray:
+    """
+    Wilson lower bound of 1-5 star ratings, on the same 1-5 scale.
+
+    Args:
+        avg_ratings: Mean rating of each tradesman
+        counts: Number of ratings of each tradesman; must be positive
+        z: Normal quantile of the bound; 1.96 is 95% confidence
+    """
+    p = (avg_ratings - 1) / 4
+    n = counts.astype(float)
+    centre = p + z * z / (2 * n)
+    margin = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    lower = (centre - margin) / (1 + z * z / n)
+    return 1 + 4 * np.clip(lower, 0, 1)
+
+
+class LeaderboardService:
+    """Service maintaining and reading the tradesman_scores leaderboards."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def refresh(self, max_changes: int = 1000) -> bool:
+        """
+        Rescore the tradesmen touched by pending job changes.
+
+        Rebuilds everything if the scores have never been computed.
+
+        Returns:
+            bool: True if there may be more changes to process
+        """
+        change_log = ChangeLog(CONSUMER)
+        if change_log.get_cursor() is None:
+            self.rebuild()
+            return False
+
+        changes = change_log.pending(max_changes)
+        if not changes:
+            return False
+        self._rescore({change['tradesman_id'] for change in changes})
+        change_log.advance(changes[-1]['id'])
+        change_log.prune()
+        return len(changes) == max_changes
+
+    def rebuild(self) -> int:
+        """
+        Rescore every tradesman.
+
+        Returns:
+            int: Number of tradesman_scores rows written
+        """
+        change_log = ChangeLog(CONSUMER)
+        # Take the position first: changes made during the rebuild are replayed later
+        last_change_id = change_log.latest_id()
+        written = self._rescore(None)
+        change_log.advance(last_change_id)
+        change_log.prune()
+        return written
+
+    def _rescore(self, tradesman_ids: Optional[Iterable[int]]) -> int:
+        """Replace the scores of the given tradesmen, or of all tradesmen if None."""
+        tradesman_ids = list(tradesman_ids) if tradesman_ids is not None else None
+        query = """
+            SELECT t.id, t.trade, t.postcode, COUNT(j.id) as job_count, AVG(j.rating) as avg_rating
+            FROM tradesmen t
+            JOIN jobs j ON j.tradesman_id = t.id
+            WHERE t.deleted_at IS NULL AND j.deleted_at IS NULL AND j.type = 'job' AND j.rating IS NOT NULL
+        """
+        params: Tuple = ()
+        if tradesman_ids is not None:
+            query += f" AND t.id IN ({', '.join('?' * len(tradesman_ids))})"
+            params = tuple(tradesman_ids)
+        query += " GROUP BY t.id"
+
+        with self.db.get_cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+        scored = []
+        if rows:
+            counts = np.array([row[3] for row in rows], dtype=np.int64)
+            averages = np.array([row[4] for row in rows], dtype=float)
+            scores = wilson_scores(averages, counts, current_app.config.get('LEADERBOARD_CONFIDENCE_Z', 1.96))
+            scored = [
+                (row[0], row[1], postcode_district(row[2]), int(counts[i]), float(averages[i]), float(scores[i]))
+                for i, row in enumerate(rows)
+            ]
+
+        with self.db.transaction() as cursor:
+            if tradesman_ids is None:
+                cursor.execute("DELETE FROM tradesman_scores")
+            else:
+                cursor.executemany("DELETE FROM tradesman_scores WHERE tradesman_id = ?",
+                                   [(tradesman_id,) for tradesman_id in tradesman_ids])
+            cursor.executemany("""
+                INSERT INTO tradesman_scores (tradesman_id, trade, district, rating_count, avg_rating, score)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, scored)
+        logger.info(f"Rescored {len(scored)} tradesmen")
+        return len(scored)
+
+    def top(self, trade: str, postcode: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the best-scored tradesmen of a trade, optionally in a postcode's district.
+
+        Returns:
+            list: tradesman_scores rows with the tradesmen's names, best first
+        """
+        query = """
+            SELECT s.*, t.first_name, t.family_name, t.company_name, t.postcode
+            FROM tradesman_scores s
+            JOIN tradesmen t ON t.id = s.tradesman_id
+            WHERE s.trade = ?
+        """
+        params: List[Any] = [trade]
+        if postcode:
+            query += " AND s.district = ?"
+            params.append(postcode_district(postcode))
+        query += " ORDER BY s.score DESC LIMIT ?"
+        params.append(limit)
+        return self.db.execute_query(query, tuple(params))
@@ -0,0 +1,158 @@
+"""
+Prometheus metrics for tracking capacity.
+
+Every request records its latency, its time in the database and the SQL
+statements it ran, labelled by blueprint endpoint. Services count cache
+lookups, invitation emails, uploaded bytes and database lock timeouts. All of
+it is served at /metrics in the Prometheus text format.
+
+Under gunicorn each worker process counts on its own. Point
+PROMETHEUS_MULTIPROC_DIR at an empty directory before the workers start and
+they write their counts to files there instead. /metrics then adds up all the
+workers, including ones that have exited, whichever worker the scrape lands on.
+
+Metrics are off unless METRICS_ENABLED is set, as it is in development.
+Outside DEBUG they are only served with a METRICS_TOKEN for scrapers to send.
+Without prometheus-client installed nothing is recorded and /metrics is not
+served.
+"""
+
+import hmac
+import logging
+import os
+import time
+from typing import Iterator
+
+from flask import Flask, Response, current_app, g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    # prometheus-client not installed, metrics are disabled
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds; most pages take tens of milliseconds, exports and searches on large data take seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+if prometheus_client is not None:
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        'fairprice_request_seconds', 'Request latency', ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+    )
+    REQUESTS = prometheus_client.Counter(
+        'fairprice_requests_total', 'Requests by response status', ['endpoint', 'method', 'status']
+    )
+    REQUEST_DB_SECONDS = prometheus_client.Histogram(
+        'fairprice_request_db_seconds', 'Time spent in the database per request', ['endpoint'],
+        buckets=LATENCY_BUCKETS
+    )
+    REQUEST_QUERIES = prometheus_client.Histogram(
+        'fairprice_request_queries', 'SQL statements run per request, trigger bodies included', ['endpoint'],
+        buckets=QUERY_BUCKETS
+    )
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        'fairprice_cache_lookups_total', 'Cache lookups by result', ['cache', 'result']
+    )
+    EMAILS = prometheus_client.Counter(
+        'fairprice_emails_total', 'Emails by outcome', ['kind', 'result']
+    )
+    UPLOAD_BYTES = prometheus_client.Counter(
+        'fairprice_upload_bytes_total', 'Bytes of uploaded files received', ['kind']
+    )
+    LOCK_TIMEOUTS = prometheus_client.Counter(
+        'fairprice_db_lock_timeouts_total', 'Statements that gave up waiting for a database lock'
+    )
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count a lookup in one of the app's caches."""
+    if prometheus_client is not None:
+        CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_email(kind: str, result: str) -> None:
+    """Count an email by outcome: 'sent', 'failed' or 'skipped' when mail is not configured."""
+    if prometheus_client is not None:
+        EMAILS.labels(kind, result).inc()
+
+
+def record_upload_bytes(kind: str, size: int) -> None:
+    """Count bytes received by form ('form') or chunked ('chunked') uploads."""
+    if prometheus_client is not None and size > 0:
+        UPLOAD_BYTES.labels(kind).inc(size)
+
+
+def record_lock_timeout() -> None:
+    if prometheus_client is not None:
+        LOCK_TIMEOUTS.inc()
+
+
+class DatabaseCollector:
+    """Gauges read from the database at scrape time, the same whichever worker answers."""
+
+    def collect(self) -> Iterator:
+        from app.services.database import db_service
+        pending = db_service.execute_single_query(
+            "SELECT COUNT(*) AS count FROM group_invitations WHERE status = 'pending'"
+        )
+        # Invitations are emailed as they are made; this is what is still waiting on invitees
+        yield GaugeMetricFamily('fairprice_pending_invitations', 'Invitations not yet accepted',
+                                value=pending['count'])
+
+
+def _endpoint() -> str:
+    # Unmatched URLs share a label so that probing for pages can't create new series
+    return request.endpoint or 'unmatched'
+
+
+def _start_request() -> None:
+    g.metrics_started = time.perf_counter()
+
+
+def _finish_request(response: Response) -> Response:
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    endpoint = _endpoint()
+    REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - started)
+    REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    REQUEST_DB_SECONDS.labels(endpoint).observe(g.get('db_seconds', 0.0))
+    REQUEST_QUERIES.labels(endpoint).observe(g.get('db_queries', 0))
+    return response
+
+
+def metrics() -> Response:
+    """Serve every metric in the Prometheus text format."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        # Scrapers want a plain answer, not the error page
+        return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer'})
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Add up the files every worker writes rather than this worker's own counts
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    database = prometheus_client.CollectorRegistry()
+    database.register(DatabaseCollector())
+
+    body = prometheus_client.generate_latest(registry) + prometheus_client.generate_latest(database)
+    return Response(body, mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def init_app(app: Flask) -> None:
+    """Record request metrics and serve /metrics, when prometheus-client is installed and metrics are enabled."""
+    if prometheus_client is None or not app.config.get('METRICS_ENABLED'):
+        return
+    if not app.debug and not app.config.get('METRICS_TOKEN'):
+        logger.warning("Metrics are enabled without METRICS_TOKEN; not serving /metrics")
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
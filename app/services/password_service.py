@@ -0,0 +1,94 @@
+"""
+Password hashing off the request thread.
+
+Hashing a password costs hundreds of milliseconds of CPU by design. Hashes
+are computed in a pool of PASSWORD_HASH_WORKERS processes, so a burst of
+logins takes at most that many cores and waits its turn, while the worker's
+other threads keep serving requests. With no workers configured, under
+test, or outside an app, hashes are computed in place.
+
+New hashes use PASSWORD_HASH_METHOD. Hashes made with other parameters, a
+lower pbkdf2 iteration count for example, still verify, and
+needs_rehash() tells the caller to replace them at the next login.
+"""
+
+import os
+import logging
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """The process's hashing pool, created on first use."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited through fork (preload_app) belongs to the parent
+        if _pool is None or _pool_pid != os.getpid():
+            # Spawned rather than forked: forking copies the app's threads' locks
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def _run(function: Callable, *args: Any) -> Any:
+    if not has_app_context() or current_app.testing:
+        return function(*args)
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return function(*args)
+    try:
+        return _get_pool(workers).submit(function, *args).result()
+    except BrokenProcessPool as e:
+        # A killed hashing process shouldn't fail the login; the next call gets a new pool
+        logger.error(f"Password hashing pool failed, hashing in process: {e}")
+        _reset_pool()
+        return function(*args)
+
+
+def _method() -> str:
+    return current_app.config['PASSWORD_HASH_METHOD'] if has_app_context() else DEFAULT_METHOD
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the configured method."""
+    return _run(generate_password_hash, password, _method())
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    """Check a password against a stored hash of any method."""
+    return _run(check_password_hash, password_hash, password)
+
+
+@functools.lru_cache(maxsize=None)
+def _method_prefix(method: str) -> str:
+    """The method as Werkzeug stores it, defaults filled in: 'scrypt' is stored as 'scrypt:32768:8:1'."""
+    # Costs one hash per method and process
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Whether a stored hash was made with other than the configured method."""
+    return password_hash.split('$', 1)[0] != _method_prefix(_method())
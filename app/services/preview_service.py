@@ -0,0 +1,206 @@
+"""
+Background thumbnail and preview generation for uploaded job and quote files.
+
+Previews are generated in a process pool so the upload request never waits
+on image decoding or PDF rendering. Each preview is written next to its blob
+as ``<blob>.preview.<ext>`` and served by ``main.file_preview``.
+"""
+
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from flask import current_app
+
+try:
+    from PIL import Image, features
+except ImportError:
+    # Pillow not installed, previews are disabled
+    Image = None
+    features = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+PDF_EXTENSIONS = {'pdf'}
+PREVIEW_SUFFIX = '.preview'
+PREVIEW_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def preview_extension(requested: str = 'webp') -> str:
+    """Return the preview file extension, falling back to JPEG without WebP support."""
+    if requested == 'webp' and features is not None and features.check('webp'):
+        return 'webp'
+    return 'jpg'
+
+
+def find_preview(file_path: Path) -> Optional[Path]:
+    """Return the generated preview for a blob, if one exists."""
+    for ext in PREVIEW_FORMATS:
+        candidate = file_path.with_name(f"{file_path.name}{PREVIEW_SUFFIX}.{ext}")
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _render_pdf_first_page(source: Path, max_size: int):
+    """Render the first page of a PDF to a PIL image."""
+    if fitz is not None:
+        with fitz.open(str(source)) as document:
+            if document.page_count == 0:
+                return None
+            page = document.load_page(0)
+            scale = max_size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+    # Fall back to poppler's pdftoppm when PyMuPDF isn't installed
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        prefix = Path(tmp_dir) / 'page'
+        subprocess.run(
+            [pdftoppm, '-f', '1', '-l', '1', '-singlefile', '-png',
+             '-scale-to', str(max_size), str(source), str(prefix)],
+            check=True, capture_output=True, timeout=60
+        )
+        with Image.open(f"{prefix}.png") as page_image:
+            page_image.load()
+            return page_image.copy()
+
+
+def generate_preview(source: str, max_size: int, extension: str) -> Optional[str]:
+    """
+    Generate a downsized preview for an image or the first page of a PDF.
+
+    Runs inside a worker process, so it only takes plain, picklable arguments.
+
+    Args:
+        source: Absolute path of the uploaded blob
+        max_size: Longest edge of the preview in pixels
+        extension: Preview file extension ('webp' or 'jpg')
+
+    Returns:
+        str: Path of the written preview, or None if the file has no preview
+    """
+    if Image is None:
+        return None
+
+    source_path = Path(source)
+    file_ext = source_path.suffix.lower().lstrip('.')
+
+    if file_ext in IMAGE_EXTENSIONS:
+        with Image.open(source_path) as original:
+            original.seek(0)
+            image = original.convert('RGB')
+    elif file_ext in PDF_EXTENSIONS:
+        image = _render_pdf_first_page(source_path, max_size)
+        if image is None:
+            return None
+        image = image.convert('RGB')
+    else:
+        return None
+
+    image.thumbnail((max_size, max_size))
+
+    target = source_path.with_name(f"{source_path.name}{PREVIEW_SUFFIX}.{extension}")
+    # Write to a temporary file first so readers never see a partial preview
+    fd, tmp_path = tempfile.mkstemp(dir=str(source_path.parent), suffix=f".{extension}")
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            image.save(tmp_file, PREVIEW_FORMATS[extension], quality=80)
+        os.replace(tmp_path, target)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return str(target)
+
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Spawn rather than fork: the parent is a threaded web worker
+        _executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+
+def _log_preview_result(future: Future) -> None:
+    error = future.exception()
+    if error is not None:
+        logger.warning(f"Preview generation failed: {error}")
+
+
+class PreviewService:
+    """Schedules preview generation for uploaded files."""
+
+    @staticmethod
+    def supports(filename: str) -> bool:
+        """Check whether a preview can be generated for this file type."""
+        if Image is None or '.' not in filename:
+            return False
+        return filename.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS | PDF_EXTENSIONS
+
+    @staticmethod
+    def schedule(filename: str) -> Optional[Future]:
+        """
+        Queue preview generation for an uploaded file without blocking.
+
+        Args:
+            filename: Storage key of the upload
+
+        Returns:
+            Future: The pending job, or None if no preview will be generated
+        """
+        config = current_app.config
+        if not config.get('PREVIEW_ENABLED', True) or not PreviewService.supports(filename):
+            return None
+
+        # Previews are only generated for files stored on this node
+        from app.services.storage_service import get_storage
+        local_path = get_storage().local_path(filename)
+        if local_path is None:
+            return None
+        source = str(local_path)
+        max_size = config.get('PREVIEW_MAX_SIZE', 320)
+        extension = preview_extension(config.get('PREVIEW_FORMAT', 'webp'))
+        workers = config.get('PREVIEW_WORKERS', 2)
+
+        if workers <= 0:
+            # Synchronous mode for tests and single-process tooling
+            future: Future = Future()
+            try:
+                future.set_result(generate_preview(source, max_size, extension))
+            except Exception as e:
+                future.set_exception(e)
+            _log_preview_result(future)
+            return future
+
+        future = _get_executor(workers).submit(generate_preview, source, max_size, extension)
+        future.add_done_callback(_log_preview_result)
+        return future
+
+    @staticmethod
+    def delete_previews(file_path: Path) -> None:
+        """Remove any previews generated for a blob."""
+        for ext in PREVIEW_FORMATS:
+            preview = file_path.with_name(f"{file_path.name}{PREVIEW_SUFFIX}.{ext}")
+            if preview.exists():
+                preview.unlink()
@@ -0,0 +1,216 @@
+"""
+Monthly and quarterly price-index series per trade and postcode district.
+
+Each finished job is reduced once to a row of price_index_facts: its trade,
+district, month and prices, where the month is parsed from date_finished
+(or date_started) when the job is processed rather than on every read.
+Medians and counts per period are rolled up from the facts into
+price_index, which charts read directly.
+
+The rollup is incremental. Jobs named by the change log have their facts
+replaced. Only the (trade, month) buckets they left or entered are
+recomputed, together with the quarters containing them.
+"""
+
+import logging
+from typing import Optional, List, Dict, Any, Iterable, Set, Tuple
+
+import numpy as np
+
+from app.services.database import get_db_service
+from app.services.change_log import ChangeLog
+from app.services.anomaly_service import UNFLAGGED
+from app.services.price_stats_service import group_stats, ALL_DISTRICTS
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'price_index'
+
+PERIOD_TYPES = ('month', 'quarter')
+
+
+def quarter_of(month: str) -> str:
+    """Quarter containing a 'YYYY-MM' month, as 'YYYY-Qn'."""
+    return f"{month[:4]}-Q{(int(month[5:7]) - 1) // 3 + 1}"
+
+
+def months_of(quarter: str) -> List[str]:
+    """Months of a 'YYYY-Qn' quarter."""
+    first = (int(quarter[-1]) - 1) * 3 + 1
+    return [f"{quarter[:4]}-{month:02d}" for month in range(first, first + 3)]
+
+
+class PriceIndexService:
+    """Service maintaining and reading the price_index rollup."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def refresh(self, max_changes: int = 1000) -> bool:
+        """
+        Roll up the periods touched by pending job changes.
+
+        Rebuilds everything if the index has never been computed.
+
+        Returns:
+            bool: True if there may be more changes to process
+        """
+        change_log = ChangeLog(CONSUMER)
+        if change_log.get_cursor() is None:
+            self.rebuild()
+            return False
+
+        changes = change_log.pending(max_changes)
+        if not changes:
+            return False
+
+        job_ids = {change['job_id'] for change in changes if change['job_id'] is not None}
+        tradesman_ids = {change['tradesman_id'] for change in changes if change['operation'] == 'tradesman'}
+        if tradesman_ids:
+            # A moved tradesman takes every job to another trade or district
+            placeholders = ', '.join('?' * len(tradesman_ids))
+            rows = self.db.execute_query(f"""
+                SELECT job_id FROM price_index_facts WHERE tradesman_id IN ({placeholders})
+                UNION
+                SELECT id FROM jobs WHERE tradesman_id IN ({placeholders})
+            """, tuple(tradesman_ids) * 2)
+            job_ids.update(row['job_id'] for row in rows)
+
+        if job_ids:
+            self._rollup(self._replace_facts(job_ids))
+        change_log.advance(changes[-1]['id'])
+        change_log.prune()
+        return len(changes) == max_changes
+
+    def rebuild(self) -> int:
+        """
+        Recompute the facts and rollup of every job.
+
+        Returns:
+            int: Number of price_index rows written
+        """
+        change_log = ChangeLog(CONSUMER)
+        # Take the position first: changes made during the rebuild are replayed later
+        last_change_id = change_log.latest_id()
+        buckets = self._replace_facts(None)
+        with self.db.transaction() as cursor:
+            cursor.execute("DELETE FROM price_index")
+        written = self._rollup(buckets)
+        change_log.advance(last_change_id)
+        change_log.prune()
+        return written
+
+    def _replace_facts(self, job_ids: Optional[Iterable[int]]) -> Set[Tuple[str, str]]:
+        """
+        Replace the facts of the given jobs, or of all jobs if None.
+
+        Returns:
+            set: (trade, month) buckets the jobs were in before or are in now
+        """
+        job_ids = list(job_ids) if job_ids is not None else None
+        # Facts are derived in SQL, so the jobs are never loaded into Python
+        query = f"""
+            INSERT INTO price_index_facts (job_id, tradesman_id, trade, district, month, hourly_rate, total_cost)
+            SELECT j.id, j.tradesman_id, t.trade, postcode_district(t.postcode),
+                   substr(COALESCE(j.date_finished, j.date_started), 1, 7),
+                   j.effective_hourly_rate, j.total_cost
+            FROM jobs j
+            JOIN tradesmen t ON j.tradesman_id = t.id
+            WHERE j.type = 'job' AND j.deleted_at IS NULL AND t.deleted_at IS NULL AND {UNFLAGGED}
+              AND COALESCE(j.date_finished, j.date_started) GLOB '[0-9][0-9][0-9][0-9]-[0-1][0-9]*'
+        """
+        buckets_query = "SELECT DISTINCT trade, month FROM price_index_facts"
+        params: Tuple = ()
+        if job_ids is not None:
+            placeholders = ', '.join('?' * len(job_ids))
+            query += f" AND j.id IN ({placeholders})"
+            buckets_query += f" WHERE job_id IN ({placeholders})"
+            params = tuple(job_ids)
+
+        with self.db.transaction() as cursor:
+            if job_ids is None:
+                cursor.execute("DELETE FROM price_index_facts")
+                buckets = set()
+            else:
+                cursor.execute(buckets_query, params)
+                buckets = {(row[0], row[1]) for row in cursor.fetchall()}
+                cursor.execute(f"DELETE FROM price_index_facts WHERE job_id IN ({placeholders})", params)
+            cursor.execute(query, params)
+            cursor.execute(buckets_query, params)
+            buckets.update((row[0], row[1]) for row in cursor.fetchall())
+        return buckets
+
+    def _rollup(self, buckets: Set[Tuple[str, str]]) -> int:
+        """Recompute the month and quarter rows of the given (trade, month) buckets."""
+        periods = {(trade, 'month', month) for trade, month in buckets}
+        periods |= {(trade, 'quarter', quarter_of(month)) for trade, month in buckets}
+
+        rows = []
+        for trade, period_type, period in sorted(periods):
+            months = [period] if period_type == 'month' else months_of(period)
+            facts = self.db.execute_query(f"""
+                SELECT district, hourly_rate, total_cost FROM price_index_facts
+                WHERE trade = ? AND month IN ({', '.join('?' * len(months))})
+            """, (trade, *months))
+            if not facts:
+                continue
+
+            # Every job counts towards its own district and towards the trade as a whole
+            district_names, district_codes = np.unique(
+                [fact['district'] for fact in facts] + [ALL_DISTRICTS], return_inverse=True
+            )
+            keys = np.concatenate([district_codes[:-1], np.full(len(facts), district_codes[-1])])
+            columns = {
+                name: np.tile(np.array([fact[name] for fact in facts], dtype=float), 2)
+                for name in ('hourly_rate', 'total_cost')
+            }
+            counts = group_stats(keys, np.ones(len(keys)))
+            hourly = group_stats(keys, columns['hourly_rate'])
+            totals = group_stats(keys, columns['total_cost'])
+            hourly_medians = dict(zip(hourly['key'].tolist(), hourly['p50'].tolist()))
+            total_medians = dict(zip(totals['key'].tolist(), totals['p50'].tolist()))
+
+            for key, count in zip(counts['key'].tolist(), counts['count'].tolist()):
+                rows.append((
+                    trade, str(district_names[key]), period_type, period, count,
+                    hourly_medians.get(key), total_medians.get(key)
+                ))
+
+        with self.db.transaction() as cursor:
+            cursor.executemany(
+                "DELETE FROM price_index WHERE trade = ? AND period_type = ? AND period = ?",
+                sorted(periods)
+            )
+            cursor.executemany("""
+                INSERT INTO price_index (trade, district, period_type, period, job_count,
+                                         median_hourly_rate, median_total_cost)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        logger.info(f"Rolled up {len(rows)} price index rows")
+        return len(rows)
+
+    def get_series(self, trade: str, district: str = ALL_DISTRICTS, period_type: str = 'month',
+                   start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get a trade's price index, oldest period first.
+
+        Args:
+            trade: Trade name
+            district: Postcode district, or '' for all districts
+            period_type: 'month' or 'quarter'
+            start: First period to include, e.g. '2024-01' or '2024-Q1'
+            end: Last period to include
+        """
+        query = """
+            SELECT period, job_count, median_hourly_rate, median_total_cost FROM price_index
+            WHERE trade = ? AND district = ? AND period_type = ?
+        """
+        params: List[Any] = [trade, district, period_type]
+        if start:
+            query += " AND period >= ?"
+            params.append(start)
+        if end:
+            query += " AND period <= ?"
+            params.append(end)
+        query += " ORDER BY period"
+        return self.db.execute_query(query, tuple(params))
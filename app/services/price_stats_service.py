@@ -0,0 +1,268 @@
+"""
+Fair-price statistics per trade and postcode district.
+
+Distributions (count, mean, p10/p25/median/p75/p90) of each price component
+are precomputed into the price_stats table, so pages read them with a single
+indexed lookup. Stats are computed in vectorised NumPy passes: values are
+sorted once by (group, value) and every percentile of every group is read
+off the sorted array by index arithmetic, with no per-group Python loop.
+
+The table is kept fresh from the job_changes log. Any change touching a trade
+recomputes that whole trade, since its all-districts row depends on every job.
+"""
+
+import logging
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.helpers import postcode_district
+from app.services.database import get_db_service
+from app.services.change_log import ChangeLog
+from app.services.anomaly_service import UNFLAGGED
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'price_stats'
+
+# District value of the row covering every district of a trade
+ALL_DISTRICTS = ''
+
+# Metric name -> SQL expression over jobs j; NULL means "no value"
+METRICS = {
+    'total_cost': "CASE WHEN j.type = 'job' THEN j.total_cost END",
+    'total_quote': "CASE WHEN j.type = 'quote' THEN j.total_quote END",
+    'hourly_rate': "j.hourly_rate",
+    'daily_rate': "j.daily_rate",
+    'call_out_fee': "j.call_out_fee",
+    'materials_fee': "j.materials_fee",
+    'effective_hourly_rate': "j.effective_hourly_rate",
+}
+
+JOB_METRICS = ['total_cost', 'effective_hourly_rate', 'hourly_rate', 'daily_rate', 'call_out_fee', 'materials_fee']
+QUOTE_METRICS = ['total_quote', 'effective_hourly_rate', 'hourly_rate', 'daily_rate', 'call_out_fee', 'materials_fee']
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Rows fetched at a time when loading columns
+LOAD_BATCH_SIZE = 5000
+
+
+def fetch_columns(cursor, dtypes: List[Any], batch_size: int = LOAD_BATCH_SIZE) -> List[np.ndarray]:
+    """
+    Read the rest of a cursor's result set into one array per column.
+
+    Rows are fetched in batches and copied into arrays that double in size as
+    they fill, so only one batch of row tuples is alive at a time. NULLs in
+    float columns become NaN.
+
+    Args:
+        cursor: A cursor with a SELECT executed on it
+        dtypes: numpy dtype of each selected column
+
+    Returns:
+        list: One array per column, as long as the result set
+    """
+    columns = [np.empty(batch_size, dtype=dtype) for dtype in dtypes]
+    size = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        end = size + len(rows)
+        if end > len(columns[0]):
+            capacity = max(end, 2 * len(columns[0]))
+            grown = [np.empty(capacity, dtype=column.dtype) for column in columns]
+            for column, target in zip(columns, grown):
+                target[:size] = column[:size]
+            columns = grown
+        for column, values in zip(columns, zip(*rows)):
+            column[size:end] = values
+        size = end
+    return [column[:size] for column in columns]
+
+
+def group_stats(keys: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Compute count, mean and percentiles of values for each distinct key.
+
+    NaN values are ignored. Percentiles interpolate linearly between closest
+    ranks, matching numpy.percentile's default method.
+
+    Returns:
+        dict: 'key', 'count', 'mean' and one 'pNN' array per percentile, one entry per group
+    """
+    present = ~np.isnan(values)
+    keys = keys[present]
+    values = values[present]
+    if len(values) == 0:
+        empty = {'key': keys[:0], 'count': np.zeros(0, dtype=np.int64), 'mean': values[:0]}
+        empty.update({f'p{q}': values[:0] for q in PERCENTILES})
+        return empty
+
+    order = np.lexsort((values, keys))
+    keys = keys[order]
+    values = values[order]
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(values)])
+    result = {
+        'key': keys[starts],
+        'count': counts,
+        'mean': np.add.reduceat(values, starts) / counts,
+    }
+    for q in PERCENTILES:
+        position = starts + (counts - 1) * (q / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        result[f'p{q}'] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return result
+
+
+class PriceStatsService:
+    """Service maintaining and reading the price_stats table."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def refresh(self, max_changes: int = 1000) -> bool:
+        """
+        Recompute the trades touched by pending job changes.
+
+        Rebuilds everything if the stats have never been computed.
+
+        Returns:
+            bool: True if there may be more changes to process
+        """
+        change_log = ChangeLog(CONSUMER)
+        if change_log.get_cursor() is None:
+            self.rebuild()
+            return False
+
+        changes = change_log.pending(max_changes)
+        if not changes:
+            return False
+        trades = {change['trade'] for change in changes if change['trade']}
+        if trades:
+            self._recompute(trades)
+        change_log.advance(changes[-1]['id'])
+        change_log.prune()
+        return len(changes) == max_changes
+
+    def rebuild(self) -> int:
+        """
+        Recompute the stats of every trade.
+
+        Returns:
+            int: Number of price_stats rows written
+        """
+        change_log = ChangeLog(CONSUMER)
+        # Take the position first: changes made during the rebuild are replayed later
+        last_change_id = change_log.latest_id()
+        written = self._recompute(None)
+        change_log.advance(last_change_id)
+        change_log.prune()
+        return written
+
+    def _load(self, trades: Optional[List[str]]) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Load trade, district and metric columns of the live jobs of the given trades."""
+        query = f"""
+            SELECT t.trade, t.postcode, {', '.join(f'{sql} as {name}' for name, sql in METRICS.items())}
+            FROM jobs j
+            JOIN tradesmen t ON j.tradesman_id = t.id
+            WHERE j.deleted_at IS NULL AND t.deleted_at IS NULL AND {UNFLAGGED}
+        """
+        params: Tuple = ()
+        if trades is not None:
+            query += f" AND t.trade IN ({', '.join('?' * len(trades))})"
+            params = tuple(trades)
+
+        with self.db.get_cursor() as cursor:
+            cursor.execute(query, params)
+            trade_column, postcode_column, *values = fetch_columns(
+                cursor, [object, object] + [float] * len(METRICS)
+            )
+
+        # Tradesmen share postcodes, so reduce each distinct one only once
+        postcodes, postcode_codes = np.unique(postcode_column.astype(str), return_inverse=True)
+        districts = np.array([postcode_district(postcode) for postcode in postcodes], dtype=object)
+        district_column = districts[postcode_codes]
+        return trade_column, district_column, dict(zip(METRICS, values))
+
+    def _recompute(self, trades: Optional[Iterable[str]]) -> int:
+        """Replace the price_stats rows of the given trades, or of all trades if None."""
+        trades = list(trades) if trades is not None else None
+        trade_column, district_column, metric_columns = self._load(trades)
+
+        trade_names, trade_codes = np.unique(trade_column.astype(str), return_inverse=True)
+        district_names, district_codes = np.unique(
+            np.append(district_column.astype(str), ALL_DISTRICTS), return_inverse=True
+        )
+        district_codes = district_codes[:-1]
+        all_districts_code = int(np.searchsorted(district_names, ALL_DISTRICTS))
+
+        # Every job counts towards its own district and towards the trade as a whole
+        n_districts = len(district_names)
+        keys = np.concatenate([
+            trade_codes * n_districts + district_codes,
+            trade_codes * n_districts + all_districts_code,
+        ])
+
+        rows = []
+        for metric, values in metric_columns.items():
+            stats = group_stats(keys, np.concatenate([values, values]))
+            for i, key in enumerate(stats['key']):
+                trade_code, district_code = divmod(int(key), n_districts)
+                rows.append((
+                    str(trade_names[trade_code]), str(district_names[district_code]), metric,
+                    int(stats['count'][i]), float(stats['mean'][i]),
+                    *(float(stats[f'p{q}'][i]) for q in PERCENTILES)
+                ))
+
+        with self.db.transaction() as cursor:
+            if trades is None:
+                cursor.execute("DELETE FROM price_stats")
+            else:
+                cursor.executemany("DELETE FROM price_stats WHERE trade = ?", [(trade,) for trade in trades])
+            cursor.executemany("""
+                INSERT INTO price_stats (trade, district, metric, count, mean, p10, p25, median, p75, p90)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        logger.info(f"Recomputed {len(rows)} price statistics")
+        return len(rows)
+
+    def get_stats(self, trade: str, postcode: Optional[str],
+                  metrics: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the price distributions for a trade around a postcode.
+
+        Each metric uses the postcode's district when it has enough samples,
+        otherwise the trade as a whole. Metrics with too few samples either way
+        are left out.
+
+        Args:
+            trade: Trade name
+            postcode: Postcode the prices are compared around
+            metrics: Metric names to return, in display order; all by default
+
+        Returns:
+            dict: Metric name -> price_stats row
+        """
+        metrics = metrics or list(METRICS)
+        district = postcode_district(postcode)
+        min_samples = current_app.config.get('PRICE_STATS_MIN_SAMPLES', 5)
+        rows = self.db.execute_query(
+            "SELECT * FROM price_stats WHERE trade = ? AND district IN (?, ?)",
+            (trade, district, ALL_DISTRICTS)
+        )
+        by_scope = {(row['metric'], row['district']): row for row in rows}
+
+        stats = {}
+        for metric in metrics:
+            for scope in (district, ALL_DISTRICTS):
+                row = by_scope.get((metric, scope))
+                if row and row['count'] >= min_samples:
+                    stats[metric] = row
+                    break
+        return stats
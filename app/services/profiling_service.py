@@ -0,0 +1,203 @@
+"""
+Request profiling for finding hot spots without reproducing traffic.
+
+A share of requests (PROFILE_SAMPLE_RATE) is watched by a stack sampler: a
+daemon thread that records the request thread's stack every
+PROFILE_INTERVAL_MS. Watched requests slower than PROFILE_SLOW_MS are written
+to PROFILE_DIR in the collapsed-stack format flamegraph.pl and speedscope
+read. Jinja templates show up in the stacks under their file names, next to
+the service methods they call.
+
+Admins can profile any request by adding ?__profile=1 (sampled stacks) or
+?__profile=pstats (cProfile, every call counted), whatever its duration.
+The file name comes back in the X-Profile header.
+
+Every profile has a JSON file alongside it with the route, user, status,
+duration and the SQL statements the request ran.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import cProfile
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from flask import Flask, Response, current_app, g, request, session
+
+from app.helpers import is_admin
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAMETER = '__profile'
+PROFILE_HEADER = 'X-Profile'
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Paths under the project are shortest relative to it; anything else by file name
+    if filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """A stack as one collapsed-stack line, outermost frame first."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads from a daemon thread, idle while none are registered."""
+
+    def __init__(self, interval: float):
+        """
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self._stacks: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int) -> None:
+        """Start sampling a thread."""
+        with self._lock:
+            self._stacks[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+            self._active.set()
+
+    def stop(self, thread_id: int) -> Counter:
+        """Stop sampling a thread; returns its collapsed stacks and their sample counts."""
+        with self._lock:
+            stacks = self._stacks.pop(thread_id, Counter())
+            if not self._stacks:
+                self._active.clear()
+        return stacks
+
+    def _run(self) -> None:
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+
+_sampler: Optional[StackSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler() -> StackSampler:
+    """The process's stack sampler, created on first use."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = StackSampler(current_app.config['PROFILE_INTERVAL_MS'] / 1000)
+        return _sampler
+
+
+def _start_profile() -> None:
+    mode = request.args.get(PROFILE_PARAMETER)
+    if mode and is_admin():
+        forced = True
+    elif random.random() < current_app.config['PROFILE_SAMPLE_RATE']:
+        forced, mode = False, 'stacks'
+    else:
+        return
+
+    if mode == 'pstats':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        g.profile = {'mode': 'pstats', 'profiler': profiler}
+    else:
+        get_sampler().start(threading.get_ident())
+        g.profile = {'mode': 'stacks'}
+    g.profile.update(forced=forced, started=time.perf_counter())
+    # DatabaseService adds the request's statements
+    g.query_log = []
+
+
+def _finish_profile(response: Response) -> Response:
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    if profile['mode'] == 'pstats':
+        profile['profiler'].disable()
+    else:
+        profile['stacks'] = get_sampler().stop(threading.get_ident())
+    duration_ms = (time.perf_counter() - profile['started']) * 1000
+
+    if profile['forced'] or duration_ms >= current_app.config['PROFILE_SLOW_MS']:
+        try:
+            name = write_profile(profile, duration_ms, response.status_code)
+        except OSError as e:
+            logger.error(f"Could not write profile: {e}")
+        else:
+            if profile['forced']:
+                response.headers[PROFILE_HEADER] = name
+    return response
+
+
+def write_profile(profile: dict, duration_ms: float, status: int) -> str:
+    """Write a profile and its request details to PROFILE_DIR; returns the profile's file name."""
+    directory = Path(current_app.config['PROFILE_DIR'])
+    directory.mkdir(parents=True, exist_ok=True)
+    endpoint = request.endpoint or 'unmatched'
+    stem = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint}-{duration_ms:.0f}ms"
+
+    if profile['mode'] == 'pstats':
+        name = f"{stem}.pstats"
+        profile['profiler'].dump_stats(directory / name)
+    else:
+        name = f"{stem}.folded"
+        with open(directory / name, 'w', encoding='utf-8') as f:
+            for stack, count in profile['stacks'].most_common():
+                f.write(f"{stack} {count}\n")
+
+    details = {
+        'profile': name,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': endpoint,
+        'user_id': session.get('user_id'),
+        'status': status,
+        'duration_ms': round(duration_ms, 1),
+        'queries': g.get('query_log', []),
+    }
+    with open(directory / f"{stem}.json", 'w', encoding='utf-8') as f:
+        json.dump(details, f, indent=2)
+    _prune(directory, current_app.config['PROFILE_KEEP'])
+    return name
+
+
+def _prune(directory: Path, keep: int) -> None:
+    """Remove all but the newest profiles and their details."""
+    details = sorted(directory.glob('*.json'), key=lambda path: path.stat().st_mtime)
+    for path in details[:max(len(details) - keep, 0)]:
+        for extension in ('.json', '.folded', '.pstats'):
+            path.with_suffix(extension).unlink(missing_ok=True)
+
+
+def init_app(app: Flask) -> None:
+    """Profile sampled, and admin-requested, requests."""
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
@@ -0,0 +1,373 @@
+"""
+Percentile scoring of prices with mergeable KLL quantile sketches.
+
+A sketch summarises every price of a trade, district and price component
+in a few kilobytes with a bounded rank error (around 1% at the default k),
+so a quote is scored by loading one row instead of sorting historic prices.
+Sketches merge, so the all-districts sketch of a trade and the area covered
+by a user's groups are both built by combining district sketches.
+
+Sketches only grow: new jobs, and jobs whose flagged prices were accepted,
+are folded in one value at a time, while price edits and deletions rebuild
+the trades they touch from the jobs table. Edits that leave prices alone are
+skipped. Folding a batch in and moving the change-log cursor past it is one
+write transaction, so worker processes refreshing together never add a job
+twice.
+"""
+
+import math
+import random
+import struct
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Optional, List, Dict, Any, Iterable, Set, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.helpers import postcode_district
+from app.services.database import get_db_service
+from app.services.change_log import ChangeLog
+from app.services.anomaly_service import UNFLAGGED
+from app.services.price_stats_service import METRICS, ALL_DISTRICTS
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'price_sketches'
+
+DEFAULT_K = 200
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Values enter level 0; a full level is sorted and every other value is
+    promoted to the next level with twice the weight, so updates are amortised
+    O(1) and the total weight always equals the number of values seen.
+    """
+
+    # version, k, n, number of levels
+    HEADER = struct.Struct('<BHQB')
+    VERSION = 1
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._max_size = self._capacity(0)
+        self._size = 0
+        self._sorted = True
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _grow(self) -> None:
+        self.levels.append([])
+        self._max_size = sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self) -> None:
+        for level in range(len(self.levels)):
+            if len(self.levels[level]) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self._grow()
+            items = sorted(self.levels[level])
+            kept = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[random.getrandbits(1)::2])
+            self.levels[level] = kept
+            self._size = sum(len(items) for items in self.levels)
+            if self._size < self._max_size:
+                break
+
+    def update(self, value: float) -> None:
+        """Add a value."""
+        self.levels[0].append(float(np.float32(value)))
+        self.n += 1
+        self._size += 1
+        self._sorted = False
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Fold another sketch into this one and return self."""
+        while len(self.levels) < len(other.levels):
+            self._grow()
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._size = sum(len(items) for items in self.levels)
+        self._sorted = False
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def _sort(self) -> None:
+        if not self._sorted:
+            for items in self.levels:
+                items.sort()
+            self._sorted = True
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of values below value, counting ties as half."""
+        if self.n == 0:
+            return math.nan
+        self._sort()
+        value = float(np.float32(value))
+        below = 0.0
+        for level, items in enumerate(self.levels):
+            lower = bisect_left(items, value)
+            below += (lower + (bisect_right(items, value) - lower) / 2) * (1 << level)
+        return below / self.n
+
+    def quantile(self, q: float) -> float:
+        """Estimated value at fraction q of the distribution."""
+        if self.n == 0:
+            return math.nan
+        weighted = sorted(
+            (item, 1 << level) for level, items in enumerate(self.levels) for item in items
+        )
+        target = q * self.n
+        cumulative = 0
+        for item, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return item
+        return weighted[-1][0]
+
+    def to_bytes(self) -> bytes:
+        """Serialise to a compact binary form; values are stored as float32."""
+        self._sort()
+        return b''.join([
+            self.HEADER.pack(self.VERSION, self.k, self.n, len(self.levels)),
+            struct.pack(f'<{len(self.levels)}I', *(len(items) for items in self.levels)),
+            np.fromiter((item for items in self.levels for item in items), dtype='<f4').tobytes(),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'KLLSketch':
+        """Load a sketch written by to_bytes."""
+        version, k, n, level_count = cls.HEADER.unpack_from(data)
+        if version != cls.VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+        offset = cls.HEADER.size
+        lengths = struct.unpack_from(f'<{level_count}I', data, offset)
+        values = np.frombuffer(data, dtype='<f4', offset=offset + 4 * level_count).tolist()
+
+        sketch = cls(k)
+        sketch.n = n
+        sketch.levels = []
+        start = 0
+        for length in lengths:
+            sketch.levels.append(values[start:start + length])
+            start += length
+        sketch._max_size = sum(sketch._capacity(level) for level in range(level_count))
+        sketch._size = len(values)
+        return sketch
+
+
+class QuoteSketchService:
+    """Service maintaining price sketches and scoring prices against them."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def _price_rows(self, condition: str = '', params: Tuple = ()) -> Iterable[Dict[str, Any]]:
+        """Stream trade, postcode and price components of live jobs."""
+        query = f"""
+            SELECT t.trade, t.postcode, {', '.join(f'{sql} as {name}' for name, sql in METRICS.items())}
+            FROM jobs j
+            JOIN tradesmen t ON j.tradesman_id = t.id
+            WHERE j.deleted_at IS NULL AND t.deleted_at IS NULL AND {UNFLAGGED} {condition}
+        """
+        return self.db.iter_query(query, params)
+
+    def _load(self, trade: str, metric: str, districts: Iterable[str]) -> Dict[str, KLLSketch]:
+        """Load the stored sketches of a trade and metric for the given districts."""
+        districts = list(districts)
+        rows = self.db.execute_query(f"""
+            SELECT district, sketch FROM price_sketches
+            WHERE trade = ? AND metric = ? AND district IN ({', '.join('?' * len(districts))})
+        """, (trade, metric, *districts))
+        return {row['district']: KLLSketch.from_bytes(row['sketch']) for row in rows}
+
+    def _save(self, cursor, sketches: Dict[Tuple[str, str, str], KLLSketch]) -> None:
+        cursor.executemany("""
+            INSERT INTO price_sketches (trade, district, metric, count, sketch, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (trade, district, metric) DO UPDATE SET
+                count = excluded.count, sketch = excluded.sketch, updated_at = CURRENT_TIMESTAMP
+        """, [
+            (trade, district, metric, sketch.n, sketch.to_bytes())
+            for (trade, district, metric), sketch in sketches.items()
+        ])
+
+    def refresh(self, max_changes: int = 1000) -> bool:
+        """
+        Fold pending job changes into the sketches.
+
+        New jobs are added value by value; other changes to prices rebuild
+        the trades they touched. Rebuilds everything if no sketch was built yet.
+
+        Returns:
+            bool: True if there may be more changes to process
+        """
+        change_log = ChangeLog(CONSUMER)
+        if change_log.get_cursor() is None:
+            self.rebuild()
+            return False
+
+        # Reads go through the same connection, so everything below sees and
+        # writes one state of the sketches and the cursor
+        with self.db.transaction() as cursor:
+            last_change_id = change_log.get_cursor()
+            changes = change_log.pending(max_changes, after=last_change_id)
+            if not changes or not change_log.claim(cursor, last_change_id, changes[-1]['id']):
+                return False
+
+            stale = {c['trade'] for c in changes
+                     if c['operation'] != 'insert' and c['prices_changed'] and c['trade']}
+            if stale:
+                self._replace_trades(cursor, stale, self._build_trades(stale))
+            inserted = sorted({c['job_id'] for c in changes
+                               if c['operation'] == 'insert' and c['trade'] not in stale})
+            if inserted:
+                self._add_jobs(cursor, inserted)
+
+        change_log.prune()
+        return len(changes) == max_changes
+
+    def rebuild(self) -> int:
+        """
+        Rebuild the sketches of every trade from the jobs table.
+
+        Returns:
+            int: Number of sketches written
+        """
+        change_log = ChangeLog(CONSUMER)
+        last_change_id = change_log.latest_id()
+        sketches = self._build_trades(None)
+        with self.db.transaction() as cursor:
+            self._replace_trades(cursor, None, sketches)
+        written = len(sketches)
+        change_log.advance(last_change_id)
+        change_log.prune()
+        return written
+
+    def _add_jobs(self, cursor, job_ids: List[int]) -> None:
+        """Add the prices of new jobs to their district and all-districts sketches, on an open transaction."""
+        loaded: Dict[Tuple[str, str, str], KLLSketch] = {}
+        condition = f"AND j.id IN ({', '.join('?' * len(job_ids))})"
+        for row in self._price_rows(condition, tuple(job_ids)):
+            district = postcode_district(row['postcode'])
+            for metric in METRICS:
+                if row[metric] is None:
+                    continue
+                for scope in (district, ALL_DISTRICTS):
+                    key = (row['trade'], scope, metric)
+                    if key not in loaded:
+                        loaded[key] = self._load(row['trade'], metric, [scope]).get(scope) or KLLSketch()
+                    loaded[key].update(row[metric])
+        self._save(cursor, loaded)
+
+    def _build_trades(self, trades: Optional[Set[str]]) -> Dict[Tuple[str, str, str], KLLSketch]:
+        """Build every sketch of the given trades, or of all trades if None, from the jobs table."""
+        sketches: Dict[Tuple[str, str, str], KLLSketch] = {}
+        condition, params = '', ()
+        if trades is not None:
+            condition = f"AND t.trade IN ({', '.join('?' * len(trades))})"
+            params = tuple(trades)
+
+        districts: Dict[str, str] = {}
+        for row in self._price_rows(condition, params):
+            district = districts.setdefault(row['postcode'], postcode_district(row['postcode']))
+            for metric in METRICS:
+                if row[metric] is not None:
+                    sketches.setdefault((row['trade'], district, metric), KLLSketch()).update(row[metric])
+
+        # The all-districts sketch of a trade is the merge of its district sketches
+        for (trade, district, metric), sketch in list(sketches.items()):
+            if district != ALL_DISTRICTS:
+                sketches.setdefault((trade, ALL_DISTRICTS, metric), KLLSketch()).merge(sketch)
+        return sketches
+
+    def _replace_trades(self, cursor, trades: Optional[Set[str]],
+                        sketches: Dict[Tuple[str, str, str], KLLSketch]) -> None:
+        """Replace the stored sketches of the given trades, or of all trades if None, on an open transaction."""
+        if trades is None:
+            cursor.execute("DELETE FROM price_sketches")
+        else:
+            cursor.executemany("DELETE FROM price_sketches WHERE trade = ?", [(trade,) for trade in trades])
+        self._save(cursor, sketches)
+        logger.info(f"Rebuilt {len(sketches)} price sketches")
+
+    def get_sketch(self, trade: str, metric: str,
+                   districts: Optional[Iterable[str]] = None) -> Optional[KLLSketch]:
+        """
+        Get the sketch of a trade's prices, merged over the given districts.
+
+        Args:
+            trade: Trade name
+            metric: Price component, a key of METRICS
+            districts: Postcode districts to cover; all districts if None
+
+        Returns:
+            KLLSketch or None if there are no prices
+        """
+        scopes = [ALL_DISTRICTS] if districts is None else sorted(set(districts))
+        merged = None
+        for sketch in self._load(trade, metric, scopes).values():
+            merged = sketch if merged is None else merged.merge(sketch)
+        return merged
+
+    def score(self, value: float, trade: str, metric: str,
+              districts: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Score a price against a trade's prices.
+
+        Returns:
+            dict: percentile (0-100) and count, or None without enough prices
+        """
+        sketch = self.get_sketch(trade, metric, districts)
+        if sketch is None or sketch.n < self._min_samples():
+            return None
+        return {'percentile': int(round(sketch.rank(value) * 100)), 'count': sketch.n}
+
+    def score_quote(self, quote: Dict[str, Any], metrics: List[str],
+                    group_postcodes: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Score each price of a quote in its district, its user's group areas and nationally.
+
+        Args:
+            quote: Quote row with trade and tradesman postcode
+            metrics: Price components to score, in display order
+            group_postcodes: Postcodes of the viewing user's groups
+
+        Returns:
+            list: dicts with metric, scope ('district', 'groups' or 'all'),
+                  district, percentile and count
+        """
+        district = postcode_district(quote.get('postcode'))
+        group_districts = sorted({postcode_district(p) for p in group_postcodes} - {''})
+        scopes = [('district', [district])] if district else []
+        if group_districts and group_districts != [district]:
+            scopes.append(('groups', group_districts))
+        scopes.append(('all', None))
+
+        scores = []
+        for metric in metrics:
+            if quote.get(metric) is None:
+                continue
+            for scope, districts in scopes:
+                result = self.score(quote[metric], quote['trade'], metric, districts)
+                if result:
+                    scores.append({'metric': metric, 'scope': scope, 'district': district, **result})
+        return scores
+
+    @staticmethod
+    def _min_samples() -> int:
+        try:
+            return current_app.config.get('PRICE_STATS_MIN_SAMPLES', 5)
+        except RuntimeError:
+            return 5
@@ -0,0 +1,99 @@
+"""
+Token-bucket rate limiting shared by every worker process.
+
+Each scope and client has a bucket of `limit` tokens that refills evenly
+over `window` seconds. A request takes a token; without one left it is
+refused until the bucket has refilled enough. Buckets live in the
+rate_limits table and are refilled lazily: one upsert both refills and
+takes a token, so a check costs one indexed statement however busy the
+client is.
+
+A bucket is full again `window` seconds after it was last touched, which is
+the same as having no bucket. Those rows are removed by expire(), which a
+background worker runs every RATE_LIMIT_EXPIRY_INTERVAL seconds.
+"""
+
+import time
+import sqlite3
+import logging
+from typing import Optional, Tuple
+
+from app.services.database import get_db_service
+
+logger = logging.getLogger(__name__)
+
+# Tokens in a bucket after refilling it up to now, from its stored state
+REFILLED = "MIN(:capacity, tokens + (:now - updated_at) * :rate)"
+
+
+class RateLimitService:
+    """Takes and checks tokens of the buckets in the rate_limits table."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def hit(self, key: str, limit: int, window: float, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Take a token from a bucket, if it has one.
+
+        Args:
+            key: Scope and client, e.g. 'login:203.0.113.7'
+            limit: Tokens in a full bucket
+            window: Seconds a bucket takes to refill from empty
+            now: Current time in seconds since the epoch, for tests
+
+        Returns:
+            tuple: (allowed, seconds until a token is available again)
+        """
+        params = self._params(key, limit, window, now)
+        try:
+            row = self.db.execute_single_query(f"""
+                INSERT INTO rate_limits (key, tokens, updated_at, expires_at, allowed)
+                VALUES (:key, :capacity - 1, :now, :now + :window, 1)
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = {REFILLED} - ({REFILLED} >= 1),
+                    allowed = {REFILLED} >= 1,
+                    updated_at = :now,
+                    expires_at = :now + :window
+                RETURNING tokens, allowed
+            """, params)
+        except sqlite3.OperationalError as e:
+            # A busy database should not turn every limited request into an error
+            logger.warning(f"Rate limit check for {key} failed, allowing: {e}")
+            return True, 0.0
+        if row['allowed']:
+            return True, 0.0
+        return False, (1 - row['tokens']) / params['rate']
+
+    def refund(self, key: str, limit: int) -> None:
+        """Give back a token hit() took, for requests that turn out not to count."""
+        try:
+            self.db.execute_update(
+                "UPDATE rate_limits SET tokens = MIN(?, tokens + 1) WHERE key = ?", (limit, key)
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Rate limit refund for {key} failed: {e}")
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Remove buckets that have refilled completely; returns how many."""
+        return self.db.execute_delete(
+            "DELETE FROM rate_limits WHERE expires_at < ?", (time.time() if now is None else now,)
+        )
+
+    @staticmethod
+    def _params(key: str, limit: int, window: float, now: Optional[float]) -> dict:
+        return {
+            'key': key,
+            'capacity': limit,
+            'window': window,
+            'rate': limit / window,
+            'now': time.time() if now is None else now,
+        }
+
+
+def expire_buckets() -> bool:
+    """Background task removing full buckets; there is never more to do until the next interval."""
+    removed = RateLimitService().expire()
+    if removed:
+        logger.debug(f"Expired {removed} rate limit buckets")
+    return False
@@ -0,0 +1,186 @@
+"""
+Server-side sessions stored in the sessions table.
+
+The cookie holds only a random session id; the session's data lives in the
+database, serialized as tagged JSON like Flask's cookie sessions. Sessions
+expire SESSION_TIMEOUT seconds after they were last used.
+
+Rows are written lazily. A request that leaves its session unchanged
+doesn't write it, except to push its expiry back, which happens at most
+every SESSION_REFRESH_INTERVAL seconds. Only new ids are inserted: a request
+still running when its session was removed, by a logout in another tab or by
+expiry, leaves it removed rather than writing it back. Empty sessions, such as those of
+visitors who never log in, are never stored. Clearing a session (at login
+and logout) gives it a new id, so an id known before login is useless after.
+
+Expired rows are removed by a background worker every
+SESSION_SWEEP_INTERVAL seconds; the table only holds live sessions and the
+space of removed ones is reused.
+"""
+
+import time
+import secrets
+import logging
+from typing import Any, Dict, Optional
+
+from flask import Flask, Request, Response
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from app.services.background import start_worker
+from app.services.database import get_db_service
+
+logger = logging.getLogger(__name__)
+
+
+class StoredSession(CallbackDict, SessionMixin):
+    """A session and what is stored of it, to tell whether it needs writing."""
+
+    def __init__(self, initial: Optional[Dict[str, Any]] = None, sid: Optional[str] = None,
+                 stored: Optional[str] = None, expires_at: float = 0.0):
+        """
+        Args:
+            initial: Data of the session
+            sid: Session id; None until the session is first stored
+            stored: Serialized data as stored, None when not stored
+            expires_at: Stored expiry, seconds since the epoch
+        """
+        def on_update(session: 'StoredSession') -> None:
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.stored = stored
+        self.expires_at = expires_at
+        self.modified = False
+        self.regenerate = False
+
+    def clear(self) -> None:
+        super().clear()
+        self.regenerate = True
+
+
+class SessionService:
+    """Reads and writes rows of the sessions table."""
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def load(self, sid: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The data and expiry of a session that hasn't expired."""
+        return self.db.execute_single_query(
+            "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+            (sid, time.time() if now is None else now)
+        )
+
+    def create(self, sid: str, data: str, expires_at: float) -> None:
+        """Store a session under a new id."""
+        self.db.execute_insert(
+            "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)", (sid, data, expires_at)
+        )
+
+    def save(self, sid: str, data: str, expires_at: float) -> bool:
+        """
+        Rewrite a stored session's data and expiry.
+
+        Returns:
+            bool: False if the session is gone, e.g. logged out by another request, and was not brought back
+        """
+        return self.db.execute_update(
+            "UPDATE sessions SET data = ?, expires_at = ? WHERE id = ?", (data, expires_at, sid)
+        ) > 0
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        """Push back a session's expiry without rewriting its data."""
+        self.db.execute_update("UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, sid))
+
+    def delete(self, sid: str) -> None:
+        self.db.execute_delete("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Remove expired sessions; returns how many."""
+        return self.db.execute_delete(
+            "DELETE FROM sessions WHERE expires_at <= ?", (time.time() if now is None else now,)
+        )
+
+
+def sweep_sessions() -> bool:
+    """Background task removing expired sessions; there is never more to do until the next interval."""
+    removed = SessionService().expire()
+    if removed:
+        logger.debug(f"Removed {removed} expired sessions")
+    return False
+
+
+class DatabaseSessionInterface(SessionInterface):
+    """Keeps sessions in the sessions table, identified by the session cookie."""
+
+    serializer = TaggedJSONSerializer()
+
+    def open_session(self, app: Flask, request: Request) -> StoredSession:
+        start_worker('session-sweeper', sweep_sessions, app.config['SESSION_SWEEP_INTERVAL'])
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = SessionService().load(sid)
+            if row is not None:
+                try:
+                    data = self.serializer.loads(row['data'])
+                except ValueError as e:
+                    logger.warning(f"Discarding unreadable session: {e}")
+                else:
+                    return StoredSession(data, sid, row['data'], row['expires_at'])
+        # Ids the client sent but we don't know are never reused
+        return StoredSession()
+
+    def save_session(self, app: Flask, session: StoredSession, response: Response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        service = SessionService()
+
+        if not session:
+            if session.stored is not None:
+                service.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        lifetime = app.config['SESSION_TIMEOUT']
+        permanent = session.permanent or app.config['SESSION_PERMANENT']
+        issue_cookie = False
+        if session.stored is None or session.regenerate:
+            if session.stored is not None:
+                service.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.stored = None
+            issue_cookie = True
+
+        data = self.serializer.dumps(dict(session))
+        if session.stored is None:
+            service.create(session.sid, data, now + lifetime)
+        elif data != session.stored:
+            if not service.save(session.sid, data, now + lifetime):
+                return
+        elif session.expires_at - now < lifetime - app.config['SESSION_REFRESH_INTERVAL']:
+            service.touch(session.sid, now + lifetime)
+        else:
+            return
+        session.stored, session.expires_at = data, now + lifetime
+
+        # Browser-session cookies don't expire, so only new ids need sending
+        if issue_cookie or permanent:
+            response.set_cookie(
+                name, session.sid,
+                expires=now + lifetime if permanent else None,
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def init_app(app: Flask) -> None:
+    """Store the app's sessions in the database."""
+    app.session_interface = DatabaseSessionInterface()
@@ -0,0 +1,230 @@
+"""
+Storage backends for uploaded job and quote files.
+
+Files are addressed by key, the path relative to the upload root that is
+stored in ``jobs.quote_file``/``jobs.job_file``. The local backend keeps them
+under ``UPLOAD_FOLDER``; the S3 backend keeps them in a bucket on any
+S3-compatible service (AWS, MinIO, ...) and hands out presigned URLs so app
+nodes never proxy file bytes.
+"""
+
+import os
+import shutil
+import logging
+import datetime
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional, BinaryIO, Iterator, Tuple
+
+from flask import current_app
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    # boto3 not installed, only local storage is available
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class StorageBackend(ABC):
+    """Interface implemented by the storage backends."""
+
+    @abstractmethod
+    def save(self, key: str, stream: BinaryIO) -> None:
+        """Stream a file object into storage under key."""
+
+    @abstractmethod
+    def save_path(self, key: str, path: Path) -> None:
+        """Move a finished local file into storage under key."""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Open a stored file for reading."""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Delete a stored file; returns False if it is known not to have existed."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether a file is stored under key."""
+
+    @abstractmethod
+    def list_keys(self) -> Iterator[Tuple[str, float]]:
+        """Yield (key, last modified timestamp) for every stored file."""
+
+    def url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        """
+        Get a short-lived direct download URL.
+
+        Returns:
+            str: The URL, or None if the app has to serve the file itself
+        """
+        return None
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Get the file's path on this node, or None if it isn't stored locally."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Stores files on the local filesystem under a root folder."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def save(self, key: str, stream: BinaryIO) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as target:
+            shutil.copyfileobj(stream, target, COPY_BLOCK_SIZE)
+
+    def save_path(self, key: str, path: Path) -> None:
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), 'rb')
+
+    def delete(self, key: str) -> bool:
+        path = self._path(key)
+        if path.exists():
+            path.unlink()
+            return True
+        return False
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def list_keys(self) -> Iterator[Tuple[str, float]]:
+        if not self.root.exists():
+            return
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            # Dot folders hold in-progress chunked uploads, not stored files
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for name in filenames:
+                path = Path(dirpath) / name
+                yield path.relative_to(self.root).as_posix(), path.stat().st_mtime
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+
+class S3Storage(StorageBackend):
+    """
+    Stores files in an S3-compatible bucket.
+
+    Uploads use boto3's managed transfer, which switches to multipart uploads
+    above S3_MULTIPART_THRESHOLD so large files are streamed in parts rather
+    than buffered. Downloads are served through presigned GET URLs.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 access_key: Optional[str] = None, secret_key: Optional[str] = None,
+                 url_expiry: int = 300, multipart_threshold: int = 8 * 1024 * 1024,
+                 multipart_chunksize: int = 8 * 1024 * 1024):
+        if boto3 is None:
+            raise RuntimeError("boto3 is required for S3 storage")
+        self.bucket = bucket
+        self.url_expiry = url_expiry
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            # Path-style addressing works with MinIO and other stand-ins
+            config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path'})
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize
+        )
+
+    def ensure_bucket(self) -> None:
+        """Create the bucket if it doesn't exist yet."""
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except ClientError:
+            self.client.create_bucket(Bucket=self.bucket)
+
+    def save(self, key: str, stream: BinaryIO) -> None:
+        self.client.upload_fileobj(stream, self.bucket, key, Config=self.transfer_config)
+
+    def save_path(self, key: str, path: Path) -> None:
+        self.client.upload_file(str(path), self.bucket, key, Config=self.transfer_config)
+        os.unlink(path)
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def delete(self, key: str) -> bool:
+        # S3 deletes succeed whether or not the key exists, and checking first costs a request
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def list_keys(self) -> Iterator[Tuple[str, float]]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket):
+            for obj in page.get('Contents', []):
+                modified: datetime.datetime = obj['LastModified']
+                yield obj['Key'], modified.timestamp()
+
+    def url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        params = {'Bucket': self.bucket, 'Key': key}
+        if filename:
+            params['ResponseContentDisposition'] = f'inline; filename="{filename}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.url_expiry)
+
+
+def create_storage(config) -> StorageBackend:
+    """Build the storage backend selected by STORAGE_BACKEND."""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['S3_BUCKET'],
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY_ID'),
+            secret_key=config.get('S3_SECRET_ACCESS_KEY'),
+            url_expiry=config.get('S3_URL_EXPIRY', 300),
+            multipart_threshold=config.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            multipart_chunksize=config.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024)
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_storage() -> StorageBackend:
+    """Get the storage backend for the current app, creating it on first use."""
+    app = current_app._get_current_object()
+    config = app.config
+    storage = app.extensions.get('storage')
+    # Tests point UPLOAD_FOLDER elsewhere after the app is created
+    if isinstance(storage, LocalStorage) and storage.root != Path(config['UPLOAD_FOLDER']):
+        storage = None
+    if storage is None:
+        storage = create_storage(config)
+        app.extensions['storage'] = storage
+    return storage
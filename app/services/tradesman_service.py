@@ -1,5 +1,8 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 from app.services.database import get_db_service
+from app.services.deletion_service import DeletionService
+from app.services.change_log import schedule_change_processing
+from app.services.geo_service import GeoService
 from app.config import TRADE_TYPES
 
 class TradesmanService:
@@ -7,6 +10,7 @@ class TradesmanService:
     
     def __init__(self):
         self.db = get_db_service()
+        self.geo = GeoService()
     
     def get_tradesman_by_id(self, tradesman_id: int) -> Optional[Dict[str, Any]]:
         """Get tradesman by ID with added_by information"""
@@ -15,7 +19,7 @@ class TradesmanService:
             FROM tradesmen t
             LEFT JOIN user_tradesmen ut ON t.id = ut.tradesman_id
             LEFT JOIN users u ON ut.user_id = u.id
-            WHERE t.id = ?
+            WHERE t.id = ? AND t.deleted_at IS NULL
         """
         result = self.db.execute_single_query(query, (tradesman_id,))
         return result
@@ -53,28 +57,45 @@ class TradesmanService:
         
         params.append(tradesman_id)
         query = f"UPDATE tradesmen SET {', '.join(update_fields)} WHERE id = ?"
-        return self.db.execute_update(query, tuple(params)) > 0
+        updated = self.db.execute_update(query, tuple(params)) > 0
+        if updated and ('trade' in kwargs or 'postcode' in kwargs):
+            # Their jobs now count towards another trade or district
+            schedule_change_processing()
+        return updated
     
     def delete_tradesman(self, tradesman_id: int) -> bool:
-        """Delete a tradesman."""
-        query = "DELETE FROM tradesmen WHERE id = ?"
-        return self.db.execute_delete(query, (tradesman_id,)) > 0
+        """Delete a tradesman; the deletion worker removes their jobs and files in batches."""
+        deleted = DeletionService().mark_deleted('tradesman', tradesman_id)
+        if deleted:
+            schedule_change_processing()
+        return deleted
     
-    def search_tradesmen(self, search_term: str = None, trade: str = None, 
-                        postcode: str = None) -> List[Dict[str, Any]]:
-        """Search for tradesmen with filters"""
-        query = """
+    def _search_tradesmen_query(self, search_term: str = None, trade: str = None,
+                                postcode: str = None, sort: str = None,
+                                radius: float = None) -> Tuple[str, Tuple]:
+        """Build the tradesman search query and its parameters."""
+        # Within a radius of a known postcode the location index filters; otherwise the postcode is a prefix
+        proximity = self.geo.proximity('tradesmen', 't.id', postcode, radius) if postcode and radius else None
+        location_join, distance = (proximity[0], proximity[3]) if proximity else ('', 'NULL')
+        query = f"""
             SELECT DISTINCT t.*, 
+                   {distance} as distance,
                    COUNT(CASE WHEN j.type = 'job' THEN j.id END) as job_count,
                    COUNT(CASE WHEN j.type = 'quote' THEN j.id END) as quote_count,
                    AVG(CASE WHEN j.type = 'job' THEN j.rating END) as avg_rating,
+                   a.median as cost_overrun,
+                   a.count as cost_overrun_count,
+                   s.score,
                    u.username as added_by_username,
                    u.id as added_by_user_id
             FROM tradesmen t
-            LEFT JOIN jobs j ON t.id = j.tradesman_id
+            LEFT JOIN jobs j ON t.id = j.tradesman_id AND j.deleted_at IS NULL
+            LEFT JOIN tradesman_accuracy a ON a.tradesman_id = t.id AND a.metric = 'cost'
+            LEFT JOIN tradesman_scores s ON s.tradesman_id = t.id
             JOIN user_tradesmen ut ON t.id = ut.tradesman_id
             JOIN users u ON ut.user_id = u.id
-            WHERE 1=1
+            {location_join}
+            WHERE t.deleted_at IS NULL
         """
         params = []
         
@@ -87,13 +108,39 @@ class TradesmanService:
             query += " AND t.trade = ?"
             params.append(trade)
             
-        if postcode:
+        if proximity:
+            query += f" AND {proximity[1]}"
+            params.extend(proximity[2])
+        elif postcode:
             query += " AND t.postcode LIKE ?"
             params.append(f"{postcode}%")
             
-        query += " GROUP BY t.id ORDER BY job_count DESC, avg_rating DESC NULLS LAST"
+        if sort == 'distance' and proximity:
+            query += " GROUP BY t.id ORDER BY distance, s.score DESC NULLS LAST"
+        elif sort == 'accuracy':
+            # Closest to their quotes first; the overrun is precomputed, so no extra pass over jobs
+            query += " GROUP BY t.id ORDER BY cost_overrun IS NULL, ABS(cost_overrun), job_count DESC"
+        else:
+            # Wilson-adjusted score, so one 5-star job does not outrank many 4.8s
+            query += " GROUP BY t.id ORDER BY s.score DESC NULLS LAST, job_count DESC"
         
-        return self.db.execute_query(query, tuple(params))
+        return query, tuple(params)
+    
+    def search_tradesmen(self, search_term: str = None, trade: str = None, 
+                        postcode: str = None, sort: str = None, radius: float = None) -> List[Dict[str, Any]]:
+        """
+        Search for tradesmen with filters; sort='accuracy' orders by cost overrun.
+
+        With a radius in miles, only tradesmen that close to the postcode are
+        returned, with their distance, and sort='distance' puts the nearest first.
+        """
+        return self.db.execute_query(*self._search_tradesmen_query(search_term, trade, postcode, sort, radius))
+    
+    def iter_search_tradesmen(self, search_term: str = None, trade: str = None,
+                              postcode: str = None, sort: str = None,
+                              radius: float = None) -> Iterator[Dict[str, Any]]:
+        """Stream tradesman search results, for exports."""
+        return self.db.iter_query(*self._search_tradesmen_query(search_term, trade, postcode, sort, radius))
     
     def get_tradesman_jobs(self, tradesman_id: int) -> List[Dict[str, Any]]:
         """Get all jobs for a tradesman."""
@@ -101,7 +148,7 @@ class TradesmanService:
             SELECT id, date_started, date_finished, title, description, 
                    total_cost, rating
             FROM jobs
-            WHERE tradesman_id = ? AND type = 'job'
+            WHERE tradesman_id = ? AND type = 'job' AND deleted_at IS NULL
             ORDER BY date_finished DESC
         """
         return self.db.execute_query(query, (tradesman_id,))
@@ -112,7 +159,7 @@ class TradesmanService:
             SELECT id, date_requested, date_received, title, description, 
                    total_quote, status
             FROM jobs
-            WHERE tradesman_id = ? AND type = 'quote' AND status != 'accepted'
+            WHERE tradesman_id = ? AND type = 'quote' AND status != 'accepted' AND deleted_at IS NULL
             ORDER BY date_received DESC
         """
         return self.db.execute_query(query, (tradesman_id,))
@@ -145,8 +192,9 @@ class TradesmanService:
     def can_user_edit_tradesman(self, user_id: int, tradesman_id: int) -> bool:
         """Check if a user can edit a tradesman."""
         query = """
-            SELECT 1 FROM user_tradesmen 
-            WHERE user_id = ? AND tradesman_id = ?
+            SELECT 1 FROM user_tradesmen ut
+            JOIN tradesmen t ON ut.tradesman_id = t.id
+            WHERE ut.user_id = ? AND ut.tradesman_id = ? AND t.deleted_at IS NULL
         """
         result = self.db.execute_single_query(query, (user_id, tradesman_id))
         return result is not None
@@ -164,15 +212,15 @@ class TradesmanService:
             FROM tradesmen t
             JOIN user_tradesmen ut ON t.id = ut.tradesman_id
             JOIN users u ON ut.user_id = u.id
-            LEFT JOIN jobs j ON t.id = j.tradesman_id
-            WHERE ut.user_id = ?
+            LEFT JOIN jobs j ON t.id = j.tradesman_id AND j.deleted_at IS NULL
+            WHERE ut.user_id = ? AND t.deleted_at IS NULL
             GROUP BY t.id
             ORDER BY t.trade, t.family_name, t.first_name, t.company_name
         """
         return self.db.execute_query(query, (user_id,))
     
-    def get_tradesmen_by_group(self, group_id: int) -> List[Dict[str, Any]]:
-        """Get all tradesmen in a specific group."""
+    def _tradesmen_by_group_query(self, group_id: int) -> Tuple[str, Tuple]:
+        """Build the query for all tradesmen in a group."""
         query = """
             SELECT t.*,
                    COUNT(CASE WHEN j.type = 'job' THEN j.id END) as job_count,
@@ -180,12 +228,22 @@ class TradesmanService:
                    AVG(CASE WHEN j.type = 'job' THEN j.rating END) as avg_rating
             FROM tradesmen t
             JOIN group_tradesmen gt ON t.id = gt.tradesman_id
-            LEFT JOIN jobs j ON t.id = j.tradesman_id
-            WHERE gt.group_id = ?
-            GROUP BY t.id
+            LEFT JOIN jobs j ON t.id = j.tradesman_id AND j.deleted_at IS NULL
+            WHERE gt.group_id = ? AND t.deleted_at IS NULL
+            GROUP BY gt.tradesman_id
             ORDER BY t.trade, t.family_name, t.first_name, t.company_name
         """
-        return self.db.execute_query(query, (group_id,))
+        # Grouping on gt's column lets the group's members be read off its key in order,
+        # rather than scanning tradesmen in id order
+        return query, (group_id,)
+    
+    def get_tradesmen_by_group(self, group_id: int) -> List[Dict[str, Any]]:
+        """Get all tradesmen in a specific group."""
+        return self.db.execute_query(*self._tradesmen_by_group_query(group_id))
+    
+    def iter_tradesmen_by_group(self, group_id: int) -> Iterator[Dict[str, Any]]:
+        """Stream all tradesmen in a group, for exports."""
+        return self.db.iter_query(*self._tradesmen_by_group_query(group_id))
     
     def add_tradesman_to_group(self, group_id: int, tradesman_id: int) -> bool:
         """Add a tradesman to a group."""
@@ -203,8 +261,9 @@ class TradesmanService:
     def is_tradesman_in_group(self, group_id: int, tradesman_id: int) -> bool:
         """Check if a tradesman is in a specific group."""
         query = """
-            SELECT 1 FROM group_tradesmen 
-            WHERE group_id = ? AND tradesman_id = ?
+            SELECT 1 FROM group_tradesmen gt
+            JOIN tradesmen t ON gt.tradesman_id = t.id
+            WHERE gt.group_id = ? AND gt.tradesman_id = ? AND t.deleted_at IS NULL
         """
         result = self.db.execute_single_query(query, (group_id, tradesman_id))
         return result is not None
@@ -215,7 +274,7 @@ class TradesmanService:
     
     def get_unique_trades(self):
         """Get all unique trades for filtering"""
-        query = "SELECT DISTINCT trade FROM tradesmen ORDER BY trade"
+        query = "SELECT DISTINCT trade FROM tradesmen WHERE deleted_at IS NULL ORDER BY trade"
         results = self.db.execute_query(query)
         return [row['trade'] for row in results]
     
@@ -225,6 +284,7 @@ class TradesmanService:
             SELECT DISTINCT u.username, u.id
             FROM users u
             JOIN user_tradesmen ut ON u.id = ut.user_id
+            WHERE u.deleted_at IS NULL
             ORDER BY u.username
         """
         results = self.db.execute_query(query)
@@ -241,26 +301,28 @@ class TradesmanService:
         return results
     
     def get_top_rated_tradesmen_for_user(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get top-rated tradesmen accessible to user through groups or direct ownership"""
+        """Get the best-scored tradesmen accessible to user through groups or direct ownership"""
+        # Walk the score index best first, stopping once enough accessible tradesmen are found
         query = """
             SELECT t.*, 
-                   COUNT(CASE WHEN j.type = 'job' THEN j.id END) as job_count,
-                   AVG(CASE WHEN j.type = 'job' THEN j.rating END) as avg_rating,
-                   u.username as added_by_username,
-                   u.id as added_by_user_id,
-                   CASE WHEN ut.user_id = ? THEN 1 ELSE 0 END as is_my_tradesman
-            FROM tradesmen t
-            JOIN user_tradesmen ut ON t.id = ut.tradesman_id
-            LEFT JOIN jobs j ON t.id = j.tradesman_id
-            JOIN users u ON ut.user_id = u.id
-            WHERE ut.user_id = ? OR ut.user_id IN (
-                SELECT DISTINCT ug2.user_id 
-                FROM user_groups ug1
-                JOIN user_groups ug2 ON ug1.group_id = ug2.group_id
-                WHERE ug1.user_id = ? AND ug1.status IN ('member', 'admin', 'creator')
+                   s.rating_count as job_count,
+                   s.avg_rating,
+                   s.score,
+                   (SELECT u.username FROM user_tradesmen ut JOIN users u ON ut.user_id = u.id
+                    WHERE ut.tradesman_id = t.id ORDER BY ut.date_added LIMIT 1) as added_by_username,
+                   EXISTS (SELECT 1 FROM user_tradesmen ut WHERE ut.tradesman_id = t.id AND ut.user_id = ?) as is_my_tradesman
+            FROM tradesman_scores s
+            JOIN tradesmen t ON t.id = s.tradesman_id
+            WHERE t.deleted_at IS NULL AND EXISTS (
+                SELECT 1 FROM user_tradesmen ut
+                WHERE ut.tradesman_id = t.id AND (ut.user_id = ? OR ut.user_id IN (
+                    SELECT DISTINCT ug2.user_id 
+                    FROM user_groups ug1
+                    JOIN user_groups ug2 ON ug1.group_id = ug2.group_id
+                    WHERE ug1.user_id = ? AND ug1.status IN ('member', 'admin', 'creator')
+                ))
             )
-            GROUP BY t.id
-            ORDER BY AVG(CASE WHEN j.type = 'job' THEN j.rating END) DESC NULLS LAST, COUNT(CASE WHEN j.type = 'job' THEN j.id END) DESC
+            ORDER BY s.score DESC
             LIMIT ?
         """
         return self.db.execute_query(query, (user_id, user_id, user_id, limit)) 
\ No newline at end of file
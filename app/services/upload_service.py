@@ -0,0 +1,270 @@
+import uuid
+import hashlib
+import threading
+import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, BinaryIO, Tuple
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app.services.database import get_db_service
+from app.services.file_service import FileService
+from app.services.preview_service import PreviewService
+from app.services.storage_service import get_storage
+from app.services import metrics_service
+from app.exceptions import ValidationError, NotFoundError, AuthorizationError, DuplicateResourceError
+
+PARTIAL_FOLDER = '.partial'
+READ_BLOCK_SIZE = 64 * 1024
+
+# Running hashes of in-progress uploads, so each chunk only hashes its own bytes.
+# Another worker process (or a restart) rebuilds the hash from the partial file.
+_hash_states: Dict[str, Tuple[int, Any]] = {}
+_hash_lock = threading.Lock()
+_upload_locks: Dict[str, threading.Lock] = {}
+
+class UploadService:
+    """
+    Service for chunked, resumable uploads.
+
+    A client creates an upload session, then sends the file in chunks at the
+    offset the server reports. Chunks are streamed straight to a partial file
+    and hashed incrementally, so memory stays constant per upload. Finished
+    uploads are attached to a job by id.
+    """
+
+    ALLOWED_FOLDERS = {'quotes', 'jobs'}
+    ATTACHABLE_FIELDS = {'quote_file': 'quotes', 'job_file': 'jobs'}
+
+    def __init__(self):
+        self.db = get_db_service()
+
+    def _partial_path(self, upload_id: str) -> Path:
+        return Path(current_app.config['UPLOAD_FOLDER']) / PARTIAL_FOLDER / f"{upload_id}.part"
+
+    def create_upload(self, user_id: int, filename: str, total_size: int,
+                      folder: str = 'quotes', expected_sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Start a new upload session.
+
+        Args:
+            user_id: ID of the uploading user
+            filename: Original file name
+            total_size: Size of the whole file in bytes
+            folder: Upload folder, 'quotes' or 'jobs'
+            expected_sha256: Optional hex digest checked when the upload completes
+
+        Returns:
+            dict: The upload session
+        """
+        if not filename or not FileService.allowed_file(filename):
+            raise ValidationError("File type not allowed", "filename")
+        if folder not in self.ALLOWED_FOLDERS:
+            raise ValidationError("Invalid upload folder", "folder")
+        max_size = current_app.config.get('UPLOAD_MAX_SIZE', 200 * 1024 * 1024)
+        if total_size <= 0 or total_size > max_size:
+            raise ValidationError(f"File size must be between 1 byte and {max_size} bytes", "total_size")
+
+        upload_id = uuid.uuid4().hex
+        partial_path = self._partial_path(upload_id)
+        partial_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path.touch()
+
+        self.db.execute_insert("""
+            INSERT INTO upload_sessions (id, user_id, filename, folder, total_size, expected_sha256)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (upload_id, user_id, secure_filename(filename), folder, total_size,
+              expected_sha256.lower() if expected_sha256 else None))
+        return self.get_upload(upload_id, user_id)
+
+    def get_upload(self, upload_id: str, user_id: int) -> Dict[str, Any]:
+        """Get an upload session owned by the user."""
+        upload = self.db.execute_single_query(
+            "SELECT * FROM upload_sessions WHERE id = ?",
+            (upload_id,)
+        )
+        if not upload:
+            raise NotFoundError("Upload not found")
+        if upload['user_id'] != user_id:
+            raise AuthorizationError("You don't have access to this upload")
+        return upload
+
+    def _running_hash(self, upload_id: str, offset: int):
+        """Return the running hash of the first `offset` bytes of an upload."""
+        with _hash_lock:
+            state = _hash_states.get(upload_id)
+        if state is not None and state[0] == offset:
+            return state[1]
+
+        # Rebuild from disk, e.g. after a restart or when another worker took earlier chunks
+        digest = hashlib.sha256()
+        remaining = offset
+        with open(self._partial_path(upload_id), 'rb') as partial:
+            while remaining > 0:
+                block = partial.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest
+
+    def write_chunk(self, upload_id: str, user_id: int, offset: int,
+                    stream: BinaryIO, length: int) -> Dict[str, Any]:
+        """
+        Append a chunk at the given offset, streaming it to the partial file.
+
+        Raises:
+            DuplicateResourceError: If the offset doesn't match the bytes received so far;
+                the client should ask for the current offset and resume from there
+        """
+        with _hash_lock:
+            lock = _upload_locks.setdefault(upload_id, threading.Lock())
+
+        with lock:
+            upload = self.get_upload(upload_id, user_id)
+            if upload['status'] != 'uploading':
+                raise DuplicateResourceError("Upload is already complete")
+            if offset != upload['received_bytes']:
+                raise DuplicateResourceError(f"Expected offset {upload['received_bytes']}")
+            if length <= 0 or offset + length > upload['total_size']:
+                raise ValidationError("Chunk exceeds the declared file size")
+
+            written = 0
+            try:
+                digest = self._running_hash(upload_id, offset)
+                with open(self._partial_path(upload_id), 'r+b') as partial:
+                    partial.seek(offset)
+                    while written < length:
+                        block = stream.read(min(READ_BLOCK_SIZE, length - written))
+                        if not block:
+                            break
+                        partial.write(block)
+                        digest.update(block)
+                        written += len(block)
+                    partial.truncate()
+            except FileNotFoundError:
+                # Another worker completed the upload and moved the partial file into storage
+                with _hash_lock:
+                    _hash_states.pop(upload_id, None)
+                raise DuplicateResourceError("Upload is already complete")
+
+            if written != length:
+                # Connection dropped mid-chunk; keep the offset so the client resends it
+                with _hash_lock:
+                    _hash_states.pop(upload_id, None)
+                raise ValidationError("Incomplete chunk received")
+
+            received = offset + written
+            metrics_service.record_upload_bytes('chunked', written)
+            # The lock only covers this process; a retry of the chunk on another worker may have won
+            moved = self.db.execute_update("""
+                UPDATE upload_sessions SET received_bytes = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND received_bytes = ? AND status = 'uploading'
+            """, (received, upload_id, offset))
+            if moved == 0:
+                with _hash_lock:
+                    _hash_states.pop(upload_id, None)
+                raise DuplicateResourceError("Chunk was already received")
+            with _hash_lock:
+                _hash_states[upload_id] = (received, digest)
+
+            if received == upload['total_size']:
+                return self._complete(upload, digest.hexdigest())
+            return self.get_upload(upload_id, user_id)
+
+    def _complete(self, upload: Dict[str, Any], sha256: str) -> Dict[str, Any]:
+        """Verify the digest and move the finished file into storage."""
+        upload_id = upload['id']
+        with _hash_lock:
+            _hash_states.pop(upload_id, None)
+            _upload_locks.pop(upload_id, None)
+
+        if upload['expected_sha256'] and upload['expected_sha256'] != sha256:
+            self.discard_upload(upload_id)
+            raise ValidationError("Checksum mismatch, upload discarded", "sha256")
+
+        stored_path = f"{upload['folder']}/{uuid.uuid4().hex}_{upload['filename']}"
+        # Claimed before the file is moved, so only one process ever moves it
+        claimed = self.db.execute_update("""
+            UPDATE upload_sessions
+            SET status = 'complete', sha256 = ?, stored_path = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'uploading'
+        """, (sha256, stored_path, upload_id))
+        if claimed == 0:
+            raise DuplicateResourceError("Upload is already complete")
+        try:
+            get_storage().save_path(stored_path, self._partial_path(upload_id))
+        except Exception:
+            # Leave the upload resumable rather than complete without a file
+            self.db.execute_update("""
+                UPDATE upload_sessions SET status = 'uploading', sha256 = NULL, stored_path = NULL
+                WHERE id = ?
+            """, (upload_id,))
+            raise
+        PreviewService.schedule(stored_path)
+        return self.get_upload(upload_id, upload['user_id'])
+
+    def claim_upload(self, upload_id: str, user_id: int) -> str:
+        """
+        Mark a completed upload as used and return its stored path.
+
+        Returns:
+            str: The storage key, as stored on the job
+        """
+        upload = self.get_upload(upload_id, user_id)
+        # Checked and changed in one statement, so concurrent claims can't both attach the file
+        claimed = self.db.execute_update("""
+            UPDATE upload_sessions SET status = 'attached', updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ? AND status = 'complete'
+        """, (upload_id, user_id))
+        if claimed == 0:
+            raise ValidationError("Upload is not complete")
+        return upload['stored_path']
+
+    def attach_to_job(self, upload_id: str, user_id: int, job_id: int, field: str) -> str:
+        """Attach a completed upload to a job, replacing any previous file in that field."""
+        from app.services.job_service import JobService
+        job_service = JobService()
+
+        if field not in self.ATTACHABLE_FIELDS:
+            raise ValidationError("Invalid file field", "field")
+        job = job_service.get_job_by_id(job_id)
+        if not job:
+            raise NotFoundError("Job not found")
+        if not job_service.can_user_edit_job(user_id, job_id):
+            raise AuthorizationError("You don't have permission to edit this job")
+
+        stored_path = self.claim_upload(upload_id, user_id)
+        if job.get(field):
+            FileService.delete_file(job[field])
+        job_service.update_job(job_id, **{field: stored_path})
+        return stored_path
+
+    def discard_upload(self, upload_id: str) -> None:
+        """Delete an upload session and its partial file."""
+        with _hash_lock:
+            _hash_states.pop(upload_id, None)
+            _upload_locks.pop(upload_id, None)
+        partial_path = self._partial_path(upload_id)
+        if partial_path.exists():
+            partial_path.unlink()
+        self.db.execute_delete("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+
+    def cleanup_expired(self) -> int:
+        """
+        Remove abandoned uploads older than UPLOAD_SESSION_TTL.
+
+        Returns:
+            int: Number of sessions removed
+        """
+        ttl = current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600)
+        cutoff = (datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl)).strftime('%Y-%m-%d %H:%M:%S')
+        expired = self.db.execute_query("""
+            SELECT id, status, stored_path FROM upload_sessions
+            WHERE status IN ('uploading', 'complete') AND updated_at < ?
+        """, (cutoff,))
+        for upload in expired:
+            if upload['status'] == 'complete' and upload['stored_path']:
+                # Finished but never attached to a job
+                FileService.delete_file(upload['stored_path'])
+            self.discard_upload(upload['id'])
+        return len(expired)
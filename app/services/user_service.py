@@ -1,6 +1,7 @@
 from typing import Optional, Dict, Any
-from werkzeug.security import check_password_hash, generate_password_hash
 from app.services.database import get_db_service
+from app.services.password_service import hash_password, needs_rehash, verify_password
+from app.services.deletion_service import DeletionService
 from app.exceptions import NotFoundError, DuplicateResourceError, AuthenticationError, ValidationError
 
 class UserService:
@@ -29,7 +30,7 @@ class UserService:
             raise DuplicateResourceError("Email already registered")
         
         # Hash password
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         
         # Insert user
         try:
@@ -44,14 +45,14 @@ class UserService:
     def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get user by ID."""
         return self.db.execute_single_query(
-            "SELECT * FROM users WHERE id = ?",
+            "SELECT * FROM users WHERE id = ? AND deleted_at IS NULL",
             (user_id,)
         )
     
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Get user by username."""
         return self.db.execute_single_query(
-            "SELECT * FROM users WHERE username = ?",
+            "SELECT * FROM users WHERE username = ? AND deleted_at IS NULL",
             (username,)
         )
     
@@ -66,11 +67,23 @@ class UserService:
         """Authenticate user with username and password."""
         user = self.get_user_by_username(username)
         
-        if user and check_password_hash(user['hash'], password):
+        if user and verify_password(user['hash'], password):
+            if needs_rehash(user['hash']):
+                self._rehash_password(user, password)
             return user
         
         return None
     
+    def _rehash_password(self, user: Dict[str, Any], password: str) -> None:
+        """Replace a hash made with old parameters, now that the password is known."""
+        new_hash = hash_password(password)
+        # Unless the password was changed meanwhile
+        self.db.execute_update(
+            "UPDATE users SET hash = ? WHERE id = ? AND hash = ?",
+            (new_hash, user['id'], user['hash'])
+        )
+        user['hash'] = new_hash
+    
     def update_user(self, user_id: int, **kwargs) -> bool:
         """Update user information."""
         # Validate user exists
@@ -103,7 +116,7 @@ class UserService:
     def get_all_users(self) -> list:
         """Get all users."""
         return self.db.execute_query(
-            "SELECT id, username, firstname, lastname, email, postcode FROM users ORDER BY username"
+            "SELECT id, username, firstname, lastname, email, postcode FROM users WHERE deleted_at IS NULL ORDER BY username"
         )
     
     def delete_user(self, user_id: int) -> bool:
@@ -113,13 +126,8 @@ class UserService:
         if not user:
             raise NotFoundError("User not found")
         
-        # Delete user
-        affected_rows = self.db.execute_delete(
-            "DELETE FROM users WHERE id = ?",
-            (user_id,)
-        )
-        
-        return affected_rows > 0
+        # Mark deleted; the deletion worker removes their jobs and files in batches
+        return DeletionService().mark_deleted('user', user_id)
     
     def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Get user statistics."""
@@ -130,7 +138,8 @@ class UserService:
         
         # Get tradesmen count
         tradesmen_result = self.db.execute_single_query(
-            "SELECT COUNT(*) as count FROM user_tradesmen WHERE user_id = ?",
+            "SELECT COUNT(*) as count FROM user_tradesmen ut JOIN tradesmen t ON ut.tradesman_id = t.id "
+            "WHERE ut.user_id = ? AND t.deleted_at IS NULL",
             (user_id,)
         )
         tradesmen_count = tradesmen_result['count'] if tradesmen_result else 0
@@ -144,7 +153,7 @@ class UserService:
         
         # Get jobs count
         jobs_result = self.db.execute_single_query(
-            "SELECT COUNT(*) as count FROM jobs WHERE user_id = ?",
+            "SELECT COUNT(*) as count FROM jobs WHERE user_id = ? AND deleted_at IS NULL",
             (user_id,)
         )
         jobs_count = jobs_result['count'] if jobs_result else 0
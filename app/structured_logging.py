@@ -0,0 +1,194 @@
+"""
+Queue-based, structured application logging.
+
+Loggers never touch the log file on the request thread. A QueueHandler puts
+each record on an in-memory queue, and a QueueListener thread formats and
+writes it. Records are written one JSON object per line. Records made during a
+request carry its id, user and route. Every request also logs one access
+record with its status and duration.
+
+The file rotates when it reaches LOG_MAX_BYTES or after LOG_ROTATE_INTERVAL
+seconds, whichever comes first.
+"""
+
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+
+from flask import Flask, Response, g, has_request_context, request, session
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Loggers of the app's own modules (app.services.*, app.routes.*) and requests
+PACKAGE_LOGGER = 'app'
+ACCESS_LOGGER = 'app.requests'
+
+# Attributes every record has; anything else was passed in extra= and is written too
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotates when the file reaches max_bytes or interval seconds after the last rotation."""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: float):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The plain format, with the request id when there is one."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, 'request_id', None)
+        return f"{line} [request {request_id}]" if request_id else line
+
+
+class RequestQueueHandler(QueueHandler):
+    """Queues records with the current request's details; the listener formats them."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Everything that needs the request thread, or objects that may change, is resolved here
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.user_id = session.get('user_id')
+            record.route = request.endpoint
+        return record
+
+
+class LogPipeline:
+    """The queue handler on the app's loggers and the listener thread writing its records."""
+
+    def __init__(self, handler: logging.Handler, level: int):
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.queue_handler = RequestQueueHandler(self.queue)
+        self.queue_handler.setLevel(level)
+        self.listener = QueueListener(self.queue, handler, respect_handler_level=True)
+        self.handler = handler
+
+    def start(self, loggers) -> None:
+        self.loggers = list(loggers)
+        for logger in self.loggers:
+            logger.addHandler(self.queue_handler)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Write out the records still queued and detach from the loggers."""
+        for logger in self.loggers:
+            logger.removeHandler(self.queue_handler)
+        self.listener.stop()
+        self.handler.close()
+
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def setup_logging(app: Flask, config) -> LogPipeline:
+    """
+    Send the app's log records through the queue to the log file.
+
+    The pipeline is per process; setting it up again, for another app,
+    replaces the previous one once its queued records are written.
+    """
+    global _pipeline
+    Path(config.LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+    handler = SizeAndTimeRotatingFileHandler(
+        config.LOG_FILE, config.LOG_MAX_BYTES, config.LOG_BACKUP_COUNT, config.LOG_ROTATE_INTERVAL
+    )
+    handler.setFormatter(JsonFormatter() if config.LOG_FORMAT == 'json' else TextFormatter())
+    level = getattr(logging, config.LOG_LEVEL)
+
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+        _pipeline = LogPipeline(handler, level)
+        package_logger = logging.getLogger(PACKAGE_LOGGER)
+        package_logger.setLevel(level)
+        app.logger.setLevel(level)
+        _pipeline.start([package_logger, app.logger])
+
+    if 'structured_logging' not in app.extensions:
+        app.extensions['structured_logging'] = True
+        app.before_request(_start_request)
+        app.after_request(_log_request)
+    return _pipeline
+
+
+def stop_logging() -> None:
+    """Write out queued records; called at exit."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            _pipeline = None
+
+
+atexit.register(stop_logging)
+
+
+def _start_request() -> None:
+    # A request id set by the proxy in front ties our records to its logs
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+
+
+def _log_request(response: Response) -> Response:
+    started = g.get('request_started')
+    if started is None:
+        return response
+    response.headers[REQUEST_ID_HEADER] = g.request_id
+    access_logger.info(f"{request.method} {request.path} {response.status_code}", extra={
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+    return response
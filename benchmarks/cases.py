@@ -0,0 +1,366 @@
+"""
+Benchmark cases, one per public method of the benchmarked services.
+
+A case takes the Fixture and returns the call to time. Anything the call
+needs that must be fresh every time (a quote to convert, a group to join) is
+created by the case itself, outside the timed call.
+"""
+
+import itertools
+from typing import Any, Callable, Dict
+
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.group_service import GroupService
+from app.services.user_service import UserService
+from app.services.invitation_service import InvitationService
+
+SERVICES = (JobService, TradesmanService, GroupService, UserService, InvitationService)
+
+# Password of every generated user, see scripts/generate_dataset.py
+PASSWORD = 'password'
+
+CASES: Dict[str, Callable[['Fixture'], Callable[[], Any]]] = {}
+
+
+def case(name: str):
+    """Register a case that prepares fresh rows before returning the call to time."""
+    def register(prepare):
+        CASES[name] = prepare
+        return prepare
+    return register
+
+
+def read(name: str, call: Callable[['Fixture'], Any]) -> None:
+    """Register a case with nothing to prepare."""
+    CASES[name] = lambda f: lambda: call(f)
+
+
+class Fixture:
+    """Services and the busiest rows of a generated database, the worst cases of most reads."""
+
+    def __init__(self, db):
+        self.jobs = JobService()
+        self.tradesmen = TradesmanService()
+        self.groups = GroupService()
+        self.users = UserService()
+        self.invitations = InvitationService()
+        self._counter = itertools.count(1)
+
+        self.user = db.execute_single_query("""
+            SELECT u.* FROM users u JOIN user_tradesmen ut ON ut.user_id = u.id
+            GROUP BY u.id ORDER BY COUNT(*) DESC, u.id LIMIT 1
+        """)
+        self.user_id = self.user['id']
+        self.tradesman_id = db.execute_single_query("""
+            SELECT tradesman_id FROM jobs GROUP BY tradesman_id ORDER BY COUNT(*) DESC, tradesman_id LIMIT 1
+        """)['tradesman_id']
+        self.trade = self.tradesmen.get_tradesman_by_id(self.tradesman_id)['trade']
+        self.job_id = db.execute_single_query(
+            "SELECT MIN(id) as id FROM jobs WHERE tradesman_id = ? AND type = 'job'", (self.tradesman_id,)
+        )['id']
+        self.quote_id = db.execute_single_query(
+            "SELECT MIN(id) as id FROM jobs WHERE tradesman_id = ? AND type = 'quote'", (self.tradesman_id,)
+        )['id']
+        self.group_id = db.execute_single_query("""
+            SELECT group_id FROM user_groups GROUP BY group_id ORDER BY COUNT(*) DESC, group_id LIMIT 1
+        """)['group_id']
+        self.membership_id = db.execute_single_query(
+            "SELECT MIN(id) as id FROM user_groups WHERE group_id = ?", (self.group_id,)
+        )['id']
+
+    def unique(self, prefix: str) -> str:
+        """A name no other prepared row uses."""
+        return f"{prefix}{next(self._counter)}"
+
+    def new_user(self) -> int:
+        name = self.unique('bench')
+        return self.users.create_user(name, 'Bench', 'User', f"{name}@example.com", self.user['postcode'], PASSWORD)
+
+    def new_group(self) -> int:
+        return self.groups.create_group(self.unique('Bench group '), self.user['postcode'])
+
+    def new_tradesman(self) -> int:
+        return self.tradesmen.create_tradesman(
+            self.trade, 'Bench', self.unique('Tradesman'), None, '1 High Street', self.user['postcode'], '0700', None
+        )
+
+    def new_quote(self) -> int:
+        return self.jobs.create_quote(self.user_id, self.tradesman_id, 'Fix leak', 'Benchmark',
+                                      hourly_rate=50, hours_estimated=4)
+
+    def new_invitation(self, group_id: int, email: str) -> str:
+        return self.invitations.create_invitation(group_id, self.user_id, email)
+
+
+# JobService
+read('JobService.get_job_by_id', lambda f: f.jobs.get_job_by_id(f.job_id))
+read('JobService.get_jobs_by_user', lambda f: f.jobs.get_jobs_by_user(f.user_id))
+read('JobService.get_quotes_by_user', lambda f: f.jobs.get_quotes_by_user(f.user_id))
+read('JobService.iter_user_jobs', lambda f: list(f.jobs.iter_user_jobs(f.user_id, 'job')))
+read('JobService.search_jobs', lambda f: f.jobs.search_jobs(trade=f.trade))
+read('JobService.iter_search_jobs', lambda f: list(f.jobs.iter_search_jobs(trade=f.trade)))
+read('JobService.search_quotes', lambda f: f.jobs.search_quotes(trade=f.trade))
+read('JobService.iter_search_quotes', lambda f: list(f.jobs.iter_search_quotes(trade=f.trade)))
+read('JobService.get_quote_snapshot', lambda f: f.jobs.get_quote_snapshot(f.job_id))
+read('JobService.get_jobs_by_tradesman', lambda f: f.jobs.get_jobs_by_tradesman(f.tradesman_id))
+read('JobService.get_quotes_by_tradesman', lambda f: f.jobs.get_quotes_by_tradesman(f.tradesman_id))
+read('JobService.can_user_edit_job', lambda f: f.jobs.can_user_edit_job(f.user_id, f.job_id))
+read('JobService.get_unique_trades', lambda f: f.jobs.get_unique_trades())
+read('JobService.get_unique_users', lambda f: f.jobs.get_unique_users())
+read('JobService.get_unique_groups', lambda f: f.jobs.get_unique_groups())
+read('JobService.get_recent_completed_jobs_for_user', lambda f: f.jobs.get_recent_completed_jobs_for_user(f.user_id))
+read('JobService.get_job_status_counts', lambda f: f.jobs.get_job_status_counts(f.tradesman_id))
+read('JobService.get_job_titles_for_tradesman', lambda f: f.jobs.get_job_titles_for_tradesman(f.tradesman_id))
+
+
+@case('JobService.create_job')
+def _create_job(f):
+    return lambda: f.jobs.create_job(f.user_id, f.tradesman_id, 'Fix leak', 'Benchmark',
+                                     hourly_rate=50, hours_worked=4, rating=4)
+
+
+@case('JobService.create_quote')
+def _create_quote(f):
+    return f.new_quote
+
+
+@case('JobService.update_job')
+def _update_job(f):
+    description = f.unique('Benchmark ')
+    return lambda: f.jobs.update_job(f.job_id, description=description)
+
+
+@case('JobService.update_quote')
+def _update_quote(f):
+    description = f.unique('Benchmark ')
+    return lambda: f.jobs.update_quote(f.quote_id, description=description)
+
+
+@case('JobService.delete_job')
+def _delete_job(f):
+    quote_id = f.new_quote()
+    return lambda: f.jobs.delete_job(quote_id)
+
+
+@case('JobService.convert_quote_to_job')
+def _convert_quote_to_job(f):
+    quote_id = f.new_quote()
+    return lambda: f.jobs.convert_quote_to_job(quote_id)
+
+
+@case('JobService.accept_quote')
+def _accept_quote(f):
+    quote_id = f.new_quote()
+    return lambda: f.jobs.accept_quote(quote_id)
+
+
+@case('JobService.reject_quote')
+def _reject_quote(f):
+    quote_id = f.new_quote()
+    return lambda: f.jobs.reject_quote(quote_id)
+
+
+# TradesmanService
+read('TradesmanService.get_tradesman_by_id', lambda f: f.tradesmen.get_tradesman_by_id(f.tradesman_id))
+read('TradesmanService.search_tradesmen', lambda f: f.tradesmen.search_tradesmen(trade=f.trade))
+read('TradesmanService.iter_search_tradesmen', lambda f: list(f.tradesmen.iter_search_tradesmen(trade=f.trade)))
+read('TradesmanService.get_tradesman_jobs', lambda f: f.tradesmen.get_tradesman_jobs(f.tradesman_id))
+read('TradesmanService.get_tradesman_quotes', lambda f: f.tradesmen.get_tradesman_quotes(f.tradesman_id))
+read('TradesmanService.get_tradesman_added_by_info', lambda f: f.tradesmen.get_tradesman_added_by_info(f.tradesman_id))
+read('TradesmanService.can_user_edit_tradesman',
+     lambda f: f.tradesmen.can_user_edit_tradesman(f.user_id, f.tradesman_id))
+read('TradesmanService.get_tradesmen_by_user', lambda f: f.tradesmen.get_tradesmen_by_user(f.user_id))
+read('TradesmanService.get_tradesmen_by_group', lambda f: f.tradesmen.get_tradesmen_by_group(f.group_id))
+read('TradesmanService.iter_tradesmen_by_group', lambda f: list(f.tradesmen.iter_tradesmen_by_group(f.group_id)))
+read('TradesmanService.is_tradesman_in_group', lambda f: f.tradesmen.is_tradesman_in_group(f.group_id, f.tradesman_id))
+read('TradesmanService.get_available_trades', lambda f: f.tradesmen.get_available_trades())
+read('TradesmanService.get_unique_trades', lambda f: f.tradesmen.get_unique_trades())
+read('TradesmanService.get_unique_users', lambda f: f.tradesmen.get_unique_users())
+read('TradesmanService.get_unique_groups', lambda f: f.tradesmen.get_unique_groups())
+read('TradesmanService.get_top_rated_tradesmen_for_user',
+     lambda f: f.tradesmen.get_top_rated_tradesmen_for_user(f.user_id))
+
+
+@case('TradesmanService.create_tradesman')
+def _create_tradesman(f):
+    return f.new_tradesman
+
+
+@case('TradesmanService.update_tradesman')
+def _update_tradesman(f):
+    address = f"{next(f._counter)} High Street"
+    return lambda: f.tradesmen.update_tradesman(f.tradesman_id, address=address)
+
+
+@case('TradesmanService.delete_tradesman')
+def _delete_tradesman(f):
+    tradesman_id = f.new_tradesman()
+    return lambda: f.tradesmen.delete_tradesman(tradesman_id)
+
+
+@case('TradesmanService.add_user_tradesman_relationship')
+def _add_user_tradesman_relationship(f):
+    tradesman_id = f.new_tradesman()
+    return lambda: f.tradesmen.add_user_tradesman_relationship(f.user_id, tradesman_id)
+
+
+@case('TradesmanService.remove_user_tradesman_relationship')
+def _remove_user_tradesman_relationship(f):
+    tradesman_id = f.new_tradesman()
+    f.tradesmen.add_user_tradesman_relationship(f.user_id, tradesman_id)
+    return lambda: f.tradesmen.remove_user_tradesman_relationship(f.user_id, tradesman_id)
+
+
+@case('TradesmanService.add_tradesman_to_group')
+def _add_tradesman_to_group(f):
+    tradesman_id = f.new_tradesman()
+    return lambda: f.tradesmen.add_tradesman_to_group(f.group_id, tradesman_id)
+
+
+@case('TradesmanService.remove_tradesman_from_group')
+def _remove_tradesman_from_group(f):
+    tradesman_id = f.new_tradesman()
+    f.tradesmen.add_tradesman_to_group(f.group_id, tradesman_id)
+    return lambda: f.tradesmen.remove_tradesman_from_group(f.group_id, tradesman_id)
+
+
+# GroupService
+read('GroupService.get_group_by_id', lambda f: f.groups.get_group_by_id(f.group_id))
+read('GroupService.get_all_groups', lambda f: f.groups.get_all_groups())
+read('GroupService.search_groups', lambda f: f.groups.search_groups(postcode=f.user['postcode'], radius=10))
+read('GroupService.get_user_group_membership', lambda f: f.groups.get_user_group_membership(f.user_id, f.group_id))
+read('GroupService.get_group_members', lambda f: f.groups.get_group_members(f.group_id))
+read('GroupService.get_user_groups', lambda f: f.groups.get_user_groups(f.user_id))
+read('GroupService.get_pending_requests', lambda f: f.groups.get_pending_requests(f.group_id))
+read('GroupService.handle_request', lambda f: f.groups.handle_request(f.membership_id, 'approve'))
+read('GroupService.get_user_groups_with_stats', lambda f: f.groups.get_user_groups_with_stats(f.user_id))
+read('GroupService.get_request_by_id', lambda f: f.groups.get_request_by_id(f.membership_id))
+read('GroupService.get_group_creator', lambda f: f.groups.get_group_creator(f.group_id))
+read('GroupService.get_group_job_count', lambda f: f.groups.get_group_job_count(f.group_id))
+read('GroupService.get_group_jobs_and_quotes', lambda f: f.groups.get_group_jobs_and_quotes(f.group_id))
+read('GroupService.get_group_member_count', lambda f: f.groups.get_group_member_count(f.group_id))
+read('GroupService.get_all_pending_requests_for_user',
+     lambda f: f.groups.get_all_pending_requests_for_user(f.user_id))
+read('GroupService.get_group_names', lambda f: f.groups.get_group_names())
+
+
+@case('GroupService.create_group')
+def _create_group(f):
+    return f.new_group
+
+
+@case('GroupService.create_group_with_creator')
+def _create_group_with_creator(f):
+    name = f.unique('Bench group ')
+    return lambda: f.groups.create_group_with_creator(name, f.user['postcode'], f.user_id)
+
+
+@case('GroupService.update_group')
+def _update_group(f):
+    group_id = f.new_group()
+    name = f.unique('Renamed group ')
+    return lambda: f.groups.update_group(group_id, name=name)
+
+
+@case('GroupService.delete_group')
+def _delete_group(f):
+    group_id = f.new_group()
+    return lambda: f.groups.delete_group(group_id)
+
+
+@case('GroupService.add_user_to_group')
+def _add_user_to_group(f):
+    group_id = f.new_group()
+    return lambda: f.groups.add_user_to_group(f.user_id, group_id)
+
+
+@case('GroupService.update_user_group_status')
+def _update_user_group_status(f):
+    group_id = f.new_group()
+    f.groups.add_user_to_group(f.user_id, group_id)
+    return lambda: f.groups.update_user_group_status(f.user_id, group_id, 'member')
+
+
+@case('GroupService.remove_user_from_group')
+def _remove_user_from_group(f):
+    group_id = f.new_group()
+    f.groups.add_user_to_group(f.user_id, group_id)
+    return lambda: f.groups.remove_user_from_group(f.user_id, group_id)
+
+
+@case('GroupService.add_user_tradesmen_to_group')
+def _add_user_tradesmen_to_group(f):
+    group_id = f.new_group()
+    return lambda: f.groups.add_user_tradesmen_to_group(f.user_id, group_id)
+
+
+# UserService
+read('UserService.get_user_by_id', lambda f: f.users.get_user_by_id(f.user_id))
+read('UserService.get_user_by_username', lambda f: f.users.get_user_by_username(f.user['username']))
+read('UserService.get_user_by_email', lambda f: f.users.get_user_by_email(f.user['email']))
+read('UserService.authenticate_user', lambda f: f.users.authenticate_user(f.user['username'], PASSWORD))
+read('UserService.get_all_users', lambda f: f.users.get_all_users())
+read('UserService.get_user_stats', lambda f: f.users.get_user_stats(f.user_id))
+
+
+@case('UserService.create_user')
+def _create_user(f):
+    return f.new_user
+
+
+@case('UserService.update_user')
+def _update_user(f):
+    firstname = f.unique('Bench')
+    return lambda: f.users.update_user(f.user_id, firstname=firstname)
+
+
+@case('UserService.delete_user')
+def _delete_user(f):
+    user_id = f.new_user()
+    return lambda: f.users.delete_user(user_id)
+
+
+# InvitationService
+read('InvitationService.get_pending_invitations_for_group',
+     lambda f: f.invitations.get_pending_invitations_for_group(f.group_id))
+read('InvitationService.get_pending_invitations_by_email',
+     lambda f: f.invitations.get_pending_invitations_by_email(f.user['email']))
+
+
+@case('InvitationService.create_invitation')
+def _create_invitation(f):
+    email = f"{f.unique('invitee')}@example.com"
+    return lambda: f.new_invitation(f.group_id, email)
+
+
+@case('InvitationService.send_invitation_email')
+def _send_invitation_email(f):
+    # Without mail credentials this stops short of sending, after all the database work
+    email = f"{f.unique('invitee')}@example.com"
+    return lambda: f.invitations.send_invitation_email(f.group_id, f.user_id, email)
+
+
+@case('InvitationService.get_invitation_by_token')
+def _get_invitation_by_token(f):
+    token = f.new_invitation(f.group_id, f"{f.unique('invitee')}@example.com")
+    return lambda: f.invitations.get_invitation_by_token(token)
+
+
+@case('InvitationService.accept_invitation')
+def _accept_invitation(f):
+    token = f.new_invitation(f.new_group(), f.user['email'])
+    return lambda: f.invitations.accept_invitation(token, f.user_id)
+
+
+@case('InvitationService.cancel_invitation')
+def _cancel_invitation(f):
+    token = f.new_invitation(f.group_id, f"{f.unique('invitee')}@example.com")
+    invitation_id = f.invitations.get_invitation_by_token(token)['id']
+    return lambda: f.invitations.cancel_invitation(invitation_id, f.user_id)
+
+
+@case('InvitationService.accept_all_pending_invitations_for_user')
+def _accept_all_pending_invitations_for_user(f):
+    f.new_invitation(f.new_group(), f.user['email'])
+    return lambda: f.invitations.accept_all_pending_invitations_for_user(f.user_id, f.user['email'])
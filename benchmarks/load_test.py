@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Route Load Test
+Serves the app from main.create_app through a local WSGI server and drives it
+with concurrent virtual users, each logging in and then following scripted
+journeys: the dashboard, tradesman and job searches, group and tradesman
+pages, and adding a job. Reports throughput, latency percentiles, error rate
+and SQLite lock timeouts per route.
+
+    python benchmarks/load_test.py --users 200 --duration 60
+    python benchmarks/load_test.py --size 1m --server werkzeug --output benchmarks/results/load.json
+
+Waitress (pip install waitress) is the default server; --server werkzeug uses
+Werkzeug's threaded development server instead. Each run works on a fresh
+copy of a generated dataset (see run_benchmarks.py).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import requests
+
+# Get the project root directory (parent of benchmarks directory)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.run_benchmarks import DATASETS, DATASET_SEED, dataset_path
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" value="([^"]+)"')
+LOCK_TIMEOUTS_HEADER = 'X-Lock-Timeouts'
+
+# Journey -> share of the journeys virtual users pick
+JOURNEYS = {
+    'dashboard': 0.25,
+    'search_tradesmen': 0.2,
+    'search_jobs_quotes': 0.2,
+    'view_group': 0.15,
+    'view_tradesman': 0.15,
+    'add_job': 0.05,
+}
+
+PASSWORD = 'password'
+
+
+class Stats:
+    """Outcomes of every request, per route, shared by all virtual users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_timeouts = defaultdict(int)
+
+    def record(self, route: str, latency_ms: float, error: bool, lock_timeouts: int) -> None:
+        with self._lock:
+            self.latencies[route].append(latency_ms)
+            self.errors[route] += error
+            self.lock_timeouts[route] += lock_timeouts
+
+    def report(self, duration: float) -> dict:
+        report = {}
+        for route in sorted(self.latencies):
+            latencies = np.array(self.latencies[route])
+            report[route] = {
+                'requests': len(latencies),
+                'throughput_rps': round(len(latencies) / duration, 2),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+                'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+                'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+                'error_rate': round(self.errors[route] / len(latencies), 4),
+                'lock_timeouts': self.lock_timeouts[route],
+            }
+        return report
+
+
+class VirtualUser:
+    """One logged-in user following random journeys until the deadline."""
+
+    def __init__(self, base_url: str, username: str, ids: dict, stats: Stats, think_time: float, seed: int):
+        self.base_url = base_url
+        self.username = username
+        self.ids = ids
+        self.stats = stats
+        self.think_time = think_time
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+
+    def request(self, route: str, method: str, path: str, **kwargs) -> requests.Response:
+        """Make a request, recording it under its route; redirects count as success."""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            timeout=60, **kwargs)
+        except requests.RequestException:
+            self.stats.record(route, (time.perf_counter() - started) * 1000, True, 0)
+            return None
+        self.stats.record(
+            route, (time.perf_counter() - started) * 1000, response.status_code >= 400,
+            int(response.headers.get(LOCK_TIMEOUTS_HEADER, 0))
+        )
+        return response
+
+    def form(self, route: str, path: str, data: dict) -> requests.Response:
+        """Open a form page and submit it with its CSRF token."""
+        page = self.request(route, 'GET', path)
+        match = CSRF_TOKEN.search(page.text) if page is not None else None
+        if match:
+            return self.request(route, 'POST', path, data={**data, 'csrf_token': match.group(1)})
+        return None
+
+    def login(self) -> bool:
+        response = self.form('/login', '/login', {'username': self.username, 'password': PASSWORD})
+        # A successful login redirects to the dashboard
+        return response is not None and response.status_code == 302
+
+    def run(self, deadline: float) -> None:
+        if not self.login():
+            return
+        journeys, weights = zip(*JOURNEYS.items())
+        while time.time() < deadline:
+            getattr(self, self.random.choices(journeys, weights)[0])()
+            time.sleep(self.random.expovariate(1 / self.think_time) if self.think_time else 0)
+
+    def dashboard(self) -> None:
+        self.request('/', 'GET', '/')
+
+    def search_tradesmen(self) -> None:
+        self.form('/search_tradesmen', '/search_tradesmen', {'trade': self.random.choice(self.ids['trades'])})
+
+    def search_jobs_quotes(self) -> None:
+        self.form('/search_jobs_quotes', '/search_jobs_quotes', {'trade': self.random.choice(self.ids['trades'])})
+
+    def view_group(self) -> None:
+        self.request('/view_group/<id>', 'GET', f"/view_group/{self.random.choice(self.ids['groups'])}")
+
+    def view_tradesman(self) -> None:
+        self.request('/tradesman/<id>', 'GET', f"/tradesman/{self.random.choice(self.ids['tradesmen'])}")
+
+    def add_job(self) -> None:
+        tradesman_id = self.random.choice(self.ids['tradesmen'])
+        self.form('/add_job/<id>', f"/add_job/{tradesman_id}", {
+            'title': 'Fix leak', 'description': 'Load test', 'hourly_rate': '50',
+            'hours_worked': '3', 'rating': '4',
+        })
+
+
+def start_server(app, server: str, threads: int):
+    """Serve the app on a free local port; returns (base url, stop function)."""
+    if server == 'waitress':
+        from waitress.server import create_server
+        wsgi_server = create_server(app, host='127.0.0.1', port=0, threads=threads)
+        thread = threading.Thread(target=wsgi_server.run, daemon=True)
+        thread.start()
+        return f"http://127.0.0.1:{wsgi_server.effective_port}", wsgi_server.close
+
+    from werkzeug.serving import make_server
+    # One access log line per request would drown the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    wsgi_server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=wsgi_server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{wsgi_server.port}", wsgi_server.shutdown
+
+
+def create_load_app(database_path: str, workdir: str):
+    """The app against a database, reporting each request's lock timeouts in a header."""
+    # Keep snapshots and uploads of the run out of the project; read when config is imported
+    os.environ['JOBS_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots', 'jobs')
+    os.environ['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    from flask import g
+    from main import create_app
+    from app.services import database
+
+    # The services share the configured database; point it at the copy
+    database.db_service.database_path = database_path
+    app = create_app()
+    # Every virtual user comes from 127.0.0.1; shared per-IP limits would turn the load into 429s
+    app.config['RATE_LIMIT_ENABLED'] = False
+
+    @app.after_request
+    def report_lock_timeouts(response):
+        response.headers[LOCK_TIMEOUTS_HEADER] = str(g.get('lock_timeouts', 0))
+        return response
+
+    return app
+
+
+def sample_ids(database_path: str, users: int) -> dict:
+    """Users to log in as, and the groups, tradesmen and trades journeys pick from."""
+    import sqlite3
+    conn = sqlite3.connect(database_path)
+    try:
+        rng = random.Random(DATASET_SEED)
+        tradesmen = [row[0] for row in conn.execute("SELECT id FROM tradesmen")]
+        user_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return {
+            'usernames': [f"user{rng.randint(1, user_count)}" for _ in range(users)],
+            'groups': [row[0] for row in conn.execute("SELECT id FROM groups")],
+            'tradesmen': rng.sample(tradesmen, min(len(tradesmen), 1000)),
+            'trades': [row[0] for row in conn.execute("SELECT DISTINCT trade FROM tradesmen")],
+        }
+    finally:
+        conn.close()
+
+
+def print_report(report: dict) -> None:
+    print(f"{'Route':<22}{'Requests':>10}{'Req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'Errors':>9}{'Locks':>7}")
+    for route, row in report.items():
+        print(f"{route:<22}{row['requests']:>10}{row['throughput_rps']:>9}{row['p50_ms']:>10}"
+              f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['error_rate']:>9.2%}{row['lock_timeouts']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the app with concurrent virtual users')
+    parser.add_argument('--users', type=int, default=200, help='Concurrent virtual users (default: 200)')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds of load after ramp-up (default: 60)')
+    parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which users start (default: 10)')
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help='Mean seconds between a user\'s journeys, 0 for none (default: 1)')
+    parser.add_argument('--size', choices=list(DATASETS), default='100k', help='Dataset (default: 100k)')
+    parser.add_argument('--server', choices=['waitress', 'werkzeug'], default='waitress',
+                        help='WSGI server (default: waitress)')
+    parser.add_argument('--threads', type=int, default=16, help='Waitress worker threads (default: 16)')
+    parser.add_argument('--output', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    # The schema is read relative to the project root
+    os.chdir(project_root)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database_path = os.path.join(workdir, 'load.db')
+        shutil.copyfile(dataset_path(args.size), database_path)
+        ids = sample_ids(database_path, args.users)
+        base_url, stop = start_server(create_load_app(database_path, workdir), args.server, args.threads)
+
+        stats = Stats()
+        started = time.time()
+        deadline = started + args.ramp_up + args.duration
+        virtual_users = []
+        for number, username in enumerate(ids['usernames']):
+            user = VirtualUser(base_url, username, ids, stats, args.think_time, DATASET_SEED + number)
+            thread = threading.Thread(target=user.run, args=(deadline,), daemon=True)
+            virtual_users.append(thread)
+            thread.start()
+            time.sleep(args.ramp_up / max(args.users, 1))
+        for thread in virtual_users:
+            thread.join()
+        elapsed = time.time() - started
+        stop()
+
+    report = stats.report(elapsed)
+    print(f"{args.users} users for {elapsed:.0f}s against the {args.size} dataset ({args.server})")
+    print_report(report)
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        Path(output).write_text(json.dumps({'users': args.users, 'duration_s': round(elapsed, 1),
+                                            'size': args.size, 'server': args.server, 'routes': report},
+                                           indent=2), encoding='utf-8')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
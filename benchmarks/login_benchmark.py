@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Login Throughput Benchmark
+Serves the app as load_test.py does, with virtual users that log in over and
+over, each time with a new session, next to virtual users following the
+usual journeys. Reports logins per second and the latency of every route,
+so that runs hashing passwords in the request thread and in the hashing
+pool can be compared:
+
+    python benchmarks/login_benchmark.py --hash-workers 0 --logins 16
+    python benchmarks/login_benchmark.py --hash-workers 2 --logins 16 --output benchmarks/results/login.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+import requests
+
+# Get the project root directory (parent of benchmarks directory)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.run_benchmarks import DATASETS, DATASET_SEED, dataset_path
+from benchmarks.load_test import (CSRF_TOKEN, PASSWORD, Stats, VirtualUser, create_load_app, print_report,
+                                  sample_ids, start_server)
+
+LOGIN_ROUTE = 'POST /login'
+
+
+class LoginUser(VirtualUser):
+    """Logs in until the deadline, recording the login form and its submission separately."""
+
+    def run(self, deadline: float) -> None:
+        while time.time() < deadline:
+            self.session = requests.Session()
+            page = self.request('GET /login', 'GET', '/login')
+            match = CSRF_TOKEN.search(page.text) if page is not None else None
+            if match:
+                self.request(LOGIN_ROUTE, 'POST', '/login', data={
+                    'username': self.username, 'password': PASSWORD, 'csrf_token': match.group(1),
+                })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure login throughput under concurrent load')
+    parser.add_argument('--logins', type=int, default=16, help='Users logging in concurrently (default: 16)')
+    parser.add_argument('--users', type=int, default=50,
+                        help='Users following the usual journeys meanwhile (default: 50)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load (default: 30)')
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help='Mean seconds between the journeys of the other users (default: 1)')
+    parser.add_argument('--hash-workers', type=int, default=2,
+                        help='PASSWORD_HASH_WORKERS, 0 to hash in the request thread (default: 2)')
+    parser.add_argument('--size', choices=list(DATASETS), default='10k', help='Dataset (default: 10k)')
+    parser.add_argument('--server', choices=['waitress', 'werkzeug'], default='waitress',
+                        help='WSGI server (default: waitress)')
+    parser.add_argument('--threads', type=int, default=16, help='Waitress worker threads (default: 16)')
+    parser.add_argument('--output', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    # The schema is read relative to the project root
+    os.chdir(project_root)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database_path = os.path.join(workdir, 'login.db')
+        shutil.copyfile(dataset_path(args.size), database_path)
+        ids = sample_ids(database_path, args.logins + args.users)
+        app = create_load_app(database_path, workdir)
+        app.config['PASSWORD_HASH_WORKERS'] = args.hash_workers
+        base_url, stop = start_server(app, args.server, args.threads)
+
+        stats = Stats()
+        started = time.time()
+        deadline = started + args.duration
+        threads = []
+        for number, username in enumerate(ids['usernames']):
+            user_class = LoginUser if number < args.logins else VirtualUser
+            user = user_class(base_url, username, ids, stats, args.think_time, DATASET_SEED + number)
+            thread = threading.Thread(target=user.run, args=(deadline,), daemon=True)
+            threads.append(thread)
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+        stop()
+
+    report = stats.report(elapsed)
+    logins = report.get(LOGIN_ROUTE, {}).get('throughput_rps', 0)
+    print(f"{args.logins} users logging in and {args.users} browsing for {elapsed:.0f}s, "
+          f"{args.hash_workers} hashing processes ({args.server})")
+    print(f"{logins} logins/s")
+    print_report(report)
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        Path(output).write_text(json.dumps({'logins': args.logins, 'users': args.users,
+                                            'hash_workers': args.hash_workers, 'duration_s': round(elapsed, 1),
+                                            'size': args.size, 'server': args.server,
+                                            'logins_per_s': logins, 'routes': report},
+                                           indent=2), encoding='utf-8')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Service Benchmark Runner
+Times every public method of the job, tradesman, group, user and invitation
+services against generated databases of 10k, 100k and 1M jobs, recording
+p50/p95 latency, queries per call and peak memory as JSON.
+
+    python benchmarks/run_benchmarks.py run --sizes 10k 100k --output benchmarks/baselines/main.json
+    python benchmarks/run_benchmarks.py run --output benchmarks/results/latest.json
+    python benchmarks/run_benchmarks.py compare benchmarks/baselines/main.json benchmarks/results/latest.json
+
+Databases are generated once per size and schema with
+scripts/generate_dataset.py and cached in benchmarks/data; every run works on
+a fresh copy, since write methods add rows.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import shutil
+import sqlite3
+import inspect
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Get the project root directory (parent of benchmarks directory)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+DATA_DIR = project_root / 'benchmarks' / 'data'
+
+# Jobs in each dataset -> generator sizes; about 40 jobs and quotes per user
+DATASETS = {
+    '10k': {'users': 250, 'groups': 12},
+    '100k': {'users': 2500, 'groups': 125},
+    '1m': {'users': 25000, 'groups': 1250},
+}
+# Fixed so every machine generates the same databases
+DATASET_SEED = 42
+DATASET_END_DATE = '2026-06-30'
+GROUP_SIZE = 20
+
+# Smaller growth in peak memory is allocator noise
+MIN_MEMORY_GROWTH_KIB = 16
+
+# Transaction control is not a query
+UNCOUNTED_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def dataset_path(size: str) -> Path:
+    """Path of a generated dataset, generating it on first use."""
+    # A schema change gets a new database, rather than running against a stale one
+    schema = hashlib.sha1((project_root / 'sql' / 'schema.sql').read_bytes()).hexdigest()[:8]
+    path = DATA_DIR / f"jobs-{size}-{schema}.db"
+    if not path.exists():
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        sizes = DATASETS[size]
+        print(f"Generating the {size} dataset...")
+        subprocess.run([
+            sys.executable, str(project_root / 'scripts' / 'generate_dataset.py'), str(path),
+            '--seed', str(DATASET_SEED), '--end-date', DATASET_END_DATE,
+            '--users', str(sizes['users']), '--groups', str(sizes['groups']),
+            '--membership-density', str(GROUP_SIZE / sizes['users']), '--derive',
+        ], check=True, cwd=project_root)
+    return path
+
+
+def uncovered_methods():
+    """Public methods of the benchmarked services without a case."""
+    from benchmarks.cases import CASES, SERVICES
+    return [
+        f"{service.__name__}.{name}"
+        for service in SERVICES
+        for name, _ in inspect.getmembers(service, inspect.isfunction)
+        if not name.startswith('_') and f"{service.__name__}.{name}" not in CASES
+    ]
+
+
+class QueryCounter:
+    """Counts the statements a connection runs while enabled, trigger bodies included."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.count = 0
+        self.enabled = False
+        connection.set_trace_callback(self._trace)
+
+    def _trace(self, statement: str) -> None:
+        if self.enabled and not statement.lstrip().upper().startswith(UNCOUNTED_STATEMENTS):
+            self.count += 1
+
+
+def measure(prepare, fixture, counter: QueryCounter, iterations: int, warmup: int) -> dict:
+    """Latency percentiles, queries per call and peak memory of one case."""
+    for _ in range(warmup):
+        prepare(fixture)()
+
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        call = prepare(fixture)
+        counter.enabled = True
+        counter.count = 0
+        started = time.perf_counter()
+        try:
+            call()
+        finally:
+            elapsed = time.perf_counter() - started
+            counter.enabled = False
+        timings.append(elapsed * 1000)
+        queries = max(queries, counter.count)
+
+    # Tracing allocations slows the call down, so memory gets a run of its own
+    call = prepare(fixture)
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 4),
+        'p95_ms': round(float(np.percentile(timings, 95)), 4),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_size(size: str, cases, iterations: int, warmup: int) -> dict:
+    """Run the cases against a fresh copy of one dataset."""
+    from main import create_app
+    from app.services import database
+    from benchmarks.cases import CASES, Fixture
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'benchmark.db')
+        shutil.copyfile(dataset_path(size), path)
+
+        # The services share the configured database; point it at the copy
+        database.db_service.database_path = path
+        app = create_app()
+        # Keep background workers from running alongside the timed calls
+        app.testing = True
+        results = {}
+        with app.app_context():
+            fixture = Fixture(database.db_service)
+            counter = QueryCounter(database.db_service.get_connection())
+            for name in cases:
+                results[name] = measure(CASES[name], fixture, counter, iterations, warmup)
+                print(f"  {name}: p50 {results[name]['p50_ms']:.3f}ms, p95 {results[name]['p95_ms']:.3f}ms, "
+                      f"{results[name]['queries']} queries, {results[name]['peak_kib']} KiB")
+        return results
+
+
+def run(args) -> int:
+    from benchmarks.cases import CASES
+
+    missing = uncovered_methods()
+    if missing:
+        print("Methods without a benchmark case:")
+        for name in missing:
+            print(f"  {name}")
+        return 1
+
+    cases = [name for name in CASES if not args.filter or any(part in name for part in args.filter)]
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            'iterations': args.iterations,
+        },
+        'results': {},
+    }
+    for size in args.sizes:
+        print(f"Dataset {size}:")
+        report['results'][size] = run_size(size, cases, args.iterations, args.warmup)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, sort_keys=True), encoding='utf-8')
+    print(f"Results written to {output}")
+    return 0
+
+
+def compare_results(baseline: dict, current: dict, threshold: float, min_ms: float,
+                    min_kib: float = MIN_MEMORY_GROWTH_KIB) -> list:
+    """
+    Regressions of the current results against the baseline.
+
+    Latency and memory regress when they grow by more than threshold (a fraction)
+    and by more than min_ms or min_kib; any extra query is a regression.
+
+    Returns:
+        list: (size, case, metric, baseline value, current value) tuples
+    """
+    regressions = []
+    for size, cases in current['results'].items():
+        for name, result in cases.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if before is None:
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                if (result[metric] > before[metric] * (1 + threshold)
+                        and result[metric] - before[metric] > min_ms):
+                    regressions.append((size, name, metric, before[metric], result[metric]))
+            if result['queries'] > before['queries']:
+                regressions.append((size, name, 'queries', before['queries'], result['queries']))
+            if (result['peak_kib'] > before['peak_kib'] * (1 + threshold)
+                    and result['peak_kib'] - before['peak_kib'] > min_kib):
+                regressions.append((size, name, 'peak_kib', before['peak_kib'], result['peak_kib']))
+    return regressions
+
+
+def compare(args) -> int:
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+
+    regressions = compare_results(baseline, current, args.threshold, args.min_ms)
+    for size, name, metric, before, after in regressions:
+        print(f"REGRESSION {size} {name} {metric}: {before} -> {after}")
+    print(f"Regressions: {len(regressions)}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the service layer against generated databases')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks and write the results as JSON')
+    run_parser.add_argument('--sizes', nargs='+', choices=list(DATASETS), default=list(DATASETS),
+                            help='Datasets to run against (default: all)')
+    run_parser.add_argument('--iterations', type=int, default=20, help='Timed calls per case (default: 20)')
+    run_parser.add_argument('--warmup', type=int, default=2, help='Untimed calls per case first (default: 2)')
+    run_parser.add_argument('--filter', nargs='*', help='Only run cases whose name contains one of these')
+    run_parser.add_argument('--output', default=str(project_root / 'benchmarks' / 'results' / 'latest.json'),
+                            help='JSON file to write (default: benchmarks/results/latest.json)')
+
+    compare_parser = commands.add_parser('compare', help='Flag regressions against a baseline')
+    compare_parser.add_argument('baseline', help='Baseline JSON file')
+    compare_parser.add_argument('current', help='JSON file of the run to judge')
+    compare_parser.add_argument('--threshold', type=float, default=0.25,
+                                help='Allowed growth as a fraction (default: 0.25)')
+    compare_parser.add_argument('--min-ms', type=float, default=0.2,
+                                help='Latency growth below this is noise (default: 0.2)')
+
+    args = parser.parse_args()
+    for name in ('output', 'baseline', 'current'):
+        if getattr(args, name, None):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    # The schema is read relative to the project root
+    os.chdir(project_root)
+    return run(args) if args.command == 'run' else compare(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,6 +19,7 @@ class Config:
     # Application settings
     SECRET_KEY: str = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     DEBUG: bool = False
+    ADMIN_USERNAMES: set = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}  # May review flagged prices
     
     # Database settings
     DATABASE: str = os.environ.get('DATABASE') or 'application.db'
@@ -29,10 +30,53 @@ class Config:
     UPLOAD_FOLDER: str = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     ALLOWED_EXTENSIONS: set = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'txt'}
     
+    # Storage backend settings
+    STORAGE_BACKEND: str = os.environ.get('STORAGE_BACKEND') or 'local'  # 'local' or 's3'
+    S3_BUCKET: Optional[str] = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL: Optional[str] = os.environ.get('S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+    S3_REGION: Optional[str] = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID: Optional[str] = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY: Optional[str] = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_URL_EXPIRY: int = 300  # Presigned download URLs are valid for 5 minutes
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024  # Larger files are uploaded in parts
+    S3_MULTIPART_CHUNKSIZE: int = 8 * 1024 * 1024
+    
+    # File preview settings
+    PREVIEW_ENABLED: bool = True
+    PREVIEW_FORMAT: str = 'webp'  # Falls back to JPEG if Pillow lacks WebP support
+    PREVIEW_MAX_SIZE: int = 320  # Longest edge in pixels
+    PREVIEW_WORKERS: int = int(os.environ.get('PREVIEW_WORKERS', 2))  # 0 generates inline
+    PREVIEW_CACHE_MAX_AGE: int = 365 * 24 * 3600  # Previews are immutable
+    
+    # Deletion worker settings
+    DELETION_BATCH_SIZE: int = 500  # Dependent jobs removed per transaction
+    DELETION_WORKER_INTERVAL: int = 60  # Seconds between runs when idle
+    DELETION_MAX_ATTEMPTS: int = 5  # Failed purges of a row before it is left in the queue
+    
+    # Price statistics and analytics settings
+    PRICE_STATS_MIN_SAMPLES: int = 5  # Fewer prices than this are not shown as a distribution
+    JOB_CHANGES_WORKER_INTERVAL: int = 60  # Seconds between change log runs when no job changed
+    JOBS_SNAPSHOT_DIR: str = os.environ.get('JOBS_SNAPSHOT_DIR') or 'snapshots/jobs'
+    JOBS_SNAPSHOT_MIN_AGE: int = 60  # Refresh the snapshot at most this often
+    JOBS_SNAPSHOT_MAX_SEGMENTS: int = 16  # Compact the snapshot's segments into a new base beyond this many
+    JOBS_SNAPSHOT_COMPACT_RATIO: float = 0.25  # Or once the segments hold this fraction of the base's rows
+    JOBS_SNAPSHOT_PART_GRACE: int = 600  # Seconds before a part no version names is removed
+    LEADERBOARD_CONFIDENCE_Z: float = 1.96  # Wilson bound of leaderboard scores; higher favours more ratings
+    PRICE_ANOMALY_Z: float = 3.5  # Log-rate z-score beyond which a price is queued for review
+    PRICE_ANOMALY_MIN_SAMPLES: int = 20  # Rates of a trade needed before its prices are screened
+    PRICE_ANOMALY_TOTAL_RATIO: float = 2.0  # Largest factor between a total and its fees plus rate times time
+    
+    # Chunked upload settings
+    UPLOAD_CHUNK_SIZE: int = 4 * 1024 * 1024  # Must stay below MAX_CONTENT_LENGTH
+    UPLOAD_MAX_SIZE: int = 200 * 1024 * 1024  # Largest file accepted in chunks
+    UPLOAD_SESSION_TTL: int = 24 * 3600  # Abandoned uploads are removed after this
+    
     # Session settings
     SESSION_PERMANENT: bool = False
-    SESSION_TYPE: str = 'filesystem'
-    SESSION_FILE_DIR: str = os.environ.get('SESSION_FILE_DIR') or 'flask_session'
+    SESSION_TYPE: str = os.environ.get('SESSION_TYPE') or 'database'  # 'database', 'cookie' or a Flask-Session type
+    SESSION_FILE_DIR: str = os.environ.get('SESSION_FILE_DIR') or 'flask_session'  # Only for SESSION_TYPE 'filesystem'
+    SESSION_REFRESH_INTERVAL: int = 300  # Unchanged sessions have their expiry pushed back at most this often
+    SESSION_SWEEP_INTERVAL: int = 600  # Seconds between removals of expired sessions
     
     # CSRF settings
     WTF_CSRF_ENABLED: bool = True
@@ -41,12 +85,38 @@ class Config:
     # Logging settings
     LOG_LEVEL: str = os.environ.get('LOG_LEVEL') or 'INFO'
     LOG_FILE: str = os.environ.get('LOG_FILE') or 'logs/app.log'
-    LOG_MAX_BYTES: int = 10240
-    LOG_BACKUP_COUNT: int = 10
+    LOG_FORMAT: str = os.environ.get('LOG_FORMAT') or 'json'  # 'json' or 'text'
+    LOG_MAX_BYTES: int = 50 * 1024 * 1024  # Rotate at this size...
+    LOG_ROTATE_INTERVAL: int = 24 * 3600  # ...or after this many seconds, whichever comes first
+    LOG_BACKUP_COUNT: int = 14
+    
+    # Metrics settings (need prometheus-client; set PROMETHEUS_MULTIPROC_DIR under gunicorn)
+    METRICS_ENABLED: bool = False  # Record request metrics and serve /metrics
+    METRICS_TOKEN: Optional[str] = os.environ.get('METRICS_TOKEN')  # Bearer token scrapers must send; required unless DEBUG
+    
+    # Profiling settings (admins can also profile any request with ?__profile=1 or ?__profile=pstats)
+    PROFILE_SAMPLE_RATE: float = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # Share of requests watched
+    PROFILE_SLOW_MS: float = float(os.environ.get('PROFILE_SLOW_MS', 1000))  # Watched requests slower than this are written
+    PROFILE_INTERVAL_MS: float = 5  # Between stack samples
+    PROFILE_DIR: str = os.environ.get('PROFILE_DIR') or 'logs/profiles'
+    PROFILE_KEEP: int = 200  # Newest profiles kept
     
     # Security settings
     PASSWORD_MIN_LENGTH: int = 6
+    PASSWORD_HASH_METHOD: str = 'pbkdf2:sha256:600000'  # Werkzeug method as stored in hashes; others are upgraded at login
+    PASSWORD_HASH_WORKERS: int = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))  # Hashing processes, 0 to hash in the request thread
     MAX_LOGIN_ATTEMPTS: int = 5
+    
+    # Rate limit settings; buckets are shared by all workers through the database
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: dict = {  # Scope -> (requests, seconds to allow them again)
+        'login': (MAX_LOGIN_ATTEMPTS, 300),  # Failed logins per address
+        'register': (5, 3600),  # Registrations per address
+        'search': (60, 60),  # Searches and search exports per user
+        'invitation': (20, 3600),  # Invitations sent per user
+    }
+    RATE_LIMIT_EXPIRY_INTERVAL: int = 300  # Seconds between removals of refilled buckets
+    TRUSTED_PROXIES: int = int(os.environ.get('TRUSTED_PROXIES', '0'))  # Proxies setting X-Forwarded-For, e.g. 1 behind nginx
     SESSION_TIMEOUT: int = 3600  # 1 hour
     
     # Pagination settings
@@ -82,6 +152,7 @@ class DevelopmentConfig(Config):
     DEBUG: bool = True
     DATABASE: str = 'development.db'
     LOG_LEVEL: str = 'DEBUG'
+    METRICS_ENABLED: bool = True
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -92,6 +163,7 @@ class ProductionConfig(Config):
     SESSION_TIMEOUT: int = 86400  # 24 hours
     PASSWORD_MIN_LENGTH: int = 8
     MAX_LOGIN_ATTEMPTS: int = 3
+    RATE_LIMITS: dict = {**Config.RATE_LIMITS, 'login': (MAX_LOGIN_ATTEMPTS, 300)}
 
 class TestingConfig(Config):
     """Testing configuration."""
@@ -100,6 +172,7 @@ class TestingConfig(Config):
     DATABASE: str = ':memory:'
     WTF_CSRF_ENABLED: bool = False
     LOG_LEVEL: str = 'DEBUG'
+    PREVIEW_WORKERS: int = 0
 
 def get_config(config_name: Optional[str] = None) -> Config:
     """
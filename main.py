@@ -3,10 +3,8 @@ from flask import Flask, g, render_template, request, session, current_app, redi
 from flask_session import Session
 from flask_wtf.csrf import CSRFProtect
 from flask_babel import Babel
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
-import logging
-from logging.handlers import RotatingFileHandler
-from pathlib import Path
 
 # Import configuration
 from config import get_config
@@ -51,9 +49,6 @@ def create_app(config_name: str = None):
     # Get configuration
     config = get_config(config_name)
     
-    # DEBUG: Print which database is being used
-    print(f"Using database: {config.DATABASE_PATH}")
-    
     # Create Flask app
     app = Flask(__name__)
     
@@ -62,6 +57,7 @@ def create_app(config_name: str = None):
     
     # Configure logging
     setup_logging(app, config)
+    app.logger.info(f"Using database: {config.DATABASE_PATH}")
     
     # Initialize extensions
     setup_extensions(app, config)
@@ -75,28 +71,20 @@ def create_app(config_name: str = None):
     # Register database teardown
     register_database_teardown(app)
     
+    # Register request metrics and the /metrics endpoint
+    register_metrics(app)
+    
+    # Register request profiling
+    register_profiling(app)
+    
     return app
 
 def setup_logging(app: Flask, config):
     """Configure application logging."""
-    # Ensure logs directory exists
-    log_dir = Path(config.LOG_FILE).parent
-    log_dir.mkdir(exist_ok=True)
-    
-    # Configure file handler
-    file_handler = RotatingFileHandler(
-        config.LOG_FILE, 
-        maxBytes=config.LOG_MAX_BYTES, 
-        backupCount=config.LOG_BACKUP_COUNT
-    )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
-    file_handler.setLevel(getattr(logging, config.LOG_LEVEL))
-    
-    # Add handler to app logger
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(getattr(logging, config.LOG_LEVEL))
+    from app.structured_logging import setup_logging as setup_queue_logging
+    
+    # Records are queued on the request thread and written by a listener thread
+    setup_queue_logging(app, config)
     app.logger.info('Application startup')
 
 def setup_extensions(app: Flask, config):
@@ -104,8 +92,16 @@ def setup_extensions(app: Flask, config):
     # Initialize CSRF protection
     csrf = CSRFProtect(app)
     
-    # Initialize session
-    Session(app)
+    # Initialize session storage; signed cookies ('cookie') are Flask's own
+    if config.SESSION_TYPE == 'database':
+        from app.services import session_service
+        session_service.init_app(app)
+    elif config.SESSION_TYPE != 'cookie':
+        Session(app)
+    
+    # Take client addresses, which rate limits are keyed by, from the proxies in front
+    if config.TRUSTED_PROXIES:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.TRUSTED_PROXIES, x_proto=config.TRUSTED_PROXIES)
     
     # Initialize Babel for internationalization with locale selector
     babel.init_app(app, locale_selector=locale_selector)
@@ -137,6 +133,7 @@ def register_blueprints(app: Flask):
     from app.routes.search import search_bp
     from app.routes.profile import profile_bp
     from app.routes.main import main_bp
+    from app.routes.uploads import uploads_bp
     
     # Register blueprints
     app.register_blueprint(auth_bp)
@@ -146,6 +143,7 @@ def register_blueprints(app: Flask):
     app.register_blueprint(search_bp)
     app.register_blueprint(profile_bp)
     app.register_blueprint(main_bp)
+    app.register_blueprint(uploads_bp)
 
 def register_error_handlers(app: Flask):
     """Register centralized error handlers."""
@@ -161,12 +159,18 @@ def register_database_teardown(app: Flask):
         db_service = get_db_service()
         db_service.close_connection()
 
+def register_metrics(app: Flask):
+    """Register Prometheus request metrics, if prometheus-client is installed."""
+    from app.services import metrics_service
+    metrics_service.init_app(app)
+
+def register_profiling(app: Flask):
+    """Register profiling of sampled and admin-requested requests."""
+    from app.services import profiling_service
+    profiling_service.init_app(app)
+
 # Create app instance
 app = create_app()
 
-@app.before_request
-def before_request():
-    pass
-
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Dataset Generation Script
+Builds a database of synthetic users, groups, tradesmen, jobs and quotes for
+performance work. The same seed, sizes and end date always build the same
+database, apart from the salt of the shared password hash.
+
+Prices follow a log-normal spread around a typical rate per trade, with a
+per-tradesman premium and a yearly drift, in the shapes users actually enter
+(hourly, daily or total only, with optional call-out and materials fees).
+Rows are bulk loaded with executemany in large transactions, with the jobs
+indexes and change-log trigger dropped for the load and restored afterwards.
+
+The change log is left empty and without cursors, so the app rebuilds its
+derived tables on the first worker run; --derive rebuilds them here instead.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Get the project root directory (parent of scripts directory)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# Typical hourly rate of each trade in euros
+TRADE_RATES = {
+    'Carpenter': 45,
+    'Electrician': 55,
+    'Gardener': 28,
+    'General Builder': 42,
+    'HVAC': 60,
+    'Mason': 45,
+    'Painter / Plasterer': 35,
+    'Plumber': 52,
+    'Roofer': 48,
+    'Tiler': 40,
+}
+
+TRADE_TITLES = {
+    'Carpenter': ['Fit kitchen units', 'Hang doors', 'Build decking', 'Repair staircase'],
+    'Electrician': ['Rewire house', 'Replace consumer unit', 'Install lighting', 'Add sockets'],
+    'Gardener': ['Cut hedges', 'Lay turf', 'Clear garden', 'Prune trees'],
+    'General Builder': ['Build extension', 'Knock through wall', 'Repair garage', 'Renovate bathroom'],
+    'HVAC': ['Service boiler', 'Install heat pump', 'Fit air conditioning', 'Balance radiators'],
+    'Mason': ['Repoint wall', 'Build garden wall', 'Repair chimney', 'Lay patio'],
+    'Painter / Plasterer': ['Paint living room', 'Skim ceiling', 'Paint exterior', 'Plaster bedroom'],
+    'Plumber': ['Fix leak', 'Replace boiler', 'Fit bathroom suite', 'Unblock drain'],
+    'Roofer': ['Replace tiles', 'Fix gutters', 'Repair flat roof', 'Reseal flashing'],
+    'Tiler': ['Tile bathroom', 'Tile kitchen floor', 'Regrout shower', 'Tile splashback'],
+}
+
+FIRST_NAMES = ['James', 'Mary', 'Ahmed', 'Olivia', 'Piotr', 'Amelia', 'Liam', 'Chloe', 'Noah', 'Priya',
+               'Jack', 'Sofia', 'Oscar', 'Grace', 'Mateo', 'Isla', 'Ewan', 'Freya', 'Kofi', 'Lucy']
+FAMILY_NAMES = ['Smith', 'Jones', 'Taylor', 'Brown', 'Khan', 'Wilson', 'Evans', 'Nowak', 'Walker', 'Patel',
+                'Wright', 'Murphy', 'Hughes', 'Edwards', 'Green', 'Hall', 'Wood', 'Clarke', 'Mensah', 'Roberts']
+
+# Postcode areas the synthetic districts are spread over, with their rough centres
+POSTCODE_AREAS = {
+    'B': (52.48, -1.90), 'BS': (51.45, -2.59), 'CF': (51.48, -3.18), 'E': (51.53, -0.03),
+    'EH': (55.95, -3.19), 'G': (55.86, -4.25), 'L': (53.41, -2.98), 'LS': (53.80, -1.55),
+    'M': (53.48, -2.24), 'N': (51.57, -0.11), 'NE': (54.97, -1.61), 'NW': (51.55, -0.18),
+    'S': (53.38, -1.47), 'SE': (51.47, -0.06), 'SW': (51.46, -0.17), 'W': (51.51, -0.21),
+}
+POSTCODE_LETTERS = 'ABDEFGHJLNPQRSTUWXYZ'
+
+# Shares of jobs recorded as hourly, daily or total-only prices
+PRICE_SHAPES = (0.5, 0.25, 0.25)
+RATINGS = (1, 2, 3, 4, 5)
+RATING_WEIGHTS = (0.03, 0.05, 0.12, 0.35, 0.45)
+QUOTE_STATUSES = ('pending', 'accepted', 'declined')
+QUOTE_STATUS_WEIGHTS = (0.3, 0.4, 0.3)
+YEARLY_PRICE_DRIFT = 0.03
+
+JOB_COLUMNS = (
+    'user_id', 'tradesman_id', 'type', 'date_started', 'date_finished', 'date_requested', 'date_received',
+    'title', 'description', 'call_out_fee', 'materials_fee', 'hourly_rate', 'hours_worked',
+    'hours_estimated', 'daily_rate', 'days_worked', 'days_estimated', 'total_cost', 'total_quote',
+    'rating', 'status', 'effective_labour_cost', 'effective_hourly_rate', 'materials_share',
+)
+
+
+def _nullable(values, present=None, cast=float):
+    """Python values of an array for executemany, None where NaN or not present."""
+    values = np.asarray(values)
+    if present is None:
+        present = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(len(values), dtype=bool)
+    return [cast(value) if keep else None for value, keep in zip(values.tolist(), present.tolist())]
+
+
+def _days(start: date, offsets) -> list:
+    """ISO dates a number of days after start, as entered through the date inputs."""
+    return [(start + timedelta(days=offset)).isoformat() for offset in offsets.tolist()]
+
+
+class DatasetGenerator:
+    """Deterministic generator of a synthetic database of the given sizes."""
+
+    def __init__(self, connection: sqlite3.Connection, seed: int = 42, end_date: date = None,
+                 years: int = 5, batch_size: int = 100000):
+        self.conn = connection
+        self.rng = np.random.default_rng(seed)
+        self.end_date = end_date or date.today()
+        self.start_date = self.end_date - timedelta(days=365 * years)
+        self.batch_size = batch_size
+        self.postcodes = []
+
+    def _bulk_insert(self, table: str, columns, rows) -> int:
+        """Insert rows in transactions of batch_size rows."""
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        inserted = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                inserted += self._write(query, batch)
+                batch = []
+        return inserted + self._write(query, batch)
+
+    def _write(self, query: str, batch) -> int:
+        if batch:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(query, batch)
+            self.conn.execute("COMMIT")
+        return len(batch)
+
+    def generate_postcodes(self, districts: int, per_district: int = 50) -> int:
+        """Postcodes with coordinates, so the location indexes fill as rows are inserted."""
+        areas = list(POSTCODE_AREAS)
+        rows = []
+        for number in range(districts):
+            area = areas[number % len(areas)]
+            district = f"{area}{number // len(areas) + 1}"
+            centre_lat, centre_lon = POSTCODE_AREAS[area]
+            lat = centre_lat + self.rng.normal(0, 0.05)
+            lon = centre_lon + self.rng.normal(0, 0.08)
+            rows.append((district, lat, lon))
+            for _ in range(per_district):
+                inward = (f"{self.rng.integers(0, 10)}"
+                          f"{POSTCODE_LETTERS[self.rng.integers(0, 20)]}{POSTCODE_LETTERS[self.rng.integers(0, 20)]}")
+                self.postcodes.append(f"{district} {inward}")
+                rows.append((f"{district}{inward}", lat + self.rng.normal(0, 0.005), lon + self.rng.normal(0, 0.008)))
+        self._write("INSERT OR REPLACE INTO postcodes (postcode, latitude, longitude) VALUES (?, ?, ?)", rows)
+        return len(self.postcodes)
+
+    def _postcode_sample(self, n: int) -> list:
+        picks = self.rng.integers(0, len(self.postcodes), n).tolist()
+        return [self.postcodes[pick] for pick in picks]
+
+    def _dates(self, n: int) -> list:
+        """Random dates in the generated history, for columns that default to the load time."""
+        return _days(self.start_date, self.rng.integers(0, (self.end_date - self.start_date).days, n))
+
+    def _names(self, n: int):
+        first = self.rng.integers(0, len(FIRST_NAMES), n).tolist()
+        family = self.rng.integers(0, len(FAMILY_NAMES), n).tolist()
+        return [FIRST_NAMES[i] for i in first], [FAMILY_NAMES[i] for i in family]
+
+    def generate_users(self, count: int, password_hash: str) -> int:
+        firstnames, lastnames = self._names(count)
+        postcodes = self._postcode_sample(count)
+        rows = (
+            (f"user{i}", firstnames[i - 1], lastnames[i - 1], f"user{i}@example.com", postcodes[i - 1], password_hash)
+            for i in range(1, count + 1)
+        )
+        return self._bulk_insert('users', ('username', 'firstname', 'lastname', 'email', 'postcode', 'hash'), rows)
+
+    def generate_groups(self, count: int, users: int, density: float):
+        """Groups, each joined by about density of all users; the first member created it."""
+        postcodes = self._postcode_sample(count)
+        created = self._dates(count)
+        self._bulk_insert('groups', ('name', 'postcode', 'created_at'), (
+            (f"{postcodes[i].split()[0]} Neighbours {i + 1}", postcodes[i], created[i]) for i in range(count)
+        ))
+
+        user_groups = {}
+        memberships = []
+        sizes = self.rng.binomial(users, density, count)
+        for group_id, size in enumerate(sizes.tolist(), start=1):
+            members = (self.rng.choice(users, size=max(size, 1), replace=False) + 1).tolist()
+            for position, user_id in enumerate(members):
+                memberships.append((user_id, group_id, 'creator' if position == 0 else 'member'))
+                user_groups.setdefault(user_id, []).append(group_id)
+        self._bulk_insert('user_groups', ('user_id', 'group_id', 'status'), memberships)
+        return len(memberships), user_groups
+
+    def generate_tradesmen(self, users: int, per_user: float, user_groups, share_rate: float = 0.3):
+        """
+        Tradesmen added by each user, some shared with the user's groups.
+
+        Returns:
+            tuple: (owner user id, trade index, price premium) arrays, one entry per tradesman
+        """
+        counts = self.rng.poisson(per_user, users)
+        owners = np.repeat(np.arange(1, users + 1), counts)
+        n = len(owners)
+        trades = self.rng.integers(0, len(TRADE_RATES), n)
+        premiums = self.rng.lognormal(0, 0.2, n)
+        first_names, family_names = self._names(n)
+        postcodes = self._postcode_sample(n)
+        has_company = (self.rng.random(n) < 0.4).tolist()
+        trade_names = list(TRADE_RATES)
+
+        self._bulk_insert('tradesmen', (
+            'trade', 'first_name', 'family_name', 'company_name', 'address', 'postcode', 'phone_number', 'email'
+        ), (
+            (trade_names[trades[i]], first_names[i], family_names[i],
+             f"{family_names[i]} {trade_names[trades[i]]}s Ltd" if has_company[i] else None,
+             f"{i % 200 + 1} High Street", postcodes[i], f"07{i:09d}", f"tradesman{i + 1}@example.com")
+            for i in range(n)
+        ))
+        added = self._dates(n)
+        self._bulk_insert('user_tradesmen', ('user_id', 'tradesman_id', 'date_added'), (
+            (int(owners[i]), i + 1, added[i]) for i in range(n)
+        ))
+
+        shares = self.rng.random(n) < share_rate
+        self._bulk_insert('group_tradesmen', ('group_id', 'tradesman_id'), (
+            (group_id, i + 1)
+            for i in np.flatnonzero(shares).tolist()
+            for group_id in user_groups.get(int(owners[i]), ())
+        ))
+        return owners, trades, premiums
+
+    def generate_jobs(self, owners, trades, premiums, per_tradesman: float, quote_share: float) -> int:
+        """Jobs and quotes of every tradesman, in batches of about batch_size rows."""
+        counts = self.rng.poisson(per_tradesman, len(owners))
+        # Tradesmen per batch, so every batch holds about batch_size jobs
+        per_batch = max(int(self.batch_size / max(per_tradesman, 1)), 1)
+        inserted = 0
+        for first in range(0, len(owners), per_batch):
+            tradesman_index = np.repeat(np.arange(first, min(first + per_batch, len(owners))),
+                                        counts[first:first + per_batch])
+            if len(tradesman_index):
+                columns = self._job_columns(tradesman_index, owners, trades, premiums, quote_share)
+                inserted += self._bulk_insert('jobs', JOB_COLUMNS, zip(*(columns[name] for name in JOB_COLUMNS)))
+        return inserted
+
+    def _job_columns(self, tradesman_index, owners, trades, premiums, quote_share):
+        """One list per JOB_COLUMNS name for the jobs of the given tradesmen."""
+        from app.services.effective_cost_service import effective_costs, DERIVED_COLUMNS
+
+        n = len(tradesman_index)
+        rng = self.rng
+        trade = trades[tradesman_index]
+        is_quote = rng.random(n) < quote_share
+        shape = rng.choice(3, size=n, p=PRICE_SHAPES)
+        hourly, daily, total_only = shape == 0, shape == 1, shape == 2
+        # Total-only prices record the time half of the time
+        timed = hourly | (total_only & (rng.random(n) < 0.5))
+
+        span = (self.end_date - self.start_date).days
+        start_offset = rng.integers(0, span, n)
+        years_ago = (span - start_offset) / 365
+        typical = np.array(list(TRADE_RATES.values()), dtype=np.float64)[trade]
+        rate = typical * premiums[tradesman_index] * rng.lognormal(0, 0.15, n) / (1 + YEARLY_PRICE_DRIFT) ** years_ago
+
+        hours = np.maximum(np.round(rng.lognormal(np.log(6), 0.6, n), 1), 0.5)
+        days = (1 + rng.poisson(2, n)).astype(np.float64)
+        hourly_rate = np.where(hourly, np.round(rate), np.nan)
+        daily_rate = np.where(daily, np.round(rate * 8 * 0.9), np.nan)
+        labour = np.where(daily, daily_rate * days, np.round(rate) * hours)
+        call_out = np.where(rng.random(n) < 0.3, np.round(rate * rng.uniform(0.5, 1.5, n)), np.nan)
+        materials = np.where(rng.random(n) < 0.5, np.round(labour * rng.uniform(0.1, 1.0, n)), np.nan)
+        total = np.round(labour + np.nan_to_num(call_out) + np.nan_to_num(materials))
+        hours = np.where(timed, hours, np.nan)
+        days = np.where(daily, days, np.nan)
+
+        duration = np.where(daily, np.nan_to_num(days), np.ceil(np.nan_to_num(hours) / 8)).astype(np.int64)
+        duration += rng.integers(0, 3, n)
+        ratings = rng.choice(RATINGS, size=n, p=RATING_WEIGHTS)
+        rated = ~is_quote & (rng.random(n) < 0.8)
+        statuses = np.array(QUOTE_STATUSES)[rng.choice(len(QUOTE_STATUSES), size=n, p=QUOTE_STATUS_WEIGHTS)]
+        title_picks = rng.integers(0, 4, n)
+        received = start_offset + rng.integers(1, 15, n)
+        trade_names = list(TRADE_RATES)
+        types = np.where(is_quote, 'quote', 'job')
+        nan = np.full(n, np.nan)
+
+        derived = effective_costs({
+            'type': types, 'call_out_fee': call_out, 'materials_fee': materials,
+            'hourly_rate': hourly_rate, 'daily_rate': daily_rate,
+            'hours_worked': np.where(is_quote, nan, hours), 'days_worked': np.where(is_quote, nan, days),
+            'total_cost': np.where(is_quote, nan, total),
+            'hours_estimated': np.where(is_quote, hours, nan), 'days_estimated': np.where(is_quote, days, nan),
+            'total_quote': np.where(is_quote, total, nan),
+        })
+
+        columns = {
+            'user_id': owners[tradesman_index].tolist(),
+            'tradesman_id': (tradesman_index + 1).tolist(),
+            'type': types.tolist(),
+            'date_started': _nullable(_days(self.start_date, start_offset), ~is_quote, str),
+            'date_finished': _nullable(_days(self.start_date, start_offset + duration), ~is_quote, str),
+            'date_requested': _nullable(_days(self.start_date, start_offset), is_quote, str),
+            'date_received': _nullable(_days(self.start_date, received), is_quote, str),
+            'title': [TRADE_TITLES[trade_names[t]][p] for t, p in zip(trade.tolist(), title_picks.tolist())],
+            'description': ['Generated for benchmarking'] * n,
+            'call_out_fee': _nullable(call_out, cast=int),
+            'materials_fee': _nullable(materials, cast=int),
+            'hourly_rate': _nullable(hourly_rate, cast=int),
+            'hours_worked': _nullable(hours, ~is_quote & timed),
+            'hours_estimated': _nullable(hours, is_quote & timed),
+            'daily_rate': _nullable(daily_rate, cast=int),
+            'days_worked': _nullable(days, ~is_quote & daily),
+            'days_estimated': _nullable(days, is_quote & daily),
+            'total_cost': _nullable(total, ~is_quote, int),
+            'total_quote': _nullable(total, is_quote, int),
+            'rating': _nullable(ratings, rated, int),
+            'status': np.where(is_quote, statuses, 'pending').tolist(),
+        }
+        for name in DERIVED_COLUMNS:
+            columns[name] = _nullable(np.round(derived[name], 4))
+        return columns
+
+
+@contextmanager
+def _bulk_load(conn: sqlite3.Connection, table: str, triggers=()):
+    """Drop a table's indexes and the given triggers for a load and restore them afterwards."""
+    dropped = conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = ? AND sql IS NOT NULL AND (type = 'index' OR name IN ({}))
+    """.format(', '.join('?' * len(triggers))), (table, *triggers)).fetchall()
+    for kind, name, _ in dropped:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    try:
+        yield
+    finally:
+        for _, _, sql in dropped:
+            conn.execute(sql)
+
+
+def generate_dataset(database_path: str, seed: int = 42, users: int = 1000, groups: int = 50,
+                     membership_density: float = 0.02, tradesmen_per_user: float = 2.0,
+                     jobs_per_tradesman: float = 20.0, quote_share: float = 0.3, districts: int = 200,
+                     years: int = 5, end_date: date = None, batch_size: int = 100000) -> dict:
+    """
+    Create a database at database_path and fill it with synthetic data.
+
+    Returns:
+        dict: Number of rows generated per table
+    """
+    from werkzeug.security import generate_password_hash
+    from app.services.database import DatabaseService
+
+    schema = DatabaseService(database_path)
+    schema.init_db()
+    schema.close_connection()
+
+    conn = sqlite3.connect(database_path, isolation_level=None)
+    # Nothing to recover if a build is interrupted, so skip the journal and fsyncs
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")
+    try:
+        generator = DatasetGenerator(conn, seed, end_date, years, batch_size)
+        counts = {'postcodes': generator.generate_postcodes(districts)}
+        # Every generated user shares one password, 'password', hashed once
+        counts['users'] = generator.generate_users(users, generate_password_hash('password'))
+        counts['user_groups'], user_groups = generator.generate_groups(groups, users, membership_density)
+        counts['groups'] = groups
+        owners, trades, premiums = generator.generate_tradesmen(users, tradesmen_per_user, user_groups)
+        counts['tradesmen'] = len(owners)
+        # Consumers without a cursor rebuild from the jobs table, so the load needs no change log
+        with _bulk_load(conn, 'jobs', triggers=('job_changes_insert',)):
+            counts['jobs'] = generator.generate_jobs(owners, trades, premiums, jobs_per_tradesman, quote_share)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return counts
+
+
+def derive(database_path: str) -> None:
+    """Build the price moments and every change-log consumer's tables for the database."""
+    from main import create_app
+    from app.services import database
+    from app.services.anomaly_service import AnomalyService
+    from app.services.change_log import process_job_changes
+
+    # The services share the configured database; point it at the generated one
+    database.db_service.database_path = database_path
+    app = create_app()
+    # Keep the snapshot with the database rather than over the app's own
+    app.config['JOBS_SNAPSHOT_DIR'] = os.path.join(os.path.dirname(database_path), 'snapshots', 'jobs')
+    with app.app_context():
+        AnomalyService().rebuild()
+        process_job_changes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic database for benchmarking')
+    parser.add_argument('database', help='Path of the database to create')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--users', type=int, default=1000, help='Number of users (default: 1000)')
+    parser.add_argument('--groups', type=int, default=50, help='Number of groups (default: 50)')
+    parser.add_argument('--membership-density', type=float, default=0.02,
+                        help='Share of all users in each group (default: 0.02)')
+    parser.add_argument('--tradesmen-per-user', type=float, default=2.0,
+                        help='Mean tradesmen added per user (default: 2)')
+    parser.add_argument('--jobs-per-tradesman', type=float, default=20.0,
+                        help='Mean jobs and quotes per tradesman (default: 20)')
+    parser.add_argument('--quote-share', type=float, default=0.3,
+                        help='Share of jobs that are quotes (default: 0.3)')
+    parser.add_argument('--districts', type=int, default=200,
+                        help='Number of postcode districts (default: 200)')
+    parser.add_argument('--years', type=int, default=5, help='Years of history (default: 5)')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                        help='Latest job date, YYYY-MM-DD (default: today; set it for identical rebuilds)')
+    parser.add_argument('--batch-size', type=int, default=100000,
+                        help='Rows inserted per transaction (default: 100000)')
+    parser.add_argument('--derive', action='store_true',
+                        help='Also build price statistics, indexes and leaderboards')
+    parser.add_argument('--force', action='store_true', help='Overwrite an existing database')
+    args = parser.parse_args()
+
+    database_path = os.path.abspath(args.database)
+    if os.path.exists(database_path):
+        if not args.force:
+            print(f"{database_path} exists; use --force to overwrite it")
+            return 1
+        os.remove(database_path)
+    # The schema is read relative to the project root
+    os.chdir(project_root)
+
+    started = time.perf_counter()
+    counts = generate_dataset(
+        database_path, seed=args.seed, users=args.users, groups=args.groups,
+        membership_density=args.membership_density, tradesmen_per_user=args.tradesmen_per_user,
+        jobs_per_tradesman=args.jobs_per_tradesman, quote_share=args.quote_share,
+        districts=args.districts, years=args.years, end_date=args.end_date, batch_size=args.batch_size,
+    )
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"Generated in {time.perf_counter() - started:.1f}s")
+
+    if args.derive:
+        started = time.perf_counter()
+        derive(database_path)
+        print(f"Derived tables built in {time.perf_counter() - started:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
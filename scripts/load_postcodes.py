@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Postcode Loading Script
+Loads postcode coordinates from an offline CSV dataset (for example the
+ONS Postcode Directory or a ukpostcodes.csv extract) and re-indexes where
+every tradesman, group and user is for proximity search.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Get the project root directory (parent of scripts directory)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+def main():
+    parser = argparse.ArgumentParser(description='Load postcode coordinates for proximity search')
+    parser.add_argument('csv_file', help='CSV file with postcode, latitude and longitude columns')
+    parser.add_argument('--postcode-column', default='postcode',
+                        help='Name of the postcode column (default: postcode)')
+    parser.add_argument('--latitude-column', default='latitude',
+                        help='Name of the latitude column (default: latitude)')
+    parser.add_argument('--longitude-column', default='longitude',
+                        help='Name of the longitude column (default: longitude)')
+    args = parser.parse_args()
+
+    import csv
+    from main import create_app
+    from app.services.geo_service import GeoService
+
+    app = create_app()
+    with app.app_context():
+        geo_service = GeoService()
+        with open(args.csv_file, newline='', encoding='utf-8') as f:
+            rows = (
+                {
+                    'postcode': row.get(args.postcode_column),
+                    'latitude': row.get(args.latitude_column),
+                    'longitude': row.get(args.longitude_column),
+                }
+                for row in csv.DictReader(f)
+            )
+            print(f"Postcodes loaded: {geo_service.load_postcodes(rows)}")
+        print(f"Locations indexed: {geo_service.reindex()}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
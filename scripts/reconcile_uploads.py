@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Upload Reconciliation Script
+Finds uploaded files that no job references and optionally deletes them,
+then drains any queued deletions left behind by a stopped worker and
+removes abandoned chunked uploads.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Get the project root directory (parent of scripts directory)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile the uploads folder against the jobs table')
+    parser.add_argument('--delete', action='store_true',
+                        help='Delete orphaned files instead of only listing them')
+    parser.add_argument('--min-age', type=int, default=3600,
+                        help='Ignore files younger than this many seconds (default: 3600)')
+    parser.add_argument('--drain-queue', action='store_true',
+                        help='Purge all queued deletions before scanning')
+    parser.add_argument('--expire-uploads', action='store_true',
+                        help='Remove chunked uploads older than UPLOAD_SESSION_TTL before scanning')
+    args = parser.parse_args()
+
+    from main import create_app
+    from app.services.deletion_service import DeletionService
+    from app.services.upload_service import UploadService
+
+    app = create_app()
+    with app.app_context():
+        deletion_service = DeletionService()
+
+        if args.drain_queue:
+            print(f"Queued deletions: {deletion_service.get_pending_count()}")
+            while deletion_service.process_pending():
+                pass
+
+        if args.expire_uploads:
+            print(f"Expired uploads removed: {UploadService().cleanup_expired()}")
+
+        result = deletion_service.reconcile_orphan_files(delete=args.delete, min_age_seconds=args.min_age)
+        for orphan in result['orphans']:
+            print(orphan)
+        print(f"Orphaned files: {len(result['orphans'])}")
+        if args.delete:
+            print(f"Deleted files: {result['deleted']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
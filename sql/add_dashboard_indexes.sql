@@ -0,0 +1,12 @@
+-- Migration script for the paginated dashboard endpoints
+CREATE INDEX IF NOT EXISTS idx_user_groups_group_id ON user_groups (group_id, status, user_id);
+-- Dashboard: jobs table sorted by its default and most used columns, so pages
+-- are read off the index (expressions match SECTION_QUERIES in dashboard_service)
+CREATE INDEX IF NOT EXISTS idx_jobs_dashboard_date ON jobs (COALESCE(CASE
+    WHEN type = 'job' THEN COALESCE(date_finished, date_started, date_requested)
+    WHEN type = 'quote' THEN date_received
+END, ''), id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_jobs_dashboard_cost ON jobs (
+    COALESCE(CASE WHEN type = 'job' THEN total_cost ELSE total_quote END, 0), id
+) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_jobs_dashboard_title ON jobs (LOWER(title), id) WHERE deleted_at IS NULL;
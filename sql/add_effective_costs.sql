@@ -0,0 +1,33 @@
+-- Migration script for the normalised effective-cost columns
+-- Run after add_price_sketches.sql, then fill existing rows with
+-- EffectiveCostService().backfill()
+
+ALTER TABLE jobs ADD COLUMN effective_labour_cost REAL NULL;
+ALTER TABLE jobs ADD COLUMN effective_hourly_rate REAL NULL;
+ALTER TABLE jobs ADD COLUMN materials_share REAL NULL;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_effective_hourly_rate ON jobs (type, effective_hourly_rate);
+
+-- Derived cost columns are left out: recomputing them does not change the job
+DROP TRIGGER IF EXISTS job_changes_update;
+
+CREATE TRIGGER job_changes_update AFTER UPDATE OF
+    user_id, tradesman_id, type, date_started, date_finished, date_requested, date_received,
+    title, description, call_out_fee, materials_fee, hourly_rate, hours_worked, hours_estimated,
+    daily_rate, days_worked, days_estimated, total_cost, total_quote, rating, status,
+    quote_file, job_file, deleted_at ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, prices_changed)
+    SELECT NEW.id, NEW.tradesman_id, t.trade, t.postcode,
+           NEW.tradesman_id IS NOT OLD.tradesman_id OR NEW.type IS NOT OLD.type
+           OR NEW.call_out_fee IS NOT OLD.call_out_fee OR NEW.materials_fee IS NOT OLD.materials_fee
+           OR NEW.hourly_rate IS NOT OLD.hourly_rate OR NEW.hours_worked IS NOT OLD.hours_worked
+           OR NEW.hours_estimated IS NOT OLD.hours_estimated OR NEW.daily_rate IS NOT OLD.daily_rate
+           OR NEW.days_worked IS NOT OLD.days_worked OR NEW.days_estimated IS NOT OLD.days_estimated
+           OR NEW.total_cost IS NOT OLD.total_cost OR NEW.total_quote IS NOT OLD.total_quote
+           OR NEW.deleted_at IS NOT OLD.deleted_at
+    FROM tradesmen t WHERE t.id = NEW.tradesman_id;
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode)
+    SELECT OLD.id, OLD.tradesman_id, t.trade, t.postcode FROM tradesmen t
+    WHERE t.id = OLD.tradesman_id AND OLD.tradesman_id != NEW.tradesman_id;
+END;
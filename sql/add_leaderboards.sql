@@ -0,0 +1,19 @@
+-- Migration script for the tradesman leaderboards
+-- Run after add_quote_accuracy.sql; the first LeaderboardService refresh scores every tradesman
+
+-- Wilson-adjusted rating per tradesman, rescored from job_changes by LeaderboardService.
+-- The score indexes are the leaderboards per trade, per trade and district, and overall.
+CREATE TABLE IF NOT EXISTS tradesman_scores (
+    tradesman_id INTEGER PRIMARY KEY,
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    rating_count INTEGER NOT NULL,
+    avg_rating REAL NOT NULL,
+    score REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (tradesman_id) REFERENCES tradesmen (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_tradesman_scores_trade ON tradesman_scores (trade, score DESC);
+CREATE INDEX IF NOT EXISTS idx_tradesman_scores_district ON tradesman_scores (trade, district, score DESC);
+CREATE INDEX IF NOT EXISTS idx_tradesman_scores_score ON tradesman_scores (score DESC);
@@ -0,0 +1,82 @@
+-- Migration script for postcode coordinates and proximity search
+-- Run after add_price_anomalies.sql, then scripts/load_postcodes.py to load the coordinates and index everyone
+
+-- Coordinates of postcodes, loaded from an offline dataset by scripts/load_postcodes.py.
+-- Keys are upper case without spaces; outward codes ('SW1A') hold the centroid of their postcodes.
+CREATE TABLE IF NOT EXISTS postcodes (
+    postcode TEXT PRIMARY KEY,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL
+) WITHOUT ROWID;
+
+-- R*Tree indexes of where tradesmen, groups and users are, keyed by their ids and
+-- kept up to date by the triggers below; GeoService.reindex() refills them
+CREATE VIRTUAL TABLE IF NOT EXISTS tradesman_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE VIRTUAL TABLE IF NOT EXISTS group_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE VIRTUAL TABLE IF NOT EXISTS user_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+
+CREATE TRIGGER IF NOT EXISTS tradesman_locations_insert AFTER INSERT ON tradesmen
+BEGIN
+    INSERT INTO tradesman_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tradesman_locations_update AFTER UPDATE OF postcode ON tradesmen
+BEGIN
+    DELETE FROM tradesman_locations WHERE id = OLD.id;
+    INSERT INTO tradesman_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tradesman_locations_delete AFTER DELETE ON tradesmen
+BEGIN
+    DELETE FROM tradesman_locations WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_locations_insert AFTER INSERT ON groups
+BEGIN
+    INSERT INTO group_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_locations_update AFTER UPDATE OF postcode ON groups
+BEGIN
+    DELETE FROM group_locations WHERE id = OLD.id;
+    INSERT INTO group_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_locations_delete AFTER DELETE ON groups
+BEGIN
+    DELETE FROM group_locations WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_locations_insert AFTER INSERT ON users
+BEGIN
+    INSERT INTO user_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_locations_update AFTER UPDATE OF postcode ON users
+BEGIN
+    DELETE FROM user_locations WHERE id = OLD.id;
+    INSERT INTO user_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_locations_delete AFTER DELETE ON users
+BEGIN
+    DELETE FROM user_locations WHERE id = OLD.id;
+END;
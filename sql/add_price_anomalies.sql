@@ -0,0 +1,46 @@
+-- Migration script for price anomaly screening and the review queue
+-- Run after add_price_index.sql, then AnomalyService().rebuild() to seed the moments from existing jobs
+
+-- Running count, mean and squared deviations (Welford) of log rates per trade,
+-- updated by AnomalyService as prices are saved
+CREATE TABLE IF NOT EXISTS price_moments (
+    trade TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, metric)
+);
+
+-- Implausible prices awaiting review; jobs with an open or rejected anomaly
+-- are left out of the price statistics
+CREATE TABLE IF NOT EXISTS price_anomalies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    trade TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    expected REAL NULL,
+    z_score REAL NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'accepted', 'rejected')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    reviewed_by INTEGER NULL,
+    reviewed_at TIMESTAMP NULL,
+    FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE,
+    FOREIGN KEY (reviewed_by) REFERENCES users (id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_anomalies_status ON price_anomalies (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_price_anomalies_job ON price_anomalies (job_id, status);
+
+-- A review decision brings the job back into, or keeps it out of, the statistics.
+-- Accepting adds the job's prices like a new job; nothing else changes them.
+CREATE TRIGGER IF NOT EXISTS price_anomalies_reviewed AFTER UPDATE OF status ON price_anomalies
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, operation, prices_changed)
+    SELECT j.id, j.tradesman_id, t.trade, t.postcode,
+           CASE WHEN NEW.status = 'accepted' AND OLD.status != 'accepted' THEN 'insert' ELSE 'update' END,
+           OLD.status = 'accepted' AND NEW.status != 'accepted'
+    FROM jobs j JOIN tradesmen t ON t.id = j.tradesman_id WHERE j.id = NEW.job_id;
+END;
@@ -0,0 +1,31 @@
+-- Migration script for the monthly and quarterly price index
+-- Run after add_leaderboards.sql; the first PriceIndexService refresh rolls up every job
+
+-- One row per live finished job with its month parsed from date_finished,
+-- so PriceIndexService rolls periods up without parsing dates per read
+CREATE TABLE IF NOT EXISTS price_index_facts (
+    job_id INTEGER PRIMARY KEY,
+    tradesman_id INTEGER NOT NULL,
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    month TEXT NOT NULL,
+    hourly_rate REAL NULL,
+    total_cost REAL NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_index_facts_month ON price_index_facts (trade, month);
+CREATE INDEX IF NOT EXISTS idx_price_index_facts_tradesman ON price_index_facts (tradesman_id);
+
+-- Monthly ('2024-01') and quarterly ('2024-Q1') price index per trade,
+-- per district and for all districts (''); charts read it directly
+CREATE TABLE IF NOT EXISTS price_index (
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    period_type TEXT NOT NULL CHECK (period_type IN ('month', 'quarter')),
+    period TEXT NOT NULL,
+    job_count INTEGER NOT NULL,
+    median_hourly_rate REAL NULL,
+    median_total_cost REAL NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, district, period_type, period)
+);
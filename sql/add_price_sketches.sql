@@ -0,0 +1,44 @@
+-- Migration script for quantile sketches of prices
+-- Run after add_price_stats.sql
+
+-- Sketches treat inserts and other changes differently, so log which it was
+ALTER TABLE job_changes ADD COLUMN operation TEXT NOT NULL DEFAULT 'update'
+    CHECK (operation IN ('insert', 'update', 'delete', 'tradesman'));
+-- and whether an update touched prices (set by job_changes_update, see add_effective_costs.sql)
+ALTER TABLE job_changes ADD COLUMN prices_changed INTEGER NOT NULL DEFAULT 1;
+
+DROP TRIGGER IF EXISTS job_changes_insert;
+DROP TRIGGER IF EXISTS job_changes_delete;
+DROP TRIGGER IF EXISTS job_changes_tradesman;
+
+CREATE TRIGGER job_changes_insert AFTER INSERT ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, operation)
+    SELECT NEW.id, NEW.tradesman_id, t.trade, t.postcode, 'insert' FROM tradesmen t WHERE t.id = NEW.tradesman_id;
+END;
+
+CREATE TRIGGER job_changes_delete AFTER DELETE ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, operation)
+    VALUES (OLD.id, OLD.tradesman_id,
+            (SELECT trade FROM tradesmen WHERE id = OLD.tradesman_id),
+            (SELECT postcode FROM tradesmen WHERE id = OLD.tradesman_id), 'delete');
+END;
+
+CREATE TRIGGER job_changes_tradesman AFTER UPDATE OF trade, postcode, deleted_at ON tradesmen
+BEGIN
+    INSERT INTO job_changes (tradesman_id, trade, postcode, operation) VALUES (OLD.id, OLD.trade, OLD.postcode, 'tradesman');
+    INSERT INTO job_changes (tradesman_id, trade, postcode, operation) VALUES (NEW.id, NEW.trade, NEW.postcode, 'tradesman');
+END;
+
+-- Mergeable KLL quantile sketches of the same prices, for percentile scoring.
+-- Kept per district and for all districts ('') by QuoteSketchService.
+CREATE TABLE IF NOT EXISTS price_sketches (
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sketch BLOB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, district, metric)
+);
@@ -0,0 +1,67 @@
+-- Migration script for the job change log and price statistics
+
+-- Change log of jobs, filled by triggers; consumers keep their position in change_cursors.
+-- trade and postcode are captured at change time so deleted rows can still be attributed.
+CREATE TABLE IF NOT EXISTS job_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NULL,
+    tradesman_id INTEGER NOT NULL,
+    trade TEXT NULL,
+    postcode TEXT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS change_cursors (
+    consumer TEXT PRIMARY KEY,
+    last_change_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS job_changes_insert AFTER INSERT ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode)
+    SELECT NEW.id, NEW.tradesman_id, t.trade, t.postcode FROM tradesmen t WHERE t.id = NEW.tradesman_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_changes_update AFTER UPDATE ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode)
+    SELECT NEW.id, NEW.tradesman_id, t.trade, t.postcode FROM tradesmen t WHERE t.id = NEW.tradesman_id;
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode)
+    SELECT OLD.id, OLD.tradesman_id, t.trade, t.postcode FROM tradesmen t
+    WHERE t.id = OLD.tradesman_id AND OLD.tradesman_id != NEW.tradesman_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS job_changes_delete AFTER DELETE ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode)
+    VALUES (OLD.id, OLD.tradesman_id,
+            (SELECT trade FROM tradesmen WHERE id = OLD.tradesman_id),
+            (SELECT postcode FROM tradesmen WHERE id = OLD.tradesman_id));
+END;
+
+-- A tradesman changing trade or area moves all their jobs between groups
+CREATE TRIGGER IF NOT EXISTS job_changes_tradesman AFTER UPDATE OF trade, postcode, deleted_at ON tradesmen
+BEGIN
+    INSERT INTO job_changes (tradesman_id, trade, postcode) VALUES (OLD.id, OLD.trade, OLD.postcode);
+    INSERT INTO job_changes (tradesman_id, trade, postcode) VALUES (NEW.id, NEW.trade, NEW.postcode);
+END;
+
+-- Price distributions per trade and postcode district ('' is all districts),
+-- rebuilt from job_changes by PriceStatsService
+CREATE TABLE IF NOT EXISTS price_stats (
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    p10 REAL NOT NULL,
+    p25 REAL NOT NULL,
+    median REAL NOT NULL,
+    p75 REAL NOT NULL,
+    p90 REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, district, metric)
+);
+
+
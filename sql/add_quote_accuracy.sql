@@ -0,0 +1,49 @@
+-- Migration script for quote snapshots and per-tradesman estimate accuracy
+-- Run after add_effective_costs.sql
+
+CREATE TABLE IF NOT EXISTS quote_snapshots (
+    job_id INTEGER PRIMARY KEY,
+    date_requested TEXT,
+    date_received TEXT,
+    call_out_fee INTEGER NULL,
+    materials_fee INTEGER NULL,
+    hourly_rate INTEGER NULL,
+    hours_estimated REAL NULL,
+    daily_rate INTEGER NULL,
+    days_estimated REAL NULL,
+    total_quote INTEGER NULL,
+    cost_entered INTEGER NOT NULL DEFAULT 0,
+    converted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE
+);
+
+-- A converted job is costed at its quote until the final cost is entered
+CREATE TRIGGER IF NOT EXISTS quote_snapshots_cost_entered AFTER UPDATE OF total_cost ON jobs
+WHEN NEW.total_cost IS NOT NULL
+BEGIN
+    UPDATE quote_snapshots SET cost_entered = 1 WHERE job_id = NEW.id AND cost_entered = 0;
+END;
+
+CREATE TABLE IF NOT EXISTS tradesman_accuracy (
+    tradesman_id INTEGER NOT NULL,
+    metric TEXT NOT NULL CHECK (metric IN ('cost', 'hours', 'days')),
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    median REAL NOT NULL,
+    p90 REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (tradesman_id, metric)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tradesman_accuracy_metric ON tradesman_accuracy (metric, median);
+
+-- Jobs converted before this migration kept their quoted fields on the row.
+-- Fees and rates may have been edited since, so only the estimates are recovered.
+-- Conversion copied the quote into total_cost, so only a cost that differs from
+-- it is known to have been entered.
+INSERT OR IGNORE INTO quote_snapshots (job_id, date_requested, date_received, hours_estimated, days_estimated,
+                                       total_quote, cost_entered)
+SELECT id, date_requested, date_received, hours_estimated, days_estimated,
+       total_quote, total_cost IS NOT NULL AND total_cost IS NOT total_quote
+FROM jobs
+WHERE type = 'job' AND (total_quote IS NOT NULL OR hours_estimated IS NOT NULL OR days_estimated IS NOT NULL);
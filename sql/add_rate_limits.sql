@@ -0,0 +1,14 @@
+-- Migration script for the shared rate limiter
+-- Run after add_postcode_locations.sql
+
+-- Token buckets of the rate limiter, one per scope and client (e.g. 'login:ip:203.0.113.7').
+-- Refilled lazily when used; a bucket is full, and removed, once expires_at has passed.
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    allowed INTEGER NOT NULL DEFAULT 1
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_rate_limits_expires_at ON rate_limits (expires_at);
@@ -0,0 +1,10 @@
+-- Migration script for the indexes the query budgets rely on
+-- Run after add_sessions.sql
+
+-- Dashboard: jobs by members of the user's groups, read off the index alone
+DROP INDEX IF EXISTS idx_user_groups_group_id;
+CREATE INDEX idx_user_groups_group_id ON user_groups (group_id, status, user_id);
+-- Searches filtered by trade
+CREATE INDEX IF NOT EXISTS idx_tradesmen_trade ON tradesmen (trade) WHERE deleted_at IS NULL;
+-- Who added a tradesman (the primary key leads with user_id)
+CREATE INDEX IF NOT EXISTS idx_user_tradesmen_tradesman_id ON user_tradesmen (tradesman_id);
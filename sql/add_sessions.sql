@@ -0,0 +1,12 @@
+-- Migration script for server-side sessions in the database
+-- Run after add_rate_limits.sql
+
+-- Server-side sessions, keyed by the id in the session cookie; data is tagged JSON.
+-- Rows past expires_at are ignored, and removed by the session sweeper.
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
@@ -0,0 +1,19 @@
+-- Migration script for asynchronous deletion
+-- Rows are marked deleted first and purged later by the deletion worker
+
+ALTER TABLE users ADD COLUMN deleted_at TIMESTAMP NULL;
+ALTER TABLE tradesmen ADD COLUMN deleted_at TIMESTAMP NULL;
+ALTER TABLE jobs ADD COLUMN deleted_at TIMESTAMP NULL;
+
+-- The worker deletes dependent jobs in batches by these keys
+CREATE INDEX IF NOT EXISTS idx_jobs_tradesman_id ON jobs (tradesman_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_user_id ON jobs (user_id);
+
+CREATE TABLE IF NOT EXISTS deletion_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity_type TEXT NOT NULL CHECK (entity_type IN ('job', 'tradesman', 'user')),
+    entity_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NULL
+);
@@ -0,0 +1,18 @@
+-- Migration script for chunked, resumable uploads
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    folder TEXT NOT NULL CHECK (folder IN ('quotes', 'jobs')),
+    total_size INTEGER NOT NULL,
+    received_bytes INTEGER NOT NULL DEFAULT 0,
+    expected_sha256 TEXT NULL,
+    sha256 TEXT NULL,
+    status TEXT NOT NULL CHECK (status IN ('uploading', 'complete', 'attached')) DEFAULT 'uploading',
+    stored_path TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_status ON upload_sessions (status, updated_at);
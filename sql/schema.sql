@@ -6,6 +6,25 @@ DROP TABLE IF EXISTS user_groups;
 DROP TABLE IF EXISTS group_tradesmen;
 DROP TABLE IF EXISTS user_tradesmen;
 DROP TABLE IF EXISTS group_invitations;
+DROP TABLE IF EXISTS deletion_queue;
+DROP TABLE IF EXISTS upload_sessions;
+DROP TABLE IF EXISTS job_changes;
+DROP TABLE IF EXISTS change_cursors;
+DROP TABLE IF EXISTS price_stats;
+DROP TABLE IF EXISTS price_sketches;
+DROP TABLE IF EXISTS quote_snapshots;
+DROP TABLE IF EXISTS tradesman_accuracy;
+DROP TABLE IF EXISTS tradesman_scores;
+DROP TABLE IF EXISTS price_index_facts;
+DROP TABLE IF EXISTS price_index;
+DROP TABLE IF EXISTS price_moments;
+DROP TABLE IF EXISTS price_anomalies;
+DROP TABLE IF EXISTS postcodes;
+DROP TABLE IF EXISTS tradesman_locations;
+DROP TABLE IF EXISTS group_locations;
+DROP TABLE IF EXISTS user_locations;
+DROP TABLE IF EXISTS rate_limits;
+DROP TABLE IF EXISTS sessions;
 -- DROP TABLE IF EXISTS  join_requests;
 
 
@@ -17,7 +36,8 @@ CREATE TABLE users (
     lastname TEXT NOT NULL,
     email TEXT NOT NULL UNIQUE,
     postcode TEXT NOT NULL,
-    hash TEXT NOT NULL
+    hash TEXT NOT NULL,
+    deleted_at TIMESTAMP NULL
 );
 
 -- groups
@@ -64,7 +84,8 @@ CREATE TABLE tradesmen (
     address TEXT NOT NULL,
     postcode TEXT NOT NULL,
     phone_number TEXT NOT NULL,
-    email TEXT
+    email TEXT,
+    deleted_at TIMESTAMP NULL
 );
 
 -- New junction table for group-tradesman relationship
@@ -112,9 +133,388 @@ CREATE TABLE jobs (
     status TEXT CHECK (status IN ('pending', 'accepted', 'declined')) DEFAULT 'pending',
     quote_file TEXT NULL,
     job_file TEXT NULL,
+    deleted_at TIMESTAMP NULL,
+    -- Normalised costs, derived from the price fields on every write (see EffectiveCostService)
+    effective_labour_cost REAL NULL,
+    effective_hourly_rate REAL NULL,
+    materials_share REAL NULL,
     FOREIGN KEY (tradesman_id) REFERENCES tradesmen (id) ON DELETE CASCADE
 );
 
+CREATE INDEX idx_jobs_tradesman_id ON jobs (tradesman_id);
+CREATE INDEX idx_jobs_user_id ON jobs (user_id);
+-- Search results sorted by effective rate
+CREATE INDEX idx_jobs_effective_hourly_rate ON jobs (type, effective_hourly_rate);
+-- Dashboard: jobs by members of the user's groups, read off the index alone
+CREATE INDEX idx_user_groups_group_id ON user_groups (group_id, status, user_id);
+-- Searches filtered by trade
+CREATE INDEX idx_tradesmen_trade ON tradesmen (trade) WHERE deleted_at IS NULL;
+-- Who added a tradesman (the primary key leads with user_id)
+CREATE INDEX idx_user_tradesmen_tradesman_id ON user_tradesmen (tradesman_id);
+-- Dashboard: jobs table sorted by its default and most used columns, so pages
+-- are read off the index (expressions match SECTION_QUERIES in dashboard_service)
+CREATE INDEX idx_jobs_dashboard_date ON jobs (COALESCE(CASE
+    WHEN type = 'job' THEN COALESCE(date_finished, date_started, date_requested)
+    WHEN type = 'quote' THEN date_received
+END, ''), id) WHERE deleted_at IS NULL;
+CREATE INDEX idx_jobs_dashboard_cost ON jobs (
+    COALESCE(CASE WHEN type = 'job' THEN total_cost ELSE total_quote END, 0), id
+) WHERE deleted_at IS NULL;
+CREATE INDEX idx_jobs_dashboard_title ON jobs (LOWER(title), id) WHERE deleted_at IS NULL;
+
+-- Rows marked deleted, waiting for the background worker to purge them
+CREATE TABLE deletion_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity_type TEXT NOT NULL CHECK (entity_type IN ('job', 'tradesman', 'user')),
+    entity_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NULL
+);
+
+-- Chunked, resumable uploads; finished files are attached to jobs by id
+CREATE TABLE upload_sessions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    folder TEXT NOT NULL CHECK (folder IN ('quotes', 'jobs')),
+    total_size INTEGER NOT NULL,
+    received_bytes INTEGER NOT NULL DEFAULT 0,
+    expected_sha256 TEXT NULL,
+    sha256 TEXT NULL,
+    status TEXT NOT NULL CHECK (status IN ('uploading', 'complete', 'attached')) DEFAULT 'uploading',
+    stored_path TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_upload_sessions_status ON upload_sessions (status, updated_at);
+
+-- Change log of jobs, filled by triggers; consumers keep their position in change_cursors.
+-- trade and postcode are captured at change time so deleted rows can still be attributed.
+CREATE TABLE job_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NULL,
+    tradesman_id INTEGER NOT NULL,
+    trade TEXT NULL,
+    postcode TEXT NULL,
+    operation TEXT NOT NULL DEFAULT 'update' CHECK (operation IN ('insert', 'update', 'delete', 'tradesman')),
+    -- 0 for updates that leave the job's prices as they were
+    prices_changed INTEGER NOT NULL DEFAULT 1,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE change_cursors (
+    consumer TEXT PRIMARY KEY,
+    last_change_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER job_changes_insert AFTER INSERT ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, operation)
+    SELECT NEW.id, NEW.tradesman_id, t.trade, t.postcode, 'insert' FROM tradesmen t WHERE t.id = NEW.tradesman_id;
+END;
+
+-- Derived cost columns are left out: recomputing them does not change the job
+CREATE TRIGGER job_changes_update AFTER UPDATE OF
+    user_id, tradesman_id, type, date_started, date_finished, date_requested, date_received,
+    title, description, call_out_fee, materials_fee, hourly_rate, hours_worked, hours_estimated,
+    daily_rate, days_worked, days_estimated, total_cost, total_quote, rating, status,
+    quote_file, job_file, deleted_at ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, prices_changed)
+    SELECT NEW.id, NEW.tradesman_id, t.trade, t.postcode,
+           NEW.tradesman_id IS NOT OLD.tradesman_id OR NEW.type IS NOT OLD.type
+           OR NEW.call_out_fee IS NOT OLD.call_out_fee OR NEW.materials_fee IS NOT OLD.materials_fee
+           OR NEW.hourly_rate IS NOT OLD.hourly_rate OR NEW.hours_worked IS NOT OLD.hours_worked
+           OR NEW.hours_estimated IS NOT OLD.hours_estimated OR NEW.daily_rate IS NOT OLD.daily_rate
+           OR NEW.days_worked IS NOT OLD.days_worked OR NEW.days_estimated IS NOT OLD.days_estimated
+           OR NEW.total_cost IS NOT OLD.total_cost OR NEW.total_quote IS NOT OLD.total_quote
+           OR NEW.deleted_at IS NOT OLD.deleted_at
+    FROM tradesmen t WHERE t.id = NEW.tradesman_id;
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode)
+    SELECT OLD.id, OLD.tradesman_id, t.trade, t.postcode FROM tradesmen t
+    WHERE t.id = OLD.tradesman_id AND OLD.tradesman_id != NEW.tradesman_id;
+END;
+
+CREATE TRIGGER job_changes_delete AFTER DELETE ON jobs
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, operation)
+    VALUES (OLD.id, OLD.tradesman_id,
+            (SELECT trade FROM tradesmen WHERE id = OLD.tradesman_id),
+            (SELECT postcode FROM tradesmen WHERE id = OLD.tradesman_id), 'delete');
+END;
+
+-- A tradesman changing trade or area moves all their jobs between groups
+CREATE TRIGGER job_changes_tradesman AFTER UPDATE OF trade, postcode, deleted_at ON tradesmen
+BEGIN
+    INSERT INTO job_changes (tradesman_id, trade, postcode, operation) VALUES (OLD.id, OLD.trade, OLD.postcode, 'tradesman');
+    INSERT INTO job_changes (tradesman_id, trade, postcode, operation) VALUES (NEW.id, NEW.trade, NEW.postcode, 'tradesman');
+END;
+
+-- Price distributions per trade and postcode district ('' is all districts),
+-- rebuilt from job_changes by PriceStatsService
+CREATE TABLE price_stats (
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    p10 REAL NOT NULL,
+    p25 REAL NOT NULL,
+    median REAL NOT NULL,
+    p75 REAL NOT NULL,
+    p90 REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, district, metric)
+);
+
+
+-- Mergeable KLL quantile sketches of the same prices, for percentile scoring.
+-- Kept per district and for all districts ('') by QuoteSketchService.
+CREATE TABLE price_sketches (
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sketch BLOB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, district, metric)
+);
+
+-- Quotes as they stood when converted into jobs, to compare estimates with outcomes
+CREATE TABLE quote_snapshots (
+    job_id INTEGER PRIMARY KEY,
+    date_requested TEXT,
+    date_received TEXT,
+    call_out_fee INTEGER NULL,
+    materials_fee INTEGER NULL,
+    hourly_rate INTEGER NULL,
+    hours_estimated REAL NULL,
+    daily_rate INTEGER NULL,
+    days_estimated REAL NULL,
+    total_quote INTEGER NULL,
+    cost_entered INTEGER NOT NULL DEFAULT 0,
+    converted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE
+);
+
+-- A converted job is costed at its quote until the final cost is entered
+CREATE TRIGGER quote_snapshots_cost_entered AFTER UPDATE OF total_cost ON jobs
+WHEN NEW.total_cost IS NOT NULL
+BEGIN
+    UPDATE quote_snapshots SET cost_entered = 1 WHERE job_id = NEW.id AND cost_entered = 0;
+END;
+
+-- Overrun of final cost, hours and days over the quote per tradesman,
+-- rebuilt from job_changes by AccuracyService
+CREATE TABLE tradesman_accuracy (
+    tradesman_id INTEGER NOT NULL,
+    metric TEXT NOT NULL CHECK (metric IN ('cost', 'hours', 'days')),
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    median REAL NOT NULL,
+    p90 REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (tradesman_id, metric)
+);
+
+CREATE INDEX idx_tradesman_accuracy_metric ON tradesman_accuracy (metric, median);
+
+-- Wilson-adjusted rating per tradesman, rescored from job_changes by LeaderboardService.
+-- The score indexes are the leaderboards per trade, per trade and district, and overall.
+CREATE TABLE tradesman_scores (
+    tradesman_id INTEGER PRIMARY KEY,
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    rating_count INTEGER NOT NULL,
+    avg_rating REAL NOT NULL,
+    score REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (tradesman_id) REFERENCES tradesmen (id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_tradesman_scores_trade ON tradesman_scores (trade, score DESC);
+CREATE INDEX idx_tradesman_scores_district ON tradesman_scores (trade, district, score DESC);
+CREATE INDEX idx_tradesman_scores_score ON tradesman_scores (score DESC);
+
+-- One row per live finished job with its month parsed from date_finished,
+-- so PriceIndexService rolls periods up without parsing dates per read
+CREATE TABLE price_index_facts (
+    job_id INTEGER PRIMARY KEY,
+    tradesman_id INTEGER NOT NULL,
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    month TEXT NOT NULL,
+    hourly_rate REAL NULL,
+    total_cost REAL NULL
+);
+
+CREATE INDEX idx_price_index_facts_month ON price_index_facts (trade, month);
+CREATE INDEX idx_price_index_facts_tradesman ON price_index_facts (tradesman_id);
+
+-- Monthly ('2024-01') and quarterly ('2024-Q1') price index per trade,
+-- per district and for all districts (''); charts read it directly
+CREATE TABLE price_index (
+    trade TEXT NOT NULL,
+    district TEXT NOT NULL,
+    period_type TEXT NOT NULL CHECK (period_type IN ('month', 'quarter')),
+    period TEXT NOT NULL,
+    job_count INTEGER NOT NULL,
+    median_hourly_rate REAL NULL,
+    median_total_cost REAL NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, district, period_type, period)
+);
+
+-- Running count, mean and squared deviations (Welford) of log rates per trade,
+-- updated by AnomalyService as prices are saved
+CREATE TABLE price_moments (
+    trade TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (trade, metric)
+);
+
+-- Implausible prices awaiting review; jobs with an open or rejected anomaly
+-- are left out of the price statistics
+CREATE TABLE price_anomalies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    trade TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    expected REAL NULL,
+    z_score REAL NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'accepted', 'rejected')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    reviewed_by INTEGER NULL,
+    reviewed_at TIMESTAMP NULL,
+    FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE CASCADE,
+    FOREIGN KEY (reviewed_by) REFERENCES users (id) ON DELETE SET NULL
+);
+
+CREATE INDEX idx_price_anomalies_status ON price_anomalies (status, created_at);
+CREATE INDEX idx_price_anomalies_job ON price_anomalies (job_id, status);
+
+-- A review decision brings the job back into, or keeps it out of, the statistics.
+-- Accepting adds the job's prices like a new job; nothing else changes them.
+CREATE TRIGGER price_anomalies_reviewed AFTER UPDATE OF status ON price_anomalies
+BEGIN
+    INSERT INTO job_changes (job_id, tradesman_id, trade, postcode, operation, prices_changed)
+    SELECT j.id, j.tradesman_id, t.trade, t.postcode,
+           CASE WHEN NEW.status = 'accepted' AND OLD.status != 'accepted' THEN 'insert' ELSE 'update' END,
+           OLD.status = 'accepted' AND NEW.status != 'accepted'
+    FROM jobs j JOIN tradesmen t ON t.id = j.tradesman_id WHERE j.id = NEW.job_id;
+END;
+
+-- Coordinates of postcodes, loaded from an offline dataset by scripts/load_postcodes.py.
+-- Keys are upper case without spaces; outward codes ('SW1A') hold the centroid of their postcodes.
+CREATE TABLE postcodes (
+    postcode TEXT PRIMARY KEY,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL
+) WITHOUT ROWID;
+
+-- R*Tree indexes of where tradesmen, groups and users are, keyed by their ids and
+-- kept up to date by the triggers below; GeoService.reindex() refills them
+CREATE VIRTUAL TABLE tradesman_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE VIRTUAL TABLE group_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE VIRTUAL TABLE user_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+
+CREATE TRIGGER tradesman_locations_insert AFTER INSERT ON tradesmen
+BEGIN
+    INSERT INTO tradesman_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER tradesman_locations_update AFTER UPDATE OF postcode ON tradesmen
+BEGIN
+    DELETE FROM tradesman_locations WHERE id = OLD.id;
+    INSERT INTO tradesman_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER tradesman_locations_delete AFTER DELETE ON tradesmen
+BEGIN
+    DELETE FROM tradesman_locations WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER group_locations_insert AFTER INSERT ON groups
+BEGIN
+    INSERT INTO group_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER group_locations_update AFTER UPDATE OF postcode ON groups
+BEGIN
+    DELETE FROM group_locations WHERE id = OLD.id;
+    INSERT INTO group_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER group_locations_delete AFTER DELETE ON groups
+BEGIN
+    DELETE FROM group_locations WHERE id = OLD.id;
+END;
+
+CREATE TRIGGER user_locations_insert AFTER INSERT ON users
+BEGIN
+    INSERT INTO user_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER user_locations_update AFTER UPDATE OF postcode ON users
+BEGIN
+    DELETE FROM user_locations WHERE id = OLD.id;
+    INSERT INTO user_locations (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT NEW.id, latitude, latitude, longitude, longitude FROM postcodes
+    WHERE postcode IN (upper(replace(NEW.postcode, ' ', '')), substr(upper(replace(NEW.postcode, ' ', '')), 1, length(upper(replace(NEW.postcode, ' ', ''))) - 3))
+    ORDER BY length(postcode) DESC LIMIT 1;
+END;
+
+CREATE TRIGGER user_locations_delete AFTER DELETE ON users
+BEGIN
+    DELETE FROM user_locations WHERE id = OLD.id;
+END;
+
+-- Token buckets of the rate limiter, one per scope and client (e.g. 'login:ip:203.0.113.7').
+-- Refilled lazily when used; a bucket is full, and removed, once expires_at has passed.
+CREATE TABLE rate_limits (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    allowed INTEGER NOT NULL DEFAULT 1
+) WITHOUT ROWID;
+
+CREATE INDEX idx_rate_limits_expires_at ON rate_limits (expires_at);
+
+-- Server-side sessions, keyed by the id in the session cookie; data is tagged JSON.
+-- Rows past expires_at are ignored, and removed by the session sweeper.
+CREATE TABLE sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX idx_sessions_expires_at ON sessions (expires_at);
+
 
 -- -- New table for requests to join a table; for now keep simple; don't store old requests
 -- CREATE TABLE join_requests (
@@ -128,4 +528,3 @@ CREATE TABLE jobs (
 --     UNIQUE (user_id, group_id)
 -- );
 
-
@@ -0,0 +1,124 @@
+// Chunked, resumable uploads for file inputs marked with data-chunked-upload.
+// The file starts uploading as soon as it is picked, while the user fills in the
+// rest of the form; on submit only the upload id is posted.
+(function () {
+    const MAX_RETRIES = 5;
+
+    function csrfToken(form) {
+        const input = form && form.querySelector('input[name="csrf_token"]');
+        return input ? input.value : '';
+    }
+
+    async function request(method, url, token, body, headers) {
+        const response = await fetch(url, {
+            method: method,
+            credentials: 'same-origin',
+            headers: Object.assign({
+                'X-CSRFToken': token,
+                'X-Requested-With': 'XMLHttpRequest'
+            }, headers || {}),
+            body: body
+        });
+        const data = response.status === 204 ? null : await response.json();
+        return { ok: response.ok, status: response.status, data: data };
+    }
+
+    async function uploadFile(file, folder, token, onProgress) {
+        let created = await request('POST', '/api/uploads', token, JSON.stringify({
+            filename: file.name,
+            total_size: file.size,
+            folder: folder
+        }), { 'Content-Type': 'application/json' });
+        if (!created.ok) {
+            throw new Error(created.data ? created.data.message : 'Upload failed');
+        }
+
+        let upload = created.data;
+        let retries = 0;
+        while (upload.status === 'uploading') {
+            const chunk = file.slice(upload.offset, upload.offset + upload.chunk_size);
+            let result;
+            try {
+                result = await request('PUT', upload.url, token, chunk, {
+                    'Content-Type': 'application/octet-stream',
+                    'Upload-Offset': String(upload.offset)
+                });
+            } catch (networkError) {
+                result = { ok: false, status: 0 };
+            }
+
+            if (result.ok) {
+                upload = result.data;
+                retries = 0;
+                onProgress(upload.offset / upload.total_size);
+                continue;
+            }
+            if (result.status >= 400 && result.status < 500 && result.status !== 409) {
+                throw new Error(result.data ? result.data.message : 'Upload failed');
+            }
+            if (++retries > MAX_RETRIES) {
+                throw new Error('Upload interrupted');
+            }
+            // Connection dropped or offset mismatch: ask the server where to resume
+            await new Promise(resolve => setTimeout(resolve, 500 * retries));
+            const status = await request('GET', upload.url, token);
+            if (status.ok) {
+                upload = status.data;
+            }
+        }
+        return upload;
+    }
+
+    function setupInput(input) {
+        const form = input.form;
+        const hidden = document.createElement('input');
+        hidden.type = 'hidden';
+        hidden.name = input.name + '_upload_id';
+        input.insertAdjacentElement('afterend', hidden);
+
+        let pending = null;
+        input.addEventListener('change', () => {
+            const file = input.files[0];
+            hidden.value = '';
+            if (!file) {
+                return;
+            }
+            const label = document.getElementById(input.id + '_name');
+            pending = uploadFile(file, input.dataset.chunkedUpload, csrfToken(form), fraction => {
+                if (label) {
+                    label.textContent = file.name + ' (' + Math.round(fraction * 100) + '%)';
+                }
+            }).then(upload => {
+                hidden.value = upload.id;
+                // The bytes are already on the server; don't send them again
+                input.value = '';
+                if (label) {
+                    label.textContent = file.name;
+                }
+            }).catch(error => {
+                // Fall back to the regular multipart upload
+                if (label) {
+                    label.textContent = file.name + ' (' + error.message + ')';
+                }
+            }).finally(() => {
+                pending = null;
+            });
+        });
+
+        if (form) {
+            form.addEventListener('submit', event => {
+                if (pending) {
+                    event.preventDefault();
+                    pending.then(() => form.submit());
+                }
+            });
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        if (!window.fetch || !window.Blob || !Blob.prototype.slice) {
+            return;
+        }
+        document.querySelectorAll('input[type="file"][data-chunked-upload]').forEach(setupInput);
+    });
+})();
@@ -4,8 +4,9 @@
 
 class DashboardManager {
     constructor() {
+        this.serverTables = {};
         this.initializeTables();
-        this.initializeRowInteractions();
+        this.initializeRowInteractions(document);
         this.initializeSorting();
         this.initializeResponsiveBehavior();
     }
@@ -24,56 +25,41 @@ class DashboardManager {
      * Setup individual table with enhanced functionality
      */
     setupTable(table) {
-        const tableId = table.id;
-        const clickableRows = table.querySelectorAll('tr.clickable');
-        
-        clickableRows.forEach(row => {
-            row.addEventListener('click', (e) => {
-                // Don't trigger if clicking on links or buttons
-                if (e.target.tagName === 'A' || e.target.tagName === 'BUTTON' || 
-                    e.target.closest('a') || e.target.closest('button')) {
-                    return;
-                }
-                
-                this.handleRowClick(row, tableId);
-            });
+        // Delegate so rows loaded later are clickable too
+        table.addEventListener('click', (e) => {
+            const row = e.target.closest('tr.clickable');
+            if (!row) return;
+
+            // Don't trigger if clicking on links or buttons
+            if (e.target.tagName === 'A' || e.target.tagName === 'BUTTON' || 
+                e.target.closest('a') || e.target.closest('button')) {
+                return;
+            }
+            
+            this.handleRowClick(row);
         });
+
+        if (table.dataset.source) {
+            this.serverTables[table.id] = new ServerTable(table, this);
+        }
     }
 
     /**
      * Handle row click events
      */
-    handleRowClick(row, tableId) {
-        const dataId = row.dataset[`${tableId.replace('-table', '')}Id`];
-        
-        if (!dataId) return;
-
-        // Determine the appropriate URL based on table type
-        let url;
-        if (tableId === 'tradesmen-table') {
-            url = `/tradesmen/${dataId}`;
-        } else if (tableId === 'jobs-table') {
-            // Check if it's a job or quote
-            const iconElement = row.querySelector('.icon-circle i');
-            if (iconElement && iconElement.classList.contains('fa-hammer')) {
-                url = `/jobs/${dataId}`;
-            } else {
-                url = `/quotes/${dataId}`;
-            }
-        } else if (tableId === 'groups-table') {
-            url = `/groups/${dataId}`;
-        }
-
-        if (url) {
-            window.location.href = url;
+    handleRowClick(row) {
+        // Every row links to its detail page from the first cell with a link
+        const link = row.querySelector('a');
+        if (link) {
+            window.location.href = link.href;
         }
     }
 
     /**
-     * Initialize row interaction effects
+     * Initialize row interaction effects for the rows under root
      */
-    initializeRowInteractions() {
-        const clickableRows = document.querySelectorAll('tr.clickable');
+    initializeRowInteractions(root) {
+        const clickableRows = root.querySelectorAll('tr.clickable');
         
         clickableRows.forEach(row => {
             // Add hover effects
@@ -117,6 +103,13 @@ class DashboardManager {
         const table = clickedHeader.closest('table');
         const column = clickedHeader.dataset.column;
         const dataType = clickedHeader.dataset.type;
+
+        // Paginated tables are sorted by the server, only the loaded rows are in the DOM
+        if (this.serverTables[table.id]) {
+            this.serverTables[table.id].toggleSort(column);
+            return;
+        }
+
         const currentDirection = clickedHeader.dataset.sortDirection || 'none';
         
         // Clear previous sort indicators
@@ -282,6 +275,197 @@ class DashboardManager {
     }
 }
 
+/**
+ * A dashboard table backed by a JSON endpoint.
+ *
+ * Sorting goes back to the server, further pages are fetched by keyset cursor
+ * as the user scrolls, and with virtual scrolling only a window of rows around
+ * the viewport is kept in the DOM.
+ */
+class ServerTable {
+    constructor(table, dashboard) {
+        this.table = table;
+        this.dashboard = dashboard;
+        this.tbody = table.querySelector('tbody');
+        this.container = table.closest('.table-responsive') || table.parentElement;
+        this.source = table.dataset.source;
+        this.sort = table.dataset.sort;
+        this.order = table.dataset.order;
+        this.nextCursor = table.dataset.nextCursor || null;
+        this.pageSize = parseInt(table.dataset.pageSize, 10) || 10;
+        this.lazy = table.dataset.lazy === 'true';
+        this.virtual = table.dataset.virtual === 'true';
+        this.maxVisibleRows = parseInt(table.dataset.maxVisibleRows, 10) || 50;
+        this.loading = false;
+        this.request = 0;
+
+        this.rows = Array.from(this.tbody.querySelectorAll('tr'));
+        this.rowHeight = 0;
+        this.windowStart = 0;
+
+        this.updateSortIndicators();
+        this.setupLoading();
+    }
+
+    setupLoading() {
+        // Without lazy loading a button fetches the next page on demand
+        this.moreButton = document.createElement('button');
+        this.moreButton.type = 'button';
+        this.moreButton.className = 'btn btn-link w-100 server-table-more';
+        this.moreButton.textContent = 'Show more';
+        this.moreButton.addEventListener('click', () => this.loadMore());
+        this.container.insertAdjacentElement('afterend', this.moreButton);
+
+        if (this.virtual) {
+            this.container.classList.add('virtual-scroll');
+            this.container.addEventListener('scroll', () => this.onScroll(), { passive: true });
+        } else if (this.lazy && 'IntersectionObserver' in window) {
+            this.observer = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    this.loadMore();
+                }
+            }, { rootMargin: '200px' });
+            this.observer.observe(this.moreButton);
+        }
+        this.updateMoreButton();
+    }
+
+    updateMoreButton() {
+        this.moreButton.hidden = !this.nextCursor;
+    }
+
+    updateSortIndicators() {
+        this.table.querySelectorAll('.sortable-header').forEach(header => {
+            const active = header.dataset.column === this.sort;
+            header.classList.toggle('sort-asc', active && this.order === 'asc');
+            header.classList.toggle('sort-desc', active && this.order === 'desc');
+            header.dataset.sortDirection = active ? this.order : 'none';
+        });
+
+        // Exports follow the order the table is shown in
+        document.querySelectorAll(`[data-export-for="${this.table.id}"] a`).forEach(link => {
+            const url = new URL(link.href, window.location.origin);
+            url.searchParams.set('sort', this.sort);
+            url.searchParams.set('order', this.order);
+            link.href = url.toString();
+        });
+    }
+
+    toggleSort(column) {
+        const order = column === this.sort && this.order === 'asc' ? 'desc' : 'asc';
+        this.fetchPage({ sort: column, order: order }, true);
+    }
+
+    loadMore() {
+        if (!this.nextCursor || this.loading) return;
+        this.fetchPage({ sort: this.sort, order: this.order, cursor: this.nextCursor }, false);
+    }
+
+    async fetchPage(params, replace) {
+        const request = ++this.request;
+        this.loading = true;
+        const query = new URLSearchParams(Object.assign({ limit: this.pageSize }, params));
+        try {
+            const response = await fetch(`${this.source}?${query}`, {
+                credentials: 'same-origin',
+                headers: { 'X-Requested-With': 'XMLHttpRequest' }
+            });
+            if (!response.ok) return;
+            const page = await response.json();
+            // A newer sort superseded this request
+            if (request !== this.request) return;
+
+            this.sort = page.sort;
+            this.order = page.order;
+            this.nextCursor = page.next_cursor;
+            this.updateSortIndicators();
+            this.appendRows(page.html, replace);
+            this.updateMoreButton();
+        } finally {
+            if (request === this.request) {
+                this.loading = false;
+            }
+        }
+    }
+
+    appendRows(html, replace) {
+        const template = document.createElement('template');
+        template.innerHTML = html.trim();
+        const rows = Array.from(template.content.querySelectorAll('tr'));
+
+        // Format and decorate once, while the rows are still detached
+        if (typeof formatAllDateCells === 'function') formatAllDateCells(template.content);
+        if (typeof formatAllNumericCells === 'function') formatAllNumericCells(template.content);
+        this.dashboard.initializeRowInteractions(template.content);
+
+        if (replace) {
+            this.rows = rows;
+            this.container.scrollTop = 0;
+            this.windowStart = 0;
+        } else {
+            this.rows = this.rows.concat(rows);
+        }
+
+        if (this.virtual) {
+            this.renderWindow(true);
+        } else {
+            if (replace) this.tbody.replaceChildren();
+            rows.forEach(row => this.tbody.appendChild(row));
+        }
+    }
+
+    onScroll() {
+        if (this.scrollScheduled) return;
+        this.scrollScheduled = true;
+        window.requestAnimationFrame(() => {
+            this.scrollScheduled = false;
+            this.renderWindow(false);
+
+            // Prefetch the next page before the user reaches the end
+            const remaining = this.container.scrollHeight - this.container.scrollTop - this.container.clientHeight;
+            if (this.lazy && remaining < this.container.clientHeight) {
+                this.loadMore();
+            }
+        });
+    }
+
+    spacer(height) {
+        const row = document.createElement('tr');
+        row.className = 'virtual-spacer';
+        row.setAttribute('aria-hidden', 'true');
+        const cell = document.createElement('td');
+        cell.colSpan = this.table.querySelectorAll('thead th').length;
+        cell.style.height = `${height}px`;
+        row.appendChild(cell);
+        return row;
+    }
+
+    /**
+     * Keep only maxVisibleRows rows around the viewport in the DOM, with
+     * spacer rows standing in for the rest so the scrollbar stays accurate.
+     */
+    renderWindow(force) {
+        if (!this.rowHeight && this.rows.length) {
+            this.tbody.replaceChildren(this.rows[0]);
+            this.rowHeight = this.rows[0].getBoundingClientRect().height || 48;
+        }
+        const rowHeight = this.rowHeight || 48;
+        const visible = Math.ceil(this.container.clientHeight / rowHeight);
+        const buffer = Math.max(0, Math.floor((this.maxVisibleRows - visible) / 2));
+        const start = Math.max(0, Math.floor(this.container.scrollTop / rowHeight) - buffer);
+        const end = Math.min(this.rows.length, start + this.maxVisibleRows);
+
+        if (!force && start === this.windowStart && this.tbody.children.length) return;
+        this.windowStart = start;
+
+        const fragment = document.createDocumentFragment();
+        if (start > 0) fragment.appendChild(this.spacer(start * rowHeight));
+        this.rows.slice(start, end).forEach(row => fragment.appendChild(row));
+        if (end < this.rows.length) fragment.appendChild(this.spacer((this.rows.length - end) * rowHeight));
+        this.tbody.replaceChildren(fragment);
+    }
+}
+
 /**
  * Initialize dashboard when DOM is loaded
  */
@@ -1,7 +1,8 @@
 // Table sorting functionality
 function makeTableSortable(tableId) {
     const table = document.getElementById(tableId);
-    if (!table) return;
+    // Tables with a data source are sorted by the server (see dashboard.js)
+    if (!table || table.dataset.source) return;
 
     const headers = table.querySelectorAll('th.sortable-header');
     headers.forEach(header => {
@@ -117,9 +118,9 @@ document.addEventListener('DOMContentLoaded', function() {
     formatAllNumericCells();
 });
 
-// Format all date cells on the page
-function formatAllDateCells() {
-    document.querySelectorAll('.date-cell').forEach(cell => {
+// Format all date cells on the page, or under root
+function formatAllDateCells(root = document) {
+    root.querySelectorAll('.date-cell').forEach(cell => {
         const dateValue = cell.dataset.date;
         
         if (dateValue) {
@@ -128,9 +129,9 @@ function formatAllDateCells() {
     });
 }
 
-// Format all numeric cells on the page
-function formatAllNumericCells() {
-    document.querySelectorAll('td.numeric').forEach(cell => {
+// Format all numeric cells on the page, or under root
+function formatAllNumericCells(root = document) {
+    root.querySelectorAll('td.numeric').forEach(cell => {
         const text = cell.textContent.trim();
         // Check if it's a currency value (starts with €)
         if (text.startsWith('€')) {
@@ -0,0 +1,137 @@
+import pytest
+import tempfile
+import os
+from app.services.accuracy_service import AccuracyService
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestAccuracy:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['WTF_CSRF_ENABLED'] = False
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.accuracy_service = AccuracyService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            self.accurate_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", None, "1 Main St", "SW1A 2AA", "555-1234", None
+            )
+            self.overrunning_id = self.tradesman_service.create_tradesman(
+                "Plumber", "Jane", "Roe", None, "2 High St", "M1 1AE", "555-5678", None
+            )
+            for tradesman_id in (self.accurate_id, self.overrunning_id):
+                self.tradesman_service.add_user_tradesman_relationship(self.user_id, tradesman_id)
+            for final in (100, 110, 90):
+                self._finish_quote(self.accurate_id, 100, final)
+            for final in (150, 200, 300):
+                self._finish_quote(self.overrunning_id, 100, final, hours_estimated=4, hours_worked=6)
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _finish_quote(self, tradesman_id, quoted, final, hours_estimated=None, hours_worked=None):
+        quote_id = self.job_service.create_quote(self.user_id, tradesman_id, "Work", "Description",
+                                                 total_quote=quoted, hours_estimated=hours_estimated)
+        self.job_service.convert_quote_to_job(quote_id)
+        self.job_service.update_job(quote_id, total_cost=final, hours_worked=hours_worked)
+        return quote_id
+
+    def test_conversion_keeps_the_quote(self):
+        """Test that the quote survives the job being costed"""
+        job_id = self._finish_quote(self.accurate_id, 250, 400, hours_estimated=3)
+
+        job = self.job_service.get_job_by_id(job_id)
+        snapshot = self.job_service.get_quote_snapshot(job_id)
+        assert job['type'] == 'job'
+        assert job['total_cost'] == 400
+        assert snapshot['total_quote'] == 250
+        assert snapshot['hours_estimated'] == 3
+
+    def test_refresh(self):
+        """Test the overrun stats of each tradesman and metric"""
+        self.accuracy_service.refresh()
+
+        accurate = self.accuracy_service.get_accuracy(self.accurate_id)
+        overrunning = self.accuracy_service.get_accuracy(self.overrunning_id)
+        assert list(accurate) == ['cost']
+        assert accurate['cost']['median'] == 0
+        assert accurate['cost']['mean'] == pytest.approx(0)
+        assert overrunning['cost']['count'] == 3
+        assert overrunning['cost']['median'] == 1
+        assert overrunning['cost']['p90'] == pytest.approx(1.8)
+        assert overrunning['hours']['mean'] == pytest.approx(0.5)
+
+    def test_unentered_costs_are_left_out(self):
+        """Test that a converted job only counts once its final cost is entered"""
+        self.accuracy_service.refresh()
+        quote_id = self.job_service.create_quote(self.user_id, self.overrunning_id, "Work", "Description",
+                                                 total_quote=100)
+        self.job_service.convert_quote_to_job(quote_id)
+        assert self.job_service.get_job_by_id(quote_id)['total_cost'] == 100
+        assert self.job_service.get_quote_snapshot(quote_id)['cost_entered'] == 0
+        self.accuracy_service.refresh()
+        assert self.accuracy_service.get_accuracy(self.overrunning_id)['cost']['count'] == 3
+
+        # Confirming the quoted figure is an entered cost
+        self.job_service.update_job(quote_id, total_cost=100)
+        self.accuracy_service.refresh()
+        assert self.accuracy_service.get_accuracy(self.overrunning_id)['cost']['count'] == 4
+
+    def test_incremental_refresh(self):
+        """Test that only tradesmen with changed jobs are recomputed"""
+        self.accuracy_service.refresh()
+        self.db_service.execute_update(
+            "UPDATE tradesman_accuracy SET updated_at = '2000-01-01' WHERE tradesman_id = ?", (self.accurate_id,)
+        )
+
+        job_id = self._finish_quote(self.overrunning_id, 100, 100)
+        self.accuracy_service.refresh()
+        assert self.accuracy_service.get_accuracy(self.overrunning_id)['cost']['count'] == 4
+        untouched = self.db_service.execute_single_query(
+            "SELECT updated_at FROM tradesman_accuracy WHERE tradesman_id = ?", (self.accurate_id,)
+        )
+        assert untouched['updated_at'] == '2000-01-01'
+
+        self.job_service.delete_job(job_id)
+        self.accuracy_service.refresh()
+        assert self.accuracy_service.get_accuracy(self.overrunning_id)['cost']['count'] == 3
+
+    def test_shown_and_sortable(self):
+        """Test the overrun on the tradesman page and ordering tradesman searches by it"""
+        self.accuracy_service.refresh()
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        page = client.get(f'/tradesman/{self.overrunning_id}').data.decode()
+        assert 'Quote Accuracy' in page
+        assert '+100%' in page
+
+        # The overrunning tradesman has more jobs, so comes first by default
+        self._finish_quote(self.overrunning_id, 100, 400)
+        self.accuracy_service.refresh()
+        default = client.post('/search_tradesmen', data={}).data.decode()
+        by_accuracy = client.post('/search_tradesmen', data={'sort': 'accuracy'}).data.decode()
+        assert default.index('Roe') < default.index('Doe')
+        assert by_accuracy.index('Doe') < by_accuracy.index('Roe')
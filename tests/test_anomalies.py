@@ -0,0 +1,133 @@
+import pytest
+import tempfile
+import os
+import math
+from app.services.anomaly_service import AnomalyService, total_mismatch
+from app.services.price_stats_service import PriceStatsService
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestAnomalies:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['ADMIN_USERNAMES'] = {'admin'}
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.anomaly_service = AnomalyService()
+            self.price_stats_service = PriceStatsService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            self.admin_id = self.user_service.create_user("admin", "Ad", "Min", "admin@example.com", "SW1A 1AA", "password123")
+            self.tradesman_id = self.tradesman_service.create_tradesman(
+                "Plumber", "Pete", "Pipes", None, "1 Main St", "SW1A 2AA", "555-1234", None
+            )
+            self.rates = [40 + i for i in range(25)]
+            for rate in self.rates:
+                self._job(rate)
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _job(self, hourly_rate, hours_worked=10, total_cost=None):
+        return self.job_service.create_job(
+            self.user_id, self.tradesman_id, "Leak", "Description",
+            hourly_rate=hourly_rate, hours_worked=hours_worked, total_cost=total_cost
+        )
+
+    def _pending(self, job_id):
+        return self.db_service.execute_query(
+            "SELECT * FROM price_anomalies WHERE job_id = ? AND status = 'pending' ORDER BY metric", (job_id,)
+        )
+
+    def _moments(self):
+        return self.db_service.execute_single_query(
+            "SELECT * FROM price_moments WHERE trade = 'Plumber' AND metric = 'hourly_rate'"
+        )
+
+    def test_running_moments(self):
+        """Test that the running moments match the rates saved so far"""
+        logs = [math.log(rate) for rate in self.rates]
+        mean = sum(logs) / len(logs)
+        moments = self._moments()
+
+        assert moments['count'] == 25
+        assert moments['mean'] == pytest.approx(mean)
+        assert moments['m2'] == pytest.approx(sum((x - mean) ** 2 for x in logs))
+
+    def test_outlier_is_queued_and_excluded(self):
+        """Test that a rate ten times the norm is queued and kept out of the statistics"""
+        job_id = self._job(500)
+        pending = self._pending(job_id)
+
+        assert [row['metric'] for row in pending] == ['effective_hourly_rate', 'hourly_rate']
+        assert pending[1]['expected'] == pytest.approx(51, rel=0.05)
+        assert self._moments()['count'] == 25
+        assert self._pending(self._job(55)) == []
+
+        self.price_stats_service.refresh()
+        stats = self.price_stats_service.get_stats("Plumber", None, ["hourly_rate"])
+        assert stats['hourly_rate']['count'] == 26
+
+    def test_total_mismatch(self):
+        """Test totals that disagree with rate times hours"""
+        assert total_mismatch({'type': 'job', 'hourly_rate': 50, 'hours_worked': 10, 'total_cost': 550}) is None
+        assert total_mismatch({'type': 'job', 'hourly_rate': 50, 'hours_worked': 10, 'total_cost': 5000}) == (5000, 500)
+        assert total_mismatch({'type': 'quote', 'daily_rate': 400, 'days_estimated': 2,
+                               'call_out_fee': 100, 'total_quote': 300}) == (300, 900)
+        assert total_mismatch({'type': 'job', 'total_cost': 5000}) is None
+
+        job_id = self._job(50, total_cost=5000)
+        assert [row['metric'] for row in self._pending(job_id)] == ['effective_hourly_rate', 'total_cost']
+
+    def test_edit_rescreens(self):
+        """Test that fixing a flagged price clears its anomalies and counts it"""
+        job_id = self._job(500)
+        self.job_service.update_job(job_id, hourly_rate=50)
+
+        assert self._pending(job_id) == []
+        assert self._moments()['count'] == 26
+
+        self.job_service.update_job(job_id, hourly_rate=52)
+        assert self._moments()['count'] == 26
+
+    def test_review(self):
+        """Test the review queue is admin-only and that accepting counts the price"""
+        job_id = self._job(500)
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        assert client.get('/price_review').status_code == 403
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.admin_id
+        assert 'Leak' in client.get('/price_review').data.decode()
+
+        for anomaly in self._pending(job_id):
+            client.post(f"/price_review/{anomaly['id']}", data={'status': 'accepted'})
+        assert self._pending(job_id) == []
+        assert self._moments()['count'] == 26
+        assert not self.anomaly_service.review(anomaly['id'], 'rejected', self.admin_id)
+
+        self.price_stats_service.refresh()
+        assert self.price_stats_service.get_stats("Plumber", None, ["hourly_rate"])['hourly_rate']['count'] == 26
@@ -7,8 +7,12 @@ Tests services, routes, and database operations
 import unittest
 import tempfile
 import os
+import re
 import sys
+import time
+import shutil
 from datetime import datetime
+from typing import NamedTuple
 
 # Add the app directory to the path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
@@ -506,6 +510,193 @@ class TestIntegration(unittest.TestCase):
         self.assertTrue(any(job['id'] == job_id for job in user_jobs))
 
 
+
+class Budget(NamedTuple):
+    """Most a route or service method may cost on the benchmark fixture."""
+    queries: int
+    rows_scanned: int
+    ms: float
+
+
+# Service methods, named as benchmark cases, -> budget on the 10k fixture. None
+# of them may read a table in full.
+SERVICE_BUDGETS = {
+    'JobService.get_jobs_by_user': Budget(queries=1, rows_scanned=0, ms=50),
+    'JobService.get_quotes_by_user': Budget(queries=1, rows_scanned=0, ms=50),
+    'JobService.search_jobs': Budget(queries=1, rows_scanned=0, ms=100),
+    'JobService.search_quotes': Budget(queries=1, rows_scanned=0, ms=100),
+    'JobService.get_jobs_by_tradesman': Budget(queries=1, rows_scanned=0, ms=50),
+    'TradesmanService.get_tradesman_by_id': Budget(queries=1, rows_scanned=0, ms=20),
+    'TradesmanService.search_tradesmen': Budget(queries=1, rows_scanned=0, ms=50),
+    'TradesmanService.get_tradesmen_by_user': Budget(queries=1, rows_scanned=0, ms=20),
+    'TradesmanService.get_tradesmen_by_group': Budget(queries=1, rows_scanned=0, ms=20),
+    'GroupService.get_group_members': Budget(queries=1, rows_scanned=0, ms=20),
+    'GroupService.get_user_groups_with_stats': Budget(queries=1, rows_scanned=0, ms=20),
+    'GroupService.get_group_jobs_and_quotes': Budget(queries=1, rows_scanned=0, ms=50),
+    'UserService.get_user_by_username': Budget(queries=1, rows_scanned=0, ms=20),
+    'UserService.get_user_stats': Budget(queries=4, rows_scanned=0, ms=20),
+}
+
+# Rows of the full scans routes are allowed: the search forms' filter dropdowns list
+# every live trade (522 tradesmen), user with tradesmen or jobs (250 users), group
+# (12 groups) and group with jobs (130 group_tradesmen rows).
+TRADESMAN_FILTERS = 522 + 250 + 12
+JOB_FILTERS = 522 + 250 + 130
+
+# Routes, with fixture ids as format fields, -> budget on the 10k fixture. Queries include
+# loading the session and, for searches, taking a rate limit token.
+ROUTE_BUDGETS = {
+    ('GET', '/'): Budget(queries=7, rows_scanned=0, ms=200),
+    ('GET', '/view_group/{group_id}'): Budget(queries=9, rows_scanned=0, ms=200),
+    ('GET', '/tradesman/{tradesman_id}'): Budget(queries=8, rows_scanned=0, ms=200),
+    ('GET', '/search_tradesmen'): Budget(queries=4, rows_scanned=TRADESMAN_FILTERS, ms=200),
+    ('POST', '/search_tradesmen'): Budget(queries=6, rows_scanned=TRADESMAN_FILTERS, ms=300),
+    ('POST', '/search_jobs_quotes'): Budget(queries=7, rows_scanned=JOB_FILTERS, ms=1000),
+}
+
+# Timings depend on the machine, so they are only checked when asked for
+CHECK_TIME_BUDGETS = os.environ.get('BUDGET_CHECK_TIME', '').lower() in ('1', 'true', 'yes')
+
+# Transaction control is not a query
+UNCOUNTED_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|INNER\b|'
+                         r'CROSS\b|GROUP\b|ORDER\b|LIMIT\b|USING\b)(\w+))?', re.IGNORECASE)
+FULL_SCAN = re.compile(r'^SCAN (\w+)')
+AUTOMATIC_INDEX = re.compile(r'^SEARCH (\w+) USING AUTOMATIC')
+
+
+class StatementLog:
+    """Statements a connection runs while enabled, trigger bodies included."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = []
+        self.enabled = False
+        connection.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        if self.enabled and not statement.lstrip().upper().startswith(UNCOUNTED_STATEMENTS):
+            self.statements.append(statement)
+
+    def scanned_tables(self, statement):
+        """Tables EXPLAIN QUERY PLAN reads in full, scans and automatic indexes alike."""
+        # Trigger bodies are traced as comments, with nothing to explain
+        if statement.lstrip().startswith('--'):
+            return []
+        aliases = {}
+        for table, alias in TABLE_ALIAS.findall(statement):
+            aliases[table.lower()] = table.lower()
+            if alias:
+                aliases[alias.lower()] = table.lower()
+        tables = []
+        for row in self.connection.execute(f"EXPLAIN QUERY PLAN {statement}"):
+            detail = row[3]
+            match = FULL_SCAN.match(detail) or AUTOMATIC_INDEX.match(detail)
+            # Virtual tables (the location index) answer from their own index
+            if match and 'VIRTUAL TABLE' not in detail:
+                tables.append(aliases.get(match.group(1).lower(), match.group(1).lower()))
+        return tables
+
+
+class BudgetTestCase(unittest.TestCase):
+    """
+    Runs calls against a copy of the 10k benchmark dataset and fails those over budget.
+
+    Queries are counted as the benchmarks count them. Rows scanned adds up the
+    rows of every table the query plan reads in full, so a lost index shows up
+    even where the fixture is too small for it to cost time. Timings are only
+    checked with BUDGET_CHECK_TIME=1.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        from benchmarks.run_benchmarks import dataset_path
+        from benchmarks.cases import Fixture
+        from app.services import database
+        from main import create_app
+
+        cls.workdir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls.workdir, 'budget.db')
+        shutil.copyfile(dataset_path('10k'), cls.db_path)
+        # The services share the configured database; point it at the copy
+        cls.previous_path = database.db_service.database_path
+        database.db_service.database_path = cls.db_path
+        cls.db_service = database.db_service
+
+        cls.app = create_app()
+        cls.app.config['TESTING'] = True
+        cls.app.config['WTF_CSRF_ENABLED'] = False
+        cls.app.config['JOBS_SNAPSHOT_DIR'] = os.path.join(cls.workdir, 'snapshots')
+        with cls.app.app_context():
+            cls.fixture = Fixture(cls.db_service)
+            cls.table_rows = {
+                row['name']: cls.db_service.execute_single_query(f"SELECT COUNT(*) AS n FROM \"{row['name']}\"")['n']
+                for row in cls.db_service.execute_query("SELECT name FROM sqlite_master WHERE type = 'table'")
+            }
+
+    @classmethod
+    def tearDownClass(cls):
+        from app.services import database
+        database.db_service.database_path = cls.previous_path
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def assertWithinBudget(self, name, call, budget):
+        """Run call once to warm up, then fail if a second run exceeds the budget."""
+        with self.app.app_context():
+            call()
+            log = StatementLog(self.db_service.get_connection())
+            log.enabled = True
+            started = time.perf_counter()
+            try:
+                result = call()
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                log.enabled = False
+            # Common table expressions and subqueries are scanned too, but hold no rows of their own
+            scanned = [table for statement in log.statements for table in log.scanned_tables(statement)
+                       if table in self.table_rows]
+            rows_scanned = sum(self.table_rows[table] for table in scanned)
+
+        self.assertLessEqual(len(log.statements), budget.queries,
+                             f"{name} ran {len(log.statements)} queries:\n" + "\n".join(log.statements))
+        self.assertLessEqual(rows_scanned, budget.rows_scanned,
+                             f"{name} scanned {rows_scanned} rows in full scans of {sorted(set(scanned))}")
+        if CHECK_TIME_BUDGETS:
+            self.assertLessEqual(elapsed, budget.ms, f"{name} took {elapsed:.1f}ms")
+        return result
+
+
+class TestServiceBudgets(BudgetTestCase):
+    """Test that service methods stay within their query, scan and time budgets"""
+
+    def test_service_budgets(self):
+        """Test every budgeted service method on the benchmark fixture"""
+        from benchmarks.cases import CASES
+        for name, budget in SERVICE_BUDGETS.items():
+            with self.subTest(method=name):
+                self.assertWithinBudget(name, CASES[name](self.fixture), budget)
+
+
+class TestRouteBudgets(BudgetTestCase):
+    """Test that routes stay within their query, scan and time budgets"""
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.fixture.user_id
+
+    def test_route_budgets(self):
+        """Test every budgeted route on the benchmark fixture"""
+        ids = {'group_id': self.fixture.group_id, 'tradesman_id': self.fixture.tradesman_id}
+        form = {'trade': self.fixture.trade}
+        for (method, path), budget in ROUTE_BUDGETS.items():
+            url = path.format(**ids)
+            with self.subTest(route=f"{method} {path}"):
+                call = lambda: self.client.open(url, method=method, data=form if method == 'POST' else None)
+                response = self.assertWithinBudget(f"{method} {path}", call, budget)
+                self.assertEqual(response.status_code, 200)
+
+
 def run_tests():
     """Run all tests"""
     # Create test suite
@@ -518,7 +709,9 @@ def run_tests():
         TestGroupService,
         TestTradesmanService,
         TestJobService,
-        TestIntegration
+        TestIntegration,
+        TestServiceBudgets,
+        TestRouteBudgets
     ]
     
     for test_class in test_classes:
@@ -0,0 +1,174 @@
+import pytest
+import tempfile
+import os
+from pathlib import Path
+from app.services.deletion_service import DeletionService
+from app.services.group_service import GroupService
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestAsyncDeletion:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database, upload folder and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+        self.upload_dir = tempfile.TemporaryDirectory()
+        
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.deletion_service = DeletionService(batch_size=2)
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+            
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "12345", "password123")
+            self.tradesman_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", "Doe Plumbing", "123 Main St", "12345", "555-1234", "john@example.com"
+            )
+            self.tradesman_service.add_user_tradesman_relationship(self.user_id, self.tradesman_id)
+            
+            yield
+        
+        self.upload_dir.cleanup()
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+    
+    def _write_upload(self, relative_path):
+        path = Path(self.upload_dir.name) / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"file contents")
+        return path
+    
+    def _create_job_with_file(self, title):
+        filename = f"jobs/{title}.pdf"
+        self._write_upload(filename)
+        return self.job_service.create_job(
+            self.user_id, self.tradesman_id, title, "Description", total_cost=100, job_file=filename
+        ), filename
+    
+    def _row_count(self, table):
+        return self.db_service.execute_single_query(f"SELECT COUNT(*) as count FROM {table}")['count']
+    
+    def test_delete_marks_row_and_queues_purge(self):
+        """Test that deleting only marks the row until the worker runs"""
+        job_id, filename = self._create_job_with_file("marked")
+        
+        assert self.job_service.delete_job(job_id) == True
+        assert self.job_service.get_job_by_id(job_id) is None
+        assert self._row_count('jobs') == 1
+        assert self.deletion_service.get_pending_count() == 1
+        assert (Path(self.upload_dir.name) / filename).exists()
+        
+        # Deleting twice doesn't queue twice
+        assert self.job_service.delete_job(job_id) == False
+        
+        self.deletion_service.process_pending()
+        assert self._row_count('jobs') == 0
+        assert self.deletion_service.get_pending_count() == 0
+        assert not (Path(self.upload_dir.name) / filename).exists()
+    
+    def test_deleted_rows_are_hidden_before_the_purge(self):
+        """Test that group pages, filters and counts leave out deleted jobs and tradesmen at once"""
+        group_service = GroupService()
+        group_id = group_service.create_group_with_creator("Street", "12345", self.user_id)
+        self.tradesman_service.add_tradesman_to_group(group_id, self.tradesman_id)
+        job_id, _ = self._create_job_with_file("hidden")
+        assert group_service.get_group_job_count(group_id) == 1
+        
+        self.job_service.delete_job(job_id)
+        assert group_service.get_group_job_count(group_id) == 0
+        assert group_service.get_group_jobs_and_quotes(group_id) == []
+        assert self.job_service.get_job_titles_for_tradesman(self.tradesman_id) == []
+        assert self.job_service.get_job_status_counts(self.tradesman_id) == {}
+        assert self.job_service.get_unique_users() == []
+        assert self.job_service.get_unique_groups() == []
+        assert self.user_service.get_user_stats(self.user_id)['jobs_count'] == 0
+        
+        self.tradesman_service.delete_tradesman(self.tradesman_id)
+        other_group_id = group_service.create_group_with_creator("Other", "12345", self.user_id)
+        assert group_service.add_user_tradesmen_to_group(self.user_id, other_group_id) == 0
+        assert self.job_service.get_unique_trades() == []
+        assert self.user_service.get_user_stats(self.user_id)['tradesmen_count'] == 0
+    
+    def test_failing_purge_does_not_block_the_queue(self, monkeypatch):
+        """Test that a row that fails to purge is retried after the others, then left alone"""
+        poison_id, _ = self._create_job_with_file("poison")
+        job_id, _ = self._create_job_with_file("healthy")
+        self.job_service.delete_job(poison_id)
+        self.job_service.delete_job(job_id)
+        
+        purge = self.deletion_service.purge
+        def failing_purge(entity_type, entity_id):
+            if entity_id == poison_id:
+                raise RuntimeError("disk on fire")
+            purge(entity_type, entity_id)
+        monkeypatch.setattr(self.deletion_service, 'purge', failing_purge)
+        
+        self.deletion_service.process_pending()
+        assert self.db_service.execute_query("SELECT id FROM jobs") == [{'id': poison_id}]
+        for _ in range(self.app.config['DELETION_MAX_ATTEMPTS'] + 2):
+            self.deletion_service.process_pending()
+        item = self.db_service.execute_single_query("SELECT * FROM deletion_queue")
+        assert item['attempts'] == self.app.config['DELETION_MAX_ATTEMPTS']
+        assert item['last_error'] == "disk on fire"
+    
+    def test_tradesman_purge_removes_jobs_in_batches(self):
+        """Test that purging a tradesman removes every job and file across several batches"""
+        files = [self._create_job_with_file(f"job{i}")[1] for i in range(5)]
+        
+        assert self.tradesman_service.delete_tradesman(self.tradesman_id) == True
+        assert self.tradesman_service.get_tradesman_by_id(self.tradesman_id) is None
+        assert self.tradesman_service.get_tradesmen_by_user(self.user_id) == []
+        
+        self.deletion_service.process_pending()
+        assert self._row_count('jobs') == 0
+        assert self._row_count('tradesmen') == 0
+        assert self._row_count('user_tradesmen') == 0
+        for filename in files:
+            assert not (Path(self.upload_dir.name) / filename).exists()
+    
+    def test_user_purge_removes_their_jobs(self):
+        """Test that purging a user removes the jobs they added"""
+        job_id, filename = self._create_job_with_file("users_job")
+        
+        assert self.user_service.delete_user(self.user_id) == True
+        assert self.user_service.get_user_by_id(self.user_id) is None
+        assert self.user_service.authenticate_user("testuser1", "password123") is None
+        
+        self.deletion_service.process_pending()
+        assert self._row_count('users') == 0
+        assert self._row_count('jobs') == 0
+        assert not (Path(self.upload_dir.name) / filename).exists()
+        # Tradesmen are shared and outlive the user who added them
+        assert self._row_count('tradesmen') == 1
+    
+    def test_orphan_file_reconciliation(self):
+        """Test that only files no job references are reported and deleted"""
+        _, referenced = self._create_job_with_file("kept")
+        self._write_upload(f"{referenced}.preview.webp")
+        self._write_upload("quotes/orphan.pdf")
+        self._write_upload("quotes/orphan.pdf.preview.jpg")
+        
+        orphans = self.deletion_service.find_orphan_files(min_age_seconds=0)
+        assert orphans == ["quotes/orphan.pdf", "quotes/orphan.pdf.preview.jpg"]
+        
+        # Fresh files are skipped by default, they may belong to an in-flight upload
+        assert self.deletion_service.find_orphan_files() == []
+        
+        result = self.deletion_service.reconcile_orphan_files(delete=True, min_age_seconds=0)
+        assert result['deleted'] == 2
+        assert (Path(self.upload_dir.name) / referenced).exists()
+        assert not (Path(self.upload_dir.name) / "quotes/orphan.pdf").exists()
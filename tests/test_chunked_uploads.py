@@ -0,0 +1,242 @@
+import pytest
+import tempfile
+import hashlib
+import io
+import os
+from pathlib import Path
+from app.services.upload_service import UploadService
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from app.exceptions import ValidationError, DuplicateResourceError, AuthorizationError
+from main import create_app
+
+class TestChunkedUploads:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database, upload folder and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+        self.upload_dir = tempfile.TemporaryDirectory()
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        self.app.config['UPLOAD_CHUNK_SIZE'] = 4
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.upload_service = UploadService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "12345", "password123")
+            self.other_user_id = self.user_service.create_user("testuser2", "Test", "User2", "test2@example.com", "12345", "password123")
+            self.tradesman_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", "Doe Plumbing", "123 Main St", "12345", "555-1234", "john@example.com"
+            )
+            self.tradesman_service.add_user_tradesman_relationship(self.user_id, self.tradesman_id)
+
+            yield
+
+        self.upload_dir.cleanup()
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _upload(self, content, **kwargs):
+        upload = self.upload_service.create_upload(self.user_id, "quote.pdf", len(content), 'quotes', **kwargs)
+        offset = 0
+        while offset < len(content):
+            chunk = content[offset:offset + 4]
+            upload = self.upload_service.write_chunk(upload['id'], self.user_id, offset, io.BytesIO(chunk), len(chunk))
+            offset += len(chunk)
+        return upload
+
+    def test_upload_completes_with_checksum(self):
+        """Test that a file sent in chunks is assembled and hashed"""
+        content = b"quote document contents"
+        upload = self._upload(content, expected_sha256=hashlib.sha256(content).hexdigest())
+
+        assert upload['status'] == 'complete'
+        assert upload['received_bytes'] == len(content)
+        assert upload['sha256'] == hashlib.sha256(content).hexdigest()
+        assert upload['stored_path'].startswith('quotes')
+        assert (Path(self.upload_dir.name) / upload['stored_path']).read_bytes() == content
+
+    def test_checksum_mismatch_discards_upload(self):
+        """Test that a corrupted upload is rejected"""
+        with pytest.raises(ValidationError):
+            self._upload(b"quote document", expected_sha256="0" * 64)
+
+        assert self.db_service.execute_query("SELECT * FROM upload_sessions") == []
+
+    def test_wrong_offset_is_rejected_and_resumable(self):
+        """Test that a client can resume from the offset the server reports"""
+        upload = self.upload_service.create_upload(self.user_id, "quote.pdf", 8, 'quotes')
+        self.upload_service.write_chunk(upload['id'], self.user_id, 0, io.BytesIO(b"abcd"), 4)
+
+        with pytest.raises(DuplicateResourceError):
+            self.upload_service.write_chunk(upload['id'], self.user_id, 0, io.BytesIO(b"abcd"), 4)
+
+        # Simulate another worker process picking up the next chunk
+        from app.services import upload_service as upload_module
+        upload_module._hash_states.clear()
+
+        status = self.upload_service.get_upload(upload['id'], self.user_id)
+        upload = self.upload_service.write_chunk(upload['id'], self.user_id, status['received_bytes'],
+                                                 io.BytesIO(b"efgh"), 4)
+        assert upload['status'] == 'complete'
+        assert upload['sha256'] == hashlib.sha256(b"abcdefgh").hexdigest()
+
+    @pytest.mark.parametrize('interleave', ['before_write', 'before_offset_update'])
+    def test_final_chunk_retried_on_another_process(self, monkeypatch, interleave):
+        """Test that when two processes write the last chunk, one completes and the other reports a conflict"""
+        from app.services import upload_service as upload_module
+        upload = self.upload_service.create_upload(self.user_id, "quote.pdf", 8, 'quotes')
+        self.upload_service.write_chunk(upload['id'], self.user_id, 0, io.BytesIO(b"abcd"), 4)
+        completed = []
+        retried = []
+
+        def retry_elsewhere():
+            if retried:
+                return
+            retried.append(True)
+            # The other process has its own lock for the upload
+            upload_module._upload_locks.pop(upload['id'], None)
+            completed.append(UploadService().write_chunk(upload['id'], self.user_id, 4, io.BytesIO(b"efgh"), 4))
+
+        first = UploadService()
+        if interleave == 'before_write':
+            # The other process has moved the partial file by the time this one opens it
+            running_hash = first._running_hash
+            monkeypatch.setattr(first, '_running_hash',
+                                lambda *args: (retry_elsewhere(), running_hash(*args))[1])
+        else:
+            # Both wrote the chunk; the other process moved the offset first
+            record = upload_module.metrics_service.record_upload_bytes
+            monkeypatch.setattr(upload_module.metrics_service, 'record_upload_bytes',
+                                lambda *args: (record(*args), retry_elsewhere()))
+        with pytest.raises(DuplicateResourceError):
+            first.write_chunk(upload['id'], self.user_id, 4, io.BytesIO(b"efgh"), 4)
+
+        upload = self.upload_service.get_upload(upload['id'], self.user_id)
+        assert upload['status'] == 'complete' and upload['stored_path'] == completed[0]['stored_path']
+        assert os.listdir(Path(self.upload_dir.name) / 'quotes') == [Path(upload['stored_path']).name]
+        assert (Path(self.upload_dir.name) / upload['stored_path']).read_bytes() == b"abcdefgh"
+
+        # Completing again never moves a second file
+        with pytest.raises(DuplicateResourceError):
+            self.upload_service._complete(dict(upload, status='uploading'), upload['sha256'])
+        assert self.upload_service.get_upload(upload['id'], self.user_id)['stored_path'] == upload['stored_path']
+
+    def test_incomplete_chunk_keeps_offset(self):
+        """Test that a dropped connection doesn't advance the offset"""
+        upload = self.upload_service.create_upload(self.user_id, "quote.pdf", 8, 'quotes')
+
+        with pytest.raises(ValidationError):
+            self.upload_service.write_chunk(upload['id'], self.user_id, 0, io.BytesIO(b"ab"), 4)
+
+        assert self.upload_service.get_upload(upload['id'], self.user_id)['received_bytes'] == 0
+
+    def test_rejects_invalid_uploads(self):
+        """Test validation of new upload sessions"""
+        with pytest.raises(ValidationError):
+            self.upload_service.create_upload(self.user_id, "script.exe", 10, 'quotes')
+        with pytest.raises(ValidationError):
+            self.upload_service.create_upload(self.user_id, "quote.pdf", 0, 'quotes')
+        with pytest.raises(ValidationError):
+            self.upload_service.create_upload(self.user_id, "quote.pdf", 10, 'elsewhere')
+
+    def test_other_users_cannot_access_upload(self):
+        """Test that uploads are private to their owner"""
+        upload = self.upload_service.create_upload(self.user_id, "quote.pdf", 8, 'quotes')
+
+        with pytest.raises(AuthorizationError):
+            self.upload_service.get_upload(upload['id'], self.other_user_id)
+
+    def test_attach_to_job(self):
+        """Test attaching a finished upload to a job"""
+        job_id = self.job_service.create_job(self.user_id, self.tradesman_id, "Fix sink", "Description", total_cost=100)
+        upload = self._upload(b"invoice contents")
+
+        stored_path = self.upload_service.attach_to_job(upload['id'], self.user_id, job_id, 'quote_file')
+
+        assert self.job_service.get_job_by_id(job_id)['quote_file'] == stored_path
+        assert self.upload_service.get_upload(upload['id'], self.user_id)['status'] == 'attached'
+        with pytest.raises(ValidationError):
+            self.upload_service.claim_upload(upload['id'], self.user_id)
+
+    def test_concurrent_claims_attach_once(self):
+        """Test that a claim that read the upload as complete fails once another claim won"""
+        upload = self._upload(b"invoice contents")
+        stale = self.upload_service.get_upload(upload['id'], self.user_id)
+        self.upload_service.claim_upload(upload['id'], self.user_id)
+
+        # The losing request read the row before the winner changed it
+        self.upload_service.get_upload = lambda upload_id, user_id: stale
+        with pytest.raises(ValidationError):
+            self.upload_service.claim_upload(upload['id'], self.user_id)
+
+    def test_cleanup_expired(self):
+        """Test that abandoned uploads are removed with their files"""
+        from app.services import upload_service
+        partial = self.upload_service.create_upload(self.user_id, "quote.pdf", 8, 'quotes')
+        self.upload_service.write_chunk(partial['id'], self.user_id, 0, io.BytesIO(b"half"), 4)
+        finished = self._upload(b"finished")
+        self.db_service.execute_update("UPDATE upload_sessions SET updated_at = '2000-01-01 00:00:00'")
+
+        assert partial['id'] in upload_service._upload_locks
+        assert self.upload_service.cleanup_expired() == 2
+        assert not (Path(self.upload_dir.name) / '.partial' / f"{partial['id']}.part").exists()
+        assert not (Path(self.upload_dir.name) / finished['stored_path']).exists()
+        assert partial['id'] not in upload_service._upload_locks
+        assert partial['id'] not in upload_service._hash_states
+
+    def test_upload_api_round_trip(self):
+        """Test creating, sending and resuming an upload over HTTP"""
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+
+        response = client.post('/api/uploads', json={'filename': 'quote.pdf', 'total_size': 8, 'folder': 'quotes'})
+        assert response.status_code == 201
+        upload = response.get_json()
+        assert upload['offset'] == 0
+        assert upload['chunk_size'] == 4
+
+        response = client.put(upload['url'], data=b"abcd", headers={'Upload-Offset': '0'})
+        assert response.get_json()['offset'] == 4
+
+        conflict = client.put(upload['url'], data=b"abcd", headers={'Upload-Offset': '0'})
+        assert conflict.status_code == 409
+        assert conflict.get_json()['error'] == 'DuplicateResourceError'
+
+        assert client.get(upload['url']).get_json()['offset'] == 4
+        response = client.put(upload['url'], data=b"efgh", headers={'Upload-Offset': '4'})
+        assert response.get_json()['status'] == 'complete'
+
+    def test_add_job_form_claims_upload(self):
+        """Test that the job form accepts a chunked upload id in place of a file"""
+        upload = self._upload(b"quote contents")
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+
+        response = client.post(f'/add_job/{self.tradesman_id}', data={
+            'title': 'Fix sink',
+            'description': 'Description',
+            'total_cost': '100',
+            'quote_file_upload_id': upload['id'],
+        })
+        assert response.status_code == 302
+
+        jobs = self.db_service.execute_query("SELECT quote_file FROM jobs WHERE title = 'Fix sink'")
+        assert jobs[0]['quote_file'] == upload['stored_path']
@@ -0,0 +1,158 @@
+import pytest
+import tempfile
+import os
+from app.services.dashboard_service import DashboardService
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.group_service import GroupService
+from app.services.database import DatabaseService
+from app.exceptions import ValidationError, NotFoundError
+from main import create_app
+
+class TestDashboardPagination:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.dashboard_service = DashboardService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+            self.group_service = GroupService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "12345", "password123")
+            self.member_id = self.user_service.create_user("testuser2", "Test", "User2", "test2@example.com", "12345", "password123")
+
+            self.tradesman_ids = []
+            for i, trade in enumerate(["Plumber", "Electrician", "Carpenter", "Painter", "Roofer"]):
+                tradesman_id = self.tradesman_service.create_tradesman(
+                    trade, f"First{i}", f"Family{i}", None, "123 Main St", "12345", "555-1234", None
+                )
+                self.tradesman_service.add_user_tradesman_relationship(self.user_id, tradesman_id)
+                self.tradesman_ids.append(tradesman_id)
+
+            # Costs tie in pairs so the id tiebreaker is exercised
+            for i in range(7):
+                self.job_service.create_job(
+                    self.user_id, self.tradesman_ids[i % 5], f"Job {i}", "Description",
+                    total_cost=100 * (i // 2), date_finished=f"2024-01-{i + 10:02d}", rating=(i % 5) + 1
+                )
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _all_pages(self, section, sort, order, limit=2):
+        ids = []
+        cursor = None
+        while True:
+            page = self.dashboard_service.get_page(section, self.user_id, sort, order, cursor, limit)
+            assert len(page['rows']) <= limit
+            ids.extend(row['id'] for row in page['rows'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_keyset_pages_cover_every_row_once(self):
+        """Test that walking the cursors returns each job exactly once, in order"""
+        ids = self._all_pages('jobs', 'cost', 'asc')
+
+        assert len(ids) == 7
+        assert len(set(ids)) == 7
+        costs = [self.job_service.get_job_by_id(job_id)['total_cost'] for job_id in ids]
+        assert costs == sorted(costs)
+
+    def test_descending_sort(self):
+        """Test that descending pages are the reverse of ascending ones"""
+        ascending = self._all_pages('jobs', 'date', 'asc', limit=3)
+        descending = self._all_pages('jobs', 'date', 'desc', limit=3)
+
+        assert descending == list(reversed(ascending))
+
+    def test_jobs_pages_are_read_off_the_sort_index(self):
+        """Test that the seek and ORDER BY let the sort index drive the LIMIT"""
+        # Give the planner a dashboard's worth of jobs and statistics on them
+        self.db_service.execute_transaction([
+            ("INSERT INTO jobs (user_id, tradesman_id, title, total_cost, date_finished) VALUES (?, ?, ?, ?, ?)",
+             (self.user_id, self.tradesman_ids[i % 5], f"Bulk {i}", i, f"2023-{i % 12 + 1:02d}-01"))
+            for i in range(500)
+        ])
+        self.db_service.execute_update("ANALYZE")
+        for sort, index in [('date', 'idx_jobs_dashboard_date'), ('cost', 'idx_jobs_dashboard_cost'),
+                            ('title', 'idx_jobs_dashboard_title')]:
+            query = self.dashboard_service._sorted_query('jobs', sort, 'desc', seek=True) + " LIMIT ?"
+            plan = [row['detail'] for row in self.db_service.execute_query(
+                "EXPLAIN QUERY PLAN " + query, (self.user_id, self.user_id, '', '', 0, 11)
+            )]
+            assert any(f"USING INDEX {index}" in detail for detail in plan), plan
+            assert not any("TEMP B-TREE" in detail for detail in plan), plan
+
+    def test_sort_by_aggregate_column(self):
+        """Test sorting tradesmen by their job count"""
+        ids = self._all_pages('tradesmen', 'jobs', 'desc')
+
+        counts = [row['job_count'] for row in
+                  self.dashboard_service.get_page('tradesmen', self.user_id, 'jobs', 'desc', limit=10)['rows']]
+        assert len(ids) == 5
+        assert counts == sorted(counts, reverse=True)
+
+    def test_includes_group_members_jobs(self):
+        """Test that jobs added by members of the user's groups are listed"""
+        group_id = self.group_service.create_group_with_creator("Street", "12345", self.user_id)
+        self.group_service.add_user_to_group(self.member_id, group_id, 'member')
+        member_job = self.job_service.create_job(
+            self.member_id, self.tradesman_ids[0], "Member job", "Description", total_cost=50
+        )
+
+        assert member_job in self._all_pages('jobs', 'title', 'asc')
+        assert self.dashboard_service.count('groups', self.user_id) == 1
+
+    def test_unknown_sort_falls_back_to_default(self):
+        """Test that unsortable columns use the configured default"""
+        page = self.dashboard_service.get_page('tradesmen', self.user_id, 'avatar', 'sideways')
+
+        assert page['sort'] == 'rating'
+        assert page['order'] == 'desc'
+
+    def test_invalid_input(self):
+        """Test invalid cursors and sections"""
+        with pytest.raises(ValidationError):
+            self.dashboard_service.get_page('jobs', self.user_id, cursor='not-a-cursor')
+        with pytest.raises(NotFoundError):
+            self.dashboard_service.get_page('users', self.user_id)
+
+    def test_dashboard_endpoint(self):
+        """Test the JSON endpoint and the first page rendered on the dashboard"""
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+
+        response = client.get('/api/dashboard/jobs?sort=cost&order=desc&limit=3')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['count'] == 3
+        assert data['sort'] == 'cost'
+        assert data['next_cursor']
+        assert data['html'].count('<tr') == 3
+
+        response = client.get(f"/api/dashboard/jobs?sort=cost&order=desc&limit=3&cursor={data['next_cursor']}")
+        assert response.get_json()['count'] == 3
+
+        index = client.get('/')
+        assert index.status_code == 200
+        assert b'data-source="/api/dashboard/tradesmen"' in index.data
+        assert b'data-next-cursor=' in index.data
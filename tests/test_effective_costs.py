@@ -0,0 +1,147 @@
+import pytest
+import tempfile
+import os
+import numpy as np
+from app.services.effective_cost_service import EffectiveCostService, effective_costs, derive_costs, SOURCE_COLUMNS
+from app.services.change_log import ChangeLog
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestEffectiveCosts:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['WTF_CSRF_ENABLED'] = False
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.effective_cost_service = EffectiveCostService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            self.tradesman_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", None, "1 Main St", "SW1A 2AA", "555-1234", None
+            )
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _derived(self, job_id):
+        return self.db_service.execute_single_query(
+            "SELECT effective_labour_cost, effective_hourly_rate, materials_share FROM jobs WHERE id = ?", (job_id,)
+        )
+
+    def test_effective_costs(self):
+        """Test the normaliser on each shape a price can be recorded in"""
+        rows = [
+            # Total with fees and time: labour is what was charged less the fees
+            dict(type='job', total_cost=500, call_out_fee=50, materials_fee=150, hours_worked=5),
+            # Rate times time, fees on top
+            dict(type='job', hourly_rate=40, hours_worked=3, materials_fee=30),
+            # Day rate, a day counting as eight hours
+            dict(type='job', daily_rate=200, days_worked=2),
+            # Quotes use the estimated fields
+            dict(type='quote', total_quote=300, hours_estimated=4, hours_worked=100),
+            # A rate without time is the rate itself
+            dict(type='quote', daily_rate=160),
+            # Nothing to go on
+            dict(type='job', rating=4),
+        ]
+        columns = {name: np.array([row.get(name, np.nan) for row in rows], dtype=float)
+                   for name in SOURCE_COLUMNS if name != 'type'}
+        columns['type'] = np.array([row['type'] for row in rows])
+
+        derived = effective_costs(columns)
+
+        np.testing.assert_allclose(derived['effective_labour_cost'], [300, 120, 400, 300, np.nan, np.nan])
+        np.testing.assert_allclose(derived['effective_hourly_rate'], [60, 40, 25, 75, 20, np.nan])
+        np.testing.assert_allclose(derived['materials_share'], [0.3, 0.2, np.nan, np.nan, np.nan, np.nan])
+        assert derive_costs(rows[1]) == {'effective_labour_cost': 120.0, 'effective_hourly_rate': 40.0,
+                                         'materials_share': 0.2}
+        assert derive_costs(rows[5])['effective_hourly_rate'] is None
+
+    def test_maintained_on_write(self):
+        """Test that inserts, updates and conversions keep the derived columns current"""
+        job_id = self.job_service.create_job(self.user_id, self.tradesman_id, "Leak", "Description",
+                                             hourly_rate=50, hours_worked=2)
+        assert self._derived(job_id)['effective_hourly_rate'] == 50
+
+        self.job_service.update_job(job_id, total_cost=300, materials_fee=100)
+        assert self._derived(job_id) == {'effective_labour_cost': 200, 'effective_hourly_rate': 100,
+                                         'materials_share': pytest.approx(1 / 3, abs=1e-4)}
+
+        quote_id = self.job_service.create_quote(self.user_id, self.tradesman_id, "Boiler", "Description",
+                                                 total_quote=800, days_estimated=1)
+        assert self._derived(quote_id)['effective_hourly_rate'] == 100
+        self.job_service.update_quote(quote_id, days_estimated=2)
+        assert self._derived(quote_id)['effective_hourly_rate'] == 50
+
+        # The job has no time worked yet, so it falls back to no rate rather than the estimate
+        self.job_service.convert_quote_to_job(quote_id)
+        assert self._derived(quote_id)['effective_labour_cost'] == 800
+        assert self._derived(quote_id)['effective_hourly_rate'] is None
+
+    def test_backfill_does_not_log_changes(self):
+        """Test that backfilling fills old rows without waking the change-log consumers"""
+        job_id = self.job_service.create_job(self.user_id, self.tradesman_id, "Leak", "Description", total_cost=100)
+        self.db_service.execute_update("""
+            UPDATE jobs SET effective_labour_cost = NULL, effective_hourly_rate = NULL, materials_share = NULL
+        """)
+        changes = ChangeLog('test').latest_id()
+
+        assert self.effective_cost_service.backfill(only_missing=True) == 1
+        assert self._derived(job_id)['effective_labour_cost'] == 100
+        assert ChangeLog('test').latest_id() == changes
+
+    def test_backfill_pages_through_jobs(self):
+        """Test that a backfill in small pages reaches every row once"""
+        job_ids = [self.job_service.create_job(self.user_id, self.tradesman_id, f"Job {i}", "Description",
+                                               total_cost=100 * (i + 1)) for i in range(5)]
+        self.db_service.execute_update("UPDATE jobs SET effective_labour_cost = NULL, effective_hourly_rate = NULL")
+
+        assert self.effective_cost_service.backfill(batch_size=2) == len(job_ids)
+        assert [self._derived(job_id)['effective_labour_cost'] for job_id in job_ids] == [100, 200, 300, 400, 500]
+        assert self.effective_cost_service.backfill(batch_size=2, only_missing=True) == 0
+
+    def test_search_sorted_by_effective_rate(self):
+        """Test that searches sort jobs and quotes together by effective rate, using the index"""
+        for rate in (30, 90, 60):
+            self.job_service.create_job(self.user_id, self.tradesman_id, f"Job {rate}", "Description",
+                                        hourly_rate=rate, hours_worked=1)
+            self.job_service.create_quote(self.user_id, self.tradesman_id, f"Quote {rate + 5}", "Description",
+                                          hourly_rate=rate + 5, hours_estimated=1)
+        self.job_service.create_job(self.user_id, self.tradesman_id, "Unpriced", "Description")
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        response = client.post('/search_jobs_quotes', data={'sort': 'rate_desc', 'include_jobs': 'on',
+                                                             'include_quotes': 'on'})
+
+        page = response.data.decode()
+        titles = ['Quote 95', 'Job 90', 'Quote 65', 'Job 60', 'Quote 35', 'Job 30']
+        positions = [page.index(title) for title in titles]
+        assert positions == sorted(positions)
+        assert 'Unpriced' not in page
+
+        query, params = self.job_service._search_jobs_query(trade='Plumber', sort='rate_asc')
+        plan = ' '.join(row['detail'] for row in self.db_service.execute_query(f"EXPLAIN QUERY PLAN {query}", params))
+        assert 'idx_jobs_effective_hourly_rate' in plan
+        assert 'TEMP B-TREE' not in plan
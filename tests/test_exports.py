@@ -0,0 +1,176 @@
+import pytest
+import tempfile
+import zipfile
+import csv
+import io
+import os
+import sqlite3
+import xml.etree.ElementTree as ET
+from app.services.export_service import ExportService, iter_csv, iter_xlsx, JOB_COLUMNS, field
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.group_service import GroupService
+from app.services.database import DatabaseService
+from app.config.dashboard import EXPORT_CONFIG
+from main import create_app
+
+SHEET_NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+def _read_xlsx(data):
+    """Return the sheet as a list of rows of cell texts."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        root = ET.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+    rows = []
+    for row in root.iterfind('.//s:row', SHEET_NS):
+        cells = []
+        for cell in row.iterfind('s:c', SHEET_NS):
+            text = cell.find('s:is/s:t', SHEET_NS)
+            value = cell.find('s:v', SHEET_NS)
+            cells.append(text.text if text is not None else value.text)
+        rows.append(cells)
+    return rows
+
+class TestExportWriters:
+    def test_csv_escapes_formulas(self):
+        """Test that cells that would run as formulas are neutralised"""
+        columns = [('Title', field('title')), ('Price', field('price'))]
+        data = b''.join(iter_csv([{'title': '=HYPERLINK("x")', 'price': 10}, {'title': 'Sink', 'price': None}], columns))
+
+        rows = list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+        assert rows == [['Title', 'Price'], ["'=HYPERLINK(\"x\")", '10'], ['Sink', '']]
+
+    def test_xlsx_is_valid_workbook(self):
+        """Test that the streamed workbook opens and holds every row"""
+        columns = [('Title', field('title')), ('Price', field('price'))]
+        rows = ({'title': f'Job <{i}> & co\x01', 'price': i} for i in range(1000))
+
+        chunks = list(iter_xlsx(rows, columns, 'Jobs'))
+        sheet = _read_xlsx(b''.join(chunks))
+
+        # Rows are flushed as they are written, not all at the end
+        assert len(chunks) > 3
+        assert sheet[0] == ['Title', 'Price']
+        assert sheet[1] == ['Job <0> & co', '0']
+        assert len(sheet) == 1001
+
+    def test_rows_are_consumed_lazily(self):
+        """Test that the writer pulls rows from the generator as it goes"""
+        consumed = []
+        def rows():
+            for i in range(10000):
+                consumed.append(i)
+                yield {'title': 'Job', 'price': i}
+
+        stream = ExportService.stream(rows(), [('Price', field('price'))], 'csv')
+        next(stream)
+        next(stream)
+        assert len(consumed) < 10000
+
+
+class TestExportRoutes:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+            self.group_service = GroupService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "12345", "password123")
+            self.outsider_id = self.user_service.create_user("testuser2", "Test", "User2", "test2@example.com", "12345", "password123")
+            self.tradesman_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", "Doe Plumbing", "123 Main St", "12345", "555-1234", "john@example.com"
+            )
+            self.tradesman_service.add_user_tradesman_relationship(self.user_id, self.tradesman_id)
+            self.group_id = self.group_service.create_group_with_creator("Street", "12345", self.user_id)
+            self.tradesman_service.add_tradesman_to_group(self.group_id, self.tradesman_id)
+
+            for i in range(3):
+                self.job_service.create_job(self.user_id, self.tradesman_id, f"Job {i}", "Description", total_cost=100 + i)
+            self.job_service.create_quote(self.user_id, self.tradesman_id, "Quote", "Description", total_quote=500)
+
+            self.client = self.app.test_client()
+            with self.client.session_transaction() as sess:
+                sess['user_id'] = self.user_id
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _csv_rows(self, response):
+        assert response.status_code == 200
+        assert response.is_streamed
+        return list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+
+    def test_export_jobs_quotes_csv(self):
+        """Test exporting job and quote search results"""
+        rows = self._csv_rows(self.client.get('/search_jobs_quotes/export.csv?trade=Plumber'))
+
+        assert rows[0] == [header for header, _ in JOB_COLUMNS]
+        assert [row[0] for row in rows[1:]] == ['job', 'job', 'job', 'quote']
+
+        jobs_only = self._csv_rows(self.client.get('/search_jobs_quotes/export.csv?include_quotes=off'))
+        assert len(jobs_only) == 4
+
+    def test_export_tradesmen_xlsx(self, monkeypatch):
+        """Test exporting tradesman search results as a workbook, once workbooks are switched on"""
+        assert self.client.get('/search_tradesmen/export.xlsx?search_term=Doe').status_code == 404
+        monkeypatch.setitem(EXPORT_CONFIG, 'enable_excel_export', True)
+        response = self.client.get('/search_tradesmen/export.xlsx?search_term=Doe')
+
+        assert response.status_code == 200
+        assert 'attachment; filename="tradesmen-' in response.headers['Content-Disposition']
+        sheet = _read_xlsx(response.get_data())
+        assert sheet[1][:3] == ['Plumber', 'John', 'Doe']
+
+    def test_export_group_tradesmen_members_only(self):
+        """Test that only group members can export its tradesmen"""
+        rows = self._csv_rows(self.client.get(f'/view_group/{self.group_id}/tradesmen/export.csv'))
+        assert len(rows) == 2
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.outsider_id
+        response = self.client.get(f'/view_group/{self.group_id}/tradesmen/export.csv',
+                                   headers={'X-Requested-With': 'XMLHttpRequest'})
+        assert response.status_code == 403
+
+    def test_export_rows_are_capped(self, monkeypatch):
+        """Test that exports stop at max_export_rows"""
+        monkeypatch.setitem(EXPORT_CONFIG, 'max_export_rows', 2)
+        rows = self._csv_rows(self.client.get('/search_jobs_quotes/export.csv?trade=Plumber'))
+        assert len(rows) == 3
+
+    def test_open_export_does_not_block_writes(self):
+        """Test that writes go ahead while an export's read cursor is open"""
+        with self.app.app_context():
+            rows = self.db_service.iter_query("SELECT * FROM jobs", batch_size=1)
+            next(rows)
+            writer = sqlite3.connect(self.temp_db_path, timeout=0.1)
+            writer.execute("UPDATE jobs SET total_cost = total_cost + 1")
+            writer.commit()
+            writer.close()
+            assert len(list(rows)) == 3
+
+    def test_export_dashboard_section(self):
+        """Test exporting a whole dashboard section in the requested order"""
+        rows = self._csv_rows(self.client.get('/api/dashboard/jobs/export.csv?sort=cost&order=asc'))
+
+        prices = [int(row[7]) for row in rows[1:]]
+        assert prices == sorted(prices)
+        assert self.client.get('/api/dashboard/jobs/export.pdf').status_code == 404
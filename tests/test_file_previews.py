@@ -0,0 +1,76 @@
+import io
+import pytest
+import tempfile
+from pathlib import Path
+from werkzeug.datastructures import FileStorage
+from app.services.file_service import FileService
+from app.services.preview_service import find_preview
+from main import create_app
+
+PIL = pytest.importorskip("PIL.Image")
+
+class TestFilePreviews:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up an app with a temporary upload folder"""
+        self.upload_dir = tempfile.TemporaryDirectory()
+        
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        self.app.config['PREVIEW_WORKERS'] = 0  # Generate inline so the test can check the result
+        
+        yield
+        
+        self.upload_dir.cleanup()
+    
+    def _png_upload(self, name="photo.png", size=(1200, 800)):
+        buffer = io.BytesIO()
+        PIL.new('RGB', size, color=(200, 30, 30)).save(buffer, 'PNG')
+        buffer.seek(0)
+        return FileStorage(stream=buffer, filename=name, content_type='image/png')
+    
+    def test_save_file_generates_thumbnail(self):
+        """Test that saving an image writes a downsized preview next to the blob"""
+        with self.app.test_request_context():
+            filename = FileService.save_file(self._png_upload(), 'quotes')
+        
+        preview = find_preview(Path(self.upload_dir.name) / filename)
+        assert preview is not None
+        assert preview.name.startswith(Path(filename).name)
+        with PIL.open(preview) as image:
+            assert max(image.size) == self.app.config['PREVIEW_MAX_SIZE']
+    
+    def test_non_previewable_file_has_no_preview(self):
+        """Test that text uploads are saved without a preview"""
+        upload = FileStorage(stream=io.BytesIO(b"quote details"), filename="quote.txt")
+        with self.app.test_request_context():
+            filename = FileService.save_file(upload, 'quotes')
+        
+        assert filename is not None
+        assert find_preview(Path(self.upload_dir.name) / filename) is None
+    
+    def test_delete_file_removes_preview(self):
+        """Test that deleting an upload also deletes its preview"""
+        with self.app.test_request_context():
+            filename = FileService.save_file(self._png_upload(), 'jobs')
+            assert FileService.delete_file(filename) == True
+        
+        assert find_preview(Path(self.upload_dir.name) / filename) is None
+    
+    def test_preview_route_sets_long_cache_headers(self):
+        """Test that previews are served with immutable cache headers"""
+        with self.app.test_request_context():
+            filename = FileService.save_file(self._png_upload(), 'quotes')
+        
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        
+        response = client.get(f'/previews/{filename}')
+        assert response.status_code == 200
+        assert response.cache_control.max_age == self.app.config['PREVIEW_CACHE_MAX_AGE']
+        assert response.cache_control.immutable
+        
+        missing = client.get('/previews/quotes/missing.png')
+        assert missing.status_code == 404
@@ -0,0 +1,130 @@
+import pytest
+import tempfile
+import os
+from app.helpers import distance_miles
+from app.services.geo_service import GeoService, bounding_box
+from app.services.tradesman_service import TradesmanService
+from app.services.group_service import GroupService
+from app.services.job_service import JobService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from main import create_app
+
+# Westminster, Brixton (about 3 miles away), Croydon (about 10) and Manchester (about 160)
+POSTCODES = [
+    {'postcode': 'SW1A 1AA', 'latitude': 51.5010, 'longitude': -0.1416},
+    {'postcode': 'SW1A 2AA', 'latitude': 51.5034, 'longitude': -0.1276},
+    {'postcode': 'SW9 8HE', 'latitude': 51.4613, 'longitude': -0.1156},
+    {'postcode': 'CR0 1NX', 'latitude': 51.3762, 'longitude': -0.0982},
+    {'postcode': 'M1 1AE', 'latitude': 53.4794, 'longitude': -2.2453},
+    {'postcode': 'XX1 1XX', 'latitude': '', 'longitude': ''},
+]
+
+class TestGeo:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['WTF_CSRF_ENABLED'] = False
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.geo_service = GeoService()
+            self.tradesman_service = TradesmanService()
+            self.group_service = GroupService()
+            self.job_service = JobService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            # Added before the coordinates are loaded, so only a reindex places it
+            self.early_id = self._tradesman("Early", "SW1A 2AA")
+            self.geo_service.load_postcodes(POSTCODES)
+            self.brixton_id = self._tradesman("Brixton", "SW9 8HE")
+            self.croydon_id = self._tradesman("Croydon", "cr0 1nx")
+            self.manchester_id = self._tradesman("Manchester", "M1 1AE")
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _tradesman(self, name, postcode):
+        tradesman_id = self.tradesman_service.create_tradesman(
+            "Plumber", name, "Pipes", None, "1 Main St", postcode, "555-1234", None
+        )
+        self.tradesman_service.add_user_tradesman_relationship(self.user_id, tradesman_id)
+        return tradesman_id
+
+    def _ids(self, rows):
+        return [row['id'] for row in rows]
+
+    def test_distance_and_box(self):
+        """Test the great-circle distance and that the search box encloses the circle"""
+        assert distance_miles(51.5010, -0.1416, 53.4794, -2.2453) == pytest.approx(163, abs=2)
+        assert distance_miles(None, 0, 0, 0) is None
+
+        min_lat, max_lat, min_lon, max_lon = bounding_box(51.5, -0.12, 10)
+        assert distance_miles(51.5, -0.12, max_lat, -0.12) == pytest.approx(10, rel=0.01)
+        assert distance_miles(51.5, -0.12, 51.5, max_lon) >= 10
+
+    def test_locate(self):
+        """Test exact postcodes, outward code fallback and unknown postcodes"""
+        assert self.geo_service.locate("sw9 8he") == pytest.approx((51.4613, -0.1156))
+        assert self.geo_service.locate("SW1A 9ZZ") == pytest.approx((51.5022, -0.1346))
+        assert self.geo_service.locate("ZZ9 9ZZ") is None
+        assert self.geo_service.locate("XX1 1XX") is None
+
+    def test_radius_and_nearest(self):
+        """Test radius and k-nearest queries over the location index"""
+        within = self.geo_service.within('tradesmen', "SW1A 1AA", 5)
+        assert self._ids(within) == [self.brixton_id]
+        assert within[0]['distance'] == pytest.approx(3, abs=0.5)
+
+        self.geo_service.reindex()
+        assert self._ids(self.geo_service.within('tradesmen', "SW1A 1AA", 12)) == [
+            self.early_id, self.brixton_id, self.croydon_id
+        ]
+        nearest = self.geo_service.nearest('tradesmen', "M1 1AE", k=2)
+        assert self._ids(nearest) == [self.manchester_id, self.early_id]
+        assert self.geo_service.within('users', "SW1A 1AA", 1)[0]['id'] == self.user_id
+
+    def test_index_follows_postcode_changes(self):
+        """Test that moving or deleting a tradesman updates the location index"""
+        self.tradesman_service.update_tradesman(self.manchester_id, postcode="SW1A 1AA")
+        self.db_service.execute_delete("DELETE FROM tradesmen WHERE id = ?", (self.brixton_id,))
+
+        assert self._ids(self.geo_service.within('tradesmen', "SW1A 1AA", 5)) == [self.manchester_id]
+
+    def test_searches(self):
+        """Test tradesman, quote and group searches within a radius"""
+        results = self.tradesman_service.search_tradesmen(postcode="SW1A 1AA", radius=12, sort='distance')
+        assert self._ids(results) == [self.brixton_id, self.croydon_id]
+        assert results[0]['distance'] < results[1]['distance']
+        # Without a radius the postcode is still a prefix
+        assert self._ids(self.tradesman_service.search_tradesmen(postcode="M1")) == [self.manchester_id]
+
+        self.job_service.create_quote(self.user_id, self.croydon_id, "Boiler", "Description", total_quote=900)
+        self.job_service.create_quote(self.user_id, self.manchester_id, "Boiler", "Description", total_quote=900)
+        quotes = self.job_service.search_quotes(postcode="SW1A 1AA", radius=25, sort='distance')
+        assert [quote['tradesman_id'] for quote in quotes] == [self.croydon_id]
+
+        near_id = self.group_service.create_group("Pimlico Neighbours", "SW1A 2AA")
+        self.group_service.create_group("Northern Quarter", "M1 1AE")
+        groups = self.group_service.search_groups(postcode="SW1A 1AA", radius=5)
+        assert self._ids(groups) == [near_id]
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        page = client.post('/search_tradesmen', data={'postcode': 'SW1A 1AA', 'radius': '5'}).data.decode()
+        assert 'Brixton' in page and 'Manchester' not in page
+        assert '3.' in page and 'mi)' in page
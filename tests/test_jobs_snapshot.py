@@ -0,0 +1,242 @@
+import pytest
+import tempfile
+import shutil
+import os
+import numpy as np
+from app.services.jobs_snapshot_service import JobsSnapshotService, get_jobs_snapshot
+from app.services.change_log import ChangeLog
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestJobsSnapshot:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database, snapshot directory and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+        self.snapshot_dir = tempfile.mkdtemp()
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['JOBS_SNAPSHOT_DIR'] = self.snapshot_dir
+        self.app.config['JOBS_SNAPSHOT_MIN_AGE'] = 0
+        # Keep segments around unless a test compacts them
+        self.app.config['JOBS_SNAPSHOT_COMPACT_RATIO'] = 100
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.snapshot_service = JobsSnapshotService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            self.plumber_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", None, "1 Main St", "SW1A 2AA", "555-1234", None
+            )
+            self.electrician_id = self.tradesman_service.create_tradesman(
+                "Electrician", "Jane", "Roe", None, "2 High St", "M1 1AE", "555-5678", None
+            )
+            # Estimates come from the quote a job was converted from
+            self._converted_job(self.plumber_id, dict(hours_estimated=2),
+                                dict(total_cost=200, hours_worked=4, date_finished="2024-01-15", rating=4))
+            self._converted_job(self.plumber_id, dict(hours_estimated=2),
+                                dict(total_cost=300, hours_worked=2, date_finished="2024-01-20", rating=2))
+            self._converted_job(self.electrician_id, dict(days_estimated=2),
+                                dict(total_cost=400, days_worked=1, date_finished="2024-02-03", rating=5))
+            self.job_service.create_quote(self.user_id, self.electrician_id, "Rewire", "Description",
+                                          total_quote=5000)
+
+            yield
+
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _converted_job(self, tradesman_id, estimate, outcome):
+        quote_id = self.job_service.create_quote(self.user_id, tradesman_id, "Work", "Description", **estimate)
+        self.job_service.convert_quote_to_job(quote_id)
+        self.job_service.update_job(quote_id, **outcome)
+        return quote_id
+
+    def test_first_refresh_builds_memory_mapped_columns(self):
+        """Test that the first refresh writes every live job as memory-mapped columns"""
+        assert self.snapshot_service.open() is None
+        self.snapshot_service.refresh()
+
+        snapshot = self.snapshot_service.open()
+        assert len(snapshot) == 4
+        assert isinstance(snapshot['total_cost'], np.memmap)
+        assert sorted(snapshot.decode('trade', snapshot['trade'])) == ['Electrician', 'Electrician', 'Plumber', 'Plumber']
+        assert set(snapshot.decode('district', snapshot['district'])) == {'SW1', 'M1'}
+        assert np.isnan(snapshot['total_cost']).sum() == 1
+        assert str(np.sort(snapshot['date_finished'])[0]) == '2024-01-15'
+        assert ChangeLog('jobs_snapshot').pending() == []
+
+    def test_tradesman_rows(self):
+        """Test that a tradesman's jobs are found through the base's index, or among the segments"""
+        self.snapshot_service.refresh()
+        snapshot = self.snapshot_service.open()
+
+        rows = snapshot.tradesman_rows(self.electrician_id)
+        assert list(snapshot['tradesman_id'][rows]) == [self.electrician_id] * 2
+        assert len(snapshot.tradesman_rows(999)) == 0
+
+        self.job_service.create_job(self.user_id, self.electrician_id, "Lights", "Description", total_cost=90)
+        self.snapshot_service.refresh()
+        snapshot = self.snapshot_service.open()
+        rows = snapshot.tradesman_rows(self.electrician_id)
+        assert list(snapshot['tradesman_id'][rows]) == [self.electrician_id] * 3
+
+    def test_incremental_refresh(self):
+        """Test that inserts, deletions and tradesman moves are appended as segments of a new version"""
+        self.snapshot_service.refresh()
+        first = self.snapshot_service.open()
+        base_files = os.listdir(os.path.join(self.snapshot_dir, first.parts[0]))
+
+        job_id = self.job_service.create_job(self.user_id, self.plumber_id, "Boiler", "Description", total_cost=900)
+        self.snapshot_service.refresh()
+        snapshot = self.snapshot_service.open()
+        assert snapshot.path != first.path
+        assert len(snapshot) == 5
+        assert job_id in snapshot['id']
+        # Only the changed job was written; the base is shared with the first version
+        assert snapshot.parts[0] == first.parts[0] and len(snapshot.parts) == 2
+        assert os.listdir(os.path.join(self.snapshot_dir, first.parts[0])) == base_files
+        assert list(np.load(os.path.join(self.snapshot_dir, snapshot.parts[1], 'id.npy'))) == [job_id]
+        # Older versions stay readable for processes still mapping them
+        assert len(first) == 4 and len(first['id']) == 4
+
+        self.job_service.delete_job(job_id)
+        self.tradesman_service.update_tradesman(self.electrician_id, trade="Gas Engineer", postcode="B33 8TH")
+        self.snapshot_service.refresh()
+        snapshot = self.snapshot_service.open()
+        rows = snapshot.tradesman_rows(self.electrician_id)
+        assert len(snapshot) == 4
+        assert job_id not in snapshot['id']
+        assert snapshot.decode('trade', snapshot['trade'][rows]) == ['Gas Engineer'] * 2
+        assert snapshot.decode('district', snapshot['district'][rows]) == ['B33'] * 2
+        assert len(snapshot['id']) == len(np.unique(snapshot['id'])) == 4
+
+    def test_segments_are_compacted(self):
+        """Test that segments are folded into a new base once they outgrow the compaction ratio"""
+        self.snapshot_service.refresh()
+        self.job_service.create_job(self.user_id, self.plumber_id, "Boiler", "Description", total_cost=900)
+        self.snapshot_service.refresh()
+        before = self.snapshot_service.open()
+        assert len(before.parts) == 2
+
+        self.app.config['JOBS_SNAPSHOT_COMPACT_RATIO'] = 0.25
+        self.app.config['JOBS_SNAPSHOT_PART_GRACE'] = 0
+        quote_id = self.job_service.get_quotes_by_tradesman(self.electrician_id)[0]['id']
+        self.job_service.delete_job(quote_id)
+        self.snapshot_service.refresh()
+
+        snapshot = self.snapshot_service.open()
+        assert len(snapshot.parts) == 1 and snapshot.parts[0] != before.parts[0]
+        assert len(snapshot) == 4
+        assert sorted(snapshot['id']) == sorted(set(before['id']) - {quote_id})
+        assert isinstance(snapshot['total_cost'], np.memmap)
+        # Parts no version uses any more are removed
+        assert set(os.listdir(self.snapshot_dir)) >= set(snapshot.parts)
+        assert len([name for name in os.listdir(self.snapshot_dir) if name.startswith('segment')]) <= 2
+
+    def test_concurrent_refreshes(self):
+        """Test that a second process refreshing mid-write neither removes the new segment nor writes a version"""
+        self.snapshot_service.refresh()
+        self.app.config['JOBS_SNAPSHOT_PART_GRACE'] = 0
+        self.job_service.create_job(self.user_id, self.plumber_id, "Boiler", "Description", total_cost=900)
+
+        first, second = JobsSnapshotService(), JobsSnapshotService()
+        write_version = first._write_version
+        interleaved = []
+
+        def write_after_second_refresh(*args, **kwargs):
+            # The segment is on disk, the manifest naming it is not
+            interleaved.append(second.refresh(force=True))
+            return write_version(*args, **kwargs)
+
+        first._write_version = write_after_second_refresh
+        first.refresh(force=True)
+
+        assert interleaved == [False]
+        snapshot = self.snapshot_service.open()
+        assert len(snapshot) == 5
+        assert snapshot['total_cost'][snapshot['id'] == max(snapshot['id'])][0] == 900
+
+    def test_unnamed_parts_have_a_grace_period(self):
+        """Test that parts no version names yet survive until they are older than the grace period"""
+        self.snapshot_service.refresh()
+        pending = self.snapshot_service._write_part('segment', self.snapshot_service._empty_columns())
+        self.job_service.create_job(self.user_id, self.plumber_id, "Boiler", "Description", total_cost=900)
+        self.snapshot_service.refresh()
+        assert os.path.isdir(os.path.join(self.snapshot_dir, pending))
+
+        self.app.config['JOBS_SNAPSHOT_PART_GRACE'] = 0
+        self.job_service.create_job(self.user_id, self.plumber_id, "Tap", "Description", total_cost=90)
+        self.snapshot_service.refresh()
+        assert not os.path.isdir(os.path.join(self.snapshot_dir, pending))
+
+    def test_missing_parts_are_rebuilt(self):
+        """Test that a version naming a removed part is ignored and rebuilt by the next refresh"""
+        self.snapshot_service.refresh()
+        self.job_service.create_job(self.user_id, self.plumber_id, "Boiler", "Description", total_cost=900)
+        self.snapshot_service.refresh()
+        shutil.rmtree(os.path.join(self.snapshot_dir, self.snapshot_service.open().parts[1]))
+
+        assert self.snapshot_service.open() is None
+        self.snapshot_service.refresh()
+        snapshot = self.snapshot_service.open()
+        assert len(snapshot) == 5 and len(snapshot.parts) == 1
+
+    def test_refresh_waits_for_min_age(self):
+        """Test that young snapshots are not rewritten unless forced"""
+        self.snapshot_service.refresh()
+        self.app.config['JOBS_SNAPSHOT_MIN_AGE'] = 3600
+        self.job_service.create_job(self.user_id, self.plumber_id, "Boiler", "Description", total_cost=900)
+
+        self.snapshot_service.refresh()
+        assert len(self.snapshot_service.open()) == 4
+        self.snapshot_service.refresh(force=True)
+        assert len(self.snapshot_service.open()) == 5
+
+    def test_aggregates(self):
+        """Test the vectorised aggregates against the seeded jobs"""
+        self.snapshot_service.refresh()
+        snapshot = get_jobs_snapshot()
+
+        cost_per_hour = snapshot.cost_per_hour_by_trade()
+        assert cost_per_hour['Plumber'] == {'count': 2, 'mean': 100.0, 'median': 100.0}
+        assert cost_per_hour['Electrician']['mean'] == 50.0
+
+        accuracy = snapshot.estimate_accuracy_by_trade()
+        assert accuracy['Plumber']['mean'] == 1.5
+        assert accuracy['Electrician']['mean'] == 0.5
+
+        assert snapshot.rating_trend() == [
+            {'month': '2024-01', 'count': 2, 'mean_rating': 3.0},
+            {'month': '2024-02', 'count': 1, 'mean_rating': 5.0},
+        ]
+        assert snapshot.rating_trend('Plumber')[0]['count'] == 2
+        assert snapshot.rating_trend('Roofer') == []
+
+    def test_trade_insights_endpoint(self):
+        """Test that the trade insights API serves the snapshot's aggregates"""
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        assert client.get('/api/trade_insights').get_json()['cost_per_hour'] == {}
+
+        self.snapshot_service.refresh()
+        data = client.get('/api/trade_insights?trade=Plumber').get_json()
+        assert data['cost_per_hour'] == {'Plumber': {'count': 2, 'mean': 100.0, 'median': 100.0}}
+        assert list(data['estimate_accuracy']) == ['Plumber']
+        assert data['rating_trend'] == [{'month': '2024-01', 'count': 2, 'mean_rating': 3.0}]
@@ -0,0 +1,123 @@
+import pytest
+import tempfile
+import os
+import numpy as np
+from app.services.leaderboard_service import LeaderboardService, wilson_scores
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.group_service import GroupService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestLeaderboards:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['WTF_CSRF_ENABLED'] = False
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.leaderboard_service = LeaderboardService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+            self.group_service = GroupService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            # One perfect job against a long record of very good ones
+            self.lucky_id = self._tradesman("Lucky", "SW1A 2AA", [5])
+            self.steady_id = self._tradesman("Steady", "SW1A 3BB", [5, 5, 5, 5, 4] * 6)
+            self.far_id = self._tradesman("Far", "M1 1AE", [5, 4, 4, 5, 4, 5, 4, 5])
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _tradesman(self, name, postcode, ratings):
+        tradesman_id = self.tradesman_service.create_tradesman(
+            "Electrician", name, "Sparks", None, "1 Main St", postcode, "555-1234", None
+        )
+        self.tradesman_service.add_user_tradesman_relationship(self.user_id, tradesman_id)
+        for rating in ratings:
+            self.job_service.create_job(self.user_id, tradesman_id, "Rewire", "Description", rating=rating)
+        return tradesman_id
+
+    def test_wilson_scores(self):
+        """Test that few ratings are pulled down more than many equal ones"""
+        scores = wilson_scores(np.array([5.0, 4.8, 4.8, 1.0]), np.array([1, 50, 500, 10]))
+
+        assert scores[0] < scores[1] < scores[2] < 4.8
+        assert scores[3] == 1
+        assert scores[1] == pytest.approx(4.41, abs=0.01)
+
+    def test_leaderboards(self):
+        """Test the ranking of a trade everywhere and in one district"""
+        self.leaderboard_service.refresh()
+
+        everywhere = self.leaderboard_service.top("Electrician")
+        nearby = self.leaderboard_service.top("Electrician", "SW1A 9ZZ")
+
+        assert [row['tradesman_id'] for row in everywhere] == [self.steady_id, self.far_id, self.lucky_id]
+        assert [row['tradesman_id'] for row in nearby] == [self.steady_id, self.lucky_id]
+        assert everywhere[0]['rating_count'] == 30
+        assert self.leaderboard_service.top("Electrician", limit=1)[0]['tradesman_id'] == self.steady_id
+
+    def test_incremental_refresh(self):
+        """Test that rating changes and tradesman moves rescore only those tradesmen"""
+        self.leaderboard_service.refresh()
+        self.db_service.execute_update(
+            "UPDATE tradesman_scores SET updated_at = '2000-01-01' WHERE tradesman_id = ?", (self.steady_id,)
+        )
+
+        for _ in range(60):
+            self.job_service.create_job(self.user_id, self.lucky_id, "Rewire", "Description", rating=5)
+        self.tradesman_service.update_tradesman(self.far_id, postcode="SW1A 4CC")
+        self.leaderboard_service.refresh()
+
+        nearby = self.leaderboard_service.top("Electrician", "SW1A 1AA")
+        assert [row['tradesman_id'] for row in nearby] == [self.lucky_id, self.steady_id, self.far_id]
+        untouched = self.db_service.execute_single_query(
+            "SELECT updated_at FROM tradesman_scores WHERE tradesman_id = ?", (self.steady_id,)
+        )
+        assert untouched['updated_at'] == '2000-01-01'
+
+    def test_leaderboard_is_an_index_scan(self):
+        """Test that reading a district's top tradesmen walks the leaderboard index"""
+        query = "SELECT * FROM tradesman_scores WHERE trade = ? AND district = ? ORDER BY score DESC LIMIT 10"
+        plan = ' '.join(row['detail'] for row in
+                        self.db_service.execute_query(f"EXPLAIN QUERY PLAN {query}", ("Electrician", "SW1")))
+
+        assert 'idx_tradesman_scores_district' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_top_rated_for_user_and_search_order(self):
+        """Test the user's top tradesmen and the default search order use the adjusted score"""
+        self.leaderboard_service.refresh()
+        other_id = self.user_service.create_user("testuser2", "Other", "User", "test2@example.com", "SW1A 1AA", "password123")
+
+        top = self.tradesman_service.get_top_rated_tradesmen_for_user(self.user_id)
+        assert [row['id'] for row in top] == [self.steady_id, self.far_id, self.lucky_id]
+        assert top[0]['is_my_tradesman'] == 1
+        assert self.tradesman_service.get_top_rated_tradesmen_for_user(other_id) == []
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        page = client.post('/search_tradesmen', data={}).data.decode()
+        assert page.index('Steady') < page.index('Far') < page.index('Lucky')
+
+        page = client.get('/top_tradesmen?trade=Electrician&near_me=1').data.decode()
+        assert 'Steady' in page and 'Lucky' in page
+        assert 'Far' not in page
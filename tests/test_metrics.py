@@ -0,0 +1,93 @@
+import pytest
+import tempfile
+import os
+from flask import g
+from app.services import database
+from app.services.database import DatabaseService
+from app.services.user_service import UserService
+from main import create_app
+
+
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and app"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        # The routes use the shared database service; point it at the test database
+        previous_path = database.db_service.database_path
+        database.db_service.database_path = self.temp_db_path
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+
+        with self.app.app_context():
+            DatabaseService(self.temp_db_path).init_db()
+            self.user_id = UserService().create_user("metrics", "Test", "User", "metrics@example.com",
+                                                     "SW1A 1AA", "password123")
+
+        yield
+
+        database.db_service.database_path = previous_path
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def test_request_database_usage(self):
+        """Test that statements and database time add up per request, transaction control excluded"""
+        with self.app.app_context():
+            db = database.db_service
+            db.execute_query("SELECT * FROM users")
+            with db.transaction() as cursor:
+                cursor.execute("UPDATE users SET firstname = 'Renamed' WHERE id = ?", (self.user_id,))
+            assert list(db.iter_query("SELECT id FROM users")) == [{'id': self.user_id}]
+            assert g.db_queries == 3
+            assert g.db_seconds > 0
+
+    def test_metrics_endpoint(self):
+        """Test that /metrics reports per-endpoint latency, database usage and database gauges"""
+        pytest.importorskip("prometheus_client")
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        client.get('/search_tradesmen')
+        client.get('/no_such_page')
+
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        body = response.data.decode()
+        assert 'fairprice_request_seconds_count{endpoint="search.search_tradesmen",method="GET"}' in body
+        assert 'fairprice_request_queries_count{endpoint="search.search_tradesmen"}' in body
+        assert 'fairprice_requests_total{endpoint="unmatched",method="GET",status="404"}' in body
+        assert 'fairprice_pending_invitations 0.0' in body
+
+    def test_metrics_token(self):
+        """Test that a configured token is required to scrape"""
+        pytest.importorskip("prometheus_client")
+        self.app.config['METRICS_TOKEN'] = 'secret'
+        client = self.app.test_client()
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+    def test_production_requires_token(self):
+        """Test that metrics are off by default and not served outside DEBUG without a token"""
+        pytest.importorskip("prometheus_client")
+        from flask import Flask
+        from config import Config
+        from app.services import metrics_service
+        assert not Config.METRICS_ENABLED
+
+        app = Flask(__name__)
+        app.config.update(DEBUG=False, METRICS_ENABLED=True, METRICS_TOKEN=None)
+        metrics_service.init_app(app)
+        assert 'metrics' not in app.view_functions
+
+        app = Flask(__name__)
+        app.config.update(DEBUG=False, METRICS_ENABLED=True, METRICS_TOKEN='secret')
+        metrics_service.init_app(app)
+        assert 'metrics' in app.view_functions
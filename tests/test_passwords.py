@@ -0,0 +1,91 @@
+import pytest
+import tempfile
+import os
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.services import database, password_service
+from app.services.database import DatabaseService
+from app.services.user_service import UserService
+from main import create_app
+
+
+class TestPasswords:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and an app hashing with few iterations"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        # The routes use the shared database service; point it at the test database
+        previous_path = database.db_service.database_path
+        database.db_service.database_path = self.temp_db_path
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+        with self.app.app_context():
+            DatabaseService(self.temp_db_path).init_db()
+            self.user_id = UserService().create_user("hashed", "Test", "User", "hashed@example.com",
+                                                     "SW1A 1AA", "password123")
+
+        yield
+
+        database.db_service.database_path = previous_path
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _stored_hash(self):
+        return database.db_service.execute_single_query("SELECT hash FROM users WHERE id = ?",
+                                                        (self.user_id,))['hash']
+
+    def test_configured_method(self):
+        """Test that new hashes use the configured method and verify"""
+        with self.app.app_context():
+            stored = self._stored_hash()
+            assert stored.startswith('pbkdf2:sha256:2000$')
+            assert not password_service.needs_rehash(stored)
+            assert password_service.verify_password(stored, 'password123')
+            assert not password_service.verify_password(stored, 'password124')
+
+    def test_method_defaults(self):
+        """Test that a method configured without its parameters doesn't flag every hash it makes"""
+        self.app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+        with self.app.app_context():
+            stored = password_service.hash_password('password123')
+            assert stored.startswith('scrypt:32768:8:1$')
+            assert not password_service.needs_rehash(stored)
+            assert password_service.needs_rehash(self._stored_hash())
+
+    def test_rehash_on_login(self):
+        """Test that a hash with old parameters is upgraded by a successful login only"""
+        with self.app.app_context():
+            old_hash = generate_password_hash('password123', 'pbkdf2:sha256:1000')
+            database.db_service.execute_update("UPDATE users SET hash = ? WHERE id = ?", (old_hash, self.user_id))
+            assert password_service.needs_rehash(old_hash)
+
+            assert UserService().authenticate_user('hashed', 'wrong-password') is None
+            assert self._stored_hash() == old_hash
+
+            user = UserService().authenticate_user('hashed', 'password123')
+            assert user['id'] == self.user_id
+            stored = self._stored_hash()
+            assert stored.startswith('pbkdf2:sha256:2000$') and user['hash'] == stored
+            assert check_password_hash(stored, 'password123')
+
+    def test_process_pool(self):
+        """Test hashing and verifying in the process pool"""
+        self.app.config['TESTING'] = False
+        self.app.config['PASSWORD_HASH_WORKERS'] = 1
+        try:
+            with self.app.app_context():
+                stored = password_service.hash_password('password123')
+                assert password_service._pool is not None
+                assert stored.startswith('pbkdf2:sha256:2000$')
+                assert password_service.verify_password(stored, 'password123')
+                assert not password_service.verify_password(stored, 'password124')
+        finally:
+            password_service._reset_pool()
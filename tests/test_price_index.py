@@ -0,0 +1,137 @@
+import pytest
+import tempfile
+import os
+from app.services.price_index_service import PriceIndexService, quarter_of, months_of
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestPriceIndex:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.price_index_service = PriceIndexService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            self.london_id = self.tradesman_service.create_tradesman(
+                "Plumber", "Pete", "Pipes", None, "1 Main St", "SW1A 2AA", "555-1234", None
+            )
+            self.manchester_id = self.tradesman_service.create_tradesman(
+                "Plumber", "Mo", "Taps", None, "2 High St", "M1 1AE", "555-5678", None
+            )
+            self.january_ids = [
+                self._job(self.london_id, "2024-01-10", 400, 10),
+                self._job(self.london_id, "2024-01-20", 600, 10),
+                self._job(self.manchester_id, "2024-01-25", 300, 10),
+            ]
+            self.march_id = self._job(self.london_id, "2024-03-05", 1000, 20)
+            # Undated jobs have no period to count towards
+            self._job(self.london_id, None, 5000, 10)
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _job(self, tradesman_id, date_finished, total_cost, hours_worked):
+        return self.job_service.create_job(
+            self.user_id, tradesman_id, "Leak", "Description", date_finished=date_finished,
+            total_cost=total_cost, hours_worked=hours_worked
+        )
+
+    def _series(self, **kwargs):
+        return {row['period']: row for row in self.price_index_service.get_series("Plumber", **kwargs)}
+
+    def test_periods(self):
+        """Test the mapping between months and quarters"""
+        assert quarter_of("2024-01") == "2024-Q1"
+        assert quarter_of("2024-12") == "2024-Q4"
+        assert months_of("2024-Q2") == ["2024-04", "2024-05", "2024-06"]
+
+    def test_rollup(self):
+        """Test monthly and quarterly medians for a trade and a district"""
+        self.price_index_service.refresh()
+
+        months = self._series()
+        assert list(months) == ["2024-01", "2024-03"]
+        assert months["2024-01"]['job_count'] == 3
+        assert months["2024-01"]['median_total_cost'] == 400
+        assert months["2024-01"]['median_hourly_rate'] == 40
+
+        london = self._series(district="SW1")
+        assert london["2024-01"]['job_count'] == 2
+        assert london["2024-01"]['median_total_cost'] == 500
+
+        quarters = self._series(period_type='quarter')
+        assert list(quarters) == ["2024-Q1"]
+        assert quarters["2024-Q1"]['job_count'] == 4
+        assert quarters["2024-Q1"]['median_total_cost'] == 500
+
+    def test_incremental_refresh(self):
+        """Test that an edit recomputes the months a job left and entered, and no others"""
+        self.price_index_service.refresh()
+        self.db_service.execute_update(
+            "UPDATE price_index SET updated_at = '2000-01-01' WHERE period = '2024-03'"
+        )
+
+        self.job_service.update_job(self.january_ids[2], date_finished="2024-02-01")
+        self.job_service.delete_job(self.january_ids[0])
+        self.price_index_service.refresh()
+
+        months = self._series()
+        assert list(months) == ["2024-01", "2024-02", "2024-03"]
+        assert months["2024-01"]['job_count'] == 1
+        assert months["2024-01"]['median_total_cost'] == 600
+        assert months["2024-02"]['job_count'] == 1
+        untouched = self.db_service.execute_single_query(
+            "SELECT updated_at FROM price_index WHERE period = '2024-03' AND district = ''"
+        )
+        assert untouched['updated_at'] == '2000-01-01'
+        assert self._series(period_type='quarter')["2024-Q1"]['job_count'] == 3
+        assert list(self._series(district="M1")) == ["2024-02"]
+
+    def test_tradesman_move(self):
+        """Test that moving a tradesman moves their jobs to the new district"""
+        self.price_index_service.refresh()
+        self.tradesman_service.update_tradesman(self.manchester_id, postcode="SW1A 5DD")
+        self.price_index_service.refresh()
+
+        assert self._series(district="M1") == {}
+        assert self._series(district="SW1")["2024-01"]['job_count'] == 3
+
+    def test_chart_endpoint(self):
+        """Test the chart series served from the rollup"""
+        self.price_index_service.refresh()
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+
+        data = client.get('/api/price_index?trade=Plumber&postcode=SW1A+1AA').get_json()
+        assert data['district'] == "SW1"
+        assert data['labels'] == ["2024-01", "2024-03"]
+        assert data['job_count'] == [2, 1]
+        assert data['median_total_cost'] == [500, 1000]
+
+        data = client.get('/api/price_index?trade=Plumber&period=quarter').get_json()
+        assert data['labels'] == ["2024-Q1"]
+
+        assert client.get('/api/price_index?trade=Plumber&period=year').status_code == 400
+        assert client.get('/api/price_index').status_code == 400
@@ -0,0 +1,166 @@
+import pytest
+import tempfile
+import os
+import sqlite3
+import numpy as np
+from app.services.price_stats_service import PriceStatsService, group_stats, fetch_columns, PERCENTILES
+from app.services.change_log import ChangeLog
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.database import DatabaseService
+from app.helpers import postcode_district
+from main import create_app
+
+class TestPriceStats:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['PRICE_STATS_MIN_SAMPLES'] = 2
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.price_stats_service = PriceStatsService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            self.london_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", None, "1 Main St", "SW1A 2AA", "555-1234", None
+            )
+            self.manchester_id = self.tradesman_service.create_tradesman(
+                "Plumber", "Jane", "Roe", None, "2 High St", "M1 1AE", "555-5678", None
+            )
+            for cost in (100, 200, 300, 400):
+                self.job_service.create_job(self.user_id, self.london_id, "Leak", "Description",
+                                            total_cost=cost, hourly_rate=cost // 10)
+            self.job_service.create_job(self.user_id, self.manchester_id, "Leak", "Description", total_cost=1000)
+            self.job_service.create_quote(self.user_id, self.london_id, "Boiler", "Description", total_quote=800)
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _row(self, district, metric):
+        return self.db_service.execute_single_query(
+            "SELECT * FROM price_stats WHERE trade = 'Plumber' AND district = ? AND metric = ?",
+            (district, metric)
+        )
+
+    def test_group_stats_matches_numpy_percentile(self):
+        """Test the vectorised percentiles against numpy.percentile per group"""
+        rng = np.random.default_rng(1)
+        keys = rng.integers(0, 5, 500)
+        values = rng.normal(100, 30, 500)
+        values[::7] = np.nan
+
+        stats = group_stats(keys, values)
+
+        for i, key in enumerate(stats['key']):
+            group = values[(keys == key) & ~np.isnan(values)]
+            assert stats['count'][i] == len(group)
+            assert stats['mean'][i] == pytest.approx(group.mean())
+            for q in PERCENTILES:
+                assert stats[f'p{q}'][i] == pytest.approx(np.percentile(group, q))
+
+    def test_fetch_columns_grows_across_batches(self):
+        """Test that columns loaded batch by batch hold every row, with NULLs as NaN"""
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE t (name TEXT, value REAL)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)",
+                         [(f"row {i}", None if i % 3 == 0 else i) for i in range(11)])
+        cursor = conn.execute("SELECT name, value FROM t ORDER BY rowid")
+
+        names, values = fetch_columns(cursor, [object, float], batch_size=2)
+
+        assert list(names) == [f"row {i}" for i in range(11)]
+        assert np.array_equal(values, [np.nan if i % 3 == 0 else i for i in range(11)], equal_nan=True)
+        empty, = fetch_columns(conn.execute("SELECT value FROM t WHERE 0"), [float])
+        assert len(empty) == 0
+
+    def test_postcode_district(self):
+        """Test reducing postcodes to districts"""
+        assert postcode_district("SW1A 1AA") == "SW1"
+        assert postcode_district("m11ae") == "M1"
+        assert postcode_district("DN55 1PT") == "DN55"
+        assert postcode_district("75001") == "75001"
+        assert postcode_district(None) == ""
+
+    def test_first_refresh_rebuilds(self):
+        """Test that the first refresh computes every district and the trade overall"""
+        self.price_stats_service.refresh()
+
+        london = self._row('SW1', 'total_cost')
+        overall = self._row('', 'total_cost')
+        assert london['count'] == 4
+        assert london['median'] == 250
+        assert london['p25'] == 175
+        assert overall['count'] == 5
+        assert self._row('M1', 'total_cost')['count'] == 1
+        assert self._row('SW1', 'total_quote')['median'] == 800
+        assert self._row('SW1', 'hourly_rate')['mean'] == 25
+        assert ChangeLog('price_stats').pending() == []
+
+    def test_incremental_refresh(self):
+        """Test that job changes are folded in from the change log"""
+        self.price_stats_service.refresh()
+
+        job_id = self.job_service.create_job(self.user_id, self.manchester_id, "Leak", "Description", total_cost=2000)
+        assert len(ChangeLog('price_stats').pending()) == 1
+        self.price_stats_service.refresh()
+        assert self._row('M1', 'total_cost')['count'] == 2
+        assert self._row('', 'total_cost')['count'] == 6
+
+        self.job_service.delete_job(job_id)
+        self.price_stats_service.refresh()
+        assert self._row('M1', 'total_cost')['count'] == 1
+
+        # Moving a tradesman takes their jobs to the new trade and district
+        self.tradesman_service.update_tradesman(self.manchester_id, trade="Electrician", postcode="B33 8TH")
+        self.price_stats_service.refresh()
+        assert self._row('M1', 'total_cost') is None
+        assert self._row('', 'total_cost')['count'] == 4
+        electrician = self.db_service.execute_single_query(
+            "SELECT * FROM price_stats WHERE trade = 'Electrician' AND district = 'B33' AND metric = 'total_cost'"
+        )
+        assert electrician['median'] == 1000
+
+    def test_get_stats_falls_back_to_all_districts(self):
+        """Test that districts with too few prices use the trade-wide distribution"""
+        self.price_stats_service.refresh()
+
+        london = self.price_stats_service.get_stats("Plumber", "SW1A 9ZZ", ['total_cost', 'daily_rate'])
+        manchester = self.price_stats_service.get_stats("Plumber", "M1 2AB", ['total_cost'])
+
+        assert london['total_cost']['district'] == 'SW1'
+        assert 'daily_rate' not in london
+        assert manchester['total_cost']['district'] == ''
+
+    def test_stats_shown_on_pages(self):
+        """Test that job, quote and tradesman pages show the precomputed prices"""
+        self.price_stats_service.refresh()
+        job = self.job_service.get_jobs_by_tradesman(self.london_id)[0]
+        quote = self.job_service.get_quotes_by_tradesman(self.london_id)[0]
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+
+        for url in (f'/view_job/{job["id"]}', f'/tradesman/{self.london_id}'):
+            response = client.get(url)
+            assert response.status_code == 200
+            assert b'Typical Plumber Prices' in response.data
+            assert '€250'.encode() in response.data
+        assert '€800'.encode() in client.get(f'/view_quote/{quote["id"]}').data
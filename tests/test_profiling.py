@@ -0,0 +1,118 @@
+import pytest
+import tempfile
+import pstats
+import shutil
+import json
+import os
+from app.services import database
+from app.services.database import DatabaseService
+from app.services.user_service import UserService
+from main import create_app
+
+
+class TestProfiling:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database, app and profile directory"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+        self.profile_dir = tempfile.mkdtemp()
+
+        # The routes use the shared database service; point it at the test database
+        previous_path = database.db_service.database_path
+        database.db_service.database_path = self.temp_db_path
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['PROFILE_DIR'] = self.profile_dir
+        self.app.config['ADMIN_USERNAMES'] = {'admin'}
+
+        with self.app.app_context():
+            DatabaseService(self.temp_db_path).init_db()
+            user_service = UserService()
+            self.admin_id = user_service.create_user("admin", "Admin", "User", "admin@example.com",
+                                                     "SW1A 1AA", "password123")
+            self.user_id = user_service.create_user("member", "Member", "User", "member@example.com",
+                                                    "SW1A 1AA", "password123")
+
+        yield
+
+        database.db_service.database_path = previous_path
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _client(self, user_id):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        return client
+
+    def _details(self, name):
+        stem = os.path.splitext(name)[0]
+        with open(os.path.join(self.profile_dir, f"{stem}.json"), encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_admin_profiles_on_demand(self):
+        """Test that ?__profile=1 writes collapsed stacks with the request details"""
+        response = self._client(self.admin_id).get('/search_tradesmen?__profile=1')
+        assert response.status_code == 200
+
+        name = response.headers['X-Profile']
+        assert name.endswith('.folded')
+        assert os.path.exists(os.path.join(self.profile_dir, name))
+        details = self._details(name)
+        assert details['endpoint'] == 'search.search_tradesmen'
+        assert details['path'] == '/search_tradesmen?__profile=1'
+        assert details['user_id'] == self.admin_id
+        assert details['status'] == 200
+        assert any('tradesmen' in query for query in details['queries'])
+
+    def test_admin_pstats(self):
+        """Test that ?__profile=pstats writes a cProfile file pstats can read"""
+        response = self._client(self.admin_id).get('/search_tradesmen?__profile=pstats')
+        name = response.headers['X-Profile']
+        stats = pstats.Stats(os.path.join(self.profile_dir, name))
+        assert any(function[2] == 'search_tradesmen' for function in stats.stats)
+
+    def test_non_admin_is_not_profiled(self):
+        """Test that only admins can ask for a profile"""
+        response = self._client(self.user_id).get('/search_tradesmen?__profile=1')
+        assert response.status_code == 200
+        assert 'X-Profile' not in response.headers
+        assert os.listdir(self.profile_dir) == []
+
+    def test_sampled_requests(self):
+        """Test that sampled requests are written only when slower than the threshold"""
+        client = self._client(self.user_id)
+        self.app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        self.app.config['PROFILE_SLOW_MS'] = 60000
+        client.get('/search_tradesmen')
+        assert os.listdir(self.profile_dir) == []
+
+        self.app.config['PROFILE_SLOW_MS'] = 0
+        client.get('/search_tradesmen')
+        files = sorted(os.listdir(self.profile_dir))
+        assert len(files) == 2 and files[0].endswith('.folded')
+        # Sampled profiles are not announced to the user
+        assert 'X-Profile' not in client.get('/search_tradesmen').headers
+
+    def test_collapsed_stacks(self):
+        """Test the sampler's collapsed-stack lines"""
+        from app.services.profiling_service import StackSampler
+        import threading
+        import time
+
+        sampler = StackSampler(0.001)
+        sampler.start(threading.get_ident())
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        stacks = sampler.stop(threading.get_ident())
+        assert sum(stacks.values()) > 0
+        assert all(stack.split(';')[-1].startswith('TestProfiling.test_collapsed_stacks (')
+                   for stack in stacks)
@@ -0,0 +1,253 @@
+import pytest
+import tempfile
+import os
+import random
+import threading
+import time
+from app.services.quote_sketch_service import KLLSketch, QuoteSketchService
+from app.services.job_service import JobService
+from app.services.tradesman_service import TradesmanService
+from app.services.user_service import UserService
+from app.services.group_service import GroupService
+from app.services.anomaly_service import AnomalyService
+from app.services.database import DatabaseService
+from main import create_app
+
+class TestKLLSketch:
+    def test_rank_error_is_bounded(self):
+        """Test that ranks stay close to the exact ranks on a large stream"""
+        values = [random.uniform(0, 1000) for _ in range(50000)]
+        sketch = KLLSketch()
+        for value in values:
+            sketch.update(value)
+
+        values.sort()
+        for q in (0.01, 0.1, 0.5, 0.82, 0.99):
+            assert abs(sketch.rank(values[int(q * len(values))]) - q) < 0.02
+            assert abs(sketch.quantile(q) - values[int(q * len(values))]) < 25
+        assert sketch.n == 50000
+        # A few kilobytes however long the stream
+        assert len(sketch.to_bytes()) < 4 * 1024
+
+    def test_merge(self):
+        """Test that merged sketches describe the combined stream"""
+        low, high = KLLSketch(), KLLSketch()
+        for i in range(5000):
+            low.update(i)
+            high.update(5000 + i)
+
+        merged = KLLSketch().merge(low).merge(high)
+
+        assert merged.n == 10000
+        assert abs(merged.rank(5000) - 0.5) < 0.02
+        assert abs(merged.rank(2500) - 0.25) < 0.02
+
+    def test_serialisation_round_trip(self):
+        """Test that a stored sketch scores exactly like the original"""
+        sketch = KLLSketch()
+        for i in range(3000):
+            sketch.update(i % 700)
+
+        loaded = KLLSketch.from_bytes(sketch.to_bytes())
+
+        assert loaded.n == sketch.n
+        for value in (0, 123, 350, 699, 1000):
+            assert loaded.rank(value) == sketch.rank(value)
+        loaded.update(5)
+        assert loaded.n == 3001
+
+    def test_ties_count_half(self):
+        """Test that a value equal to every other value sits at the 50th percentile"""
+        sketch = KLLSketch()
+        for _ in range(10):
+            sketch.update(100)
+
+        assert sketch.rank(100) == 0.5
+        assert sketch.rank(99) == 0
+        assert sketch.rank(101) == 1
+
+
+class TestQuoteSketchService:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and services"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['DATABASE'] = self.temp_db_path
+        self.app.config['PRICE_STATS_MIN_SAMPLES'] = 3
+
+        with self.app.app_context():
+            self.db_service = DatabaseService(self.temp_db_path)
+            self.db_service.init_db()
+            self.sketch_service = QuoteSketchService()
+            self.job_service = JobService()
+            self.tradesman_service = TradesmanService()
+            self.user_service = UserService()
+            self.group_service = GroupService()
+
+            self.user_id = self.user_service.create_user("testuser1", "Test", "User1", "test1@example.com", "SW1A 1AA", "password123")
+            self.london_id = self.tradesman_service.create_tradesman(
+                "Plumber", "John", "Doe", None, "1 Main St", "SW1A 2AA", "555-1234", None
+            )
+            self.manchester_id = self.tradesman_service.create_tradesman(
+                "Plumber", "Jane", "Roe", None, "2 High St", "M1 1AE", "555-5678", None
+            )
+            for price in range(100, 1100, 100):
+                self.job_service.create_quote(self.user_id, self.london_id, "Boiler", "Description", total_quote=price)
+            for price in range(1000, 4000, 1000):
+                self.job_service.create_quote(self.user_id, self.manchester_id, "Boiler", "Description", total_quote=price)
+
+            yield
+
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _count(self, district, metric='total_quote'):
+        row = self.db_service.execute_single_query(
+            "SELECT count FROM price_sketches WHERE trade = 'Plumber' AND district = ? AND metric = ?",
+            (district, metric)
+        )
+        return row['count'] if row else None
+
+    def test_first_refresh_rebuilds(self):
+        """Test that the first refresh builds district and all-districts sketches"""
+        self.sketch_service.refresh()
+
+        assert self._count('SW1') == 10
+        assert self._count('M1') == 3
+        assert self._count('') == 13
+
+    def test_inserts_are_added_incrementally(self):
+        """Test that new quotes are folded in without rebuilding the trade"""
+        self.sketch_service.refresh()
+        self.db_service.execute_update("UPDATE price_sketches SET updated_at = '2000-01-01' WHERE district = 'SW1'")
+
+        self.job_service.create_quote(self.user_id, self.manchester_id, "Boiler", "Description", total_quote=5000)
+        self.sketch_service.refresh()
+
+        assert self._count('M1') == 4
+        assert self._count('') == 14
+        untouched = self.db_service.execute_single_query(
+            "SELECT updated_at FROM price_sketches WHERE district = 'SW1' AND metric = 'total_quote'"
+        )
+        assert untouched['updated_at'] == '2000-01-01'
+
+    def test_concurrent_refreshes_add_jobs_once(self):
+        """Test that a second process refreshing before the first moves its cursor doesn't add the jobs again"""
+        self.sketch_service.refresh()
+        for price in range(1100, 1600, 100):
+            self.job_service.create_quote(self.user_id, self.london_id, "Boiler", "Description", total_quote=price)
+
+        first = QuoteSketchService()
+        add_jobs = first._add_jobs
+        errors = []
+
+        def refresh_elsewhere():
+            try:
+                with self.app.app_context():
+                    # Services use the context's connection; open it on the test database, as setup does
+                    DatabaseService(self.temp_db_path).get_connection()
+                    QuoteSketchService().refresh()
+            except Exception as e:
+                errors.append(e)
+
+        def add_jobs_while_another_refreshes(cursor, job_ids):
+            # The first refresh has read its batch but not moved the cursor past it
+            other = threading.Thread(target=refresh_elsewhere)
+            other.start()
+            time.sleep(0.3)
+            add_jobs(cursor, job_ids)
+            return other
+
+        threads = []
+        first._add_jobs = lambda cursor, job_ids: threads.append(add_jobs_while_another_refreshes(cursor, job_ids))
+        first.refresh()
+        for thread in threads:
+            thread.join()
+
+        assert threads and not errors
+        assert self._count('SW1') == 15
+        assert self._count('') == 18
+
+    def test_changes_rebuild_the_trade(self):
+        """Test that edits and deletions, which sketches cannot undo, rebuild the trade"""
+        self.sketch_service.refresh()
+        quote_id = self.job_service.get_quotes_by_tradesman(self.manchester_id)[0]['id']
+
+        self.job_service.delete_job(quote_id)
+        self.sketch_service.refresh()
+
+        assert self._count('M1') == 2
+        assert self._count('') == 12
+
+    def test_edits_that_leave_prices_alone_are_skipped(self):
+        """Test that changes to other columns, or rejected prices, don't rebuild the trade"""
+        self.sketch_service.refresh()
+        quote_id = self.job_service.get_quotes_by_tradesman(self.manchester_id)[0]['id']
+        self.db_service.execute_update("UPDATE price_sketches SET updated_at = '2000-01-01'")
+
+        self.db_service.execute_update("UPDATE jobs SET title = 'Combi boiler' WHERE id = ?", (quote_id,))
+        anomaly_id = self.db_service.execute_insert("""
+            INSERT INTO price_anomalies (job_id, trade, metric, value) VALUES (?, 'Plumber', 'total_quote', 1000)
+        """, (quote_id,))
+        AnomalyService().review(anomaly_id, 'rejected', self.user_id)
+        self.sketch_service.refresh()
+
+        updated = self.db_service.execute_query("SELECT DISTINCT updated_at FROM price_sketches")
+        assert [row['updated_at'] for row in updated] == ['2000-01-01']
+
+    def test_accepted_prices_are_added_incrementally(self):
+        """Test that a flagged quote is left out until accepted, then added without a rebuild"""
+        quote_id = self.job_service.create_quote(self.user_id, self.manchester_id, "Boiler", "Description",
+                                                 total_quote=9000)
+        anomaly_id = self.db_service.execute_insert("""
+            INSERT INTO price_anomalies (job_id, trade, metric, value) VALUES (?, 'Plumber', 'total_quote', 9000)
+        """, (quote_id,))
+        self.sketch_service.refresh()
+        assert self._count('M1') == 3
+        self.db_service.execute_update("UPDATE price_sketches SET updated_at = '2000-01-01' WHERE district = 'SW1'")
+
+        AnomalyService().review(anomaly_id, 'accepted', self.user_id)
+        self.sketch_service.refresh()
+
+        assert self._count('M1') == 4
+        assert self._count('') == 14
+        untouched = self.db_service.execute_single_query(
+            "SELECT updated_at FROM price_sketches WHERE district = 'SW1' AND metric = 'total_quote'"
+        )
+        assert untouched['updated_at'] == '2000-01-01'
+
+    def test_score(self):
+        """Test scoring against one district, several merged districts and all districts"""
+        self.sketch_service.refresh()
+
+        district = self.sketch_service.score(850, 'Plumber', 'total_quote', ['SW1'])
+        merged = self.sketch_service.score(850, 'Plumber', 'total_quote', ['SW1', 'M1'])
+        everywhere = self.sketch_service.score(850, 'Plumber', 'total_quote')
+
+        assert district == {'percentile': 80, 'count': 10}
+        assert merged == everywhere
+        assert everywhere['percentile'] == 62
+        assert self.sketch_service.score(850, 'Plumber', 'hourly_rate') is None
+
+    def test_view_quote_shows_percentiles(self):
+        """Test that the quote page shows where the quote sits"""
+        self.sketch_service.refresh()
+        self.group_service.create_group_with_creator("Street", "M1 2AB", self.user_id)
+        quote = self.job_service.get_quotes_by_tradesman(self.london_id)[7]
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        response = client.get(f"/view_quote/{quote['id']}")
+
+        assert response.status_code == 200
+        assert b'Price Check' in response.data
+        assert b'in SW1' in response.data
+        assert b"in your groups" in response.data
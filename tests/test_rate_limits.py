@@ -0,0 +1,110 @@
+import pytest
+import tempfile
+import os
+from app.services import database
+from app.services.database import DatabaseService
+from app.services.rate_limit_service import RateLimitService
+from app.services.user_service import UserService
+from main import create_app
+
+
+class TestRateLimits:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and app with rate limiting on"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        # The routes use the shared database service; point it at the test database
+        previous_path = database.db_service.database_path
+        database.db_service.database_path = self.temp_db_path
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['RATE_LIMIT_ENABLED'] = True
+        self.app.config['RATE_LIMITS'] = dict(self.app.config['RATE_LIMITS'], login=(3, 300))
+
+        with self.app.app_context():
+            DatabaseService(self.temp_db_path).init_db()
+            UserService().create_user("limited", "Test", "User", "limited@example.com",
+                                      "SW1A 1AA", "password123")
+
+        yield
+
+        database.db_service.database_path = previous_path
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _buckets(self):
+        return [row['key'] for row in database.db_service.execute_query("SELECT key FROM rate_limits ORDER BY key")]
+
+    def _login(self, client, password):
+        return client.post('/login', data={'username': 'limited', 'password': password})
+
+    def test_token_bucket(self):
+        """Test that a bucket allows its limit, then refills evenly over the window"""
+        with self.app.app_context():
+            limiter = RateLimitService()
+            assert [limiter.hit('test:ip:1', 2, 60, now=1000)[0] for _ in range(3)] == [True, True, False]
+            allowed, retry_after = limiter.hit('test:ip:1', 2, 60, now=1000)
+            assert not allowed and retry_after == pytest.approx(30)
+            # Other clients have their own bucket
+            assert limiter.hit('test:ip:2', 2, 60, now=1000)[0]
+
+            # Half the window refills one token
+            assert limiter.hit('test:ip:1', 2, 60, now=1030)[0]
+            assert not limiter.hit('test:ip:1', 2, 60, now=1030)[0]
+
+    def test_refund(self):
+        """Test that a refunded token can be taken again, but never beyond a full bucket"""
+        with self.app.app_context():
+            limiter = RateLimitService()
+            assert limiter.hit('test:ip:1', 2, 60, now=1000)[0]
+            assert limiter.hit('test:ip:1', 2, 60, now=1000)[0]
+            limiter.refund('test:ip:1', 2)
+            assert limiter.hit('test:ip:1', 2, 60, now=1000)[0]
+            assert not limiter.hit('test:ip:1', 2, 60, now=1000)[0]
+
+            for _ in range(3):
+                limiter.refund('test:ip:1', 2)
+            assert [limiter.hit('test:ip:1', 2, 60, now=1000)[0] for _ in range(3)] == [True, True, False]
+            # Refunding a bucket that was never hit does nothing
+            limiter.refund('test:ip:2', 2)
+            assert self._buckets() == ['test:ip:1']
+
+    def test_expire(self):
+        """Test that only buckets that have refilled completely are removed"""
+        with self.app.app_context():
+            limiter = RateLimitService()
+            limiter.hit('test:ip:1', 2, 60, now=1000)
+            limiter.hit('test:ip:2', 2, 60, now=1050)
+            assert limiter.expire(now=1070) == 1
+            assert self._buckets() == ['test:ip:2']
+            # The other bucket is kept, with the token it lost not refilled yet
+            assert limiter.hit('test:ip:2', 2, 60, now=1070)[0]
+            assert not limiter.hit('test:ip:2', 2, 60, now=1070)[0]
+
+    def test_failed_logins_are_limited(self):
+        """Test that failed logins run out, with a Retry-After header, while the right password doesn't count"""
+        client = self.app.test_client()
+        for _ in range(2):
+            assert self._login(client, 'wrong').status_code == 200
+        assert self._login(client, 'password123').status_code == 302
+        assert self._login(client, 'wrong').status_code == 200
+
+        response = self._login(client, 'password123')
+        assert response.status_code == 429
+        assert 0 < int(response.headers['Retry-After']) <= 100
+        # Only form submissions are limited
+        assert client.get('/login').status_code == 200
+
+    def test_disabled(self):
+        """Test that RATE_LIMIT_ENABLED turns the limits off"""
+        self.app.config['RATE_LIMIT_ENABLED'] = False
+        client = self.app.test_client()
+        for _ in range(5):
+            assert self._login(client, 'wrong').status_code == 200
@@ -0,0 +1,130 @@
+import pytest
+import tempfile
+import time
+import os
+from app.services import database
+from app.services.database import DatabaseService
+from app.services.session_service import SessionService
+from app.services.user_service import UserService
+from main import create_app
+
+
+class TestSessions:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and app with sessions in the database"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+
+        # The routes use the shared database service; point it at the test database
+        previous_path = database.db_service.database_path
+        database.db_service.database_path = self.temp_db_path
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.cookie_name = self.app.config['SESSION_COOKIE_NAME']
+
+        with self.app.app_context():
+            DatabaseService(self.temp_db_path).init_db()
+            self.user_id = UserService().create_user("sessions", "Test", "User", "sessions@example.com",
+                                                     "SW1A 1AA", "password123")
+
+        yield
+
+        database.db_service.database_path = previous_path
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _rows(self):
+        with self.app.app_context():
+            return database.db_service.execute_query("SELECT id, data, expires_at FROM sessions")
+
+    def _login(self, client):
+        response = client.post('/login', data={'username': 'sessions', 'password': 'password123'})
+        assert response.status_code == 302
+        return client.get_cookie(self.cookie_name).value
+
+    def test_anonymous_requests_store_nothing(self):
+        """Test that empty sessions get neither a row nor a cookie"""
+        client = self.app.test_client()
+        response = client.get('/')
+        assert response.status_code == 302
+        assert 'Set-Cookie' not in response.headers
+        assert self._rows() == []
+
+    def test_login_stores_session(self):
+        """Test that the cookie holds only the id and the data is read back from the table"""
+        client = self.app.test_client()
+        sid = self._login(client)
+        rows = self._rows()
+        assert [row['id'] for row in rows] == [sid]
+        assert '"user_id"' in rows[0]['data'] and 'sessions' not in sid
+
+        with client.session_transaction() as sess:
+            assert sess['user_id'] == self.user_id
+            assert sess['username'] == 'sessions'
+
+    def test_unchanged_sessions_are_not_written(self):
+        """Test that only changed sessions, or ones due a refresh, are written"""
+        client = self._logged_in_client()
+        # The first form rendered adds the CSRF token
+        client.get('/search_tradesmen')
+        expires_at = self._rows()[0]['expires_at']
+        response = client.get('/search_tradesmen')
+        assert response.status_code == 200
+        assert 'Set-Cookie' not in response.headers
+        assert self._rows()[0]['expires_at'] == expires_at
+
+        self.app.config['SESSION_REFRESH_INTERVAL'] = 0
+        client.get('/search_tradesmen')
+        assert self._rows()[0]['expires_at'] > expires_at
+
+    def test_login_and_logout_change_the_id(self):
+        """Test that logging in issues a new id and logging out removes the session"""
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['pending_invitation'] = 'token'
+        before = client.get_cookie(self.cookie_name).value
+
+        after = self._login(client)
+        assert after != before
+        assert [row['id'] for row in self._rows()] == [after]
+
+        client.get('/logout')
+        assert self._rows() == []
+        assert client.get_cookie(self.cookie_name) is None
+
+    def test_removed_sessions_stay_removed(self):
+        """Test that a request changing a session removed meanwhile doesn't write it back"""
+        client = self._logged_in_client()
+        sid = client.get_cookie(self.cookie_name).value
+        with client.session_transaction() as sess:
+            # Logged out by another request while this one ran
+            with self.app.app_context():
+                SessionService().delete(sid)
+            sess['pending_invitation'] = 'token'
+        assert self._rows() == []
+        assert client.get('/search_tradesmen').status_code == 302
+
+    def test_expiry(self):
+        """Test that expired sessions are not loaded and are removed by the sweeper"""
+        client = self._logged_in_client()
+        sid = client.get_cookie(self.cookie_name).value
+        later = time.time() + self.app.config['SESSION_TIMEOUT'] + 1
+        with self.app.app_context():
+            service = SessionService()
+            assert service.load(sid) is not None
+            assert service.load(sid, now=later) is None
+            assert service.expire() == 0
+            assert service.expire(now=later) == 1
+        response = client.get('/search_tradesmen')
+        assert response.status_code == 302
+
+    def _logged_in_client(self):
+        client = self.app.test_client()
+        self._login(client)
+        return client
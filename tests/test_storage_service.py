@@ -0,0 +1,167 @@
+import pytest
+import tempfile
+import uuid
+import io
+import os
+import datetime
+from pathlib import Path
+from app.services.storage_service import LocalStorage, S3Storage, get_storage, boto3
+from main import create_app
+
+# S3 tests run against a MinIO-style stand-in, e.g.
+#   docker run -p 9000:9000 minio/minio server /data
+#   S3_TEST_ENDPOINT_URL=http://localhost:9000 pytest tests/test_storage_service.py
+S3_TEST_ENDPOINT_URL = os.environ.get('S3_TEST_ENDPOINT_URL')
+
+class TestLocalStorage:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up a temporary storage root"""
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.upload_dir.name)
+        yield
+        self.upload_dir.cleanup()
+
+    def test_save_open_delete(self):
+        """Test the basic file lifecycle"""
+        self.storage.save("quotes/a.pdf", io.BytesIO(b"contents"))
+
+        assert self.storage.exists("quotes/a.pdf")
+        with self.storage.open("quotes/a.pdf") as f:
+            assert f.read() == b"contents"
+        assert self.storage.url("quotes/a.pdf") is None
+        assert self.storage.delete("quotes/a.pdf") == True
+        assert self.storage.delete("quotes/a.pdf") == False
+
+    def test_save_path_moves_file(self):
+        """Test moving a finished local file into storage"""
+        source = Path(self.upload_dir.name) / ".partial" / "upload.part"
+        source.parent.mkdir()
+        source.write_bytes(b"chunked")
+
+        self.storage.save_path("jobs/b.pdf", source)
+
+        assert not source.exists()
+        assert (Path(self.upload_dir.name) / "jobs" / "b.pdf").read_bytes() == b"chunked"
+
+    def test_list_keys_skips_partial_uploads(self):
+        """Test that in-progress uploads aren't listed as stored files"""
+        self.storage.save("quotes/a.pdf", io.BytesIO(b"a"))
+        partial = Path(self.upload_dir.name) / ".partial" / "upload.part"
+        partial.parent.mkdir()
+        partial.write_bytes(b"partial")
+
+        assert [key for key, _ in self.storage.list_keys()] == ["quotes/a.pdf"]
+
+    def test_rejects_path_traversal(self):
+        """Test that keys can't escape the storage root"""
+        with pytest.raises(ValueError):
+            self.storage.save("../outside.pdf", io.BytesIO(b"x"))
+
+    def test_app_uses_configured_backend(self):
+        """Test that the app builds its backend from config"""
+        app = create_app()
+        app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        with app.app_context():
+            storage = get_storage()
+            assert isinstance(storage, LocalStorage)
+            assert storage.root == Path(self.upload_dir.name)
+
+
+@pytest.mark.skipif(boto3 is None, reason="needs boto3")
+class TestS3StorageRequests:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up S3 storage with a stubbed client, to check the requests it makes"""
+        from botocore.stub import Stubber
+        self.storage = S3Storage(bucket="test-bucket", region='us-east-1',
+                                 access_key='test', secret_key='test')
+        self.stubber = Stubber(self.storage.client)
+        with self.stubber:
+            yield
+        self.stubber.assert_no_pending_responses()
+
+    def test_delete_is_a_single_request(self):
+        """Test that deleting doesn't check for the object first"""
+        self.stubber.add_response('delete_object', {}, {'Bucket': "test-bucket", 'Key': "quotes/a.pdf"})
+
+        assert self.storage.delete("quotes/a.pdf") == True
+
+    def test_exists(self):
+        """Test that a missing object is reported rather than raised"""
+        self.stubber.add_response('head_object', {'ContentLength': 8},
+                                  {'Bucket': "test-bucket", 'Key': "quotes/a.pdf"})
+        self.stubber.add_client_error('head_object', service_error_code='404', http_status_code=404,
+                                      expected_params={'Bucket': "test-bucket", 'Key': "quotes/b.pdf"})
+
+        assert self.storage.exists("quotes/a.pdf")
+        assert not self.storage.exists("quotes/b.pdf")
+
+    def test_list_keys(self):
+        """Test that listed keys come with their modification times"""
+        modified = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self.stubber.add_response('list_objects_v2', {
+            'Contents': [{'Key': "quotes/a.pdf", 'LastModified': modified}],
+            'IsTruncated': False
+        }, {'Bucket': "test-bucket"})
+
+        assert list(self.storage.list_keys()) == [("quotes/a.pdf", modified.timestamp())]
+
+    def test_presigned_url(self):
+        """Test that URLs are signed locally and name the download"""
+        url = self.storage.url("quotes/a.pdf", "a.pdf")
+
+        assert "X-Amz-Signature" in url
+        assert "response-content-disposition" in url
+
+
+@pytest.mark.skipif(boto3 is None or not S3_TEST_ENDPOINT_URL,
+                    reason="needs boto3 and S3_TEST_ENDPOINT_URL pointing at MinIO")
+class TestS3Storage:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Create a throwaway bucket on the test endpoint"""
+        self.storage = S3Storage(
+            bucket=f"test-{uuid.uuid4().hex[:12]}",
+            endpoint_url=S3_TEST_ENDPOINT_URL,
+            region='us-east-1',
+            access_key=os.environ.get('S3_TEST_ACCESS_KEY_ID', 'minioadmin'),
+            secret_key=os.environ.get('S3_TEST_SECRET_ACCESS_KEY', 'minioadmin'),
+            multipart_threshold=5 * 1024 * 1024,
+            multipart_chunksize=5 * 1024 * 1024
+        )
+        self.storage.ensure_bucket()
+        yield
+        for key, _ in list(self.storage.list_keys()):
+            self.storage.delete(key)
+        self.storage.client.delete_bucket(Bucket=self.storage.bucket)
+
+    def test_save_open_delete(self):
+        """Test the basic file lifecycle"""
+        self.storage.save("quotes/a.pdf", io.BytesIO(b"contents"))
+
+        assert self.storage.exists("quotes/a.pdf")
+        assert self.storage.open("quotes/a.pdf").read() == b"contents"
+        assert [key for key, _ in self.storage.list_keys()] == ["quotes/a.pdf"]
+        assert self.storage.delete("quotes/a.pdf") == True
+        assert not self.storage.exists("quotes/a.pdf")
+
+    def test_large_file_uses_multipart_upload(self):
+        """Test that files above the threshold are streamed in parts"""
+        content = os.urandom(11 * 1024 * 1024)
+        self.storage.save("jobs/large.pdf", io.BytesIO(content))
+
+        head = self.storage.client.head_object(Bucket=self.storage.bucket, Key="jobs/large.pdf")
+        # Multipart ETags carry the part count
+        assert head['ETag'].strip('"').endswith('-3')
+        assert self.storage.open("jobs/large.pdf").read() == content
+
+    def test_presigned_url(self):
+        """Test that downloads are served through presigned URLs"""
+        import requests
+        self.storage.save("quotes/a.pdf", io.BytesIO(b"contents"))
+
+        url = self.storage.url("quotes/a.pdf", "a.pdf")
+
+        assert "X-Amz-Signature" in url
+        assert requests.get(url).content == b"contents"
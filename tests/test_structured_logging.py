@@ -0,0 +1,109 @@
+import pytest
+import tempfile
+import logging
+import shutil
+import json
+import time
+import os
+from app.services import database
+from app.services.database import DatabaseService
+from app.services.user_service import UserService
+from app.structured_logging import SizeAndTimeRotatingFileHandler, stop_logging
+from config import get_config
+from main import create_app, setup_logging
+
+
+class TestStructuredLogging:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Set up test database and an app logging to a temporary file"""
+        # Create a temporary file for the test database
+        self.temp_db_fd, self.temp_db_path = tempfile.mkstemp(suffix='.db')
+        os.close(self.temp_db_fd)  # Close the file descriptor
+        self.log_dir = tempfile.mkdtemp()
+
+        # The routes use the shared database service; point it at the test database
+        previous_path = database.db_service.database_path
+        database.db_service.database_path = self.temp_db_path
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.config = get_config()
+        self.config.LOG_FILE = os.path.join(self.log_dir, 'app.log')
+        self.config.LOG_LEVEL = 'INFO'
+        setup_logging(self.app, self.config)
+
+        with self.app.app_context():
+            DatabaseService(self.temp_db_path).init_db()
+            self.user_id = UserService().create_user("logger", "Test", "User", "logger@example.com",
+                                                     "SW1A 1AA", "password123")
+
+        yield
+
+        stop_logging()
+        database.db_service.database_path = previous_path
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+        try:
+            os.unlink(self.temp_db_path)
+        except OSError:
+            pass  # File might already be deleted
+
+    def _records(self):
+        # Stopping the pipeline writes out everything still queued
+        stop_logging()
+        with open(self.config.LOG_FILE, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_request_records(self):
+        """Test that records made during a request carry its id, user and route, plus an access record"""
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+        response = client.get('/search_tradesmen', headers={'X-Request-ID': 'abc123'})
+        assert response.headers['X-Request-ID'] == 'abc123'
+        with self.app.test_request_context('/search_tradesmen'):
+            self.app.preprocess_request()
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logging.getLogger('app.services.invitation_service').exception("Error sending invitation email")
+
+        records = self._records()
+        access = next(record for record in records if record['logger'] == 'app.requests')
+        assert access['request_id'] == 'abc123'
+        assert access['user_id'] == self.user_id
+        assert access['route'] == 'search.search_tradesmen'
+        assert access['status'] == 200
+        assert access['duration_ms'] >= 0
+
+        error = next(record for record in records if record['logger'] == 'app.services.invitation_service')
+        assert error['level'] == 'ERROR'
+        assert error['message'] == "Error sending invitation email"
+        assert 'ValueError: boom' in error['exception']
+        assert len(error['request_id']) == 32
+
+    def test_text_format(self):
+        """Test the plain format for reading logs by eye"""
+        self.config.LOG_FORMAT = 'text'
+        setup_logging(self.app, self.config)
+        self.app.logger.warning("Disk nearly full")
+        stop_logging()
+        with open(self.config.LOG_FILE, encoding='utf-8') as f:
+            assert 'WARNING: Disk nearly full' in f.read()
+
+    def test_rotation(self):
+        """Test rotation by size and by age"""
+        path = os.path.join(self.log_dir, 'rotating.log')
+        handler = SizeAndTimeRotatingFileHandler(path, max_bytes=100, backup_count=2, interval=3600)
+        record = logging.makeLogRecord({'msg': 'x' * 60})
+        handler.emit(record)
+        handler.emit(record)
+        assert os.path.exists(f"{path}.1")
+
+        handler.rollover_at = time.time() - 1
+        assert handler.shouldRollover(logging.makeLogRecord({'msg': 'x'}))
+        handler.emit(logging.makeLogRecord({'msg': 'x'}))
+        assert os.path.exists(f"{path}.2")
+        assert handler.rollover_at > time.time()
+        handler.close()